@@ -46,6 +46,28 @@ resource "aws_cloudwatch_log_group" "api_gateway_logs" {
   retention_in_days = 30
 }
 
+# Lambda authorizer for all endpoints except signup and login. API Gateway caches its result per
+# authorization header, so a token is verified at most once per cache TTL
+resource "aws_apigatewayv2_authorizer" "jwt_authorizer" {
+  api_id                            = aws_apigatewayv2_api.paypulse_api.id
+  name                              = "jwt-authorizer"
+  authorizer_type                   = "REQUEST"
+  authorizer_uri                    = module.lambdas.authorizer_invoke_arn
+  authorizer_payload_format_version = "2.0"
+  enable_simple_responses           = true
+  identity_sources                  = ["$request.header.Authorization"]
+  authorizer_result_ttl_in_seconds  = var.authorizer_cache_ttl_seconds
+}
+
+# Allow APIGateway to invoke the authorizer lambda function
+resource "aws_lambda_permission" "authorizer_api_permission" {
+  statement_id  = "AllowAPIGatewayInvokeAuthorizer"
+  action        = "lambda:InvokeFunction"
+  function_name = module.lambdas.authorizer_function_name
+  principal     = "apigateway.amazonaws.com"
+  source_arn    = "${aws_apigatewayv2_api.paypulse_api.execution_arn}/authorizers/${aws_apigatewayv2_authorizer.jwt_authorizer.id}"
+}
+
 # ============================================================================
 # API ENDPOINT CONFIGURATIONS
 # Each endpoint requires: integration, route, and lambda permission
@@ -122,6 +144,9 @@ resource "aws_apigatewayv2_route" "fetch_invoices_route" {
   api_id    = aws_apigatewayv2_api.paypulse_api.id
   route_key = "POST /${var.api_version}/invoices/{type}/ingest"
   target    = "integrations/${aws_apigatewayv2_integration.fetch_invoices_integration.id}"
+
+  authorization_type = "CUSTOM"
+  authorizer_id      = aws_apigatewayv2_authorizer.jwt_authorizer.id
 }
 
 # Allow API Gateway to invoke the fetch_invoices lambda function
@@ -149,6 +174,9 @@ resource "aws_apigatewayv2_route" "fetch_latest_invoice_route" {
   api_id    = aws_apigatewayv2_api.paypulse_api.id
   route_key = "POST /${var.api_version}/invoices/{type}/ingest/latest"
   target    = "integrations/${aws_apigatewayv2_integration.fetch_latest_invoice_integration.id}"
+
+  authorization_type = "CUSTOM"
+  authorizer_id      = aws_apigatewayv2_authorizer.jwt_authorizer.id
 }
 
 # Allow API Gateway to invoke the fetch_latest_invoice lambda function
@@ -176,6 +204,9 @@ resource "aws_apigatewayv2_route" "delete_user_route" {
   api_id    = aws_apigatewayv2_api.paypulse_api.id
   route_key = "DELETE /${var.api_version}/user/me"
   target    = "integrations/${aws_apigatewayv2_integration.delete_user_integration.id}"
+
+  authorization_type = "CUSTOM"
+  authorizer_id      = aws_apigatewayv2_authorizer.jwt_authorizer.id
 }
 
 # Allow APIGateway to invoke the delete_user lambda function
@@ -203,6 +234,9 @@ resource "aws_apigatewayv2_route" "get_rental_invoices_route" {
   api_id    = aws_apigatewayv2_api.paypulse_api.id
   route_key = "GET /${var.api_version}/invoices/{type}"
   target    = "integrations/${aws_apigatewayv2_integration.get_rental_invoices_integration.id}"
+
+  authorization_type = "CUSTOM"
+  authorizer_id      = aws_apigatewayv2_authorizer.jwt_authorizer.id
 }
 
 # Allow APIGateway to invoke the get_rental_invoices lambda function
@@ -230,6 +264,9 @@ resource "aws_apigatewayv2_route" "get_rental_invoice_route" {
   api_id    = aws_apigatewayv2_api.paypulse_api.id
   route_key = "GET /${var.api_version}/invoices/{type}/{invoice_id}"
   target    = "integrations/${aws_apigatewayv2_integration.get_rental_invoice_integration.id}"
+
+  authorization_type = "CUSTOM"
+  authorizer_id      = aws_apigatewayv2_authorizer.jwt_authorizer.id
 }
 
 # Allow APIGateway to invoke the get_rental_invoice lambda function
@@ -257,6 +294,9 @@ resource "aws_apigatewayv2_route" "get_user_profile_route" {
   api_id    = aws_apigatewayv2_api.paypulse_api.id
   route_key = "GET /${var.api_version}/user/me"
   target    = "integrations/${aws_apigatewayv2_integration.get_user_profile_integration.id}"
+
+  authorization_type = "CUSTOM"
+  authorizer_id      = aws_apigatewayv2_authorizer.jwt_authorizer.id
 }
 
 # Allow APIGateway to invoke the get_user_profile lambda function
@@ -284,6 +324,9 @@ resource "aws_apigatewayv2_route" "gmail_store_tokens_route" {
   api_id    = aws_apigatewayv2_api.paypulse_api.id
   route_key = "POST /${var.api_version}/auth/gmail/store-tokens"
   target    = "integrations/${aws_apigatewayv2_integration.gmail_store_tokens_integration.id}"
+
+  authorization_type = "CUSTOM"
+  authorizer_id      = aws_apigatewayv2_authorizer.jwt_authorizer.id
 }
 
 # Allow APIGateway to invoke the gmail_store_tokens lambda function
@@ -293,4 +336,94 @@ resource "aws_lambda_permission" "gmail_store_tokens_api_permission" {
   function_name = module.lambdas.gmail_store_tokens_function_name
   principal     = "apigateway.amazonaws.com"
   source_arn    = "${aws_apigatewayv2_api.paypulse_api.execution_arn}/*/*"
-}
\ No newline at end of file
+}
+
+# --- Endpoint for get_invoice_aggregates ---
+
+# Connect APIGateway to get_invoice_aggregates lambda function
+resource "aws_apigatewayv2_integration" "get_invoice_aggregates_integration" {
+  api_id                 = aws_apigatewayv2_api.paypulse_api.id
+  integration_type       = "AWS_PROXY"
+  integration_uri        = module.lambdas.get_invoice_aggregates_invoke_arn
+  integration_method     = "POST"
+  payload_format_version = "2.0"
+}
+
+# Create a route (URL path/invoices/{type}/aggregates)
+resource "aws_apigatewayv2_route" "get_invoice_aggregates_route" {
+  api_id    = aws_apigatewayv2_api.paypulse_api.id
+  route_key = "GET /${var.api_version}/invoices/{type}/aggregates"
+  target    = "integrations/${aws_apigatewayv2_integration.get_invoice_aggregates_integration.id}"
+
+  authorization_type = "CUSTOM"
+  authorizer_id      = aws_apigatewayv2_authorizer.jwt_authorizer.id
+}
+
+# Allow APIGateway to invoke the get_invoice_aggregates lambda function
+resource "aws_lambda_permission" "get_invoice_aggregates_api_permission" {
+  statement_id  = "AllowAPIGatewayInvoke"
+  action        = "lambda:InvokeFunction"
+  function_name = module.lambdas.get_invoice_aggregates_function_name
+  principal     = "apigateway.amazonaws.com"
+  source_arn    = "${aws_apigatewayv2_api.paypulse_api.execution_arn}/*/*"
+}
+
+# --- Endpoint for get_deletion_status ---
+
+# Connect APIGateway to get_deletion_status lambda function
+resource "aws_apigatewayv2_integration" "get_deletion_status_integration" {
+  api_id                 = aws_apigatewayv2_api.paypulse_api.id
+  integration_type       = "AWS_PROXY"
+  integration_uri        = module.lambdas.get_deletion_status_invoke_arn
+  integration_method     = "POST"
+  payload_format_version = "2.0"
+}
+
+# Create a route (URL path/user/me/deletion)
+resource "aws_apigatewayv2_route" "get_deletion_status_route" {
+  api_id    = aws_apigatewayv2_api.paypulse_api.id
+  route_key = "GET /${var.api_version}/user/me/deletion"
+  target    = "integrations/${aws_apigatewayv2_integration.get_deletion_status_integration.id}"
+
+  authorization_type = "CUSTOM"
+  authorizer_id      = aws_apigatewayv2_authorizer.jwt_authorizer.id
+}
+
+# Allow APIGateway to invoke the get_deletion_status lambda function
+resource "aws_lambda_permission" "get_deletion_status_api_permission" {
+  statement_id  = "AllowAPIGatewayInvoke"
+  action        = "lambda:InvokeFunction"
+  function_name = module.lambdas.get_deletion_status_function_name
+  principal     = "apigateway.amazonaws.com"
+  source_arn    = "${aws_apigatewayv2_api.paypulse_api.execution_arn}/*/*"
+}
+
+# --- Endpoint for get_invoice_pdf_url ---
+
+# Connect APIGateway to get_invoice_pdf_url lambda function
+resource "aws_apigatewayv2_integration" "get_invoice_pdf_url_integration" {
+  api_id                 = aws_apigatewayv2_api.paypulse_api.id
+  integration_type       = "AWS_PROXY"
+  integration_uri        = module.lambdas.get_invoice_pdf_url_invoke_arn
+  integration_method     = "POST"
+  payload_format_version = "2.0"
+}
+
+# Create a route (URL path/invoices/{type}/{invoice_id}/pdf)
+resource "aws_apigatewayv2_route" "get_invoice_pdf_url_route" {
+  api_id    = aws_apigatewayv2_api.paypulse_api.id
+  route_key = "GET /${var.api_version}/invoices/{type}/{invoice_id}/pdf"
+  target    = "integrations/${aws_apigatewayv2_integration.get_invoice_pdf_url_integration.id}"
+
+  authorization_type = "CUSTOM"
+  authorizer_id      = aws_apigatewayv2_authorizer.jwt_authorizer.id
+}
+
+# Allow APIGateway to invoke the get_invoice_pdf_url lambda function
+resource "aws_lambda_permission" "get_invoice_pdf_url_api_permission" {
+  statement_id  = "AllowAPIGatewayInvoke"
+  action        = "lambda:InvokeFunction"
+  function_name = module.lambdas.get_invoice_pdf_url_function_name
+  principal     = "apigateway.amazonaws.com"
+  source_arn    = "${aws_apigatewayv2_api.paypulse_api.execution_arn}/*/*"
+}
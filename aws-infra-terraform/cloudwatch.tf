@@ -16,4 +16,19 @@ resource "aws_cloudwatch_log_group" "parse_invoice" {
 resource "aws_cloudwatch_log_group" "send_invoice_notification" {
   name              = "/aws/lambda/send_invoice_notification"
   retention_in_days = 90
-}
\ No newline at end of file
+}
+
+resource "aws_cloudwatch_log_group" "process_invoice_stream" {
+  name              = "/aws/lambda/process_invoice_stream"
+  retention_in_days = 90
+}
+
+resource "aws_cloudwatch_log_group" "refresh_oauth_tokens" {
+  name              = "/aws/lambda/refresh_oauth_tokens"
+  retention_in_days = 90
+}
+
+resource "aws_cloudwatch_log_group" "authorizer" {
+  name              = "/aws/lambda/authorizer"
+  retention_in_days = 90
+}
@@ -39,6 +39,21 @@ resource "aws_dynamodb_table" "rental_invoices" {
     type = "S"
   }
 
+  # the invoices of a user by due date, which get_rental_invoices pages through
+  global_secondary_index {
+    name            = "${var.invoices_table_hash_key}-${var.invoices_table_due_date_key}-index"
+    hash_key        = var.invoices_table_hash_key
+    range_key       = var.invoices_table_due_date_key
+    projection_type = "ALL"
+    read_capacity   = 5
+    write_capacity  = 5
+  }
+
+  attribute {
+    name = var.invoices_table_due_date_key
+    type = "S"
+  }
+
   stream_enabled   = true
   stream_view_type = "NEW_AND_OLD_IMAGES"
 
@@ -81,3 +96,28 @@ resource "aws_dynamodb_table" "users" {
     Environment = "production"
   }
 }
+
+# Invoice aggregates table
+
+resource "aws_dynamodb_table" "invoice_aggregates" {
+  name         = var.invoice_aggregates_table
+  billing_mode = "PAY_PER_REQUEST"
+
+  hash_key  = var.users_table_hash_key
+  # one item per year ('YYYY') and per month ('YYYY-MM') of a user's invoices
+  range_key = var.invoice_aggregates_table_range_key
+
+  attribute {
+    name = var.users_table_hash_key
+    type = "S"
+  }
+
+  attribute {
+    name = var.invoice_aggregates_table_range_key
+    type = "S"
+  }
+
+  server_side_encryption {
+    enabled = true
+  }
+}
@@ -11,6 +11,63 @@ resource "aws_lambda_event_source_mapping" "send_invoice_notification_trigger" {
   event_source_arn = aws_dynamodb_table.rental_invoices.stream_arn
   function_name     = module.lambdas.send_invoice_notification_arn
   starting_position = "LATEST"
-  batch_size        = 1
+  batch_size        = 100
+  # fetch_invoices uploads all invoices of a backfill at once, so their INSERTs arrive within seconds of each other.
+  # This window lets the function coalesce them into one notification per user, and is the most a single new invoice
+  # waits for its notification. A backfill that takes longer than the window is split into a few digests
+  maximum_batching_window_in_seconds = 5
+  # the function reports the records it couldn't notify about, and only those (and the ones after them) are retried
+  function_response_types = ["ReportBatchItemFailures"]
+  # don't let a record that keeps failing block the shard forever
+  maximum_retry_attempts  = 5
+  # the records given up on are sent to this queue instead of being dropped silently
+  destination_config {
+    on_failure {
+      destination_arn = aws_sqs_queue.send_invoice_notification_failures.arn
+    }
+  }
   enabled           = true
-}
\ No newline at end of file
+}
+
+# DynamoDB trigger event for process_invoice_stream lambda function
+resource "aws_lambda_event_source_mapping" "process_invoice_stream_trigger" {
+  event_source_arn  = aws_dynamodb_table.rental_invoices.stream_arn
+  function_name     = module.lambdas.process_invoice_stream_arn
+  starting_position = "LATEST"
+  batch_size        = 100
+  maximum_batching_window_in_seconds = 1
+  # the function reports the records of the users it couldn't process, and only those (and the ones after them) are
+  # retried
+  function_response_types = ["ReportBatchItemFailures"]
+  # a batch that fails as a whole is split in halves, so a malformed record is isolated instead of failing its batch
+  bisect_batch_on_function_error = true
+  # don't let a record that keeps failing block the shard, and with it the cache invalidation and the aggregates
+  maximum_retry_attempts  = 5
+  destination_config {
+    on_failure {
+      destination_arn = aws_sqs_queue.process_invoice_stream_failures.arn
+    }
+  }
+  enabled           = true
+}
+
+# Scheduled trigger for refresh_oauth_tokens lambda function
+resource "aws_cloudwatch_event_rule" "oauth_token_refresh_trigger" {
+  name                = var.oauth_token_refresh_trigger
+  schedule_expression = var.oauth_token_refresh_schedule
+  is_enabled          = true
+}
+
+resource "aws_cloudwatch_event_target" "oauth_token_refresh_target" {
+  rule = aws_cloudwatch_event_rule.oauth_token_refresh_trigger.name
+  arn  = module.lambdas.refresh_oauth_tokens_arn
+}
+
+# permission for the token refresh trigger to invoke the refresh_oauth_tokens lambda function
+resource "aws_lambda_permission" "refresh_oauth_tokens_event" {
+  statement_id  = "AllowEventBridgeToInvokeRefreshOAuthTokens"
+  action        = "lambda:InvokeFunction"
+  function_name = module.lambdas.refresh_oauth_tokens_function_name
+  principal     = "events.amazonaws.com"
+  source_arn    = aws_cloudwatch_event_rule.oauth_token_refresh_trigger.arn
+}
@@ -206,4 +206,21 @@ resource "aws_iam_role_policy_attachment" "lambda_role_policies" {
 
   role       = aws_iam_role.wallenstam_lambda_role.name
   policy_arn = each.value
-}
\ No newline at end of file
+}
+# the on-failure destinations of the stream mappings of send_invoice_notification and process_invoice_stream are
+# written with the functions' role
+resource "aws_iam_role_policy" "lambda_role_failure_queue" {
+  name = "stream_failure_queues"
+  role = aws_iam_role.wallenstam_lambda_role.id
+  policy = jsonencode({
+    Version = "2012-10-17",
+    Statement = [{
+      Effect   = "Allow",
+      Action   = "sqs:SendMessage",
+      Resource = [
+        var.send_invoice_notification_failures_queue_arn,
+        var.process_invoice_stream_failures_queue_arn
+      ]
+    }]
+  })
+}
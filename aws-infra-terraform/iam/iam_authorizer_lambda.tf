@@ -0,0 +1,19 @@
+# the authorizer only verifies tokens, so it doesn't need any permissions besides writing its logs
+resource "aws_iam_role" "authorizer_lambda_role" {
+  name = "authorizer_lambda_role"
+  assume_role_policy = jsonencode({
+    Version = "2012-10-17",
+    Statement = [{
+      Action    = "sts:AssumeRole",
+      Effect    = "Allow",
+      Principal = {
+        Service = "lambda.amazonaws.com"
+      }
+    }]
+  })
+}
+
+resource "aws_iam_role_policy_attachment" "authorizer_lambda_basic_execution" {
+  role       = aws_iam_role.authorizer_lambda_role.name
+  policy_arn = "arn:aws:iam::aws:policy/service-role/AWSLambdaBasicExecutionRole"
+}
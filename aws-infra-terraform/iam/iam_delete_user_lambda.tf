@@ -21,12 +21,16 @@ resource "aws_iam_policy" "delete_user_lambda_policy" {
         Effect = "Allow",
         Action = [
           "dynamodb:Query",
+          "dynamodb:GetItem",
           "dynamodb:DeleteItem",
+          "dynamodb:UpdateItem",
+          "dynamodb:BatchWriteItem",
           "dynamodb:Scan"
         ],
         Resource = [
           var.rental_invoices_table_arn,
-          var.users_table_arn
+          var.users_table_arn,
+          var.invoice_aggregates_table_arn
         ]
       },
       {
@@ -46,6 +50,14 @@ resource "aws_iam_policy" "delete_user_lambda_policy" {
           "secretsmanager:DeleteSecret"
         ],
         Resource = "*"
+      },
+      {
+        # shared with delete_user_job, which continues a deletion in a new invocation when it runs out of time
+        Effect = "Allow",
+        Action = [
+          "lambda:InvokeFunction"
+        ],
+        Resource = "arn:aws:lambda:${var.aws_region}:${data.aws_caller_identity.current.account_id}:function:${var.lambda_delete_user_job}"
       }
     ]
   })
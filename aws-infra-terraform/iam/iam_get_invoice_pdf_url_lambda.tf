@@ -0,0 +1,47 @@
+resource "aws_iam_role" "get_invoice_pdf_url_lambda_role" {
+  name = "get_invoice_pdf_url_lambda_role"
+  assume_role_policy = jsonencode({
+    Version = "2012-10-17",
+    Statement = [{
+      Action    = "sts:AssumeRole",
+      Effect    = "Allow",
+      Principal = {
+        Service = "lambda.amazonaws.com"
+      }
+    }]
+  })
+}
+
+resource "aws_iam_policy" "get_invoice_pdf_url_lambda_policy" {
+  name = "Get-Invoice-PDF-URL-Lambda-Policy"
+  policy = jsonencode({
+    Version = "2012-10-17",
+    Statement = [
+      {
+        Effect = "Allow",
+        Action = [
+          "dynamodb:GetItem"
+        ],
+        Resource = var.rental_invoices_table_arn
+      },
+      {
+        # presigned URLs carry the permissions of the role that signed them
+        Effect = "Allow",
+        Action = [
+          "s3:GetObject"
+        ],
+        Resource = "arn:aws:s3:::${var.invoices_bucket_name}/rental-invoices/*"
+      }
+    ]
+  })
+}
+
+resource "aws_iam_role_policy_attachment" "get_invoice_pdf_url_lambda_basic_execution" {
+  role       = aws_iam_role.get_invoice_pdf_url_lambda_role.name
+  policy_arn = "arn:aws:iam::aws:policy/service-role/AWSLambdaBasicExecutionRole"
+}
+
+resource "aws_iam_role_policy_attachment" "get_invoice_pdf_url_lambda_role_attachment" {
+  role       = aws_iam_role.get_invoice_pdf_url_lambda_role.name
+  policy_arn = aws_iam_policy.get_invoice_pdf_url_lambda_policy.arn
+}
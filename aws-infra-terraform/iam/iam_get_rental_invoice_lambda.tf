@@ -23,6 +23,13 @@ resource "aws_iam_policy" "get_rental_invoice_lambda_policy" {
           "dynamodb:Query"
         ],
         Resource = var.rental_invoices_table_arn
+      },
+      {
+        Effect = "Allow",
+        Action = [
+          "dynamodb:GetItem"
+        ],
+        Resource = var.users_table_arn
       }
     ]
   })
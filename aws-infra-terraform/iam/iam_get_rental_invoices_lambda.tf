@@ -22,7 +22,17 @@ resource "aws_iam_policy" "get_rental_invoices_lambda_policy" {
         Action = [
           "dynamodb:Query"
         ],
-        Resource = var.rental_invoices_table_arn
+        Resource = [
+          var.rental_invoices_table_arn,
+          "${var.rental_invoices_table_arn}/index/*"
+        ]
+      },
+      {
+        Effect = "Allow",
+        Action = [
+          "dynamodb:GetItem"
+        ],
+        Resource = var.users_table_arn
       }
     ]
   })
@@ -32,6 +32,13 @@ resource "aws_iam_policy" "gmail_store_tokens_lambda_policy" {
           var.google_oauth_client_id_secret_arn
         ]
       },
+      {
+        Action = [
+          "dynamodb:UpdateItem"
+        ],
+        Effect = "Allow",
+        Resource = var.users_table_arn
+      },
       {
         Action = [
           "logs:CreateLogGroup",
@@ -22,7 +22,8 @@ resource "aws_iam_policy" "login_lambda_policy" {
       {
         Action = [
           "dynamodb:GetItem",
-          "dynamodb:Query"
+          "dynamodb:Query",
+          "dynamodb:UpdateItem"
         ],
         Effect = "Allow",
         Resource = var.users_table_arn
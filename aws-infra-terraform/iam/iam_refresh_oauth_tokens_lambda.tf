@@ -0,0 +1,48 @@
+resource "aws_iam_role" "refresh_oauth_tokens_lambda_role" {
+  name = "refresh_oauth_tokens_lambda_role"
+  assume_role_policy = jsonencode({
+    Version = "2012-10-17",
+    Statement = [{
+      Action    = "sts:AssumeRole",
+      Effect    = "Allow",
+      Principal = {
+        Service = "lambda.amazonaws.com"
+      }
+    }]
+  })
+}
+
+resource "aws_iam_policy" "refresh_oauth_tokens_lambda_policy" {
+  name = "Refresh-OAuth-Tokens-Lambda-Policy"
+  policy = jsonencode({
+    Version = "2012-10-17",
+    Statement = [
+      {
+        Effect = "Allow",
+        Action = [
+          "secretsmanager:GetSecretValue",
+          "secretsmanager:UpdateSecret"
+        ],
+        Resource = "arn:aws:secretsmanager:*:*:secret:gmail/user/*"
+      },
+      {
+        Effect = "Allow",
+        Action = [
+          "dynamodb:Scan",
+          "dynamodb:UpdateItem"
+        ],
+        Resource = var.users_table_arn
+      }
+    ]
+  })
+}
+
+resource "aws_iam_role_policy_attachment" "refresh_oauth_tokens_lambda_basic_execution" {
+  role       = aws_iam_role.refresh_oauth_tokens_lambda_role.name
+  policy_arn = "arn:aws:iam::aws:policy/service-role/AWSLambdaBasicExecutionRole"
+}
+
+resource "aws_iam_role_policy_attachment" "refresh_oauth_tokens_lambda_role_attachment" {
+  role       = aws_iam_role.refresh_oauth_tokens_lambda_role.name
+  policy_arn = aws_iam_policy.refresh_oauth_tokens_lambda_policy.arn
+}
@@ -43,4 +43,29 @@ output "get_user_profile_lambda_role_arn" {
 output "gmail_store_tokens_lambda_role_arn" {
   description = "ARN of the Gmail store tokens lambda role"
   value       = aws_iam_role.gmail_store_tokens_lambda_role.arn
-}
\ No newline at end of file
+}
+
+output "get_invoice_aggregates_lambda_role_arn" {
+  description = "ARN of the get invoice aggregates lambda role"
+  value       = aws_iam_role.get_invoice_aggregates_lambda_role.arn
+}
+
+output "refresh_oauth_tokens_lambda_role_arn" {
+  description = "ARN of the refresh oauth tokens lambda role"
+  value       = aws_iam_role.refresh_oauth_tokens_lambda_role.arn
+}
+
+output "authorizer_lambda_role_arn" {
+  description = "ARN of the authorizer lambda role"
+  value       = aws_iam_role.authorizer_lambda_role.arn
+}
+
+output "get_deletion_status_lambda_role_arn" {
+  description = "ARN of the get deletion status lambda role"
+  value       = aws_iam_role.get_deletion_status_lambda_role.arn
+}
+
+output "get_invoice_pdf_url_lambda_role_arn" {
+  description = "ARN of the get invoice pdf url lambda role"
+  value       = aws_iam_role.get_invoice_pdf_url_lambda_role.arn
+}
@@ -23,6 +23,11 @@ variable "lambda_role" {
   description = "The lambda role name"
 }
 
+variable "lambda_delete_user_job" {
+  type        = string
+  description = "Name of the lambda function running account deletions asynchronously"
+}
+
 variable "invoices_bucket_name" {
   type        = string
   description = "The S3 bucket which stores the rental invoices"
@@ -39,6 +44,11 @@ variable "rental_invoices_table_arn" {
   description = "The ARN of the rental invoices DynamoDB table"
 }
 
+variable "invoice_aggregates_table_arn" {
+  type        = string
+  description = "The ARN of the invoice aggregates DynamoDB table"
+}
+
 # Secrets Manager reference
 variable "jwt_secret_arn" {
   type        = string
@@ -49,3 +59,14 @@ variable "google_oauth_client_id_secret_arn" {
   type        = string
   description = "The ARN of the Google OAuth client ID secret"
 }
+
+# SQS reference
+variable "send_invoice_notification_failures_queue_arn" {
+  type        = string
+  description = "The ARN of the queue receiving the stream records send_invoice_notification failed to notify about"
+}
+
+variable "process_invoice_stream_failures_queue_arn" {
+  type        = string
+  description = "The ARN of the queue receiving the stream records process_invoice_stream failed to process"
+}
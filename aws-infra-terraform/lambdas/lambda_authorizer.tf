@@ -0,0 +1,36 @@
+# this fetches the latest version of the authorizer.zip file from S3
+data "aws_s3_bucket_object" "authorizer_zip" {
+  bucket = var.lambda_bucket_id
+  key    = "${var.lambda_authorizer}.zip"
+}
+
+# === Authorizer lambda function ===
+resource "aws_lambda_function" "authorizer" {
+  description   = "This function is the Lambda authorizer of PayPulseAPI. It verifies the JWT token of a request, and passes the user ID on to the protected lambda functions."
+  function_name = var.lambda_authorizer
+  role          = var.authorizer_lambda_role_arn
+  runtime       = var.python_runtime
+  handler       = "main.lambda_handler"
+
+  timeout       = 5
+  memory_size   = 128
+
+  environment {
+    variables = {
+      JWT_SECRET = var.jwt_secret_version_secret_string
+    }
+  }
+
+  logging_config {
+    log_format = "JSON"
+  }
+
+  layers = [
+    aws_lambda_layer_version.utils_layer.arn,
+    aws_lambda_layer_version.pyjwt_layer.arn
+  ]
+
+  s3_bucket         = var.lambda_bucket_id
+  s3_key            = "${var.lambda_authorizer}.zip"
+  s3_object_version = data.aws_s3_bucket_object.authorizer_zip.version_id
+}
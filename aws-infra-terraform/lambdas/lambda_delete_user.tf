@@ -6,7 +6,7 @@ data "aws_s3_bucket_object" "delete_user_zip" {
 
 # === Delete-user lambda function ===
 resource "aws_lambda_function" "delete_user" {
-  description   = "This function is used to delete a user's account from PayPulse. This deletes the user's invoices from the RentalInvoices table, their secrets, their S3 folder, and finally their record from the Users table."
+  description   = "This function is used to delete a user's account from PayPulse. This deletes the user's invoices, invoice aggregates, secrets and S3 folder concurrently, and finally their record from the Users table. Deletions that don't finish in time are handed over to delete_user_job."
   function_name = "delete_user"
   role          = var.delete_user_lambda_role_arn
   runtime       = var.python_runtime
@@ -17,10 +17,12 @@ resource "aws_lambda_function" "delete_user" {
 
   environment {
     variables = {
-      USERS_TABLE    = var.users_table_name
-      INVOICES_TABLE = var.rental_invoices_table_name
-      BUCKET_NAME    = var.invoices_bucket_name
-      JWT_SECRET     = var.jwt_secret_version_secret_string
+      USERS_TABLE           = var.users_table_name
+      INVOICES_TABLE        = var.rental_invoices_table_name
+      AGGREGATES_TABLE      = var.invoice_aggregates_table_name
+      BUCKET_NAME           = var.invoices_bucket_name
+      JWT_SECRET            = var.jwt_secret_version_secret_string
+      DELETION_JOB_FUNCTION = aws_lambda_function.delete_user_job.function_name
     }
   }
 
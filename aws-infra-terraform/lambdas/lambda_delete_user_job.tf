@@ -0,0 +1,38 @@
+# this fetches the latest version of the delete_user_job.zip file from S3
+data "aws_s3_bucket_object" "delete_user_job_zip" {
+  bucket = var.lambda_bucket_id
+  key    = "${var.lambda_delete_user_job}.zip"
+}
+
+# === Delete-user job lambda function ===
+resource "aws_lambda_function" "delete_user_job" {
+  description   = "This function runs the steps of a user's account deletion that haven't been completed yet. It is invoked asynchronously by delete_user, for accounts that can't be deleted within the API timeout or when the client asks for an asynchronous deletion."
+  function_name = var.lambda_delete_user_job
+  role          = var.delete_user_lambda_role_arn
+  runtime       = var.python_runtime
+  handler       = "main.lambda_handler"
+
+  timeout       = 900
+  memory_size   = 128
+
+  environment {
+    variables = {
+      USERS_TABLE      = var.users_table_name
+      INVOICES_TABLE   = var.rental_invoices_table_name
+      AGGREGATES_TABLE = var.invoice_aggregates_table_name
+      BUCKET_NAME      = var.invoices_bucket_name
+    }
+  }
+
+  logging_config {
+    log_format = "JSON"
+  }
+
+  layers = [
+    aws_lambda_layer_version.utils_layer.arn
+  ]
+
+  s3_bucket         = var.lambda_bucket_id
+  s3_key            = "${var.lambda_delete_user_job}.zip"
+  s3_object_version = data.aws_s3_bucket_object.delete_user_job_zip.version_id
+}
@@ -16,12 +16,14 @@ resource "aws_lambda_function" "fetch_invoices" {
   environment {
     variables = {
       DYNAMODB_TABLE        = var.invoices_table
+      USERS_TABLE           = var.users_table_name
       EMAIL_SENDER          = var.rental_invoice_email
       EMAIL_SUBJECT         = var.rental_invoice_email_subject
       REGION                = var.aws_region
       S3_BUCKET             = var.invoices_bucket_name
       JWT_SECRET               = var.jwt_secret_version_secret_string
       GOOGLE_OAUTH_CLIENT_ID   = var.google_oauth_client_id
+      SECRET_CACHE_TTL_SECONDS = var.secret_cache_ttl_seconds
     }
   }
 
@@ -0,0 +1,37 @@
+# this fetches the latest version of the get_deletion_status.zip file from S3
+data "aws_s3_bucket_object" "get_deletion_status_zip" {
+  bucket = var.lambda_bucket_id
+  key    = "${var.lambda_get_deletion_status}.zip"
+}
+
+# === Get deletion status lambda function ===
+resource "aws_lambda_function" "get_deletion_status" {
+  description   = "This function returns the progress of a user's account deletion, as recorded on their item in the Users table by delete_user and delete_user_job."
+  function_name = var.lambda_get_deletion_status
+  role          = var.get_deletion_status_lambda_role_arn
+  runtime       = var.python_runtime
+  handler       = "main.lambda_handler"
+
+  timeout       = 10
+  memory_size   = 128
+
+  environment {
+    variables = {
+      USERS_TABLE = var.users_table_name
+      JWT_SECRET  = var.jwt_secret_version_secret_string
+    }
+  }
+
+  logging_config {
+    log_format = "JSON"
+  }
+
+  layers = [
+    aws_lambda_layer_version.pyjwt_layer.arn,
+    aws_lambda_layer_version.utils_layer.arn
+  ]
+
+  s3_bucket         = var.lambda_bucket_id
+  s3_key            = "${var.lambda_get_deletion_status}.zip"
+  s3_object_version = data.aws_s3_bucket_object.get_deletion_status_zip.version_id
+}
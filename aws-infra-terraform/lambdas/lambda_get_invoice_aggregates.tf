@@ -0,0 +1,37 @@
+# this fetches the latest version of the get_invoice_aggregates.zip file from S3
+data "aws_s3_bucket_object" "get_invoice_aggregates_zip" {
+  bucket = var.lambda_bucket_id
+  key    = "${var.lambda_get_invoice_aggregates}.zip"
+}
+
+# === Get-invoice-aggregates lambda function ===
+resource "aws_lambda_function" "get_invoice_aggregates" {
+  description   = "This function retrieves the yearly and monthly invoice aggregates for a given user."
+  function_name = var.lambda_get_invoice_aggregates
+  role          = var.get_invoice_aggregates_lambda_role_arn
+  runtime       = var.python_runtime
+  handler       = "main.lambda_handler"
+
+  timeout       = 10
+  memory_size   = 128
+
+  environment {
+    variables = {
+      AGGREGATES_TABLE = var.invoice_aggregates_table_name
+      JWT_SECRET       = var.jwt_secret_version_secret_string
+    }
+  }
+
+  logging_config {
+    log_format = "JSON"
+  }
+
+  layers = [
+    aws_lambda_layer_version.pyjwt_layer.arn,
+    aws_lambda_layer_version.utils_layer.arn
+  ]
+
+  s3_bucket         = var.lambda_bucket_id
+  s3_key            = "${var.lambda_get_invoice_aggregates}.zip"
+  s3_object_version = data.aws_s3_bucket_object.get_invoice_aggregates_zip.version_id
+}
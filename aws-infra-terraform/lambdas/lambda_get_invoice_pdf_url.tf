@@ -0,0 +1,38 @@
+# this fetches the latest version of the get_invoice_pdf_url.zip file from S3
+data "aws_s3_bucket_object" "get_invoice_pdf_url_zip" {
+  bucket = var.lambda_bucket_id
+  key    = "${var.lambda_get_invoice_pdf_url}.zip"
+}
+
+# === Get invoice PDF URL lambda function ===
+resource "aws_lambda_function" "get_invoice_pdf_url" {
+  description   = "This function returns a short-lived presigned URL, from which the client downloads the original PDF of one of the user's rental invoices directly from S3."
+  function_name = var.lambda_get_invoice_pdf_url
+  role          = var.get_invoice_pdf_url_lambda_role_arn
+  runtime       = var.python_runtime
+  handler       = "main.lambda_handler"
+
+  timeout       = 10
+  memory_size   = 128
+
+  environment {
+    variables = {
+      INVOICES_TABLE = var.rental_invoices_table_name
+      BUCKET_NAME    = var.invoices_bucket_name
+      JWT_SECRET     = var.jwt_secret_version_secret_string
+    }
+  }
+
+  logging_config {
+    log_format = "JSON"
+  }
+
+  layers = [
+    aws_lambda_layer_version.pyjwt_layer.arn,
+    aws_lambda_layer_version.utils_layer.arn
+  ]
+
+  s3_bucket         = var.lambda_bucket_id
+  s3_key            = "${var.lambda_get_invoice_pdf_url}.zip"
+  s3_object_version = data.aws_s3_bucket_object.get_invoice_pdf_url_zip.version_id
+}
@@ -17,8 +17,11 @@ resource "aws_lambda_function" "get_rental_invoice" {
 
   environment {
     variables = {
-      INVOICES_TABLE = var.rental_invoices_table_name
-      JWT_SECRET     = var.jwt_secret_version_secret_string
+      INVOICES_TABLE            = var.rental_invoices_table_name
+      USERS_TABLE               = var.users_table_name
+      JWT_SECRET                = var.jwt_secret_version_secret_string
+      INVOICE_CACHE_TTL_SECONDS = var.invoice_cache_ttl_seconds
+      INVOICE_CACHE_REDIS_URL   = var.invoice_cache_redis_url
     }
   }
 
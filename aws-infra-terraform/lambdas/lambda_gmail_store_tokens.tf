@@ -17,8 +17,9 @@ resource "aws_lambda_function" "gmail_store_tokens" {
 
   environment {
     variables = {
-      JWT_SECRET = var.jwt_secret_version_secret_string
-      REGION     = var.aws_region
+      JWT_SECRET  = var.jwt_secret_version_secret_string
+      REGION      = var.aws_region
+      USERS_TABLE = var.users_table_name
     }
   }
 
@@ -17,8 +17,9 @@ resource "aws_lambda_function" "login_user" {
 
   environment {
     variables = {
-      USERS_TABLE = var.users_table_name
-      JWT_SECRET  = var.jwt_secret_version_secret_string
+      USERS_TABLE   = var.users_table_name
+      JWT_SECRET    = var.jwt_secret_version_secret_string
+      BCRYPT_ROUNDS = var.bcrypt_rounds
     }
   }
 
@@ -0,0 +1,34 @@
+# this fetches the latest version of the process_invoice_stream.zip file from S3
+data "aws_s3_bucket_object" "process_invoice_stream_zip" {
+  bucket = var.lambda_bucket_id
+  key    = "${var.lambda_process_invoice_stream}.zip"
+}
+
+# === Process_invoice_stream lambda function ===
+resource "aws_lambda_function" "process_invoice_stream" {
+  description   = "This function is triggered whenever a record in the RentalInvoices DynamoDB table changes. It updates the invoice aggregates of the affected users, and bumps their invoices version, which invalidates their cached invoice reads."
+  function_name = var.lambda_process_invoice_stream
+  handler       = "main.lambda_handler"
+  runtime       = var.python_runtime
+  role          = var.wallenstam_lambda_role_arn
+  timeout       = 30
+
+  environment {
+    variables = {
+      USERS_TABLE      = var.users_table_name
+      AGGREGATES_TABLE = var.invoice_aggregates_table_name
+    }
+  }
+
+  logging_config {
+    log_format = "JSON"
+  }
+
+  layers = [
+    aws_lambda_layer_version.utils_layer.arn
+  ]
+
+  s3_bucket         = var.lambda_bucket_id
+  s3_key            = "${var.lambda_process_invoice_stream}.zip"
+  s3_object_version = data.aws_s3_bucket_object.process_invoice_stream_zip.version_id
+}
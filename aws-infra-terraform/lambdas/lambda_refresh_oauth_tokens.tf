@@ -0,0 +1,40 @@
+# this fetches the latest version of the refresh_oauth_tokens.zip file from S3
+data "aws_s3_bucket_object" "refresh_oauth_tokens_zip" {
+  bucket = var.lambda_bucket_id
+  key    = "${var.lambda_refresh_oauth_tokens}.zip"
+}
+
+# === Refresh oauth tokens lambda function ===
+resource "aws_lambda_function" "refresh_oauth_tokens" {
+  description   = "This function is triggered on a schedule. It refreshes the Gmail OAuth access tokens of all users whose token expires within the refresh window, so that the invoice fetching functions rarely have to refresh a token inside a user request."
+  function_name = var.lambda_refresh_oauth_tokens
+  role          = var.refresh_oauth_tokens_lambda_role_arn
+  runtime       = var.python_runtime
+  handler       = "main.lambda_handler"
+
+  timeout       = 300
+  memory_size   = 128
+
+  environment {
+    variables = {
+      USERS_TABLE              = var.users_table_name
+      REGION                   = var.aws_region
+      GOOGLE_OAUTH_CLIENT_ID   = var.google_oauth_client_id
+      REFRESH_WINDOW_MINUTES   = var.oauth_token_refresh_window_minutes
+      SECRET_CACHE_TTL_SECONDS = 0 # always read the latest tokens, they may have been refreshed by another function
+    }
+  }
+
+  logging_config {
+    log_format = "JSON"
+  }
+
+  layers = [
+    aws_lambda_layer_version.utils_layer.arn,
+    aws_lambda_layer_version.google_api_layer.arn
+  ]
+
+  s3_bucket         = var.lambda_bucket_id
+  s3_key            = "${var.lambda_refresh_oauth_tokens}.zip"
+  s3_object_version = data.aws_s3_bucket_object.refresh_oauth_tokens_zip.version_id
+}
@@ -17,9 +17,10 @@ resource "aws_lambda_function" "signup_user" {
 
   environment {
     variables = {
-      USERS_TABLE = var.users_table_name
-      S3_BUCKET   = var.invoices_bucket_name,
-      JWT_SECRET  = var.jwt_secret_version_secret_string
+      USERS_TABLE   = var.users_table_name
+      S3_BUCKET     = var.invoices_bucket_name,
+      JWT_SECRET    = var.jwt_secret_version_secret_string
+      BCRYPT_ROUNDS = var.bcrypt_rounds
     }
   }
 
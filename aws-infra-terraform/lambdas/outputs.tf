@@ -109,6 +109,76 @@ output "gmail_store_tokens_invoke_arn" {
   value       = aws_lambda_function.gmail_store_tokens.invoke_arn
 }
 
+output "process_invoice_stream_function_name" {
+  description = "Name of the process invoice stream lambda function"
+  value       = aws_lambda_function.process_invoice_stream.function_name
+}
+
+output "process_invoice_stream_arn" {
+  description = "ARN of the process invoice stream lambda function"
+  value       = aws_lambda_function.process_invoice_stream.arn
+}
+
+output "get_invoice_aggregates_function_name" {
+  description = "Name of the get invoice aggregates lambda function"
+  value       = aws_lambda_function.get_invoice_aggregates.function_name
+}
+
+output "get_invoice_aggregates_invoke_arn" {
+  description = "Invoke ARN of the get invoice aggregates lambda function"
+  value       = aws_lambda_function.get_invoice_aggregates.invoke_arn
+}
+
+output "refresh_oauth_tokens_function_name" {
+  description = "Name of the refresh oauth tokens lambda function"
+  value       = aws_lambda_function.refresh_oauth_tokens.function_name
+}
+
+output "refresh_oauth_tokens_arn" {
+  description = "ARN of the refresh oauth tokens lambda function"
+  value       = aws_lambda_function.refresh_oauth_tokens.arn
+}
+
+output "authorizer_function_name" {
+  description = "Name of the authorizer lambda function"
+  value       = aws_lambda_function.authorizer.function_name
+}
+
+output "authorizer_invoke_arn" {
+  description = "Invoke ARN of the authorizer lambda function"
+  value       = aws_lambda_function.authorizer.invoke_arn
+}
+
+output "delete_user_job_function_name" {
+  description = "Name of the delete user job lambda function"
+  value       = aws_lambda_function.delete_user_job.function_name
+}
+
+output "delete_user_job_arn" {
+  description = "ARN of the delete user job lambda function"
+  value       = aws_lambda_function.delete_user_job.arn
+}
+
+output "get_deletion_status_function_name" {
+  description = "Name of the get deletion status lambda function"
+  value       = aws_lambda_function.get_deletion_status.function_name
+}
+
+output "get_deletion_status_invoke_arn" {
+  description = "Invoke ARN of the get deletion status lambda function"
+  value       = aws_lambda_function.get_deletion_status.invoke_arn
+}
+
+output "get_invoice_pdf_url_function_name" {
+  description = "Name of the get invoice pdf url lambda function"
+  value       = aws_lambda_function.get_invoice_pdf_url.function_name
+}
+
+output "get_invoice_pdf_url_invoke_arn" {
+  description = "Invoke ARN of the get invoice pdf url lambda function"
+  value       = aws_lambda_function.get_invoice_pdf_url.invoke_arn
+}
+
 # Lambda layers outputs
 output "utils_layer_arn" {
   description = "ARN of the utils lambda layer"
@@ -64,6 +64,46 @@ variable "lambda_gmail_store_tokens" {
   description = "The lambda function stores OAuth tokens received from iOS app"
 }
 
+variable "lambda_process_invoice_stream" {
+  type        = string
+  description = "The lambda function consumes the RentalInvoices table stream and invalidates cached invoice reads"
+}
+
+variable "lambda_get_invoice_aggregates" {
+  type        = string
+  description = "The lambda function retrieves the yearly and monthly invoice aggregates for the authenticated user"
+}
+
+variable "bcrypt_rounds" {
+  type        = number
+  description = "The bcrypt cost factor for password hashes"
+}
+
+variable "lambda_refresh_oauth_tokens" {
+  type        = string
+  description = "The lambda function refreshes Gmail OAuth tokens before they expire"
+}
+
+variable "lambda_authorizer" {
+  type        = string
+  description = "The lambda function authorizes requests to the protected API endpoints"
+}
+
+variable "lambda_delete_user_job" {
+  type        = string
+  description = "Name of the lambda function running account deletions asynchronously"
+}
+
+variable "lambda_get_deletion_status" {
+  type        = string
+  description = "Name of the lambda function returning the progress of an account deletion"
+}
+
+variable "lambda_get_invoice_pdf_url" {
+  type        = string
+  description = "Name of the lambda function returning download URLs of invoice PDFs"
+}
+
 # Table names
 variable "invoices_table" {
   type        = string
@@ -81,6 +121,29 @@ variable "rental_invoice_email_subject" {
   description = "The subject of the email from which we receive rental invoices"
 }
 
+# Invoice cache configuration
+variable "invoice_cache_ttl_seconds" {
+  type        = number
+  description = "The maximum time a cached invoice list or invoice detail is served for"
+}
+
+variable "invoice_cache_redis_url" {
+  type        = string
+  description = "URL of the optional Redis instance used as the shared invoice cache tier"
+  sensitive   = true
+}
+
+# Secrets Manager cache configuration
+variable "secret_cache_ttl_seconds" {
+  type        = number
+  description = "The maximum time a Gmail OAuth secret read from Secrets Manager is cached in a Lambda container"
+}
+
+variable "oauth_token_refresh_window_minutes" {
+  type        = number
+  description = "Gmail OAuth tokens expiring within this many minutes are refreshed by the refresh_oauth_tokens lambda function"
+}
+
 # S3 bucket names
 variable "invoices_bucket_name" {
   type        = string
@@ -103,6 +166,11 @@ variable "rental_invoices_table_name" {
   description = "The name of the rental invoices DynamoDB table"
 }
 
+variable "invoice_aggregates_table_name" {
+  type        = string
+  description = "The name of the invoice aggregates DynamoDB table"
+}
+
 variable "rental_invoices_bucket_arn" {
   type        = string
   description = "The ARN of the rental invoices S3 bucket"
@@ -166,4 +234,29 @@ variable "get_user_profile_lambda_role_arn" {
 variable "gmail_store_tokens_lambda_role_arn" {
   type        = string
   description = "The ARN of the gmail store tokens lambda role"
-}
\ No newline at end of file
+}
+
+variable "get_invoice_aggregates_lambda_role_arn" {
+  type        = string
+  description = "The ARN of the get invoice aggregates lambda role"
+}
+
+variable "refresh_oauth_tokens_lambda_role_arn" {
+  type        = string
+  description = "The ARN of the refresh oauth tokens lambda role"
+}
+
+variable "authorizer_lambda_role_arn" {
+  type        = string
+  description = "The ARN of the authorizer lambda role"
+}
+
+variable "get_deletion_status_lambda_role_arn" {
+  type        = string
+  description = "The ARN of the get deletion status lambda role"
+}
+
+variable "get_invoice_pdf_url_lambda_role_arn" {
+  type        = string
+  description = "The ARN of the get invoice pdf url lambda role"
+}
@@ -28,12 +28,16 @@ module "iam" {
   app_identity_role       = var.app_identity_role
   lambda_role             = var.lambda_role
   invoices_bucket_name    = var.invoices_bucket_name
+  lambda_delete_user_job  = var.lambda_delete_user_job
   
   # Pass resource references
   users_table_arn                        = aws_dynamodb_table.users.arn
   rental_invoices_table_arn               = aws_dynamodb_table.rental_invoices.arn
+  invoice_aggregates_table_arn            = aws_dynamodb_table.invoice_aggregates.arn
   jwt_secret_arn                          = data.aws_secretsmanager_secret.jwt_secret.arn
   google_oauth_client_id_secret_arn       = aws_secretsmanager_secret.google_oauth_client_id.arn
+  send_invoice_notification_failures_queue_arn = aws_sqs_queue.send_invoice_notification_failures.arn
+  process_invoice_stream_failures_queue_arn    = aws_sqs_queue.process_invoice_stream_failures.arn
 }
 
 # Lambda module
@@ -54,15 +58,28 @@ module "lambdas" {
   lambda_get_rental_invoice    = var.lambda_get_rental_invoice
   lambda_get_user_profile      = var.lambda_get_user_profile
   lambda_gmail_store_tokens    = var.lambda_gmail_store_tokens
+  lambda_process_invoice_stream = var.lambda_process_invoice_stream
+  lambda_get_invoice_aggregates = var.lambda_get_invoice_aggregates
+  bcrypt_rounds                = var.bcrypt_rounds
+  lambda_refresh_oauth_tokens = var.lambda_refresh_oauth_tokens
+  lambda_authorizer = var.lambda_authorizer
+  lambda_delete_user_job = var.lambda_delete_user_job
+  lambda_get_deletion_status = var.lambda_get_deletion_status
+  lambda_get_invoice_pdf_url = var.lambda_get_invoice_pdf_url
   invoices_table               = var.invoices_table
   rental_invoice_email         = var.rental_invoice_email
   rental_invoice_email_subject = var.rental_invoice_email_subject
   invoices_bucket_name         = var.invoices_bucket_name
+  invoice_cache_ttl_seconds    = var.invoice_cache_ttl_seconds
+  invoice_cache_redis_url      = var.invoice_cache_redis_url
+  secret_cache_ttl_seconds     = var.secret_cache_ttl_seconds
+  oauth_token_refresh_window_minutes = var.oauth_token_refresh_window_minutes
   
   # Pass resource references
   lambda_bucket_id                        = aws_s3_bucket.lambda_bucket.id
   users_table_name                        = aws_dynamodb_table.users.name
   rental_invoices_table_name              = aws_dynamodb_table.rental_invoices.name
+  invoice_aggregates_table_name           = aws_dynamodb_table.invoice_aggregates.name
   rental_invoices_bucket_arn              = aws_s3_bucket.rental_invoices.arn
   jwt_secret_version_secret_string        = data.aws_secretsmanager_secret_version.jwt_secret_version.secret_string
   google_oauth_client_id                  = var.google_oauth_client_id
@@ -77,4 +94,9 @@ module "lambdas" {
   get_rental_invoice_lambda_role_arn     = module.iam.get_rental_invoice_lambda_role_arn
   get_user_profile_lambda_role_arn       = module.iam.get_user_profile_lambda_role_arn
   gmail_store_tokens_lambda_role_arn     = module.iam.gmail_store_tokens_lambda_role_arn
+  get_invoice_aggregates_lambda_role_arn = module.iam.get_invoice_aggregates_lambda_role_arn
+  refresh_oauth_tokens_lambda_role_arn   = module.iam.refresh_oauth_tokens_lambda_role_arn
+  authorizer_lambda_role_arn = module.iam.authorizer_lambda_role_arn
+  get_deletion_status_lambda_role_arn = module.iam.get_deletion_status_lambda_role_arn
+  get_invoice_pdf_url_lambda_role_arn = module.iam.get_invoice_pdf_url_lambda_role_arn
 }
\ No newline at end of file
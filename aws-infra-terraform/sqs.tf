@@ -0,0 +1,14 @@
+# Records of the RentalInvoices stream that send_invoice_notification still couldn't notify about after the event
+# source mapping's maximum_retry_attempts. Lambda sends the shard, sequence numbers and error of each failed batch,
+# not the records themselves, so they have to be read from the stream within its 24 hour retention
+resource "aws_sqs_queue" "send_invoice_notification_failures" {
+  name                      = var.send_invoice_notification_failures_queue
+  message_retention_seconds = 1209600
+}
+
+# The same for process_invoice_stream. Its records only need to be processed again (e.g. with
+# scripts/backfill_invoice_aggregates.py) to bring the aggregates and invoice versions of their users up to date
+resource "aws_sqs_queue" "process_invoice_stream_failures" {
+  name                      = var.process_invoice_stream_failures_queue
+  message_retention_seconds = 1209600
+}
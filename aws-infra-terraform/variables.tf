@@ -86,6 +86,12 @@ variable "invoices_table_due_date_month" {
   default     = "due_date_month"
 }
 
+variable "invoices_table_due_date_key" {
+  type        = string
+  description = "Column name for the due date as YYYYMMDD, the sort key of the due date index"
+  default     = "due_date_key"
+}
+
 variable "users_table" {
   type        = string
   description = "The DynamoDB table containing user information"
@@ -98,6 +104,18 @@ variable "users_table_hash_key" {
   default     = "UserID"
 }
 
+variable "invoice_aggregates_table" {
+  type        = string
+  description = "The DynamoDB table containing the per-user invoice aggregates, maintained from the RentalInvoices stream"
+  default     = "RentalInvoiceAggregates"
+}
+
+variable "invoice_aggregates_table_range_key" {
+  type        = string
+  description = "The range key of the invoice aggregates DB table: the year or month an item aggregates"
+  default     = "Period"
+}
+
 # SNS
 
 variable "rental_invoice_notification_topic" {
@@ -112,6 +130,18 @@ variable "rental_invoice_notification_display_name" {
   default     = "PayPulse"
 }
 
+variable "send_invoice_notification_failures_queue" {
+  type        = string
+  description = "The SQS queue receiving the stream records send_invoice_notification failed to notify about"
+  default     = "SendInvoiceNotificationFailures"
+}
+
+variable "process_invoice_stream_failures_queue" {
+  type        = string
+  description = "The SQS queue receiving the stream records process_invoice_stream failed to process"
+  default     = "ProcessInvoiceStreamFailures"
+}
+
 # Secrets Manager
 
 variable "gmail_secret_credentials" {
@@ -135,6 +165,18 @@ variable "daily_lambda_trigger" {
   default     = "DailyLambdaTrigger"
 }
 
+variable "oauth_token_refresh_trigger" {
+  type        = string
+  description = "The name of the trigger that refreshes expiring Gmail OAuth tokens"
+  default     = "OAuthTokenRefreshTrigger"
+}
+
+variable "oauth_token_refresh_schedule" {
+  type        = string
+  description = "The schedule expression of the Gmail OAuth token refresh trigger"
+  default     = "rate(15 minutes)"
+}
+
 variable "daily_lambda_trigger_schedule" {
   type        = string
   description = "The schedule expression of the daily lambda function trigger cron job"
@@ -215,6 +257,37 @@ variable "lambda_gmail_store_tokens" {
   default     = "gmail_store_tokens"
 }
 
+variable "lambda_process_invoice_stream" {
+  type        = string
+  description = "The lambda function consumes the RentalInvoices table stream and invalidates cached invoice reads"
+  default     = "process_invoice_stream"
+}
+
+variable "invoice_cache_ttl_seconds" {
+  type        = number
+  description = "The maximum time a cached invoice list or invoice detail is served for"
+  default     = 300
+}
+
+variable "invoice_cache_redis_url" {
+  type        = string
+  description = "URL of the optional Redis instance used as the shared invoice cache tier. Leave empty to disable it"
+  default     = ""
+  sensitive   = true
+}
+
+variable "secret_cache_ttl_seconds" {
+  type        = number
+  description = "The maximum time a Gmail OAuth secret read from Secrets Manager is cached in a Lambda container"
+  default     = 300
+}
+
+variable "oauth_token_refresh_window_minutes" {
+  type        = number
+  description = "Gmail OAuth tokens expiring within this many minutes are refreshed by the refresh_oauth_tokens lambda function. Must be longer than the interval of its schedule plus 5 minutes"
+  default     = 30
+}
+
 variable "rental_invoice_email" {
   type        = string
   description = "The email address from which we receive rental invoices"
@@ -227,6 +300,48 @@ variable "rental_invoice_email_subject" {
   default     = "hyresavi"
 }
 
+variable "lambda_get_invoice_aggregates" {
+  type        = string
+  description = "The lambda function retrieves the yearly and monthly invoice aggregates for the authenticated user"
+  default     = "get_invoice_aggregates"
+}
+
+variable "bcrypt_rounds" {
+  type        = number
+  description = "The bcrypt cost factor for password hashes. Existing hashes are upgraded on the next successful login"
+  default     = 12
+}
+
+variable "lambda_refresh_oauth_tokens" {
+  type        = string
+  description = "The lambda function refreshes Gmail OAuth tokens before they expire"
+  default     = "refresh_oauth_tokens"
+}
+
+variable "lambda_authorizer" {
+  type        = string
+  description = "The lambda function authorizes requests to the protected API endpoints"
+  default     = "authorizer"
+}
+
+variable "lambda_delete_user_job" {
+  type        = string
+  description = "Name of the lambda function running account deletions asynchronously"
+  default     = "delete_user_job"
+}
+
+variable "lambda_get_deletion_status" {
+  type        = string
+  description = "Name of the lambda function returning the progress of an account deletion"
+  default     = "get_deletion_status"
+}
+
+variable "lambda_get_invoice_pdf_url" {
+  type        = string
+  description = "Name of the lambda function returning download URLs of invoice PDFs"
+  default     = "get_invoice_pdf_url"
+}
+
 # API Gateway
 
 variable "api_version" {
@@ -235,6 +350,12 @@ variable "api_version" {
   default     = "v1"
 }
 
+variable "authorizer_cache_ttl_seconds" {
+  type        = number
+  description = "How long API Gateway caches the result of the Lambda authorizer for an authorization header"
+  default     = 300
+}
+
 # Cognito
 
 variable "identity_pool_name" {
@@ -0,0 +1,120 @@
+from decimal import Decimal, ROUND_HALF_UP
+from typing import Dict, Iterable, Optional
+
+# The invoice fields that statistics are maintained for
+AGGREGATED_FIELDS = ['Hyra', 'El', 'Kallvatten', 'Varmvatten', 'Total Amount']
+
+
+def get_year_period(year) -> str:
+    """
+    This helper function returns the sort key of the aggregates item of a year, e.g. '2024'
+    """
+    return str(year)
+
+
+def get_month_period(year, month) -> str:
+    """
+    This helper function returns the sort key of the aggregates item of a month, e.g. '2024-05'. The month is
+    zero-padded, so that the months of a year sort correctly and all begin with the period of their year
+    """
+    return f"{year}-{int(month):02d}"
+
+
+def get_invoice_contribution(invoice: Dict) -> Dict:
+    """
+    This helper function extracts the part of an invoice that the aggregates are computed from
+    """
+    return {field: Decimal(str(invoice.get(field, 0))) for field in AGGREGATED_FIELDS}
+
+
+def compute_statistics(contributions: Iterable[Dict]) -> Dict:
+    """
+    This helper function computes the total, average, min and max of every aggregated field over the given invoices
+    """
+    contributions = list(contributions)
+    statistics = {'InvoiceCount': len(contributions)}
+    for field in AGGREGATED_FIELDS:
+        values = [contribution[field] for contribution in contributions]
+        total = sum(values, Decimal(0))
+        statistics[field] = {
+            'total': total,
+            'average': (total / len(values)).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP),
+            'min': min(values),
+            'max': max(values)
+        }
+    return statistics
+
+
+def combine_statistics(period_statistics: Iterable[Dict]) -> Dict:
+    """
+    This helper function combines the statistics of several periods (e.g. the months of a year) into those of the
+    whole: the totals and invoice counts add up, and the min and max are those of the periods
+    """
+    period_statistics = list(period_statistics)
+    invoice_count = sum(int(statistics['InvoiceCount']) for statistics in period_statistics)
+    combined = {'InvoiceCount': invoice_count}
+    for field in AGGREGATED_FIELDS:
+        total = sum((statistics[field]['total'] for statistics in period_statistics), Decimal(0))
+        combined[field] = {
+            'total': total,
+            'average': (total / invoice_count).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP),
+            'min': min(statistics[field]['min'] for statistics in period_statistics),
+            'max': max(statistics[field]['max'] for statistics in period_statistics)
+        }
+    return combined
+
+
+def apply_invoice_changes(year: str, items: Dict[str, Dict], changes: Dict[str, Optional[Dict]]) -> Dict:
+    """
+    This function applies a set of invoice changes to the aggregates items of one year of a user, and returns the
+    items that changed: their period mapped to their new content, or to None if they are to be deleted.
+
+    The items are the year's item and its month items, keyed by period. A month item holds the statistics of the
+    month and the contributions of its invoices (usually one), from which its min and max are recomputed. The year
+    item only holds the statistics of the year, which are combined from those of its months. The size of every item
+    is therefore bounded by the invoices of a single month or the months of a single year, not by the user's history.
+
+    The changes map an invoice ID to the new image of that invoice, or to None if the invoice was removed. A changed
+    invoice is removed from whichever month of this year it was in before, and added to its new month if that is in
+    this year. Applying the same changes twice (e.g. when a stream batch is retried) therefore gives the same items.
+    """
+    invoices_per_month = {
+        period: dict(item.get('Invoices', {})) for period, item in items.items() if period != get_year_period(year)
+    }
+
+    changed_months = set()
+    for period, invoices in invoices_per_month.items():
+        for invoice_id in changes:
+            if invoices.pop(invoice_id, None) is not None:
+                changed_months.add(period)
+    for invoice_id, new_image in changes.items():
+        if new_image is None or str(new_image['due_date_year']) != year:
+            continue
+        period = get_month_period(year, new_image['due_date_month'])
+        invoices_per_month.setdefault(period, {})[invoice_id] = get_invoice_contribution(new_image)
+        changed_months.add(period)
+
+    updated_items = {}
+    for period in changed_months:
+        invoices = invoices_per_month[period]
+        updated_items[period] = {
+            'Statistics': compute_statistics(invoices.values()),
+            'Invoices': invoices
+        } if invoices else None
+
+    month_statistics = [
+        (updated_items[period] if period in updated_items else items[period])['Statistics']
+        for period in invoices_per_month if updated_items.get(period, True) is not None
+    ]
+    updated_items[get_year_period(year)] = {
+        'Statistics': combine_statistics(month_statistics)
+    } if month_statistics else None
+
+    def is_unchanged(period: str, item: Optional[Dict]) -> bool:
+        current_item = items.get(period)
+        if item is None or current_item is None:
+            return item is current_item
+        return all(current_item.get(key) == value for key, value in item.items())
+
+    # a replayed change leaves the items as they are, so they don't need to be written again
+    return {period: item for period, item in updated_items.items() if not is_unchanged(period, item)}
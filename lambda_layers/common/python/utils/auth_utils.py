@@ -1,8 +1,44 @@
+import os
 import bcrypt
 import logging
 
 from utils.exceptions import InvalidCredentialsError
 
+# bcrypt's own default cost. Can be overridden per function through the BCRYPT_ROUNDS environment variable.
+DEFAULT_BCRYPT_ROUNDS = 12
+MIN_BCRYPT_ROUNDS = 4
+MAX_BCRYPT_ROUNDS = 31
+
+
+def get_bcrypt_rounds() -> int:
+    """
+    Returns the bcrypt cost factor that new password hashes should be created with
+    """
+    rounds = int(os.environ.get('BCRYPT_ROUNDS', DEFAULT_BCRYPT_ROUNDS))
+    if not MIN_BCRYPT_ROUNDS <= rounds <= MAX_BCRYPT_ROUNDS:
+        raise ValueError(f"BCRYPT_ROUNDS must be between {MIN_BCRYPT_ROUNDS} and {MAX_BCRYPT_ROUNDS}, got {rounds}")
+    return rounds
+
+
+def get_password_hash_rounds(db_password: str) -> int:
+    """
+    Returns the cost factor that a password hash was created with. bcrypt stores it in the hash itself,
+    e.g. '$2b$12$...' was created with 12 rounds.
+    """
+    return int(db_password.split('$')[2])
+
+
+def password_needs_rehash(db_password: str, rounds: int = None) -> bool:
+    """
+    Checks if a password hash was created with a different cost factor than the current policy
+    """
+    rounds = rounds or get_bcrypt_rounds()
+    try:
+        return get_password_hash_rounds(db_password) != rounds
+    except (IndexError, ValueError):
+        logging.warning("Could not read the cost factor of a password hash")
+        return False
+
 
 def verify_user_password(user_password: str, db_password: str):
     if not bcrypt.checkpw(user_password.encode('utf-8'), db_password.encode('utf-8')):
@@ -12,6 +48,6 @@ def verify_user_password(user_password: str, db_password: str):
     return None
 
 
-def create_password_hash(password: str) -> str:
-    hashed_password = bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt())
+def create_password_hash(password: str, rounds: int = None) -> str:
+    hashed_password = bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt(rounds=rounds or get_bcrypt_rounds()))
     return hashed_password.decode('utf-8')
@@ -0,0 +1,167 @@
+import os
+import time
+import logging
+import threading
+from typing import Dict
+
+# Opt-in, since the hooks run on every AWS call and DynamoDB then returns the consumed capacity with every response
+AWS_CALL_ACCOUNTING_ENABLED = os.environ.get('AWS_CALL_ACCOUNTING', '').lower() in ('1', 'true', 'yes')
+
+# keys under which a call's start and operation are kept in botocore's request context, which before-call, after-call
+# and after-call-error share
+_CALL_START_KEY = 'paypulse_call_start'
+_CALL_OPERATION_KEY = 'paypulse_call_operation'
+
+
+def _new_operation_stats() -> Dict:
+    return {'calls': 0, 'retries': 0, 'errors': 0, 'duration_ms': 0.0, 'capacity_units': 0.0}
+
+
+def _get_capacity_units(consumed_capacity) -> float:
+    # a single entry for most operations, a list with one entry per table for the batch and transaction operations
+    if isinstance(consumed_capacity, dict):
+        consumed_capacity = [consumed_capacity]
+    return sum(entry.get('CapacityUnits', 0) for entry in consumed_capacity or ())
+
+
+class AwsCallAccounting:
+    """
+    Counts the AWS API calls of one invocation per operation ('dynamodb.Scan', 'secretsmanager.GetSecretValue'): the
+    number of calls, their retries, errors and latency, and the DynamoDB capacity they consumed. The counts are
+    collected by botocore event hooks on the clients created through handler_utils. The decorators in handler_utils
+    reset them when an invocation starts and log a summary when it ends.
+
+    The counts stay available after the invocation, so that a test can check the calls of a handler against a budget:
+
+        aws_call_accounting.enable()
+        lambda_handler(event, context)
+        aws_call_accounting.assert_call_budget({'dynamodb.Scan': 0, 'secretsmanager.GetSecretValue': 1, '*': 4})
+    """
+
+    def __init__(self, enabled: bool = False):
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._operations: Dict[str, Dict] = {}
+
+    def enable(self):
+        """
+        Enables the accounting. Only the clients created afterwards are instrumented, so this must be called before
+        the first client is created through handler_utils.
+        """
+        self.enabled = True
+
+    def instrument(self, client):
+        """
+        Registers the hooks on a client. DynamoDB calls are made with ReturnConsumedCapacity=TOTAL, unless the caller
+        asks for the consumed capacity itself.
+        """
+        events = client.meta.events
+        events.register('before-parameter-build.dynamodb', self._request_consumed_capacity,
+                        unique_id='paypulse-call-accounting-capacity')
+        # first and as specific as any handler, so that the call is timed even when another before-call handler answers
+        # it (e.g. a Stubber)
+        events.register_first('before-call.*.*', self._before_call, unique_id='paypulse-call-accounting-before')
+        events.register('after-call', self._after_call, unique_id='paypulse-call-accounting-after')
+        events.register('after-call-error', self._after_call_error, unique_id='paypulse-call-accounting-error')
+
+    @staticmethod
+    def _request_consumed_capacity(params, model, **kwargs):
+        if model.input_shape is not None and 'ReturnConsumedCapacity' in model.input_shape.members:
+            params.setdefault('ReturnConsumedCapacity', 'TOTAL')
+
+    @staticmethod
+    def _before_call(model, context, **kwargs):
+        context[_CALL_START_KEY] = time.perf_counter()
+        context[_CALL_OPERATION_KEY] = f"{model.service_model.service_name}.{model.name}"
+
+    def _after_call(self, http_response, parsed, context, **kwargs):
+        self._record(
+            context,
+            retries=parsed.get('ResponseMetadata', {}).get('RetryAttempts', 0),
+            failed='Error' in parsed or http_response.status_code >= 300,
+            capacity_units=_get_capacity_units(parsed.get('ConsumedCapacity'))
+        )
+
+    def _after_call_error(self, context, **kwargs):
+        # the request never got a response, e.g. because the connection failed after all retries. Unlike after-call,
+        # this event doesn't carry the operation model
+        self._record(context, retries=0, failed=True, capacity_units=0.0)
+
+    def _record(self, context, retries: int, failed: bool, capacity_units: float):
+        start = context.get(_CALL_START_KEY)
+        duration_ms = (time.perf_counter() - start) * 1000 if start is not None else 0.0
+        operation = context.get(_CALL_OPERATION_KEY, 'unknown')
+        # the steps of an account deletion call AWS from several threads
+        with self._lock:
+            stats = self._operations.get(operation)
+            if stats is None:
+                stats = self._operations[operation] = _new_operation_stats()
+            stats['calls'] += 1
+            stats['retries'] += retries
+            stats['errors'] += int(failed)
+            stats['duration_ms'] += duration_ms
+            stats['capacity_units'] += capacity_units
+
+    def reset(self):
+        with self._lock:
+            self._operations = {}
+
+    def get_operations(self) -> Dict[str, Dict]:
+        """
+        Returns the counts per operation since the last reset, as {operation: {'calls', 'retries', 'errors',
+        'duration_ms', 'capacity_units'}}
+        """
+        with self._lock:
+            return {operation: dict(stats) for operation, stats in self._operations.items()}
+
+    def get_totals(self) -> Dict:
+        """
+        Returns the counts of all operations since the last reset added up
+        """
+        totals = _new_operation_stats()
+        for stats in self.get_operations().values():
+            for field, value in stats.items():
+                totals[field] += value
+        return totals
+
+    def log_summary(self, function_name: str):
+        """
+        Logs the calls of the invocation, in total and per operation, with the most called operations first
+        """
+        if not self.enabled or not logging.getLogger().isEnabledFor(logging.INFO):
+            return
+        operations = self.get_operations()
+        if not operations:
+            logging.info(f"AWS calls of {function_name}: none")
+            return
+
+        totals = self.get_totals()
+        details = '; '.join(
+            f"{operation}: {stats['calls']}x, {stats['duration_ms']:.1f} ms, {stats['retries']} retries, "
+            f"{stats['errors']} errors, {stats['capacity_units']:g} CU"
+            for operation, stats in sorted(operations.items(), key=lambda item: -item[1]['calls'])
+        )
+        logging.info(f"AWS calls of {function_name}: {totals['calls']} calls, {totals['retries']} retries, "
+                     f"{totals['errors']} errors, {totals['capacity_units']:g} capacity units ({details})")
+
+    def assert_call_budget(self, budget: Dict[str, int]):
+        """
+        Raises an AssertionError if the calls since the last reset exceed a budget. The budget maps operations to the
+        most calls allowed of each, and '*' to the most calls allowed in total. Operations missing from the budget
+        only count towards '*'.
+        """
+        operations = self.get_operations()
+        exceeded = [
+            f"{operation}: {operations[operation]['calls']} calls, budget {max_calls}"
+            for operation, max_calls in budget.items()
+            if operation != '*' and operation in operations and operations[operation]['calls'] > max_calls
+        ]
+        total_calls = sum(stats['calls'] for stats in operations.values())
+        if '*' in budget and total_calls > budget['*']:
+            exceeded.append(f"all operations: {total_calls} calls, budget {budget['*']}")
+        if exceeded:
+            raise AssertionError(f"AWS call budget exceeded: {'; '.join(exceeded)}")
+
+
+# shared by all invocations of the container
+aws_call_accounting = AwsCallAccounting(enabled=AWS_CALL_ACCOUNTING_ENABLED)
@@ -0,0 +1,211 @@
+import os
+import time
+import logging
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional
+
+from utils.json_utils import dumps, loads
+
+
+# Sentinel for cache misses, since None is a perfectly valid cached value
+MISSING = object()
+
+
+class TTLCache:
+    """
+    An in-memory LRU cache whose entries also expire after a time-to-live. It lives as long as the Lambda container
+    does, so it is shared across warm invocations but never across containers.
+    """
+
+    def __init__(self, max_entries: int = 256, ttl_seconds: float = 300):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key: Hashable, default=MISSING):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return default
+
+            expires_at, value = entry
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return default
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key: Hashable, value: Any, ttl_seconds: Optional[float] = None):
+        ttl_seconds = self.ttl_seconds if ttl_seconds is None else ttl_seconds
+        if ttl_seconds <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl_seconds, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, key: Hashable):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def stats(self) -> Dict:
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_ratio': round(self.hits / lookups, 4) if lookups else 0.0,
+            'evictions': self.evictions,
+            'expirations': self.expirations,
+            'size': len(self._entries)
+        }
+
+
+class RedisCache:
+    """
+    An optional cache tier shared by all Lambda containers, backed by Redis. Values are stored as JSON, so Decimals
+    come back as int or float. Any Redis error is logged and treated as a cache miss, so that an unavailable cache
+    never fails a request.
+    """
+
+    def __init__(self, redis_client, ttl_seconds: float = 300, key_prefix: str = "paypulse:"):
+        self._redis = redis_client
+        self.ttl_seconds = ttl_seconds
+        self.key_prefix = key_prefix
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+
+    def get(self, key: str, default=MISSING):
+        try:
+            cached_value = self._redis.get(self.key_prefix + key)
+        except Exception as e:
+            logging.warning(f"Shared cache read failed for '{key}': {e}")
+            self.errors += 1
+            cached_value = None
+
+        if cached_value is None:
+            self.misses += 1
+            return default
+        self.hits += 1
+        return loads(cached_value)
+
+    def set(self, key: str, value: Any, ttl_seconds: Optional[float] = None):
+        ttl_seconds = self.ttl_seconds if ttl_seconds is None else ttl_seconds
+        try:
+            self._redis.set(
+                self.key_prefix + key,
+                dumps(value),
+                ex=max(1, int(ttl_seconds))
+            )
+        except Exception as e:
+            logging.warning(f"Shared cache write failed for '{key}': {e}")
+            self.errors += 1
+
+    def delete(self, key: str):
+        try:
+            self._redis.delete(self.key_prefix + key)
+        except Exception as e:
+            logging.warning(f"Shared cache delete failed for '{key}': {e}")
+            self.errors += 1
+
+    def stats(self) -> Dict:
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_ratio': round(self.hits / lookups, 4) if lookups else 0.0,
+            'errors': self.errors
+        }
+
+
+class ReadThroughCache:
+    """
+    Looks values up in the in-container tier first, then in the shared tier (if configured), and only calls the
+    loader when both miss. Loaded values are written back to both tiers.
+
+    This cache does not invalidate anything by itself: callers are expected to put a version into the key that
+    changes whenever the underlying data changes (see dynamodb_utils.get_invoices_version).
+    """
+
+    def __init__(self, local_cache: TTLCache, shared_cache: Optional[RedisCache] = None):
+        self.local_cache = local_cache
+        self.shared_cache = shared_cache
+        self.loads = 0
+
+    def get_or_load(self, key: str, loader: Callable[[], Any]):
+        value = self.local_cache.get(key)
+        if value is not MISSING:
+            return value
+
+        if self.shared_cache:
+            value = self.shared_cache.get(key)
+            if value is not MISSING:
+                self.local_cache.set(key, value)
+                return value
+
+        value = loader()
+        self.loads += 1
+        self.local_cache.set(key, value)
+        if self.shared_cache:
+            self.shared_cache.set(key, value)
+        return value
+
+    def stats(self) -> Dict:
+        stats = {
+            'local': self.local_cache.stats(),
+            'loads': self.loads
+        }
+        if self.shared_cache:
+            stats['shared'] = self.shared_cache.stats()
+        return stats
+
+
+def create_shared_cache(redis_url: Optional[str], ttl_seconds: float) -> Optional[RedisCache]:
+    """
+    Creates the shared Redis cache tier, or returns None if no Redis URL is configured or the redis package is not
+    available in this Lambda
+    """
+    if not redis_url:
+        return None
+    try:
+        import redis
+    except ImportError:
+        logging.warning("INVOICE_CACHE_REDIS_URL is set, but the redis package is not installed. "
+                        "Continuing without the shared cache tier.")
+        return None
+    return RedisCache(redis.Redis.from_url(redis_url, socket_timeout=0.25), ttl_seconds=ttl_seconds)
+
+
+def create_invoice_cache() -> ReadThroughCache:
+    """
+    Creates the read-through cache used by the invoice read endpoints, configured from the environment:
+        INVOICE_CACHE_TTL_SECONDS: how long an entry may live in either tier (default 300)
+        INVOICE_CACHE_MAX_ENTRIES: maximum number of entries in the in-container tier (default 256)
+        INVOICE_CACHE_REDIS_URL: URL of the shared Redis tier (optional)
+    """
+    ttl_seconds = float(os.environ.get('INVOICE_CACHE_TTL_SECONDS', 300))
+    max_entries = int(os.environ.get('INVOICE_CACHE_MAX_ENTRIES', 256))
+    return ReadThroughCache(
+        local_cache=TTLCache(max_entries=max_entries, ttl_seconds=ttl_seconds),
+        shared_cache=create_shared_cache(os.environ.get('INVOICE_CACHE_REDIS_URL'), ttl_seconds)
+    )
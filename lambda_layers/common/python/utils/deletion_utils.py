@@ -0,0 +1,124 @@
+import time
+import logging
+from typing import Callable, Dict, Optional
+from concurrent.futures import ThreadPoolExecutor, wait
+
+from botocore.exceptions import ClientError
+
+from utils.json_utils import dumps
+from utils.s3_utils import delete_user_folder_in_s3
+from utils.secretsmanager_utils import delete_email_credentials
+from utils.dynamodb_utils import delete_user_invoices, delete_invoice_aggregates, delete_user_in_dynamodb, \
+    start_user_deletion, mark_user_deletion_step_done, fail_user_deletion, get_user_deletion_progress
+from utils.exceptions import LambdaInvocationError
+
+# The steps of an account deletion, which don't depend on each other and run concurrently. The user's item in the
+# Users table is deleted after all of them, since it holds the progress of the deletion.
+ACCOUNT_DELETION_STEPS = ('invoices', 'aggregates', 'credentials', 's3_folder')
+
+
+def build_account_deletion_steps(user_id: str, invoices_table, aggregates_table, secrets_manager, s3,
+                                 bucket_name: str) -> Dict[str, Callable[[], None]]:
+    """
+    Returns the function performing each step of ACCOUNT_DELETION_STEPS for a user. Every step can be repeated
+    safely, since a retry may run a step again that was interrupted before its completion was recorded.
+    """
+    return {
+        'invoices': lambda: delete_user_invoices(invoices_table, user_id=user_id),
+        'aggregates': lambda: delete_invoice_aggregates(aggregates_table, user_id=user_id),
+        'credentials': lambda: delete_email_credentials(secrets_manager, user_id=user_id),
+        's3_folder': lambda: delete_user_folder_in_s3(s3, user_id=user_id, s3_bucket_name=bucket_name),
+    }
+
+
+def run_account_deletion(users_table, user_id: str, steps: Dict[str, Callable[[], None]], mode: str,
+                         timeout_seconds: Optional[float] = None, grace_seconds: float = 0) -> bool:
+    """
+    Runs the steps of a user's account deletion that earlier attempts haven't completed, concurrently, and records
+    every completed step on the user's item. Once all steps are done, the user's item is deleted as well.
+
+    Returns True when the account has been deleted, and False if the steps didn't finish within timeout_seconds, after
+    which the caller hands the deletion over to a new invocation. Lambda freezes the threads of steps that are still
+    running once the invocation returns, so the steps running at the timeout get up to grace_seconds more to finish,
+    and the new invocation only repeats them if they didn't. A step that is left running may then run twice at once,
+    or resume in a later invocation of this container after the account is gone. That is safe, since every step only
+    deletes the user's data by key and treats data that is already gone as deleted, and a step recorded on a deleted
+    user's item is skipped instead of recreating the item.
+
+    If a step fails, the deletion is marked as failed and the step's exception is raised; retrying the deletion
+    resumes with the steps that are still missing.
+    """
+    completed_steps = start_user_deletion(users_table, user_id, mode)
+    if completed_steps is None:
+        logging.info(f"User '{user_id}' has already been deleted")
+        return True
+
+    pending_steps = [step for step in steps if step not in completed_steps]
+    logging.info(f"Deleting account of user '{user_id}' ({mode}), completed steps: {completed_steps}, "
+                 f"pending steps: {pending_steps}")
+
+    def run_step(step: str):
+        start = time.perf_counter()
+        steps[step]()
+        mark_user_deletion_step_done(users_table, user_id, step)
+        logging.info(f"Deletion step '{step}' done for user '{user_id}' in {time.perf_counter() - start:.2f}s")
+
+    if pending_steps:
+        executor = ThreadPoolExecutor(max_workers=len(pending_steps))
+        futures = {executor.submit(run_step, step): step for step in pending_steps}
+        done, not_done = wait(futures, timeout=timeout_seconds)
+        if not_done and grace_seconds > 0:
+            finished, not_done = wait(not_done, timeout=grace_seconds)
+            done |= finished
+        # steps still running after the grace period must not block the return
+        executor.shutdown(wait=False)
+
+        failed = [future for future in done if future.exception() is not None]
+        if failed:
+            error = failed[0].exception()
+            fail_user_deletion(users_table, user_id, f"Step '{futures[failed[0]]}' failed: {error}")
+            raise error
+        if not_done:
+            logging.warning(f"Deletion of user '{user_id}' not finished within {timeout_seconds + grace_seconds:.1f}s, "
+                            f"still running: {sorted(futures[future] for future in not_done)}")
+            return False
+
+    delete_user_in_dynamodb(users_table, user_id=user_id)
+    return True
+
+
+def start_account_deletion_job(lambda_client, function_name: str, user_id: str):
+    """
+    Invokes the account deletion job for a user asynchronously. Lambda retries a failed invocation twice, and each
+    retry resumes the deletion where the previous attempt stopped.
+    """
+    try:
+        lambda_client.invoke(
+            FunctionName=function_name,
+            InvocationType='Event',
+            Payload=dumps({'user_id': user_id}).encode('utf-8')
+        )
+        logging.info(f"Account deletion job started for user '{user_id}'")
+    except ClientError as e:
+        raise LambdaInvocationError(f"Error starting the account deletion job for '{user_id}'") from e
+
+
+def get_account_deletion_status(users_table, user_id: str) -> Dict:
+    """
+    Returns the status of a user's account deletion: 'not_started', 'in_progress', 'failed', or 'completed' once the
+    user's item is gone, along with the completed and pending steps
+    """
+    progress = get_user_deletion_progress(users_table, user_id)
+    if progress is None:
+        return {'status': 'completed', 'completedSteps': list(ACCOUNT_DELETION_STEPS), 'pendingSteps': []}
+
+    completed_steps = sorted(progress.get('DeletionSteps', set()))
+    return {
+        'status': progress.get('DeletionStatus', 'not_started'),
+        'mode': progress.get('DeletionMode'),
+        'completedSteps': completed_steps,
+        'pendingSteps': [step for step in ACCOUNT_DELETION_STEPS if step not in completed_steps],
+        'startedAt': progress.get('DeletionStartedAt'),
+        'updatedAt': progress.get('DeletionUpdatedAt'),
+        'error': progress.get('DeletionError')
+    }
@@ -1,14 +1,33 @@
-import boto3
+import time
 import logging
 from uuid import uuid4
-from typing import Dict, Tuple
+from typing import Dict, Iterable, List, Tuple, Optional
 from collections import defaultdict
 from datetime import datetime, timezone
 from botocore.exceptions import ClientError
-from boto3.dynamodb.conditions import Key, Attr
 
-from utils.utility_functions import postprocess_invoices
-from utils.exceptions import UserNotFoundError, UserAlreadyExistsError, DatabaseError, NoInvoiceFoundError
+from utils.utility_functions import postprocess_invoices, encode_pagination_token, decode_pagination_token, \
+    get_due_date_sort_key
+from utils.logging_utils import log_payload
+from utils.exceptions import UserNotFoundError, UserAlreadyExistsError, DatabaseError, NoInvoiceFoundError, \
+    InvalidQueryParameterError
+
+
+def Key(name: str):
+    """
+    boto3.dynamodb.conditions.Key, imported on first use. Importing boto3 takes over 100 ms, which a function
+    shouldn't pay for during init when the code path of the request doesn't need it
+    """
+    from boto3.dynamodb.conditions import Key as ConditionKey
+    return ConditionKey(name)
+
+
+def Attr(name: str):
+    """
+    boto3.dynamodb.conditions.Attr, imported on first use (see Key)
+    """
+    from boto3.dynamodb.conditions import Attr as ConditionAttr
+    return ConditionAttr(name)
 
 
 def fetch_user_by_email(users_table, email: str) -> dict:
@@ -36,9 +55,177 @@ def fetch_user_by_id(users_table, user_id: str) -> dict:
     return response['Item']
 
 
-def create_user_in_dynamodb(dynamodb, email: str, name: str, password: str, users_table_name: str) -> str:
+def update_user_password_hash(users_table, user_id: str, old_password_hash: str, new_password_hash: str):
+    """
+    This function replaces the password hash of a user, e.g. when it is rehashed with a new cost factor. The update
+    only goes through if the hash hasn't been changed in the meantime.
+    """
+    try:
+        users_table.update_item(
+            Key={'UserID': user_id},
+            UpdateExpression='SET Password = :new_password',
+            ConditionExpression='Password = :old_password',
+            ExpressionAttributeValues={
+                ':new_password': new_password_hash,
+                ':old_password': old_password_hash
+            }
+        )
+        logging.info(f"Password hash updated for user '{user_id}'")
+    except ClientError as e:
+        raise DatabaseError(f"Error updating password hash for '{user_id}'") from e
+
+
+def get_invoices_version(users_table, user_id: str) -> int:
+    """
+    This function returns the version of a user's invoices. The version is bumped by the process_invoice_stream
+    lambda function every time one of the user's invoices is inserted, modified or removed.
+
+    The read is eventually consistent, at half the cost of a consistent one on every (mostly 304) refresh. For up to
+    about a second after a bump it can still return the previous version, which serves the previous response from the
+    cache, or as not modified, within that window. The stream delivers the change with a delay of the same order.
+    """
+    try:
+        response = users_table.get_item(
+            Key={'UserID': user_id},
+            ProjectionExpression='InvoicesVersion'
+        )
+    except ClientError as e:
+        raise DatabaseError(f"Error getting invoices version for '{user_id}'") from e
+    return int(response.get('Item', {}).get('InvoicesVersion', 0))
+
+
+def bump_invoices_version(users_table, user_id: str):
+    """
+    This function increments the version of a user's invoices, which invalidates all cached reads of them
+    """
+    try:
+        users_table.update_item(
+            Key={'UserID': user_id},
+            UpdateExpression='ADD InvoicesVersion :one',
+            # don't recreate a user that has been deleted (their invoices are removed along with them)
+            ConditionExpression='attribute_exists(UserID)',
+            ExpressionAttributeValues={':one': 1}
+        )
+        logging.info(f"Invoices version bumped for user '{user_id}'")
+    except ClientError as e:
+        if e.response['Error']['Code'] == 'ConditionalCheckFailedException':
+            logging.info(f"User '{user_id}' no longer exists, skipping invoices version bump")
+            return
+        raise DatabaseError(f"Error bumping invoices version for '{user_id}'") from e
+
+
+def set_gmail_connection_status(users_table, user_id: str, expires_at: str, google_email: Optional[str] = None):
+    """
+    This function records on the user's item that their Gmail account is connected, when their tokens were last
+    stored or refreshed, and when the access token expires. get_user_profile reads the connection status from here
+    instead of from Secrets Manager, and the refresh_oauth_tokens lambda function uses the expiry to find the tokens
+    that are about to expire without reading every secret.
+    """
+    update_expression = 'SET GmailConnected = :connected, GmailLastRefreshed = :now, GmailTokenExpiresAt = :expires_at'
+    expression_attribute_values = {
+        ':connected': True,
+        ':now': datetime.utcnow().isoformat(),
+        ':expires_at': expires_at
+    }
+    if google_email is not None:
+        update_expression += ', GoogleEmail = :google_email'
+        expression_attribute_values[':google_email'] = google_email
+
+    try:
+        users_table.update_item(
+            Key={'UserID': user_id},
+            UpdateExpression=update_expression,
+            ConditionExpression='attribute_exists(UserID)',
+            ExpressionAttributeValues=expression_attribute_values
+        )
+    except ClientError as e:
+        if e.response['Error']['Code'] == 'ConditionalCheckFailedException':
+            logging.info(f"User '{user_id}' no longer exists, skipping Gmail connection status update")
+            return
+        raise DatabaseError(f"Error updating Gmail connection status for '{user_id}'") from e
+
+
+def acquire_token_refresh_lease(users_table, user_id: str, owner: str, lease_seconds: int) -> bool:
+    """
+    This function tries to take the lease for refreshing a user's Gmail tokens, so that only one invocation refreshes
+    them at a time. The lease is taken if nobody holds it, or if the previous holder's lease has expired (e.g. because
+    that invocation timed out). Returns True if the lease was taken by this owner.
+    """
+    now_ms = int(time.time() * 1000)
+    try:
+        users_table.update_item(
+            Key={'UserID': user_id},
+            UpdateExpression='SET GmailRefreshLeaseOwner = :owner, GmailRefreshLeaseExpiresAt = :lease_expires_at',
+            ConditionExpression='attribute_exists(UserID) AND '
+                                '(attribute_not_exists(GmailRefreshLeaseExpiresAt) OR GmailRefreshLeaseExpiresAt < :now)',
+            ExpressionAttributeValues={
+                ':owner': owner,
+                ':lease_expires_at': now_ms + lease_seconds * 1000,
+                ':now': now_ms
+            }
+        )
+        return True
+    except ClientError as e:
+        if e.response['Error']['Code'] == 'ConditionalCheckFailedException':
+            return False
+        raise DatabaseError(f"Error acquiring the token refresh lease for '{user_id}'") from e
+
+
+def release_token_refresh_lease(users_table, user_id: str, owner: str):
+    """
+    This function gives up a token refresh lease, unless it has expired and been taken by someone else in the meantime
+    """
+    try:
+        users_table.update_item(
+            Key={'UserID': user_id},
+            UpdateExpression='REMOVE GmailRefreshLeaseOwner, GmailRefreshLeaseExpiresAt',
+            ConditionExpression='GmailRefreshLeaseOwner = :owner',
+            ExpressionAttributeValues={':owner': owner}
+        )
+    except ClientError as e:
+        if e.response['Error']['Code'] == 'ConditionalCheckFailedException':
+            logging.info(f"Token refresh lease of '{user_id}' was already taken over, nothing to release")
+            return
+        raise DatabaseError(f"Error releasing the token refresh lease for '{user_id}'") from e
+
+
+def get_users_with_expiring_gmail_tokens(users_table, expiring_before: str) -> List[str]:
+    """
+    This function returns the IDs of all users whose Gmail access token expires before the given ISO timestamp
+    """
+    user_ids = []
+    scan_kwargs = {
+        'FilterExpression': Attr('GmailTokenExpiresAt').lt(expiring_before),
+        'ProjectionExpression': 'UserID'
+    }
+    try:
+        while True:
+            response = users_table.scan(**scan_kwargs)
+            user_ids.extend(item['UserID'] for item in response['Items'])
+            if 'LastEvaluatedKey' not in response:
+                break
+            scan_kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+    except ClientError as e:
+        raise DatabaseError("Error scanning for expiring Gmail tokens") from e
+    return user_ids
+
+
+def get_email_guard_id(email: str) -> str:
+    """
+    Every user has a guard item in the Users table, keyed on their email address. The guard items make sure that an
+    email address can only be registered once, even when two signups for it happen at the same time. Guard items
+    don't have an Email attribute, so they never show up in the Email-index.
+    """
+    return f"EMAIL#{email}"
+
+
+def create_user_in_dynamodb(dynamodb, email: str, name: str, password: str, users_table_name: str,
+                            max_attempts: int = 3) -> str:
     """
     This function creates an entry for a new user in the Users table. It's triggered when a new user signs up.
+
+    The user item and the email guard item are written in a single transaction, which fails if the guard item
+    already exists. This checks for an existing user and creates the new one in one round trip, without a race.
     """
     from utils.auth_utils import create_password_hash
 
@@ -50,43 +237,157 @@ def create_user_in_dynamodb(dynamodb, email: str, name: str, password: str, user
 
     creation_date = str(datetime.now(timezone.utc).date())
     creation_time = str(datetime.now(timezone.utc).time())
-    dynamodb_resource = boto3.resource('dynamodb')
-    table = dynamodb_resource.Table(users_table_name)
+    user_id = generate_random_user_id()
+    hashed_password_str = create_password_hash(password)
 
-    # check if user already exists
-    try:
-        _ = fetch_user_by_email(table, email=email)
-        raise UserAlreadyExistsError(f"User with email '{email}' already exists.")
-    except UserNotFoundError:
-        try:
-            user_id = generate_random_user_id()
-            hashed_password_str = create_password_hash(password)
-            dynamodb.put_item(
-                TableName=users_table_name,
-                Item={
+    transact_items = [
+        {
+            'Put': {
+                'TableName': users_table_name,
+                'Item': {
                     'UserID': {'S': user_id},
                     'Email': {'S': email},
                     'Name': {'S': name},
                     'Password': {'S': hashed_password_str},
                     'CreatedOn': {'S': creation_date},
                     'CreatedAt': {'S': creation_time}
-                }
-            )
+                },
+                'ConditionExpression': 'attribute_not_exists(UserID)'
+            }
+        },
+        {
+            'Put': {
+                'TableName': users_table_name,
+                'Item': {
+                    'UserID': {'S': get_email_guard_id(email)},
+                    'OwnerUserID': {'S': user_id}
+                },
+                'ConditionExpression': 'attribute_not_exists(UserID)'
+            }
+        }
+    ]
+
+    for attempt in range(1, max_attempts + 1):
+        try:
+            dynamodb.transact_write_items(TransactItems=transact_items)
             logging.info(f"User with ID {user_id} created successfully in DynamoDB.")
             return user_id
         except ClientError as e:
+            if e.response['Error']['Code'] != 'TransactionCanceledException':
+                logging.error(f"Error creating user '{email}' in DynamoDB: {e}")
+                raise DatabaseError(f"Error creating new user: '{email}'") from e
+
+            cancellation_codes = [reason.get('Code') for reason in e.response.get('CancellationReasons', [])]
+            if 'ConditionalCheckFailed' in cancellation_codes:
+                raise UserAlreadyExistsError(f"User with email '{email}' already exists.") from e
+            if 'TransactionConflict' in cancellation_codes and attempt < max_attempts:
+                # another signup for this email is in flight - retrying will either succeed or hit the guard item
+                logging.info(f"Concurrent signup detected for '{email}', retrying...")
+                continue
             logging.error(f"Error creating user '{email}' in DynamoDB: {e}")
             raise DatabaseError(f"Error creating new user: '{email}'") from e
 
 
 def delete_user_in_dynamodb(dynamodb_table, user_id: str):
+    """
+    This function deletes a user and their email guard item from the Users table, in a single transaction
+    """
     try:
-        dynamodb_table.delete_item(Key={'UserID': user_id})
+        response = dynamodb_table.get_item(Key={'UserID': user_id}, ProjectionExpression='Email')
+        transact_items = [
+            {'Delete': {'TableName': dynamodb_table.name, 'Key': {'UserID': user_id}}}
+        ]
+        if 'Item' in response:
+            transact_items.append({
+                'Delete': {
+                    'TableName': dynamodb_table.name,
+                    'Key': {'UserID': get_email_guard_id(response['Item']['Email'])},
+                    # never release an email address that has been taken over by another user
+                    'ConditionExpression': 'attribute_not_exists(UserID) OR OwnerUserID = :user_id',
+                    'ExpressionAttributeValues': {':user_id': user_id}
+                }
+            })
+        # the client of a Table resource accepts plain Python values, like the resource itself
+        dynamodb_table.meta.client.transact_write_items(TransactItems=transact_items)
         logging.info(f"User '{user_id}' deleted successfully!")
     except Exception as e:
         raise DatabaseError(f"Error deleting user '{user_id}'") from e
 
 
+def start_user_deletion(users_table, user_id: str, mode: str) -> Optional[List[str]]:
+    """
+    This function marks a user's account as being deleted, and returns the deletion steps that earlier attempts have
+    already completed. Returns None if the user doesn't exist (anymore), i.e. their account has already been deleted.
+    """
+    now = datetime.utcnow().isoformat()
+    try:
+        response = users_table.update_item(
+            Key={'UserID': user_id},
+            UpdateExpression='SET DeletionStatus = :status, DeletionMode = :mode, DeletionUpdatedAt = :now, '
+                             'DeletionStartedAt = if_not_exists(DeletionStartedAt, :now) REMOVE DeletionError',
+            ConditionExpression='attribute_exists(UserID)',
+            ExpressionAttributeValues={':status': 'in_progress', ':mode': mode, ':now': now},
+            ReturnValues='ALL_NEW'
+        )
+    except ClientError as e:
+        if e.response['Error']['Code'] == 'ConditionalCheckFailedException':
+            return None
+        raise DatabaseError(f"Error starting the deletion of '{user_id}'") from e
+    return sorted(response['Attributes'].get('DeletionSteps', set()))
+
+
+def mark_user_deletion_step_done(users_table, user_id: str, step: str):
+    """
+    This function records that a step of a user's account deletion has been completed. The steps are kept in a string
+    set, which concurrent steps can add to without overwriting each other.
+    """
+    try:
+        users_table.update_item(
+            Key={'UserID': user_id},
+            UpdateExpression='ADD DeletionSteps :step SET DeletionUpdatedAt = :now',
+            ConditionExpression='attribute_exists(UserID)',
+            ExpressionAttributeValues={':step': {step}, ':now': datetime.utcnow().isoformat()}
+        )
+    except ClientError as e:
+        if e.response['Error']['Code'] == 'ConditionalCheckFailedException':
+            logging.info(f"User '{user_id}' no longer exists, skipping deletion progress update")
+            return
+        raise DatabaseError(f"Error recording deletion step '{step}' for '{user_id}'") from e
+
+
+def fail_user_deletion(users_table, user_id: str, error: str):
+    """
+    This function marks a user's account deletion as failed. The completed steps are kept, so that retrying the
+    deletion resumes with the steps that are still missing.
+    """
+    try:
+        users_table.update_item(
+            Key={'UserID': user_id},
+            UpdateExpression='SET DeletionStatus = :status, DeletionError = :error, DeletionUpdatedAt = :now',
+            ConditionExpression='attribute_exists(UserID)',
+            ExpressionAttributeValues={':status': 'failed', ':error': error, ':now': datetime.utcnow().isoformat()}
+        )
+    except ClientError as e:
+        if e.response['Error']['Code'] == 'ConditionalCheckFailedException':
+            return
+        raise DatabaseError(f"Error marking the deletion of '{user_id}' as failed") from e
+
+
+def get_user_deletion_progress(users_table, user_id: str) -> Optional[Dict]:
+    """
+    This function returns the deletion attributes of a user's item, or None if the user doesn't exist (anymore)
+    """
+    try:
+        response = users_table.get_item(
+            Key={'UserID': user_id},
+            ProjectionExpression='UserID, DeletionStatus, DeletionMode, DeletionSteps, DeletionStartedAt, '
+                                 'DeletionUpdatedAt, DeletionError'
+        )
+    except ClientError as e:
+        raise DatabaseError(f"Error getting the deletion progress of '{user_id}'") from e
+    return response.get('Item')
+
+
 def is_invoice_already_parsed(current_month: int, current_year: int, invoice_dates: defaultdict) -> bool:
     """
     This function checks if an invoice with the current month and year exists in the provided defaultdict
@@ -102,16 +403,95 @@ def is_invoice_already_parsed(current_month: int, current_year: int, invoice_dat
     return invoice_dates[current_year][current_month]
 
 
-def get_user_rental_invoices(dynamodb_table, user_id: str) -> Tuple[Dict, int]:
-    # This returns all rental invoices for a given user
+# Attributes returned for the lightweight list view of the invoices
+INVOICE_SUMMARY_ATTRIBUTES = ['InvoiceID', 'Due Date', 'Total Amount', 'due_date_year', 'due_date_month']
+
+# Index of the invoices of a user by due date. Its sort key is the due date as 'YYYYMMDD' (get_due_date_sort_key)
+INVOICES_DUE_DATE_INDEX = 'UserID-due_date_key-index'
+DUE_DATE_KEY = 'due_date_key'
+
+
+def get_due_date_key_bounds(year: Optional[str] = None, from_date: Optional[Tuple[int, int]] = None,
+                            to_date: Optional[Tuple[int, int]] = None) -> Optional[Tuple[str, str]]:
+    """
+    This function turns the year and date range filters of the invoices into inclusive bounds on the due_date_key of
+    INVOICES_DUE_DATE_INDEX, or None if there is no filter. A month spans the keys 'YYYYMM00' to 'YYYYMM99'.
+    """
+    lower_bounds, upper_bounds = [], []
+    if year:
+        lower_bounds.append((int(year), 1))
+        upper_bounds.append((int(year), 12))
+    if from_date:
+        lower_bounds.append(from_date)
+    if to_date:
+        upper_bounds.append(to_date)
+    if not lower_bounds and not upper_bounds:
+        return None
+    lower_year, lower_month = max(lower_bounds, default=(0, 0))
+    upper_year, upper_month = min(upper_bounds, default=(9999, 12))
+    return f"{lower_year:04d}{lower_month:02d}00", f"{upper_year:04d}{upper_month:02d}99"
+
+
+def get_user_rental_invoices(dynamodb_table, user_id: str, page_size: Optional[int] = None,
+                             next_token: Optional[str] = None, year: Optional[str] = None,
+                             from_date: Optional[Tuple[int, int]] = None, to_date: Optional[Tuple[int, int]] = None,
+                             summary: bool = False, descending: bool = True) -> Tuple[Dict, int, Optional[str]]:
+    """
+    This function returns the rental invoices for a given user, grouped by year.
+
+    The invoices are read from INVOICES_DUE_DATE_INDEX in due date order, newest first unless descending is False. If
+    page_size is given, at most that many invoices are returned along with a continuation token for the next page, so
+    the first page holds the latest invoices and every following page continues where the previous one ended.
+    Otherwise, all pages of the query are read. The invoices can be filtered on a year, or on a date range given as
+    (year, month) tuples, both of which are applied in the key condition. If summary is True, only the attributes
+    needed for the list view are returned.
+    """
+    key_condition = Key('UserID').eq(user_id)
+    due_date_key_bounds = get_due_date_key_bounds(year, from_date, to_date)
+    if due_date_key_bounds:
+        if due_date_key_bounds[0] > due_date_key_bounds[1]:
+            # e.g. a year outside of the date range
+            return {}, 0, None
+        key_condition = key_condition & Key(DUE_DATE_KEY).between(*due_date_key_bounds)
+
+    query_kwargs = {
+        'IndexName': INVOICES_DUE_DATE_INDEX,
+        'KeyConditionExpression': key_condition,
+        'ScanIndexForward': not descending
+    }
+
+    if summary:
+        attribute_names = {f"#attr{index}": name for index, name in enumerate(INVOICE_SUMMARY_ATTRIBUTES)}
+        query_kwargs['ProjectionExpression'] = ', '.join(attribute_names.keys())
+        query_kwargs['ExpressionAttributeNames'] = attribute_names
+
     try:
-        response = dynamodb_table.query(
-            KeyConditionExpression=Key('UserID').eq(user_id)
-        )
-        invoices = response.get('Items', [])
-        invoices_grouped_by_year = postprocess_invoices(invoices)
-        logging.info(f"Retrieved {len(invoices)} rental invoices for user '{user_id}'")
-        return invoices_grouped_by_year, len(invoices)
+        exclusive_start_key = None
+        if next_token:
+            exclusive_start_key = decode_pagination_token(next_token, user_id)
+            # tokens of the table itself, issued before the invoices were read from the index
+            if DUE_DATE_KEY not in exclusive_start_key:
+                raise InvalidQueryParameterError("Invalid continuation token")
+        invoices = []
+        while True:
+            if exclusive_start_key:
+                query_kwargs['ExclusiveStartKey'] = exclusive_start_key
+            if page_size:
+                # never read past the end of the page, so that LastEvaluatedKey marks exactly where it ends
+                query_kwargs['Limit'] = page_size - len(invoices)
+
+            response = dynamodb_table.query(**query_kwargs)
+            invoices.extend(response.get('Items', []))
+            exclusive_start_key = response.get('LastEvaluatedKey')
+
+            if not exclusive_start_key or (page_size and len(invoices) >= page_size):
+                break
+
+        invoices_grouped_by_year = postprocess_invoices(invoices, descending=descending)
+        logging.info("Retrieved %s rental invoices for user '%s'", len(invoices), user_id)
+        return invoices_grouped_by_year, len(invoices), encode_pagination_token(exclusive_start_key)
+    except InvalidQueryParameterError:
+        raise
     except Exception as e:
         raise DatabaseError(f"Error getting rental invoices for '{user_id}'") from e
 
@@ -133,6 +513,26 @@ def get_invoice_details(dynamodb_table, user_id: str, invoice_id: str) -> Dict:
         raise DatabaseError from e
 
 
+def get_invoice_filename(dynamodb_table, user_id: str, invoice_id: str) -> str:
+    """
+    This function returns the name of the PDF file an invoice was parsed from, without its extension. The invoice is
+    looked up under the given user, so a user can only ever resolve their own invoices.
+    """
+    try:
+        response = dynamodb_table.get_item(
+            Key={'UserID': user_id, 'InvoiceID': invoice_id},
+            ProjectionExpression='#filename',
+            ExpressionAttributeNames={'#filename': 'Filename'}
+        )
+    except ClientError as e:
+        raise DatabaseError(f"Error getting the file name of invoice '{invoice_id}'") from e
+
+    filename = response.get('Item', {}).get('Filename')
+    if not filename:
+        raise NoInvoiceFoundError(f"No invoice file found with ID '{invoice_id}'")
+    return filename
+
+
 def get_all_invoice_dates(dynamodb_table, user_id: str) -> defaultdict:
     """
     This function get the month and year for all invoices in the DynamoDB table belonging to this user, and returns them as a defaultdict
@@ -176,9 +576,8 @@ def invoice_exists_in_dynamodb(dynamodb_table, user_id: str, current_month: int,
                           Attr('due_date_month').eq(str(current_month)))
     )
     items_found = response.get('Items', [])
-    logging.info(f"Found {len(items_found)} items in the table!")
-    for item in items_found:
-        print(item)
+    logging.info("Found %d items in the table!", len(items_found))
+    log_payload("Items found", items_found)
     return len(items_found) > 0
 
 
@@ -188,23 +587,157 @@ def create_invoice_in_dynamodb(dynamodb_table, invoice_id: str, user_id: str, pa
     """
     parsed_data['InvoiceID'] = invoice_id
     parsed_data['UserID'] = user_id
+    # the sort key of INVOICES_DUE_DATE_INDEX, which get_user_rental_invoices pages through
+    parsed_data[DUE_DATE_KEY] = get_due_date_sort_key(parsed_data)
     # insert parsed invoice into table
     dynamodb_table.put_item(Item=parsed_data)
 
 
 def delete_user_invoices(dynamodb_table, user_id: str):
+    """
+    This function deletes all invoices of a user. The invoices are queried page by page, and deleted in batches of 25
+    with BatchWriteItem, which also resends any unprocessed items.
+    """
+    query_kwargs = {
+        'KeyConditionExpression': Key('UserID').eq(user_id),
+        'ProjectionExpression': 'InvoiceID'
+    }
+    invoices_deleted_count = 0
     try:
-        # get all invoices for this user_id
-        response = dynamodb_table.query(
-            KeyConditionExpression=Key('UserID').eq(user_id)
-        )
-        invoices = response['Items']
-        # delete all these invoices one-by-one
-        # TODO: This can be improved by a batch delete operation later?
-        for item in invoices:
-            dynamodb_table.delete_item(
-                Key={'UserID': user_id, 'InvoiceID': item['InvoiceID']}
-            )
-        logging.info(f"{len(invoices)} invoices deleted for user '{user_id}'!")
+        with dynamodb_table.batch_writer() as batch:
+            while True:
+                response = dynamodb_table.query(**query_kwargs)
+                for item in response['Items']:
+                    batch.delete_item(Key={'UserID': user_id, 'InvoiceID': item['InvoiceID']})
+                invoices_deleted_count += len(response['Items'])
+                if 'LastEvaluatedKey' not in response:
+                    break
+                query_kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+        logging.info(f"{invoices_deleted_count} invoices deleted for user '{user_id}'!")
     except ClientError as e:
         raise DatabaseError(f"Error deleting invoices for '{user_id}'") from e
+
+
+def get_invoice_aggregates(aggregates_table, user_id: str) -> Dict:
+    """
+    This function returns the yearly and monthly invoice aggregates for a user. They are stored as one item per year
+    and per month, which a single query returns (usually in a single page).
+    """
+    query_kwargs = {
+        'KeyConditionExpression': Key('UserID').eq(user_id),
+        'ProjectionExpression': 'Period, #statistics',
+        'ExpressionAttributeNames': {'#statistics': 'Statistics'}
+    }
+    aggregates = {'Yearly': {}, 'Monthly': {}}
+    try:
+        while True:
+            response = aggregates_table.query(**query_kwargs)
+            for item in response['Items']:
+                # 'YYYY-MM' for a month, 'YYYY' for a year
+                kind = 'Monthly' if '-' in item['Period'] else 'Yearly'
+                aggregates[kind][item['Period']] = item['Statistics']
+            if 'LastEvaluatedKey' not in response:
+                break
+            query_kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+    except ClientError as e:
+        raise DatabaseError(f"Error getting invoice aggregates for '{user_id}'") from e
+
+    if not aggregates['Yearly']:
+        raise NoInvoiceFoundError(f"No invoice aggregates found for user '{user_id}'")
+    return aggregates
+
+
+def update_invoice_aggregates(aggregates_table, user_id: str, changes: Dict, previous_years: Iterable[str] = (),
+                              max_attempts: int = 5):
+    """
+    This function applies a set of invoice changes (invoice ID -> new image, or None if removed) to the aggregates
+    items of a user. previous_years are the years the changed invoices were due in before (from the old images of the
+    stream records), so that an invoice is also removed from a year it no longer belongs to.
+
+    Only the items of the affected years are read and written: every year is read with one query for its year item
+    and month items, and written back in one transaction, conditional on the revision of every item written. Stream
+    batches for the same user cannot overwrite each other's changes this way, and a cancelled transaction is retried
+    from the read.
+    """
+    from utils.aggregates_utils import apply_invoice_changes, get_year_period
+
+    years = {str(year) for year in previous_years}
+    years.update(str(new_image['due_date_year']) for new_image in changes.values() if new_image is not None)
+
+    for year in sorted(years):
+        for attempt in range(1, max_attempts + 1):
+            try:
+                response = aggregates_table.query(
+                    KeyConditionExpression=Key('UserID').eq(user_id) & Key('Period').begins_with(get_year_period(year)),
+                    ConsistentRead=True
+                )
+                items = {item['Period']: item for item in response['Items']}
+                updated_items = apply_invoice_changes(year, items, changes)
+                if updated_items:
+                    aggregates_table.meta.client.transact_write_items(TransactItems=[
+                        get_aggregates_write(aggregates_table.name, user_id, period, item, items.get(period))
+                        for period, item in updated_items.items()
+                    ])
+                logging.info("Invoice aggregates of %s updated for user '%s' (%s items written)", year, user_id,
+                             len(updated_items))
+                break
+            except ClientError as e:
+                cancellation_codes = [reason.get('Code') for reason in e.response.get('CancellationReasons', [])]
+                if e.response['Error']['Code'] == 'TransactionCanceledException' and attempt < max_attempts and \
+                        ('ConditionalCheckFailed' in cancellation_codes or 'TransactionConflict' in cancellation_codes):
+                    logging.info("Invoice aggregates of %s for user '%s' changed concurrently, retrying...", year,
+                                 user_id)
+                    continue
+                raise DatabaseError(f"Error updating invoice aggregates for '{user_id}'") from e
+
+
+def get_aggregates_write(table_name: str, user_id: str, period: str, item: Optional[Dict],
+                         current_item: Optional[Dict]) -> Dict:
+    """
+    This helper function returns the TransactWriteItems action that writes (or deletes, if item is None) the
+    aggregates item of a period, conditional on the revision it was read with
+    """
+    if current_item:
+        condition = {
+            'ConditionExpression': 'Revision = :revision',
+            'ExpressionAttributeValues': {':revision': current_item['Revision']}
+        }
+    else:
+        condition = {'ConditionExpression': 'attribute_not_exists(UserID)'}
+
+    if item is None:
+        return {'Delete': {'TableName': table_name, 'Key': {'UserID': user_id, 'Period': period}, **condition}}
+    return {'Put': {
+        'TableName': table_name,
+        'Item': {
+            **item,
+            'UserID': user_id,
+            'Period': period,
+            'Revision': (current_item['Revision'] if current_item else 0) + 1
+        },
+        **condition
+    }}
+
+
+def delete_invoice_aggregates(aggregates_table, user_id: str):
+    """
+    This function deletes all aggregates items of a user, in batches of 25
+    """
+    query_kwargs = {
+        'KeyConditionExpression': Key('UserID').eq(user_id),
+        'ProjectionExpression': 'Period'
+    }
+    items_deleted_count = 0
+    try:
+        with aggregates_table.batch_writer() as batch:
+            while True:
+                response = aggregates_table.query(**query_kwargs)
+                for item in response['Items']:
+                    batch.delete_item(Key={'UserID': user_id, 'Period': item['Period']})
+                items_deleted_count += len(response['Items'])
+                if 'LastEvaluatedKey' not in response:
+                    break
+                query_kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+        logging.info("%s invoice aggregates items deleted for user '%s'!", items_deleted_count, user_id)
+    except ClientError as e:
+        raise DatabaseError(f"Error deleting invoice aggregates for '{user_id}'") from e
@@ -38,4 +38,10 @@ class OAuthValidationError(Exception):
     pass
 
 class GmailAPIError(Exception):
+    pass
+
+class InvalidQueryParameterError(Exception):
+    pass
+
+class LambdaInvocationError(Exception):
     pass
\ No newline at end of file
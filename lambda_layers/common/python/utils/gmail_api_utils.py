@@ -1,19 +1,207 @@
+import os
+import time
 import logging
 import email
-from typing import List, Dict, Any, Optional
+from uuid import uuid4
+from typing import TYPE_CHECKING, List, Dict, Any, Optional
 from email.message import Message
 
-from google.oauth2.credentials import Credentials as OAuth2Credentials
-from googleapiclient.discovery import build
-from google.auth.exceptions import RefreshError
+from utils.metrics_utils import span
+from utils.exceptions import GmailAPIError, OAuthValidationError, DatabaseError, SecretsManagerError
 
-from utils.exceptions import GmailAPIError, OAuthValidationError
+# The Google client libraries take several hundred ms to import, so they are imported inside the functions that use
+# them. Functions importing this module only pay for them once a request actually talks to Gmail
+if TYPE_CHECKING:
+    from google.oauth2.credentials import Credentials as OAuth2Credentials
 
 
-def create_gmail_service(user_id: str, access_token: str, refresh_token: str, client_id: str, region: str, client_secret: str = None, expires_at: str = None):
+GMAIL_SCOPES = ['https://www.googleapis.com/auth/gmail.readonly']
+GOOGLE_TOKEN_URI = os.environ.get('GOOGLE_TOKEN_URI', "https://oauth2.googleapis.com/token")
+# Overrides the Gmail API's base URL, e.g. to point the functions at the fake server of scripts/load_test.py
+GMAIL_API_ENDPOINT = os.environ.get('GMAIL_API_ENDPOINT')
+
+# A token refresh normally takes well under a second; the lease only has to outlive a refresh that hangs
+TOKEN_REFRESH_LEASE_SECONDS = 30
+# How long an invocation waits for another invocation's refresh, before refreshing the token itself
+TOKEN_REFRESH_WAIT_SECONDS = 5
+TOKEN_REFRESH_POLL_SECONDS = 0.25
+# Tokens are refreshed inline when they expire within this margin
+TOKEN_REFRESH_MARGIN_SECONDS = 300
+
+
+def build_oauth_credentials(access_token: Optional[str], refresh_token: str, client_id: str, client_secret: str = None) -> 'OAuth2Credentials':
+    """
+    Creates a Google OAuth credentials object (use empty string for iOS OAuth public clients)
+    """
+    from google.oauth2.credentials import Credentials as OAuth2Credentials
+
+    return OAuth2Credentials(
+        token=access_token,
+        refresh_token=refresh_token,
+        client_id=client_id,
+        client_secret=client_secret or "",  # Empty string for iOS OAuth public clients
+        token_uri=GOOGLE_TOKEN_URI,
+        scopes=GMAIL_SCOPES
+    )
+
+
+def refresh_oauth_tokens(user_id: str, credentials: 'OAuth2Credentials', region: str, users_table=None) -> Dict[str, Any]:
+    """
+    Refreshes the access token of a user at Google's token endpoint, and writes the new tokens back.
+    
+    Args:
+        user_id: User ID for token updates
+        credentials: OAuth credentials holding the refresh token
+        region: AWS region for Secrets Manager
+        users_table: Users table to record the refresh and the new token expiry in (optional)
+        
+    Returns:
+        Dictionary containing the updated OAuth token data
+        
+    Raises:
+        OAuthValidationError: If token refresh fails
+    """
+    from datetime import datetime
+    from utils.secretsmanager_utils import update_oauth_tokens
+    from utils.dynamodb_utils import set_gmail_connection_status
+    # Import here to avoid circular imports
+    import google.auth.transport.requests
+    from google.auth.exceptions import RefreshError
+    
+    refresh_token = credentials.refresh_token
+    try:
+        request = google.auth.transport.requests.Request()
+        with span('token_refresh'):
+            credentials.refresh(request)
+    except RefreshError as e:
+        raise OAuthValidationError(f"Token refresh failed: {str(e)}") from e
+    
+    # Update tokens in Secrets Manager
+    new_expires_in = int((credentials.expiry - datetime.utcnow()).total_seconds()) if credentials.expiry else 3600
+    oauth_data = update_oauth_tokens(
+        user_id=user_id,
+        access_token=credentials.token,
+        refresh_token=credentials.refresh_token or refresh_token,
+        expires_in=new_expires_in,
+        region=region
+    )
+    logging.info("Access token refreshed and updated in Secrets Manager")
+    
+    if users_table is not None:
+        try:
+            set_gmail_connection_status(users_table, user_id, oauth_data['expires_at'])
+        except DatabaseError as e:
+            # the tokens themselves are stored, so this only means the next refresh may happen inline
+            logging.warning(f"Could not record the Gmail token refresh of user {user_id}: {e}")
+    return oauth_data
+
+
+def _use_stored_tokens(credentials: 'OAuth2Credentials', oauth_data: Dict[str, Any]):
+    from datetime import datetime
+
+    credentials.token = oauth_data['access_token']
+    if oauth_data.get('expires_at'):
+        credentials.expiry = datetime.fromisoformat(oauth_data['expires_at'])
+
+
+def _is_refreshed(credentials: 'OAuth2Credentials', oauth_data: Dict[str, Any], min_valid_seconds: float) -> bool:
+    """
+    Whether the stored tokens no longer need the refresh that the caller is about to make: another invocation stored
+    a different access token, or the stored one is valid for at least min_valid_seconds
+    """
+    from datetime import datetime
+
+    if credentials.token and oauth_data.get('access_token') != credentials.token:
+        return True
+    try:
+        valid_seconds = (datetime.fromisoformat(oauth_data['expires_at']) - datetime.utcnow()).total_seconds()
+    except (KeyError, TypeError, ValueError):
+        return False
+    return valid_seconds >= min_valid_seconds
+
+
+def refresh_oauth_tokens_single_flight(user_id: str, credentials: 'OAuth2Credentials', region: str, users_table,
+                                       wait_seconds: float = TOKEN_REFRESH_WAIT_SECONDS,
+                                       min_valid_seconds: float = TOKEN_REFRESH_MARGIN_SECONDS) -> Optional[Dict[str, Any]]:
+    """
+    Refreshes a user's tokens, making sure that concurrent invocations for the same user don't all refresh them.
+    
+    The invocation that takes the refresh lease on the user's item reads the tokens from Secrets Manager again, since
+    another invocation may have refreshed them between the caller's read and the lease being released. It only
+    refreshes them if they still need it. The others poll Secrets Manager until the new tokens show up, and continue
+    with those. If they don't show up within wait_seconds (e.g. the lease holder crashed), the waiting invocation
+    refreshes the tokens itself. With wait_seconds=0, an invocation that can't take the lease returns None straight
+    away.
+    
+    Args:
+        user_id: User ID for token updates
+        credentials: OAuth credentials holding the refresh token. Updated in place with the new access token
+        region: AWS region for Secrets Manager
+        users_table: Users table holding the refresh lease
+        wait_seconds: Maximum time to wait for another invocation's refresh
+        min_valid_seconds: Stored tokens valid for at least this long are used instead of being refreshed
+        
+    Returns:
+        Dictionary containing the new OAuth token data, or None if another invocation is refreshing them
+        
+    Raises:
+        OAuthValidationError: If token refresh fails
+    """
+    from utils.secretsmanager_utils import get_oauth_tokens
+    from utils.dynamodb_utils import acquire_token_refresh_lease, release_token_refresh_lease
+    
+    owner = str(uuid4())
+    try:
+        lease_acquired = acquire_token_refresh_lease(users_table, user_id, owner, TOKEN_REFRESH_LEASE_SECONDS)
+    except DatabaseError as e:
+        # a duplicate refresh is harmless, so this is not a reason to fail the request
+        logging.warning(f"Could not take the token refresh lease of user {user_id}, refreshing without it: {e}")
+        return refresh_oauth_tokens(user_id, credentials, region, users_table=users_table)
+    
+    if lease_acquired:
+        try:
+            try:
+                oauth_data = get_oauth_tokens(user_id, region, use_cache=False)
+            except SecretsManagerError as e:
+                logging.warning(f"Could not read the tokens of user {user_id} again, refreshing them: {e}")
+                oauth_data = None
+            if oauth_data is not None and _is_refreshed(credentials, oauth_data, min_valid_seconds):
+                _use_stored_tokens(credentials, oauth_data)
+                logging.info("Using the access token refreshed by another invocation")
+                return oauth_data
+            return refresh_oauth_tokens(user_id, credentials, region, users_table=users_table)
+        finally:
+            try:
+                release_token_refresh_lease(users_table, user_id, owner)
+            except DatabaseError as e:
+                # the lease expires by itself
+                logging.warning(f"Could not release the token refresh lease of user {user_id}: {e}")
+    
+    if not wait_seconds:
+        logging.info(f"Tokens of user {user_id} are being refreshed by another invocation")
+        return None
+    
+    logging.info(f"Tokens of user {user_id} are being refreshed by another invocation, waiting for the new token")
+    deadline = time.monotonic() + wait_seconds
+    while time.monotonic() < deadline:
+        time.sleep(TOKEN_REFRESH_POLL_SECONDS)
+        oauth_data = get_oauth_tokens(user_id, region, use_cache=False)
+        if _is_refreshed(credentials, oauth_data, min_valid_seconds):
+            _use_stored_tokens(credentials, oauth_data)
+            logging.info("Using the access token refreshed by another invocation")
+            return oauth_data
+    
+    logging.warning(f"No refreshed token for user {user_id} after {wait_seconds} seconds, refreshing it here")
+    return refresh_oauth_tokens(user_id, credentials, region, users_table=users_table)
+
+
+def create_gmail_service(user_id: str, access_token: str, refresh_token: str, client_id: str, region: str, client_secret: str = None, expires_at: str = None, users_table=None):
     """
     Creates a Gmail API service object using OAuth credentials with automatic token refresh.
     
+    Tokens are normally refreshed ahead of time by the refresh_oauth_tokens lambda function, so the inline refresh
+    here only happens when that hasn't run in time. Every call logs whether an inline refresh was needed.
+    
     Args:
         user_id: User ID for token updates
         access_token: OAuth access token
@@ -22,6 +210,7 @@ def create_gmail_service(user_id: str, access_token: str, refresh_token: str, cl
         region: AWS region for Secrets Manager
         client_secret: OAuth client secret (None for iOS public clients)
         expires_at: Token expiration timestamp in ISO format
+        users_table: Users table holding the refresh lease and the token expiry (optional)
         
     Returns:
         Gmail API service object
@@ -33,18 +222,10 @@ def create_gmail_service(user_id: str, access_token: str, refresh_token: str, cl
     try:
         # Check if token needs refresh
         from datetime import datetime, timedelta
-        from utils.secretsmanager_utils import update_oauth_tokens
         import dateutil.parser
+        from googleapiclient.discovery import build
         
-        # Create credentials object (use empty string for iOS OAuth public clients)
-        credentials = OAuth2Credentials(
-            token=access_token,
-            refresh_token=refresh_token,
-            client_id=client_id,
-            client_secret=client_secret or "",  # Empty string for iOS OAuth public clients
-            token_uri="https://oauth2.googleapis.com/token",
-            scopes=['https://www.googleapis.com/auth/gmail.readonly']
-        )
+        credentials = build_oauth_credentials(access_token, refresh_token, client_id, client_secret)
         
         # Check if token is expired or will expire soon, and refresh proactively
         
@@ -57,8 +238,8 @@ def create_gmail_service(user_id: str, access_token: str, refresh_token: str, cl
                 current_time = datetime.utcnow()
                 time_until_expiry = expiry_time - current_time
                 
-                # Refresh if expired or expiring within 5 minutes
-                should_refresh = time_until_expiry < timedelta(minutes=5)
+                # Refresh if expired or expiring within the margin
+                should_refresh = time_until_expiry < timedelta(seconds=TOKEN_REFRESH_MARGIN_SECONDS)
                 logging.info(f"Token expires in {time_until_expiry.total_seconds():.0f} seconds")
                 
             except Exception as e:
@@ -67,31 +248,20 @@ def create_gmail_service(user_id: str, access_token: str, refresh_token: str, cl
         else:
             # Fallback to credentials.expired if no expires_at provided
             should_refresh = credentials.expired
+        
+        # this line is used to compute the fraction of requests that had to refresh inline, see the README
+        logging.info(f"Gmail token check: inline_refresh={str(should_refresh).lower()}")
             
         if should_refresh:
             logging.info("Access token expired or expiring soon, refreshing...")
-            try:
-                # Import here to avoid circular imports
-                import google.auth.transport.requests
-                request = google.auth.transport.requests.Request()
-                credentials.refresh(request)
-                
-                # Update tokens in Secrets Manager
-                new_expires_in = int((credentials.expiry - datetime.utcnow()).total_seconds()) if credentials.expiry else 3600
-                update_oauth_tokens(
-                    user_id=user_id,
-                    access_token=credentials.token,
-                    refresh_token=credentials.refresh_token or refresh_token,
-                    expires_in=new_expires_in,
-                    region=region
-                )
-                logging.info("Access token refreshed and updated in Secrets Manager")
-                
-            except RefreshError as e:
-                raise OAuthValidationError(f"Token refresh failed: {str(e)}") from e
+            if users_table is not None:
+                refresh_oauth_tokens_single_flight(user_id, credentials, region, users_table)
+            else:
+                refresh_oauth_tokens(user_id, credentials, region)
         
         # Build Gmail service
-        service = build('gmail', 'v1', credentials=credentials)
+        service = build('gmail', 'v1', credentials=credentials,
+                        client_options={'api_endpoint': GMAIL_API_ENDPOINT} if GMAIL_API_ENDPOINT else None)
         logging.info("Gmail API service created successfully")
         return service
         
@@ -131,7 +301,8 @@ def search_emails(service, sender: str, subject: str = "", since_date: str = "")
         logging.info(f"Gmail API search query: {query}")
         
         # Execute search
-        result = service.users().messages().list(userId='me', q=query).execute()
+        with span('gmail_search'):
+            result = service.users().messages().list(userId='me', q=query).execute()
         messages = result.get('messages', [])
         
         logging.info(f"Found {len(messages)} messages")
@@ -158,11 +329,12 @@ def get_email_content(service, message_id: str) -> Message:
     """
     try:
         # Get message in raw format
-        message = service.users().messages().get(
-            userId='me', 
-            id=message_id, 
-            format='raw'
-        ).execute()
+        with span('gmail_get'):
+            message = service.users().messages().get(
+                userId='me',
+                id=message_id,
+                format='raw'
+            ).execute()
         
         # Decode the raw message
         import base64
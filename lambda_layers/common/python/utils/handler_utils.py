@@ -0,0 +1,187 @@
+import json
+import time
+import logging
+import functools
+import threading
+from typing import Callable, Sequence, Tuple, Union
+
+from utils.responses import log_and_generate_error_response, compress_response, ErrorCode
+from utils.metrics_utils import invocation_metrics
+from utils.aws_call_utils import aws_call_accounting
+from utils.logging_utils import start_invocation
+from utils.exceptions import InvalidCredentialsError, InvalidTokenError, TokenExpiredError, JWTDecodingError, \
+    InvalidQueryParameterError
+
+# AWS clients and resources, created on first use and shared by all invocations of the container
+_aws_clients = {}
+# boto3's default session is not thread-safe, so clients are never created concurrently
+_aws_clients_lock = threading.Lock()
+
+# True until the first invocation of this container has finished
+_cold_start = True
+
+# (exception type, error code, message or function of the exception returning the message, status code)
+ErrorMapping = Tuple[type, str, Union[str, Callable[[Exception], str]], int]
+
+# The mappings shared by all API functions. They are checked after the mappings of the function itself, in order
+COMMON_ERROR_MAPPINGS: Tuple[ErrorMapping, ...] = (
+    (InvalidCredentialsError, ErrorCode.INVALID_CREDENTIALS, "Invalid Credentials", 401),
+    (InvalidTokenError, ErrorCode.INVALID_TOKEN, "Malformed Token", 401),
+    (TokenExpiredError, ErrorCode.TOKEN_EXPIRED, "Expired token", 401),
+    (JWTDecodingError, ErrorCode.JWT_ERROR, "Error parsing JWT token", 500),
+    (InvalidQueryParameterError, ErrorCode.INVALID_QUERY_PARAMETERS, str, 400),
+    (json.JSONDecodeError, ErrorCode.INVALID_JSON, "Invalid JSON in request body", 400),
+)
+
+# For functions that read fields from the request body. Not part of the common mappings, since a KeyError elsewhere
+# is a bug rather than a bad request
+MISSING_KEY_ERROR_MAPPING: ErrorMapping = (
+    KeyError, ErrorCode.MISSING_FIELDS, lambda e: f"Missing key in request body: {e}", 400
+)
+
+
+def _get_or_create_aws_client(kind: str, service_name: str, region_name: str = None, max_attempts: int = None,
+                              retry_mode: str = None):
+    key = (kind, service_name, region_name, max_attempts, retry_mode)
+    aws_client = _aws_clients.get(key)
+    if aws_client is None:
+        with _aws_clients_lock:
+            aws_client = _aws_clients.get(key)
+            if aws_client is None:
+                import boto3
+
+                kwargs = {}
+                if region_name:
+                    kwargs['region_name'] = region_name
+                if max_attempts or retry_mode:
+                    from botocore.config import Config
+                    kwargs['config'] = Config(retries={
+                        'max_attempts': max_attempts or 3,
+                        'mode': retry_mode or 'standard'
+                    })
+                factory = boto3.client if kind == 'client' else boto3.resource
+                aws_client = factory(service_name, **kwargs)
+                if aws_call_accounting.enabled:
+                    aws_call_accounting.instrument(aws_client if kind == 'client' else aws_client.meta.client)
+                _aws_clients[key] = aws_client
+    return aws_client
+
+
+def get_client(service_name: str, region_name: str = None, max_attempts: int = None, retry_mode: str = None):
+    """
+    Returns the boto3 client of a service, creating it on first use. Functions only pay for the clients that the
+    code path of an invocation actually needs, and warm invocations reuse them.
+    """
+    return _get_or_create_aws_client('client', service_name, region_name, max_attempts, retry_mode)
+
+
+def get_resource(service_name: str, region_name: str = None, max_attempts: int = None, retry_mode: str = None):
+    """
+    Returns the boto3 resource of a service, creating it on first use
+    """
+    return _get_or_create_aws_client('resource', service_name, region_name, max_attempts, retry_mode)
+
+
+def get_table(table_name: str, **kwargs):
+    """
+    Returns a DynamoDB table, backed by the shared DynamoDB resource. Keyword arguments are passed on to get_resource
+    """
+    return get_resource('dynamodb', **kwargs).Table(table_name)
+
+
+def get_request_header(event, name: str):
+    """
+    Returns a request header of an API Gateway event, or None if it is missing. HTTP APIs (payload format 2.0) pass
+    header names in lowercase, so name must be lowercase too.
+    """
+    return (event.get('headers') or {}).get(name)
+
+
+def generate_error_response(error: Exception, error_mappings: Sequence[ErrorMapping]) -> dict:
+    """
+    Turns an exception into the error response of the first mapping that matches it, or into a 500 response if
+    none does
+    """
+    for exception_type, code, message, status_code in error_mappings:
+        if isinstance(error, exception_type):
+            return log_and_generate_error_response(
+                code,
+                message(error) if callable(message) else message,
+                status_code,
+                error
+            )
+    return log_and_generate_error_response(ErrorCode.INTERNAL_SERVER_ERROR, "Internal Server Error", 500, error)
+
+
+def _log_invocation(handler, context, start: float, outcome: str):
+    global _cold_start
+    function_name = getattr(context, 'function_name', handler.__module__)
+    duration_ms = (time.perf_counter() - start) * 1000
+    logging.info("%s finished in %.1f ms (%s, cold start: %s)", function_name, duration_ms, outcome, _cold_start)
+    invocation_metrics.flush(function_name, cold_start=_cold_start)
+    aws_call_accounting.log_summary(function_name)
+    _cold_start = False
+
+
+def api_handler(error_mappings: Sequence[ErrorMapping] = (), compress: bool = True):
+    """
+    Decorator for the lambda functions behind API Gateway. Exceptions raised by the function are turned into error
+    responses, using the given mappings first and COMMON_ERROR_MAPPINGS after them. Unless compress is False, large
+    responses are compressed according to the request's Accept-Encoding header. Every invocation logs its duration
+    and whether it was a cold start, and emits the stage durations timed with metrics_utils.span. With
+    AWS_CALL_ACCOUNTING set, it also logs the AWS calls it made (aws_call_utils). Whether the invocation's payloads
+    are sampled is drawn when it starts (logging_utils).
+
+    Usage:
+        @api_handler(error_mappings=[
+            (DatabaseError, ErrorCode.DEPENDENCY_FAILURE, "Database error during user retrieval", 502)
+        ])
+        def lambda_handler(event, context):
+            ...
+    """
+    mappings = tuple(error_mappings) + COMMON_ERROR_MAPPINGS
+
+    def decorator(handler):
+        @functools.wraps(handler)
+        def wrapper(event, context=None):
+            start = time.perf_counter()
+            invocation_metrics.reset()
+            aws_call_accounting.reset()
+            start_invocation()
+            try:
+                response = handler(event, context)
+            except Exception as e:
+                response = generate_error_response(e, mappings)
+            if compress:
+                response = compress_response(response, get_request_header(event, 'accept-encoding'))
+            _log_invocation(handler, context, start, f"status {response.get('statusCode')}")
+            return response
+
+        return wrapper
+
+    return decorator
+
+
+def event_handler(handler):
+    """
+    Decorator for the lambda functions triggered by events (streams, schedules, authorizers). Exceptions are logged
+    and raised again, so that the event source retries the event. Every invocation logs its duration and whether it
+    was a cold start, and emits the stage durations timed with metrics_utils.span. With AWS_CALL_ACCOUNTING set, it
+    also logs the AWS calls it made (aws_call_utils). Whether the invocation's payloads are sampled is drawn when it
+    starts (logging_utils).
+    """
+    @functools.wraps(handler)
+    def wrapper(event, context=None):
+        start = time.perf_counter()
+        invocation_metrics.reset()
+        aws_call_accounting.reset()
+        start_invocation()
+        try:
+            response = handler(event, context)
+        except Exception as e:
+            _log_invocation(handler, context, start, f"failed: {e}")
+            raise
+        _log_invocation(handler, context, start, "succeeded")
+        return response
+
+    return wrapper
@@ -0,0 +1,67 @@
+import json
+from decimal import Decimal
+from typing import Any
+
+# orjson is an optional, much faster JSON backend. It is used automatically when it is bundled with a function
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def convert_decimal(obj):
+    """
+    json default hook converting Decimal objects to int or float. This is needed because boto3 converts numeric values
+    to Decimal by default, and the Decimal datatype is unsupported by both JSON backends
+    """
+    if type(obj) is Decimal:
+        integer = int(obj)
+        return integer if integer == obj else float(obj)
+    raise TypeError(f"Object of type '{type(obj).__name__}' for 'obj' is not JSON serializable.")
+
+
+def convert_dynamodb_item(value: Any) -> Any:
+    """
+    Converts a DynamoDB item, or a list or dict of items, into plain JSON types in a single pass. Integral Decimals
+    become ints, the rest floats, and sets become lists. Values that are cached and served repeatedly should be
+    converted once, so that every later serialization runs without calling back into Python once per Decimal.
+    """
+    value_type = type(value)
+    if value_type is dict:
+        converted = {}
+        for key, item in value.items():
+            item_type = type(item)
+            if item_type is str:
+                converted[key] = item
+            elif item_type is Decimal:
+                integer = int(item)
+                converted[key] = integer if integer == item else float(item)
+            else:
+                converted[key] = convert_dynamodb_item(item)
+        return converted
+    if value_type is list or value_type is tuple or value_type is set:
+        return [convert_dynamodb_item(item) for item in value]
+    if value_type is Decimal:
+        integer = int(value)
+        return integer if integer == value else float(value)
+    return value
+
+
+def dumps(value: Any) -> str:
+    """
+    Serializes a value to a compact JSON string, using orjson if it is available. Decimals left in the value are
+    converted through convert_decimal. Non-ASCII characters are kept as they are, in both backends.
+    """
+    if orjson is not None:
+        # like json.dumps, non-string keys are written as strings
+        return orjson.dumps(value, default=convert_decimal, option=orjson.OPT_NON_STR_KEYS).decode('utf-8')
+    return json.dumps(value, default=convert_decimal, separators=(',', ':'), ensure_ascii=False)
+
+
+def loads(value) -> Any:
+    """
+    Parses a JSON string or bytes, using orjson if it is available
+    """
+    if orjson is not None:
+        return orjson.loads(value)
+    return json.loads(value)
@@ -1,11 +1,21 @@
-import jwt
 import time
+import hashlib
 import logging
 
+from utils.cache_utils import TTLCache, MISSING
 from utils.exceptions import InvalidCredentialsError, JWTGenerationError, TokenExpiredError, InvalidTokenError
 
+# jwt is imported inside the functions that use it: requests routed through API Gateway carry the user ID in the
+# authorizer context, so most functions never need it
+
+# User IDs of tokens that were already verified in this container, keyed by the token's hash. Every entry expires
+# together with its token, so an expired token is always decoded again (and rejected)
+verified_tokens = TTLCache(max_entries=1024)
+
 
 def generate_jwt_token(user_id: str, email: str, jwt_secret: str) -> str:
+    import jwt
+
     try:
         payload = {
             "user_id": user_id,
@@ -22,19 +32,55 @@ def generate_jwt_token(user_id: str, email: str, jwt_secret: str) -> str:
 
 
 def decode_jwt_token(token: str, jwt_secret: str) -> str:
+    import jwt
+
     decoded = jwt.decode(token, jwt_secret, algorithms=["HS256"])
     user_id = decoded['user_id']
     return user_id
 
 
+def verify_jwt_token(token: str, jwt_secret: str) -> str:
+    """
+    Returns the user ID of a token, decoding and verifying it only if it hasn't been verified in this container yet
+    """
+    token_hash = hashlib.sha256(token.encode('utf-8')).hexdigest()
+    user_id = verified_tokens.get(token_hash)
+    if user_id is not MISSING:
+        return user_id
+
+    import jwt
+
+    decoded = jwt.decode(token, jwt_secret, algorithms=["HS256"])
+    user_id = decoded['user_id']
+    verified_tokens.set(token_hash, user_id, ttl_seconds=decoded.get('exp', 0) - time.time())
+    return user_id
+
+
 def get_user_id_from_token(auth_header: str, jwt_secret: str):
+    import jwt
+
     try:
         if not auth_header:
             raise InvalidCredentialsError("Missing authentication.")
         token = auth_header.split(' ')[1]
-        user_id = decode_jwt_token(token, jwt_secret=jwt_secret)
+        user_id = verify_jwt_token(token, jwt_secret=jwt_secret)
         return user_id
+    except IndexError:
+        raise InvalidTokenError("Invalid token.")
     except jwt.ExpiredSignatureError:
         raise TokenExpiredError("Expired token.")
     except jwt.InvalidTokenError:
-        raise InvalidTokenError("Invalid token.")
\ No newline at end of file
+        raise InvalidTokenError("Invalid token.")
+
+
+def get_user_id(event: dict, jwt_secret: str) -> str:
+    """
+    Returns the ID of the user making a request. Requests routed through API Gateway were already authorized by the
+    authorizer lambda function, which passes the user ID along in the request context. Otherwise (e.g. when a
+    function is invoked directly, or the authorizer let an expired or invalid token through), the token in the
+    authorization header is verified here, and rejected with the matching error.
+    """
+    authorizer_context = event.get('requestContext', {}).get('authorizer', {}).get('lambda') or {}
+    if authorizer_context.get('user_id'):
+        return authorizer_context['user_id']
+    return get_user_id_from_token((event.get('headers') or {}).get('authorization'), jwt_secret)
\ No newline at end of file
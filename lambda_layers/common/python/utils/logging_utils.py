@@ -0,0 +1,166 @@
+import os
+import re
+import json
+import random
+import logging
+from typing import Any
+from urllib.parse import parse_qsl, urlencode
+
+# Level of the root logger. Lambda sets AWS_LAMBDA_LOG_LEVEL from the application_log_level of a function's
+# logging_config; LOG_LEVEL takes precedence over it
+LOG_LEVEL = os.environ.get('LOG_LEVEL') or os.environ.get('AWS_LAMBDA_LOG_LEVEL') or 'INFO'
+# Levels of individual loggers, as comma separated name=LEVEL pairs. The AWS and HTTP libraries log every request
+# at DEBUG, which would drown the function's own debug logs
+LOGGER_LEVELS = os.environ.get('LOGGER_LEVELS', 'boto3=WARNING,botocore=WARNING,urllib3=WARNING,'
+                                                'googleapiclient=WARNING')
+# The share of invocations that log their payloads although DEBUG is off
+PAYLOAD_LOG_SAMPLE_RATE = float(os.environ.get('PAYLOAD_LOG_SAMPLE_RATE', 0.01))
+# Payloads are cut off after this many characters in total, and every string in them after PAYLOAD_FIELD_MAX_CHARS
+PAYLOAD_LOG_MAX_CHARS = int(os.environ.get('PAYLOAD_LOG_MAX_CHARS', 2048))
+PAYLOAD_FIELD_MAX_CHARS = int(os.environ.get('PAYLOAD_FIELD_MAX_CHARS', 256))
+
+# Fields whose values never appear in the logs, compared in lowercase. Request bodies are redacted too, both JSON and
+# form encoded ones
+REDACTED_FIELDS = frozenset({
+    'authorization', 'cookie', 'set-cookie', 'password', 'token', 'access_token', 'refresh_token', 'id_token',
+    'client_secret', 'secretstring', 'jwt_secret'
+})
+REDACTED = '[REDACTED]'
+# Credentials in free text: the values of the redacted fields written as name=value or "name": "value", bearer and
+# basic credentials, and JWTs
+_SECRETS_IN_TEXT = re.compile(
+    r'(?P<field>["\']?\b(?:%s)\b["\']?\s*[:=]\s*["\']?)(?:(?:Bearer|Basic)\s+)?[^\s"\'&,;}]+'
+    r'|(?P<scheme>\b(?:Bearer|Basic)\s+)[\w\-.~+/]+=*'
+    r'|\beyJ[\w-]+\.[\w-]+\.[\w-]*' % '|'.join(re.escape(field) for field in sorted(REDACTED_FIELDS)),
+    re.IGNORECASE
+)
+
+# whether the payloads of the current invocation are logged although DEBUG is off, drawn when the invocation starts
+_payloads_sampled = False
+
+
+def _truncate(text: str, max_chars: int) -> str:
+    if len(text) <= max_chars:
+        return text
+    return f"{text[:max_chars]}...({len(text) - max_chars} more chars)"
+
+
+def _redact_text(text: str) -> str:
+    return _SECRETS_IN_TEXT.sub(lambda match: (match.group('field') or match.group('scheme') or '') + REDACTED, text)
+
+
+def _redact_body(body: str):
+    stripped = body.lstrip()
+    if stripped[:1] in ('{', '['):
+        try:
+            return redact(json.loads(body))
+        except ValueError:
+            pass
+    elif '=' in body:
+        fields = parse_qsl(body, keep_blank_values=True)
+        if fields:
+            return urlencode([(name, REDACTED if name.lower() in REDACTED_FIELDS else value) for name, value in fields])
+    return _truncate(_redact_text(body), PAYLOAD_FIELD_MAX_CHARS)
+
+
+def redact(value: Any) -> Any:
+    """
+    Returns a copy of a payload to be logged: the values of the fields in REDACTED_FIELDS are replaced, and strings are
+    cut off after PAYLOAD_FIELD_MAX_CHARS characters. The body of an API Gateway event is redacted like the rest of
+    the payload, unless it is base64 encoded, in which case it is left out.
+    """
+    if isinstance(value, dict):
+        redacted = {}
+        for key, field_value in value.items():
+            name = str(key).lower()
+            if name in REDACTED_FIELDS:
+                redacted[key] = REDACTED
+            elif name == 'body' and isinstance(field_value, str):
+                redacted[key] = f"[{len(field_value)} chars of base64]" if value.get('isBase64Encoded') \
+                    else _redact_body(field_value)
+            else:
+                redacted[key] = redact(field_value)
+        return redacted
+    if isinstance(value, (list, tuple, set)):
+        return [redact(item) for item in value]
+    if isinstance(value, str):
+        return _truncate(_redact_text(value), PAYLOAD_FIELD_MAX_CHARS)
+    return value
+
+
+class _Payload:
+    """
+    Serializes a payload when a log record is formatted, i.e. only if the record is actually written
+    """
+    __slots__ = ('value',)
+
+    def __init__(self, value: Any):
+        self.value = value
+
+    def __str__(self):
+        # a text (e.g. an extracted document or a raw request body) is redacted like a body, but only capped in total
+        if isinstance(self.value, str):
+            text = _redact_text(self.value)
+            if text.lstrip()[:1] in ('{', '['):
+                try:
+                    text = json.dumps(redact(json.loads(self.value)), default=str, ensure_ascii=False)
+                except ValueError:
+                    pass
+        else:
+            text = json.dumps(redact(self.value), default=str, ensure_ascii=False)
+        return _truncate(text, PAYLOAD_LOG_MAX_CHARS)
+
+
+def log_payload(message: str, payload: Any, *args):
+    """
+    Logs a large or sensitive value (an event, a request body, an extracted document) as "<message>: <payload>",
+    with %-style args for the message. The payload is redacted and size-capped, and only serialized if the record is
+    written. Payloads are logged at DEBUG, and at INFO for a sample of PAYLOAD_LOG_SAMPLE_RATE of the invocations:
+
+        log_payload("Received event", event)
+        log_payload("Text extracted from %s", text, filename)
+    """
+    logger = logging.getLogger()
+    if logger.isEnabledFor(logging.DEBUG):
+        level = logging.DEBUG
+    elif _payloads_sampled and logger.isEnabledFor(logging.INFO):
+        level = logging.INFO
+    else:
+        return
+    logger.log(level, message + ': %s', *args, _Payload(payload))
+
+
+def start_invocation():
+    """
+    Draws whether the payloads of the invocation that starts are sampled. The decorators in handler_utils call it, so
+    that a sampled invocation logs all of its payloads rather than a few of them.
+    """
+    global _payloads_sampled
+    _payloads_sampled = PAYLOAD_LOG_SAMPLE_RATE > 0 and random.random() < PAYLOAD_LOG_SAMPLE_RATE
+
+
+def _get_level(name: str):
+    level = logging.getLevelName(name.strip().upper())
+    return level if isinstance(level, int) else None
+
+
+def configure_logging(level: str = None, logger_levels: str = None):
+    """
+    Sets the level of the root logger (LOG_LEVEL by default) and of the loggers in LOGGER_LEVELS. The handler that
+    the Lambda runtime installs on the root logger, with its text or JSON format, is kept. Runs when this module is
+    imported inside Lambda; scripts that use the common layer keep their own logging setup unless they call it.
+    """
+    root_level = _get_level(level or LOG_LEVEL)
+    if root_level is None:
+        logging.warning(f"Unknown log level '{level or LOG_LEVEL}', using INFO")
+        root_level = logging.INFO
+    logging.getLogger().setLevel(root_level)
+
+    for entry in (LOGGER_LEVELS if logger_levels is None else logger_levels).split(','):
+        name, _, logger_level = entry.partition('=')
+        if name.strip() and _get_level(logger_level) is not None:
+            logging.getLogger(name.strip()).setLevel(_get_level(logger_level))
+
+
+if os.environ.get('AWS_LAMBDA_FUNCTION_NAME'):
+    configure_logging()
@@ -0,0 +1,95 @@
+import os
+import sys
+import json
+import time
+import random
+import logging
+from typing import Dict, List
+
+# CloudWatch namespace of the stage metrics, and the share of invocations that log a summary of their stage timings
+METRICS_NAMESPACE = os.environ.get('METRICS_NAMESPACE', 'PayPulse')
+METRICS_SUMMARY_SAMPLE_RATE = float(os.environ.get('METRICS_SUMMARY_SAMPLE_RATE', 0.1))
+# EMF accepts at most 100 values per metric in one document
+MAX_VALUES_PER_METRIC = 100
+# the part of every EMF document that is the same for all stages, serialized once
+_METRIC_DIRECTIVE = json.dumps([{
+    'Namespace': METRICS_NAMESPACE,
+    'Dimensions': [['FunctionName', 'Stage']],
+    'Metrics': [{'Name': 'StageDuration', 'Unit': 'Milliseconds'}]
+}], separators=(',', ':'))
+
+
+class _Span:
+    __slots__ = ('metrics', 'stage', 'start')
+
+    def __init__(self, metrics: 'InvocationMetrics', stage: str):
+        self.metrics = metrics
+        self.stage = stage
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.metrics.record(self.stage, (time.perf_counter() - self.start) * 1000)
+        return False
+
+
+class InvocationMetrics:
+    """
+    Collects the durations of the stages of one invocation (e.g. 'secrets_manager', 'gmail_get', 's3_upload'). A
+    stage may run several times per invocation, and from several threads. The decorators in handler_utils reset the
+    collected durations when an invocation starts and flush them when it ends.
+
+    Recording takes no lock: dict.setdefault and list.append are atomic in CPython, and a span costs about a
+    microsecond of a full vCPU this way.
+    """
+
+    def __init__(self):
+        self._durations: Dict[str, List[float]] = {}
+
+    def span(self, stage: str) -> _Span:
+        """
+        Times the enclosed block as one run of the given stage, whether it succeeds or raises:
+
+            with span('gmail_search'):
+                message_list = search_emails(gmail_service, sender, subject)
+        """
+        return _Span(self, stage)
+
+    def record(self, stage: str, duration_ms: float):
+        self._durations.setdefault(stage, []).append(duration_ms)
+
+    def reset(self):
+        self._durations = {}
+
+    def flush(self, function_name: str, cold_start: bool = False):
+        """
+        Writes one CloudWatch Embedded Metric Format document per stage to stdout, with the metric StageDuration
+        (one value per run of the stage) and the dimensions FunctionName and Stage. CloudWatch extracts the metrics
+        from the log line, so no PutMetricData calls are made. A sample of invocations, and every cold start, also
+        log a one-line summary of their stage timings.
+        """
+        durations, self._durations = self._durations, {}
+        if not durations:
+            return
+
+        # assembled by hand rather than with json.dumps per document, which would cost several times as much
+        prefix = f'{{"_aws":{{"Timestamp":{int(time.time() * 1000)},"CloudWatchMetrics":{_METRIC_DIRECTIVE}}},' \
+                 f'"FunctionName":{json.dumps(function_name)},"ColdStart":{"true" if cold_start else "false"},'
+        documents = []
+        for stage, values in durations.items():
+            for start in range(0, len(values), MAX_VALUES_PER_METRIC):
+                stage_durations = ','.join(f"{value:.3f}" for value in values[start:start + MAX_VALUES_PER_METRIC])
+                documents.append(f'{prefix}"Stage":{json.dumps(stage)},"StageDuration":[{stage_durations}]}}')
+        # every line written to stdout becomes its own log event, from which CloudWatch extracts the metrics
+        sys.stdout.write('\n'.join(documents) + '\n')
+
+        if cold_start or random.random() < METRICS_SUMMARY_SAMPLE_RATE:
+            summary = ', '.join(f"{stage}: {sum(values):.1f} ms ({len(values)}x)" for stage, values in durations.items())
+            logging.info(f"Stage timings of {function_name}: {summary}")
+
+
+# shared by all invocations of the container
+invocation_metrics = InvocationMetrics()
+span = invocation_metrics.span
@@ -1,3 +1,4 @@
+import os
 import logging
 import json
 from urllib.request import Request, urlopen
@@ -6,6 +7,9 @@ from typing import Dict, Any, Optional
 
 from utils.exceptions import OAuthValidationError
 
+GOOGLE_USERINFO_URL = os.environ.get('GOOGLE_USERINFO_URL', 'https://www.googleapis.com/oauth2/v3/userinfo')
+
+
 def validate_oauth_tokens(access_token: str, scope: str = "") -> None:
     """
     Validates OAuth tokens received from iOS app.
@@ -110,7 +114,7 @@ def get_google_user_info(access_token: str) -> Dict[str, str]:
     try:
         # Call Google's userinfo endpoint
         request = Request(
-            'https://www.googleapis.com/oauth2/v3/userinfo',
+            GOOGLE_USERINFO_URL,
             headers={'Authorization': f'Bearer {access_token}'}
         )
         
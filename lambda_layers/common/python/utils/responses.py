@@ -1,7 +1,29 @@
-import json
+import os
+import gzip
+import base64
+import hashlib
 import logging
+from typing import Optional
 
-from utils.utility_functions import convert_decimal_to_int
+from utils.json_utils import dumps
+
+# brotli is optional; functions that bundle it can serve 'br' to clients that accept it
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Bodies smaller than this are sent uncompressed, since the few bytes saved don't pay for the CPU time
+COMPRESSION_MIN_BYTES = int(os.environ.get('RESPONSE_COMPRESSION_MIN_BYTES', 1024))
+# Levels chosen with scripts/benchmark_compression.py for 128 MB functions, where higher levels cost a lot more time
+# for a few percent fewer bytes
+GZIP_LEVEL = int(os.environ.get('RESPONSE_GZIP_LEVEL', 5))
+BROTLI_QUALITY = int(os.environ.get('RESPONSE_BROTLI_QUALITY', 4))
+# Part of every ETag. Bump this whenever the format of a cacheable response changes, so that clients holding an ETag
+# from before the deployment download the new format instead of being told their copy is still current
+ETAG_FORMAT_VERSION = 1
+# Clients may keep responses that carry an ETag, but must revalidate them with If-None-Match before every use
+CONDITIONAL_CACHE_CONTROL = 'private, no-cache'
 
 
 class ErrorCode:
@@ -13,21 +35,21 @@ class ErrorCode:
     JWT_ERROR = "JWT_ERROR"
     INVALID_JSON = "INVALID_JSON"
     MISSING_FIELDS = "MISSING_FIELDS"
+    INVALID_QUERY_PARAMETERS = "INVALID_QUERY_PARAMETERS"
     INVOICE_PARSE_ERROR = "INVOICE_PARSE_ERROR"
     DEPENDENCY_FAILURE = "DEPENDENCY_FAILURE"
     INTERNAL_SERVER_ERROR = "INTERNAL_SERVER_ERROR"
 
 
-def success_response(message: str, data=None, status_code: int = 200):
+def success_response(message: str, data=None, status_code: int = 200, headers: Optional[dict] = None):
     return {
         'statusCode': status_code,
-        'headers': {"Content-Type": "application/json"},
-        'body': json.dumps({
+        'headers': {"Content-Type": "application/json", **(headers or {})},
+        'body': dumps({
             'message': message,
             'code': status_code,
             'data': data
-        },
-        default=convert_decimal_to_int)
+        })
     }
 
 
@@ -35,7 +57,7 @@ def error_response(code: ErrorCode, message: str, status_code: int = 500):
     return {
         'statusCode': status_code,
         'headers': {"Content-Type": "application/json"},
-        'body': json.dumps({
+        'body': dumps({
             'error': {
                 'code': code,
                 'message': message
@@ -48,3 +70,117 @@ def log_and_generate_error_response(code: ErrorCode, message: str, status_code:
     if error:
         logging.error(f"{code}: {message} | Exception: {error}")
     return error_response(code, message, status_code)
+
+
+def make_etag(*parts) -> str:
+    """
+    Builds a strong ETag from the values that identify a version of a response, e.g. the user, their InvoicesVersion
+    and the requested resource. Since it isn't computed from the body, a request can be answered with 304 Not
+    Modified without loading the data it would return.
+    """
+    key = ':'.join(str(part) for part in (ETAG_FORMAT_VERSION, *parts))
+    return f'"{hashlib.sha256(key.encode("utf-8")).hexdigest()[:32]}"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """
+    Checks an If-None-Match header against an ETag. Weak tags (W/) and tags given to compressed versions of the
+    response (see compress_response) match as well, since If-None-Match uses the weak comparison.
+    """
+    if not if_none_match:
+        return False
+    opaque_tag = etag.strip('"')
+    for candidate in if_none_match.split(','):
+        candidate = candidate.strip()
+        if candidate == '*':
+            return True
+        if candidate.startswith('W/'):
+            candidate = candidate[2:]
+        candidate = candidate.strip('"')
+        if candidate == opaque_tag or candidate.split('-', 1)[0] == opaque_tag:
+            return True
+    return False
+
+
+def not_modified_response(etag: str):
+    """
+    304 response telling the client that its cached copy of the resource is still current
+    """
+    return {
+        'statusCode': 304,
+        'headers': {'ETag': etag, 'Cache-Control': CONDITIONAL_CACHE_CONTROL}
+    }
+
+
+def get_accepted_encodings(accept_encoding: Optional[str]) -> set:
+    """
+    Parses an Accept-Encoding header into the set of accepted content codings. Codings with q=0 are not accepted,
+    and '*' accepts every coding not listed otherwise.
+    """
+    accepted, rejected = set(), set()
+    for part in (accept_encoding or '').lower().split(','):
+        coding, _, parameters = part.partition(';')
+        coding = coding.strip()
+        if not coding:
+            continue
+        quality = 1.0
+        for parameter in parameters.split(';'):
+            name, _, value = parameter.strip().partition('=')
+            if name == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        (accepted if quality > 0 else rejected).add(coding)
+
+    if '*' in accepted:
+        accepted |= {'br', 'gzip'} - rejected
+    return accepted
+
+
+def select_encoding(accept_encoding: Optional[str]) -> Optional[str]:
+    """
+    Returns the content coding to compress a response with, or None if the client accepts neither br nor gzip
+    """
+    accepted = get_accepted_encodings(accept_encoding)
+    if brotli is not None and 'br' in accepted:
+        return 'br'
+    if 'gzip' in accepted:
+        return 'gzip'
+    return None
+
+
+def compress_response(response: dict, accept_encoding: Optional[str]) -> dict:
+    """
+    Compresses the body of a response with the best content coding the client accepts. API Gateway HTTP APIs don't
+    compress responses themselves, so the compressed body is returned base64 encoded (isBase64Encoded), and API
+    Gateway decodes it before sending it to the client. Bodies under COMPRESSION_MIN_BYTES are left as they are.
+    """
+    body = response.get('body')
+    if not isinstance(body, str) or response.get('isBase64Encoded'):
+        return response
+
+    raw_body = body.encode('utf-8')
+    if len(raw_body) < COMPRESSION_MIN_BYTES:
+        return response
+
+    # the response depends on Accept-Encoding from here on, so caches must key on it
+    headers = {**response.get('headers', {}), 'Vary': 'Accept-Encoding'}
+    encoding = select_encoding(accept_encoding)
+    if encoding == 'br':
+        compressed_body = brotli.compress(raw_body, quality=BROTLI_QUALITY)
+    elif encoding == 'gzip':
+        compressed_body = gzip.compress(raw_body, compresslevel=GZIP_LEVEL, mtime=0)
+    else:
+        return {**response, 'headers': headers}
+
+    headers['Content-Encoding'] = encoding
+    # a strong ETag identifies the exact bytes, so every content coding gets its own tag
+    if 'ETag' in headers:
+        headers['ETag'] = f'{headers["ETag"][:-1]}-{encoding}"'
+    return {
+        **response,
+        'headers': headers,
+        'body': base64.b64encode(compressed_body).decode('ascii'),
+        'isBase64Encoded': True
+    }
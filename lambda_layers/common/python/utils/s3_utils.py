@@ -1,10 +1,21 @@
+import time
 import logging
+from typing import List
 from email.message import Message
+from concurrent.futures import ThreadPoolExecutor
 
 from botocore.exceptions import ClientError
+from utils.metrics_utils import span
+from utils.logging_utils import log_payload
 from utils.exceptions import S3Error
 from utils.utility_functions import get_body_from_email, decode_string
 
+# DeleteObjects accepts at most 1000 keys, which is also the largest page list_objects_v2 returns
+S3_DELETE_BATCH_SIZE = 1000
+MAX_CONCURRENT_DELETE_BATCHES = 4
+S3_DELETE_MAX_ATTEMPTS = 3
+S3_DELETE_RETRY_BASE_DELAY_SECONDS = 0.2
+
 
 def create_user_folder_in_s3(s3, user_id: str, s3_bucket_name: str):
     key = f"rental-invoices/{user_id}/"
@@ -13,20 +24,56 @@ def create_user_folder_in_s3(s3, user_id: str, s3_bucket_name: str):
             Bucket=s3_bucket_name,
             Key=key
         )
-        logging.info(f"Folder for '{user_id}' created successfully in S3.")
+        logging.info("Folder for '%s' created successfully in S3.", user_id)
     except Exception as e:
         raise S3Error(f"Error creating S3 folder for user '{user_id}'") from e
 
 
+def delete_objects_batch(s3, s3_bucket_name: str, keys: List[str], max_attempts: int = S3_DELETE_MAX_ATTEMPTS) -> int:
+    """
+    This function deletes up to 1000 objects with a single DeleteObjects request. DeleteObjects succeeds even if some
+    of the keys could not be deleted, and lists those in its response instead; they are retried with a backoff.
+    """
+    remaining_keys = keys
+    for attempt in range(1, max_attempts + 1):
+        response = s3.delete_objects(
+            Bucket=s3_bucket_name,
+            Delete={'Objects': [{'Key': key} for key in remaining_keys], 'Quiet': True}
+        )
+        errors = response.get('Errors', [])
+        if not errors:
+            return len(keys)
+
+        remaining_keys = [error['Key'] for error in errors]
+        logging.warning("%d of %d objects could not be deleted (attempt %d/%d), e.g. '%s': %s", len(errors), len(keys),
+                        attempt, max_attempts, errors[0]['Key'], errors[0].get('Code'))
+        if attempt < max_attempts:
+            time.sleep(S3_DELETE_RETRY_BASE_DELAY_SECONDS * 2 ** (attempt - 1))
+
+    raise S3Error(f"{len(remaining_keys)} objects could not be deleted, e.g. '{remaining_keys[0]}'")
+
+
 def delete_user_folder_in_s3(s3, user_id: str, s3_bucket_name: str):
+    """
+    This function deletes every object under a user's folder. The folder is listed page by page, and each page of up
+    to 1000 keys is deleted with one DeleteObjects request while the next page is being listed. Listing continues
+    after the last key returned, so deleting the keys of earlier pages doesn't affect it.
+    """
+    prefix = f"rental-invoices/{user_id}/"
     try:
-        prefix = f"rental-invoices/{user_id}/"
-        response = s3.list_objects_v2(Bucket=s3_bucket_name, Prefix=prefix)
-        objects_deleted_count = 0
-        for obj in response.get('Contents', []):
-            s3.delete_object(Bucket=s3_bucket_name, Key=obj['Key'])
-            objects_deleted_count += 1
-        logging.info(f"{objects_deleted_count} objects deleted from S3!")
+        paginator = s3.get_paginator('list_objects_v2')
+        pages = paginator.paginate(
+            Bucket=s3_bucket_name,
+            Prefix=prefix,
+            PaginationConfig={'PageSize': S3_DELETE_BATCH_SIZE}
+        )
+        with ThreadPoolExecutor(max_workers=MAX_CONCURRENT_DELETE_BATCHES) as executor:
+            batches = [
+                executor.submit(delete_objects_batch, s3, s3_bucket_name, [obj['Key'] for obj in page['Contents']])
+                for page in pages if page.get('Contents')
+            ]
+            objects_deleted_count = sum(batch.result() for batch in batches)
+        logging.info("%d objects deleted from S3 in %d batches!", objects_deleted_count, len(batches))
     except Exception as e:
         raise S3Error(f"Error deleting user folder for {user_id}") from e
 
@@ -36,6 +83,21 @@ def get_s3_path_to_rental_invoices(user_id: str, filename: str) -> str:
     return f"rental-invoices/{user_id}/{filename}"
 
 
+def generate_presigned_download_url(s3_client, bucket_name: str, s3_key: str, expires_in: int) -> str:
+    """
+    This function returns a URL that allows downloading an object directly from S3 for expires_in seconds, so that
+    the file doesn't have to pass through a lambda function. Signing happens locally, without a request to S3.
+    """
+    try:
+        return s3_client.generate_presigned_url(
+            'get_object',
+            Params={'Bucket': bucket_name, 'Key': s3_key},
+            ExpiresIn=expires_in
+        )
+    except ClientError as e:
+        raise S3Error(f"Could not generate a download URL for {s3_key}") from e
+
+
 def download_file_from_s3(s3_client, bucket_name: str, s3_key: str) -> str:
     """
     This function downloads a file from an S3 bucket to the local Lambda environment storage
@@ -43,7 +105,8 @@ def download_file_from_s3(s3_client, bucket_name: str, s3_key: str) -> str:
     # download the file to /tmp
     filename = f"/tmp/{s3_key.split('/')[-1]}"
     try:
-        s3_client.download_file(bucket_name, s3_key, filename)
+        with span('s3_download'):
+            s3_client.download_file(bucket_name, s3_key, filename)
         return filename
     except ClientError as e:
         raise S3Error(f"{filename} could not be downloaded.") from e
@@ -57,20 +120,21 @@ def download_and_upload_attachment(s3_client, s3_bucket_name: str, msg: Message,
         if part.get_content_type() == 'text/plain':
             body_string = part.get_payload()
             body = get_body_from_email(body_string)
-            logging.info(body)
+            log_payload("Body of the email", body)
 
         if part.get_content_type() == "application/pdf":
             filename = part.get_filename()
             filename = decode_string(filename)
             if filename:
-                logging.info(f"Downloading {filename}...")
+                logging.info("Downloading %s...", filename)
                 file_content = part.get_payload(decode=True)
                 s3_key = get_s3_path_to_rental_invoices(user_id, filename)
-                s3_client.put_object(
-                    Bucket=s3_bucket_name,
-                    Key=s3_key,
-                    Body=file_content
-                )
+                with span('s3_upload'):
+                    s3_client.put_object(
+                        Bucket=s3_bucket_name,
+                        Key=s3_key,
+                        Body=file_content
+                    )
                 invoices_found += 1
-                logging.info(f"rental-invoices/{user_id}/{filename} uploaded to S3!")
+                logging.info("rental-invoices/%s/%s uploaded to S3!", user_id, filename)
     return invoices_found
\ No newline at end of file
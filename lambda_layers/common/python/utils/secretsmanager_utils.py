@@ -1,24 +1,61 @@
+import os
 import json
-import boto3
 import logging
 from typing import Dict, Optional
 from botocore.exceptions import ClientError
 
+from utils.cache_utils import TTLCache, MISSING
+from utils.handler_utils import get_client
 from utils.exceptions import SecretsManagerError
 
+# Parsed secrets, keyed by secret name. Writes made through this module update the cache directly (write-through);
+# the TTL bounds how long a change made by another container (e.g. a token refresh) stays invisible to this one
+secret_cache = TTLCache(
+    max_entries=int(os.environ.get('SECRET_CACHE_MAX_ENTRIES', 128)),
+    ttl_seconds=float(os.environ.get('SECRET_CACHE_TTL_SECONDS', 300))
+)
+
+
+def get_secretsmanager_client(region: str):
+    """
+    Returns the Secrets Manager client for a region, shared with the rest of the container through get_client
+    """
+    return get_client('secretsmanager', region_name=region)
+
+
+def get_user_secret_name(user_id: str) -> str:
+    return f"gmail/user/{user_id}"
+
+
+def get_secret(secret_name: str, region: str, use_cache: bool = True) -> Dict:
+    """
+    Returns the parsed value of a secret, from the cache if possible (and allowed). Raises ClientError if the secret
+    cannot be retrieved. A copy is returned, so that callers can modify it without changing the cached value.
+    """
+    secret = secret_cache.get(secret_name) if use_cache else MISSING
+    if secret is MISSING:
+        client = get_secretsmanager_client(region)
+        get_secret_value_response = client.get_secret_value(
+            SecretId=secret_name
+        )
+        secret = json.loads(get_secret_value_response['SecretString'])
+        secret_cache.set(secret_name, secret)
+    return dict(secret)
+
 
 def store_email_credentials(secrets_manager, user_id: str, email: str, gmail_app_password: str):
-    secret_name = f"gmail/user/{user_id}"
+    secret_name = get_user_secret_name(user_id)
     try:
-        secret_value = json.dumps({
+        secret = {
             "GMAIL_USER": email,
             "GMAIL_PASSWORD": gmail_app_password,
             "GMAIL_IMAP_URL": "imap.gmail.com"
-        })
+        }
         secrets_manager.create_secret(
             Name=secret_name,
-            SecretString=secret_value
+            SecretString=json.dumps(secret)
         )
+        secret_cache.set(secret_name, secret)
         logging.info(f"User secret for {user_id} stored successfully.")
     except Exception as e:
         logging.error(f"Error creating secret '{secret_name}': {e}")
@@ -26,27 +63,15 @@ def store_email_credentials(secrets_manager, user_id: str, email: str, gmail_app
 
 
 def get_email_credentials(user_id: str, region: str) -> Dict:
-    secret_name = f"gmail/user/{user_id}"
-
-    # Create a Secrets Manager client
-    session = boto3.session.Session()
-    client = session.client(
-        service_name='secretsmanager',
-        region_name=region
-    )
     try:
-        get_secret_value_response = client.get_secret_value(
-            SecretId=secret_name
-        )
+        return get_secret(get_user_secret_name(user_id), region)
     except ClientError as e:
         raise SecretsManagerError("Error retrieving secret") from e
 
-    secret = get_secret_value_response['SecretString']
-    return json.loads(secret)
-
 
 def delete_email_credentials(secrets_manager, user_id: str):
-    secret_id = f"gmail/user/{user_id}"
+    secret_id = get_user_secret_name(user_id)
+    secret_cache.delete(secret_id)
     try:
         secrets_manager.delete_secret(
             SecretId=secret_id,
@@ -61,7 +86,7 @@ def delete_email_credentials(secrets_manager, user_id: str):
         raise SecretsManagerError(f"Error deleting secret for {user_id}") from e
 
 
-def store_oauth_tokens(user_id: str, access_token: str, refresh_token: Optional[str], expires_in: int, scope: str, region: str, google_user_info: Dict[str, str] = None):
+def store_oauth_tokens(user_id: str, access_token: str, refresh_token: Optional[str], expires_in: int, scope: str, region: str, google_user_info: Dict[str, str] = None) -> Dict:
     """
     Stores OAuth tokens for a user in Secrets Manager.
     
@@ -74,22 +99,20 @@ def store_oauth_tokens(user_id: str, access_token: str, refresh_token: Optional[
         region: AWS region
         google_user_info: Google user information (optional)
         
+    Returns:
+        Dictionary containing the stored OAuth token data
+        
     Raises:
         SecretsManagerError: If storage fails
     """
     from utils.oauth_utils import prepare_oauth_secret_data
     
-    secret_name = f"gmail/user/{user_id}"
+    secret_name = get_user_secret_name(user_id)
     
     # Prepare OAuth data with Google user info
     oauth_data = prepare_oauth_secret_data(access_token, refresh_token, expires_in, scope, google_user_info)
     
-    # Create a Secrets Manager client
-    session = boto3.session.Session()
-    client = session.client(
-        service_name='secretsmanager',
-        region_name=region
-    )
+    client = get_secretsmanager_client(region)
     
     try:
         # Try to update existing secret first
@@ -113,14 +136,18 @@ def store_oauth_tokens(user_id: str, access_token: str, refresh_token: Optional[
     except ClientError as e:
         raise SecretsManagerError(f"Error storing OAuth tokens for user {user_id}") from e
 
+    secret_cache.set(secret_name, oauth_data)
+    return oauth_data
+
 
-def get_oauth_tokens(user_id: str, region: str) -> Dict:
+def get_oauth_tokens(user_id: str, region: str, use_cache: bool = True) -> Dict:
     """
     Retrieves OAuth tokens for a user from Secrets Manager.
     
     Args:
         user_id: The user ID
         region: AWS region
+        use_cache: Set to False to read the latest value from Secrets Manager (e.g. after another invocation refreshed it)
         
     Returns:
         Dictionary containing OAuth token data
@@ -128,25 +155,11 @@ def get_oauth_tokens(user_id: str, region: str) -> Dict:
     Raises:
         SecretsManagerError: If retrieval fails
     """
-    secret_name = f"gmail/user/{user_id}"
-    
-    # Create a Secrets Manager client
-    session = boto3.session.Session()
-    client = session.client(
-        service_name='secretsmanager',
-        region_name=region
-    )
-    
     try:
-        get_secret_value_response = client.get_secret_value(
-            SecretId=secret_name
-        )
+        oauth_data = get_secret(get_user_secret_name(user_id), region, use_cache=use_cache)
     except ClientError as e:
         raise SecretsManagerError(f"Error retrieving OAuth tokens for user {user_id}") from e
     
-    secret = get_secret_value_response['SecretString']
-    oauth_data = json.loads(secret)
-    
     # Check if token is expired and needs refresh
     from datetime import datetime
     if 'expires_at' in oauth_data:
@@ -158,7 +171,7 @@ def get_oauth_tokens(user_id: str, region: str) -> Dict:
     return oauth_data
 
 
-def update_oauth_tokens(user_id: str, access_token: str, refresh_token: str, expires_in: int, region: str):
+def update_oauth_tokens(user_id: str, access_token: str, refresh_token: str, expires_in: int, region: str) -> Dict:
     """
     Updates existing OAuth tokens for a user in Secrets Manager (used for token refresh).
     
@@ -169,14 +182,17 @@ def update_oauth_tokens(user_id: str, access_token: str, refresh_token: str, exp
         expires_in: Token expiration in seconds
         region: AWS region
         
+    Returns:
+        Dictionary containing the updated OAuth token data
+        
     Raises:
         SecretsManagerError: If update fails
     """
     from utils.oauth_utils import prepare_oauth_secret_data
     
-    secret_name = f"gmail/user/{user_id}"
+    secret_name = get_user_secret_name(user_id)
     
-    # Get existing OAuth data to preserve scope and Google user info
+    # Get existing OAuth data to preserve scope and Google user info (usually served from the cache)
     try:
         existing_data = get_oauth_tokens(user_id, region)
         scope = existing_data.get('scope', 'https://www.googleapis.com/auth/gmail.readonly')
@@ -195,12 +211,7 @@ def update_oauth_tokens(user_id: str, access_token: str, refresh_token: str, exp
     # Prepare updated OAuth data
     oauth_data = prepare_oauth_secret_data(access_token, refresh_token, expires_in, scope, google_user_info)
     
-    # Create a Secrets Manager client
-    session = boto3.session.Session()
-    client = session.client(
-        service_name='secretsmanager',
-        region_name=region
-    )
+    client = get_secretsmanager_client(region)
     
     try:
         client.update_secret(
@@ -211,3 +222,6 @@ def update_oauth_tokens(user_id: str, access_token: str, refresh_token: str, exp
         
     except ClientError as e:
         raise SecretsManagerError(f"Error updating OAuth tokens for user {user_id}") from e
+
+    secret_cache.set(secret_name, oauth_data)
+    return oauth_data
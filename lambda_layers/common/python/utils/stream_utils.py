@@ -0,0 +1,17 @@
+from typing import Dict, List
+
+
+def get_records_to_retry(records: List[Dict], failed_sequence_numbers: List[str]) -> List[str]:
+    """
+    Returns the sequence numbers of all records of a DynamoDB stream batch from the earliest failed one on, for the
+    batchItemFailures of a function whose event source mapping reports them. Lambda retries the batch from its
+    earliest reported record, so every later record is processed again, including those that succeeded. They are
+    reported too rather than counted as done, so the consumer has to process them idempotently or accept duplicates.
+    """
+    if not failed_sequence_numbers:
+        return []
+    # sequence numbers are decimal strings of varying length
+    earliest_failed = min(int(sequence_number) for sequence_number in failed_sequence_numbers)
+    return [record['dynamodb']['SequenceNumber'] for record in records
+            if int(record['dynamodb']['SequenceNumber']) >= earliest_failed]
+
@@ -1,9 +1,12 @@
+import json
+import base64
 import quopri
-from decimal import Decimal
-from typing import List, Dict
-from collections import defaultdict
+import binascii
+from typing import List, Dict, Optional, Tuple
 from email.header import decode_header
 
+from utils.exceptions import InvalidQueryParameterError
+
 
 def decode_string(s):
     decoded_bytes, charset = decode_header(s)[0]
@@ -18,24 +21,79 @@ def get_body_from_email(s):
     return decoding_string
 
 
-def postprocess_invoices(invoices: List[Dict]) -> Dict:
+def get_due_date_sort_key(invoice: Dict) -> str:
+    """
+    This helper function returns the due date of an invoice as a 'YYYYMMDD' string, which sorts chronologically. The
+    due date is stored as 'DD-MM-YYYY', so it can't be compared as it is. Invoices without a parseable due date fall
+    back to the indexed due_date_year and due_date_month fields.
+    """
+    due_date = invoice.get('Due Date')
+    if due_date and len(due_date) == 10 and due_date[2] == '-' and due_date[5] == '-':
+        return due_date[6:] + due_date[3:5] + due_date[:2]
+    return f"{int(invoice['due_date_year']):04d}{int(invoice['due_date_month']):02d}00"
+
+
+def postprocess_invoices(invoices: List[Dict], descending: bool = True, limit_per_group: Optional[int] = None) -> Dict:
     """
-    This helper function groups invoices by year, and sorts them in descending order
+    This helper function groups invoices by year in a single pass, and sorts each year by due date. The years are
+    ordered the same way as the invoices within them. If limit_per_group is given, only the first invoices of every
+    year (in the requested order) are kept.
     """
-    invoices_grouped_by_year = defaultdict(lambda: [])
+    invoices_grouped_by_year = {}
     for invoice in invoices:
-        invoice_year = invoice['due_date_year']
-        # sort the invoices per year in descending order
-        invoices_grouped_by_year[invoice_year].insert(0, invoice)
+        year = invoice['due_date_year']
+        year_invoices = invoices_grouped_by_year.get(year)
+        if year_invoices is None:
+            year_invoices = invoices_grouped_by_year[year] = []
+        year_invoices.append(invoice)
+
+    for year_invoices in invoices_grouped_by_year.values():
+        year_invoices.sort(key=get_due_date_sort_key, reverse=descending)
+        if limit_per_group is not None:
+            del year_invoices[limit_per_group:]
+
+    return {
+        year: invoices_grouped_by_year[year]
+        for year in sorted(invoices_grouped_by_year, key=int, reverse=descending)
+    }
+
 
-    return invoices_grouped_by_year
+def encode_pagination_token(last_evaluated_key: Optional[Dict]) -> Optional[str]:
+    """
+    This helper function turns a DynamoDB LastEvaluatedKey into an opaque, URL-safe continuation token
+    """
+    if not last_evaluated_key:
+        return None
+    serialized_key = json.dumps(last_evaluated_key, separators=(',', ':'), sort_keys=True)
+    return base64.urlsafe_b64encode(serialized_key.encode('utf-8')).decode('utf-8').rstrip('=')
+
+
+def decode_pagination_token(token: str, user_id: str) -> Dict:
+    """
+    This helper function turns a continuation token back into an ExclusiveStartKey. The token must belong to the
+    user making the request, so that one user cannot page through the invoices of another
+    """
+    try:
+        padded_token = token + '=' * (-len(token) % 4)
+        exclusive_start_key = json.loads(base64.urlsafe_b64decode(padded_token.encode('utf-8')))
+    except (binascii.Error, ValueError, UnicodeDecodeError) as e:
+        raise InvalidQueryParameterError("Invalid continuation token") from e
 
+    if not isinstance(exclusive_start_key, dict) or exclusive_start_key.get('UserID') != user_id:
+        raise InvalidQueryParameterError("Invalid continuation token")
+    return exclusive_start_key
 
-def convert_decimal_to_int(obj):
+
+def parse_year_month(value: str) -> Tuple[int, int]:
     """
-    This helper function converts Decimal objects to int or float. This is needed because boto3 converts numeric values
-    to Decimal by default, and the Decimal datatype is unsupported by json.dumps
+    This helper function parses a date range bound in the format YYYY-MM into a (year, month) tuple
     """
-    if isinstance(obj, Decimal):
-        return float(obj) if obj % 1 else int(obj)
-    raise TypeError(f"Object of type '{type(obj).__name__}' for 'obj' is not JSON serializable.")
\ No newline at end of file
+    try:
+        year, month = value.split('-')
+        year, month = int(year), int(month)
+    except ValueError as e:
+        raise InvalidQueryParameterError(f"Invalid date '{value}', expected format YYYY-MM") from e
+
+    if not 1 <= month <= 12:
+        raise InvalidQueryParameterError(f"Invalid month in date '{value}'")
+    return year, month
@@ -0,0 +1,46 @@
+import os
+import logging
+
+from utils.handler_utils import event_handler
+from utils.jwt_utils import get_user_id_from_token
+from utils.exceptions import InvalidCredentialsError, InvalidTokenError, TokenExpiredError
+
+JWT_SECRET = os.environ['JWT_SECRET']
+
+
+@event_handler
+def lambda_handler(event, context):
+    """
+    Lambda authorizer of PayPulseAPI (simple response format). Verifies the JWT token in the authorization header and
+    passes the user ID on to the protected functions, which read it from
+    event['requestContext']['authorizer']['lambda']['user_id'].
+
+    API Gateway caches the result per authorization header, so a token is verified here once per cache TTL rather
+    than once per request.
+
+    Expired and invalid tokens are let through without a user ID. An HTTP API can only answer a denied request with a
+    plain 403, while the app relies on the 401 with TOKEN_EXPIRED or INVALID_TOKEN to know when to log in again. Without
+    a user ID in the context, jwt_utils.get_user_id verifies the token in the function itself and raises the error that
+    api_handler maps to that response, so these requests never reach any user data.
+    """
+    try:
+        user_id = get_user_id_from_token((event.get('headers') or {}).get('authorization'), JWT_SECRET)
+        return {
+            'isAuthorized': True,
+            'context': {
+                'user_id': user_id
+            }
+        }
+
+    except (InvalidTokenError, TokenExpiredError) as e:
+        logging.info("Token rejected, the function will answer with 401: %s", e)
+        return {
+            'isAuthorized': True,
+            'context': {}
+        }
+
+    except InvalidCredentialsError as e:
+        logging.info("Request not authorized: %s", e)
+        return {
+            'isAuthorized': False
+        }
@@ -0,0 +1,104 @@
+import os
+import time
+import logging
+import threading
+from collections import Counter
+from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
+
+from utils.handler_utils import event_handler, get_table
+from utils.secretsmanager_utils import get_oauth_tokens
+from utils.dynamodb_utils import get_users_with_expiring_gmail_tokens
+from utils.gmail_api_utils import build_oauth_credentials, refresh_oauth_tokens_single_flight
+from utils.exceptions import OAuthValidationError, SecretsManagerError
+
+REGION = os.environ['REGION']
+GOOGLE_OAUTH_CLIENT_ID = os.environ.get('GOOGLE_OAUTH_CLIENT_ID', '')
+# must be longer than the schedule interval plus the 5 minute margin of the inline refresh in create_gmail_service,
+# otherwise a token can reach that margin between two runs
+REFRESH_WINDOW_MINUTES = int(os.environ.get('REFRESH_WINDOW_MINUTES', 30))
+MAX_CONCURRENT_REFRESHES = int(os.environ.get('MAX_CONCURRENT_REFRESHES', 5))
+MAX_REFRESHES_PER_SECOND = float(os.environ.get('MAX_REFRESHES_PER_SECOND', 5))
+# refreshes are not started when less than this is left of the invocation, the next run picks them up instead
+MIN_REMAINING_TIME_MS = 10000
+
+USERS_TABLE = os.environ['USERS_TABLE']
+
+
+class RateLimiter:
+    """
+    Spaces out calls to at most `rate` per second across all threads
+    """
+
+    def __init__(self, rate: float):
+        self.interval = 1 / rate
+        self.next_slot = time.monotonic()
+        self.lock = threading.Lock()
+
+    def wait(self):
+        with self.lock:
+            now = time.monotonic()
+            slot = max(self.next_slot, now)
+            self.next_slot = slot + self.interval
+        time.sleep(max(0.0, slot - now))
+
+
+def refresh_user_tokens(user_id: str, rate_limiter: RateLimiter, context) -> str:
+    """
+    Refreshes the Gmail tokens of one user, and returns the outcome
+    """
+    if context.get_remaining_time_in_millis() < MIN_REMAINING_TIME_MS:
+        return 'deferred'
+
+    try:
+        oauth_data = get_oauth_tokens(user_id, region=REGION)
+        if not oauth_data.get('refresh_token'):
+            logging.warning(f"User {user_id} has no refresh token, skipping")
+            return 'skipped'
+
+        rate_limiter.wait()
+        credentials = build_oauth_credentials(None, oauth_data['refresh_token'], GOOGLE_OAUTH_CLIENT_ID)
+        # a request that is refreshing the same tokens right now takes care of them, and tokens refreshed since the
+        # scan are left alone
+        if refresh_oauth_tokens_single_flight(user_id, credentials, REGION, get_table(USERS_TABLE), wait_seconds=0,
+                                              min_valid_seconds=REFRESH_WINDOW_MINUTES * 60) is None:
+            return 'in_progress'
+        return 'refreshed'
+
+    except OAuthValidationError as e:
+        # e.g. the user revoked access; their next request reports this to them
+        logging.warning(f"Could not refresh Gmail tokens of user {user_id}: {e}")
+        return 'failed'
+
+    except SecretsManagerError as e:
+        logging.error(f"Could not read or write Gmail tokens of user {user_id}: {e}")
+        return 'failed'
+
+    except Exception as e:
+        # e.g. a network error at Google's token endpoint; this must not stop the refreshes of other users
+        logging.error(f"Unexpected error refreshing Gmail tokens of user {user_id}: {e}")
+        return 'failed'
+
+
+@event_handler
+def lambda_handler(event, context):
+    """
+    Triggered on a schedule. This refreshes all Gmail access tokens that expire within the refresh window, so that
+    fetch_invoices and fetch_latest_invoice find a valid token and don't have to refresh it inside the user's request.
+    """
+    expiring_before = (datetime.utcnow() + timedelta(minutes=REFRESH_WINDOW_MINUTES)).isoformat()
+    user_ids = get_users_with_expiring_gmail_tokens(get_table(USERS_TABLE), expiring_before)
+    logging.info(f"Found {len(user_ids)} users with Gmail tokens expiring before {expiring_before}")
+
+    rate_limiter = RateLimiter(MAX_REFRESHES_PER_SECOND)
+    with ThreadPoolExecutor(max_workers=MAX_CONCURRENT_REFRESHES) as executor:
+        outcomes = Counter(executor.map(lambda user_id: refresh_user_tokens(user_id, rate_limiter, context), user_ids))
+
+    logging.info(f"Gmail token refresh outcomes: {dict(outcomes)}")
+    return {
+        'statusCode': 200,
+        'body': {
+            'expiring': len(user_ids),
+            **{outcome: outcomes.get(outcome, 0) for outcome in ('refreshed', 'in_progress', 'skipped', 'failed', 'deferred')}
+        }
+    }
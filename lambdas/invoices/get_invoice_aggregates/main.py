@@ -0,0 +1,36 @@
+import os
+import logging
+
+from utils.jwt_utils import get_user_id
+from utils.dynamodb_utils import get_invoice_aggregates
+from utils.responses import success_response, ErrorCode
+from utils.handler_utils import api_handler, get_table
+from utils.exceptions import DatabaseError, NoInvoiceFoundError
+
+
+AGGREGATES_TABLE = os.environ['AGGREGATES_TABLE']
+JWT_SECRET = os.environ['JWT_SECRET']
+
+
+@api_handler(error_mappings=[
+    (DatabaseError, ErrorCode.DEPENDENCY_FAILURE, "Database error during invoice aggregates retrieval", 502),
+])
+def lambda_handler(event, context):
+    user_id = get_user_id(event, JWT_SECRET)
+
+    try:
+        aggregates = get_invoice_aggregates(get_table(AGGREGATES_TABLE), user_id=user_id)
+    except NoInvoiceFoundError as e:
+        return success_response(
+            message=f"Missing data: {str(e)}",
+            status_code=204
+        )
+
+    logging.info(f"Retrieved invoice aggregates for {len(aggregates.get('Yearly', {}))} years for user '{user_id}'")
+    return success_response(
+        message="Invoice aggregates retrieved successfully!",
+        data={
+            "yearly": aggregates.get('Yearly', {}),
+            "monthly": aggregates.get('Monthly', {})
+        }
+    )
@@ -0,0 +1,79 @@
+import os
+import time
+import logging
+
+from utils.jwt_utils import get_user_id
+from utils.cache_utils import TTLCache, MISSING
+from utils.dynamodb_utils import get_invoice_filename
+from utils.s3_utils import get_s3_path_to_rental_invoices, generate_presigned_download_url
+from utils.responses import success_response, ErrorCode
+from utils.handler_utils import api_handler, get_client, get_table
+from utils.exceptions import DatabaseError, S3Error, NoInvoiceFoundError
+
+
+INVOICES_TABLE = os.environ['INVOICES_TABLE']
+BUCKET_NAME = os.environ['BUCKET_NAME']
+JWT_SECRET = os.environ['JWT_SECRET']
+PRESIGNED_URL_EXPIRY_SECONDS = int(os.environ.get('PRESIGNED_URL_EXPIRY_SECONDS', 900))
+# cached URLs are handed out until this long before they expire, so that a client always has time to use one
+PRESIGNED_URL_MIN_REMAINING_SECONDS = int(os.environ.get('PRESIGNED_URL_MIN_REMAINING_SECONDS', 120))
+
+# (user ID, invoice ID) -> (URL, expiry as epoch seconds). Lives as long as this container does, so repeated requests
+# for the same PDF need neither the RentalInvoices table nor signing
+presigned_url_cache = TTLCache(
+    max_entries=512,
+    ttl_seconds=PRESIGNED_URL_EXPIRY_SECONDS - PRESIGNED_URL_MIN_REMAINING_SECONDS
+)
+
+
+def get_presigned_url(user_id: str, invoice_id: str):
+    """
+    Returns a presigned URL for the PDF of an invoice, and when it expires. The S3 key is built from the file name
+    stored with the invoice (parse_invoice stores it without the .pdf extension), under the folder of the user.
+    """
+    cached = presigned_url_cache.get((user_id, invoice_id))
+    if cached is not MISSING:
+        return cached
+
+    filename = get_invoice_filename(get_table(INVOICES_TABLE), user_id=user_id, invoice_id=invoice_id)
+    s3_key = get_s3_path_to_rental_invoices(user_id, f"{filename}.pdf")
+    expires_at = int(time.time()) + PRESIGNED_URL_EXPIRY_SECONDS
+    url = generate_presigned_download_url(get_client('s3'), BUCKET_NAME, s3_key, PRESIGNED_URL_EXPIRY_SECONDS)
+    presigned_url_cache.set((user_id, invoice_id), (url, expires_at))
+    return url, expires_at
+
+
+@api_handler(error_mappings=[
+    (KeyError, ErrorCode.MISSING_FIELDS, "Missing fields in URL", 400),
+    (DatabaseError, ErrorCode.DEPENDENCY_FAILURE, "Database error during invoice retrieval", 502),
+    (S3Error, ErrorCode.DEPENDENCY_FAILURE, "Error generating the invoice download URL", 502),
+])
+def lambda_handler(event, context):
+    """
+    Returns a short-lived presigned URL, from which the client downloads the original PDF of an invoice directly from
+    S3. The invoice is looked up under the user ID of the JWT token, so users can only get URLs for their own files.
+    """
+    user_id = get_user_id(event, JWT_SECRET)
+
+    invoice_id = event['pathParameters']['invoice_id']
+    logging.info(f"Received PDF URL request for invoice ID: {invoice_id}")
+
+    try:
+        url, expires_at = get_presigned_url(user_id, invoice_id)
+    except NoInvoiceFoundError as e:
+        return success_response(
+            message=f"Missing data: {str(e)}",
+            status_code=204
+        )
+
+    logging.info(f"Presigned URL cache stats: {presigned_url_cache.stats()}")
+    remaining_seconds = max(expires_at - int(time.time()) - PRESIGNED_URL_MIN_REMAINING_SECONDS, 0)
+    return success_response(
+        message="Invoice download URL generated successfully!",
+        data={
+            "url": url,
+            "expiresAt": expires_at
+        },
+        # the client may reuse the URL for as long as this container would hand out the same one
+        headers={'Cache-Control': f"private, max-age={remaining_seconds}"}
+    )
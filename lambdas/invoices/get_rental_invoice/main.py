@@ -1,78 +1,64 @@
 import os
-import json
-import boto3
 import logging
 
-from utils.jwt_utils import get_user_id_from_token
-from utils.dynamodb_utils import get_invoice_details
-from utils.responses import success_response, log_and_generate_error_response, ErrorCode
-from utils.exceptions import JWTDecodingError, InvalidCredentialsError, InvalidTokenError, TokenExpiredError, \
-    DatabaseError, NoInvoiceFoundError
+from utils.jwt_utils import get_user_id
+from utils.cache_utils import create_invoice_cache
+from utils.json_utils import convert_dynamodb_item
+from utils.dynamodb_utils import get_invoice_details, get_invoices_version
+from utils.responses import success_response, make_etag, etag_matches, not_modified_response, \
+    CONDITIONAL_CACHE_CONTROL, ErrorCode
+from utils.handler_utils import api_handler, get_table, get_request_header
+from utils.logging_utils import log_payload
+from utils.exceptions import DatabaseError, NoInvoiceFoundError
 
 
-dynamodb = boto3.resource('dynamodb')
-
 INVOICES_TABLE = os.environ['INVOICES_TABLE']
+USERS_TABLE = os.environ['USERS_TABLE']
 JWT_SECRET = os.environ['JWT_SECRET']
 
-invoices_table = dynamodb.Table(INVOICES_TABLE)
+# lives as long as this container does, so warm invocations can skip the RentalInvoices table
+invoice_cache = create_invoice_cache()
 
 
+@api_handler(error_mappings=[
+    (KeyError, ErrorCode.MISSING_FIELDS, "Missing fields in URL", 400),
+    (DatabaseError, ErrorCode.DEPENDENCY_FAILURE, "Database error during invoice retrieval", 502),
+    (TypeError, ErrorCode.INTERNAL_SERVER_ERROR, "Encountered decimal value in response", 500),
+])
 def lambda_handler(event, context):
-    try:
-        auth_header = event['headers'].get('authorization')
-        user_id = get_user_id_from_token(auth_header, JWT_SECRET)
+    user_id = get_user_id(event, JWT_SECRET)
 
-        invoice_type = event['pathParameters'].get('type')
-        invoice_id = event['pathParameters'].get('invoice_id')
-        logging.info(f"Received invoice request with type {invoice_type} and ID: {invoice_id}")
+    invoice_type = event['pathParameters'].get('type')
+    invoice_id = event['pathParameters'].get('invoice_id')
+    logging.info(f"Received invoice request with type {invoice_type} and ID: {invoice_id}")
 
-        invoice = get_invoice_details(invoices_table, user_id=user_id, invoice_id=invoice_id)
-        logging.info(f"Parsed invoice details: {invoice}")
-        return success_response(
-            message="Invoice details retrieved successfully!",
-            data=invoice
-        )
+    # the version changes whenever one of the user's invoices changes, so stale entries are never looked up again
+    invoices_version = get_invoices_version(get_table(USERS_TABLE), user_id)
+
+    # the same version also identifies the response, so an unchanged refresh is answered without the invoices table
+    etag = make_etag('invoice', user_id, invoices_version, invoice_id)
+    if etag_matches(get_request_header(event, 'if-none-match'), etag):
+        logging.info(f"Invoice {invoice_id} of user {user_id} unchanged since version {invoices_version}")
+        return not_modified_response(etag)
 
+    try:
+        invoice = invoice_cache.get_or_load(
+            f"invoice:{user_id}:v{invoices_version}:{invoice_id}",
+            # converted once here, so that cache hits serialize without any Decimal handling
+            lambda: convert_dynamodb_item(
+                get_invoice_details(get_table(INVOICES_TABLE), user_id=user_id, invoice_id=invoice_id)
+            )
+        )
     except NoInvoiceFoundError as e:
         return success_response(
             message=f"Missing data: {str(e)}",
             status_code=204
         )
 
-    except InvalidCredentialsError as e:
-        return log_and_generate_error_response(ErrorCode.INVALID_CREDENTIALS, "Invalid Credentials", 401, e)
-
-    except InvalidTokenError as e:
-        return log_and_generate_error_response(ErrorCode.INVALID_TOKEN, "Malformed Token", 401, e)
-
-    except TokenExpiredError as e:
-        return log_and_generate_error_response(ErrorCode.TOKEN_EXPIRED, "Expired token", 401, e)
-
-    except KeyError as e:
-        return log_and_generate_error_response(ErrorCode.MISSING_FIELDS, "Missing fields in URL", 400, e)
-
-    except JWTDecodingError as e:
-        return log_and_generate_error_response(ErrorCode.JWT_ERROR, "Error parsing JWT token", 500, e)
-
-    except json.JSONDecodeError as e:
-        return log_and_generate_error_response(ErrorCode.INVALID_JSON, "Invalid JSON in request body", 400, e)
-
-    except DatabaseError as e:
-        return log_and_generate_error_response(
-            ErrorCode.DEPENDENCY_FAILURE,
-            "Database error during invoice retrieval",
-            502,
-            e
-        )
-
-    except TypeError as e:
-        return log_and_generate_error_response(
-            ErrorCode.INTERNAL_SERVER_ERROR,
-            "Encountered decimal value in response",
-            500,
-            e
-        )
-
-    except Exception as e:
-        return log_and_generate_error_response(ErrorCode.INTERNAL_SERVER_ERROR, "Internal Server Error", 500, e)
\ No newline at end of file
+    logging.info("Invoice cache stats: %s", invoice_cache.stats())
+    log_payload("Parsed invoice details", invoice)
+    return success_response(
+        message="Invoice details retrieved successfully!",
+        data=invoice,
+        headers={'ETag': etag, 'Cache-Control': CONDITIONAL_CACHE_CONTROL}
+    )
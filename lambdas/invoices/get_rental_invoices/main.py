@@ -1,73 +1,124 @@
 import os
 import json
-import boto3
 import logging
 
-from utils.jwt_utils import get_user_id_from_token
-from utils.dynamodb_utils import get_user_rental_invoices
-from utils.responses import success_response, log_and_generate_error_response, ErrorCode
-from utils.exceptions import JWTDecodingError, InvalidCredentialsError, InvalidTokenError, TokenExpiredError, \
-    DatabaseError
+from utils.jwt_utils import get_user_id
+from utils.cache_utils import create_invoice_cache
+from utils.json_utils import convert_dynamodb_item
+from utils.dynamodb_utils import get_user_rental_invoices, get_invoices_version
+from utils.utility_functions import parse_year_month
+from utils.responses import success_response, make_etag, etag_matches, not_modified_response, \
+    CONDITIONAL_CACHE_CONTROL, ErrorCode
+from utils.handler_utils import api_handler, get_table, get_request_header
+from utils.exceptions import DatabaseError, InvalidQueryParameterError
 
 
-dynamodb = boto3.resource('dynamodb')
-
 INVOICES_TABLE = os.environ['INVOICES_TABLE']
+USERS_TABLE = os.environ['USERS_TABLE']
 JWT_SECRET = os.environ['JWT_SECRET']
 
-invoices_table = dynamodb.Table(INVOICES_TABLE)
+# lives as long as this container does, so warm invocations can skip the RentalInvoices table
+invoice_cache = create_invoice_cache()
+
+MAX_PAGE_SIZE = 100
+
+
+def parse_query_parameters(event) -> dict:
+    """
+    Parses the optional query string parameters of this endpoint:
+        limit: number of invoices per page (1 to MAX_PAGE_SIZE). All invoices are returned if this is missing
+        next_token: the continuation token returned with the previous page
+        year: only return invoices due in this year
+        from, to: only return invoices due within this date range, both bounds given as YYYY-MM
+        view: 'summary' returns only the fields needed for the list view, 'full' (default) returns everything
+        order: 'desc' (default) sorts the invoices of every year newest first, 'asc' oldest first
+    """
+    query_parameters = event.get('queryStringParameters') or {}
+
+    page_size = None
+    if query_parameters.get('limit'):
+        try:
+            page_size = int(query_parameters['limit'])
+        except ValueError as e:
+            raise InvalidQueryParameterError("'limit' must be an integer") from e
+        if not 1 <= page_size <= MAX_PAGE_SIZE:
+            raise InvalidQueryParameterError(f"'limit' must be between 1 and {MAX_PAGE_SIZE}")
+
+    year = query_parameters.get('year')
+    if year and not (year.isdigit() and len(year) == 4):
+        raise InvalidQueryParameterError("'year' must be in the format YYYY")
+
+    from_date = parse_year_month(query_parameters['from']) if query_parameters.get('from') else None
+    to_date = parse_year_month(query_parameters['to']) if query_parameters.get('to') else None
+    if from_date and to_date and from_date > to_date:
+        raise InvalidQueryParameterError("'from' must not be later than 'to'")
+
+    view = query_parameters.get('view', 'full')
+    if view not in ('full', 'summary'):
+        raise InvalidQueryParameterError("'view' must be either 'full' or 'summary'")
+
+    order = query_parameters.get('order', 'desc')
+    if order not in ('asc', 'desc'):
+        raise InvalidQueryParameterError("'order' must be either 'asc' or 'desc'")
+
+    return {
+        'page_size': page_size,
+        'next_token': query_parameters.get('next_token'),
+        'year': year,
+        'from_date': from_date,
+        'to_date': to_date,
+        'summary': view == 'summary',
+        'descending': order == 'desc'
+    }
+
+
+@api_handler(error_mappings=[
+    (DatabaseError, ErrorCode.DEPENDENCY_FAILURE, "Database error during invoice retrieval", 502),
+    (TypeError, ErrorCode.INTERNAL_SERVER_ERROR, "Encountered decimal value in response", 500),
+])
+def lambda_handler(event, context):
+    user_id = get_user_id(event, JWT_SECRET)
 
+    query_parameters = parse_query_parameters(event)
 
-def lambda_handler(event, context):
-    try:
-        auth_header = event['headers'].get('authorization')
-        user_id = get_user_id_from_token(auth_header, JWT_SECRET)
-
-        invoices, invoices_count = get_user_rental_invoices(invoices_table, user_id=user_id)
-        if invoices_count > 0:
-            return success_response(
-                message="Rental invoices retrieved successfully!",
-                data={
-                    "invoiceCount": invoices_count,
-                    "invoices": invoices
-                }
-            )
-        else:
-            logging.info(f"No rental invoices found for user {user_id}")
-            return success_response(
-                message="No rental invoices found for this user."
-            )
-
-    except InvalidCredentialsError as e:
-        return log_and_generate_error_response(ErrorCode.INVALID_CREDENTIALS, "Invalid Credentials", 401, e)
-
-    except InvalidTokenError as e:
-        return log_and_generate_error_response(ErrorCode.INVALID_TOKEN, "Malformed Token", 401, e)
-
-    except TokenExpiredError as e:
-        return log_and_generate_error_response(ErrorCode.TOKEN_EXPIRED, "Expired token", 401, e)
-
-    except JWTDecodingError as e:
-        return log_and_generate_error_response(ErrorCode.JWT_ERROR, "Error parsing JWT token", 500, e)
-
-    except json.JSONDecodeError as e:
-        return log_and_generate_error_response(ErrorCode.INVALID_JSON, "Invalid JSON in request body", 400, e)
-
-    except DatabaseError as e:
-        return log_and_generate_error_response(
-            ErrorCode.DEPENDENCY_FAILURE,
-            "Database error during invoice retrieval",
-            502,
-            e
+    def load_invoices() -> dict:
+        invoices, invoices_count, next_token = get_user_rental_invoices(
+            get_table(INVOICES_TABLE),
+            user_id=user_id,
+            **query_parameters
         )
-
-    except TypeError as e:
-        return log_and_generate_error_response(
-            ErrorCode.INTERNAL_SERVER_ERROR,
-            "Encountered decimal value in response",
-            500,
-            e
+        # converted once here, so that cache hits serialize without any Decimal handling
+        return {'invoices': convert_dynamodb_item(invoices), 'count': invoices_count, 'next_token': next_token}
+
+    # the version changes whenever one of the user's invoices changes, so stale entries are never looked up again
+    invoices_version = get_invoices_version(get_table(USERS_TABLE), user_id)
+    serialized_query_parameters = json.dumps(query_parameters, sort_keys=True)
+
+    # the same version also identifies the response, so an unchanged refresh is answered without the invoices table
+    etag = make_etag('invoices', user_id, invoices_version, serialized_query_parameters)
+    if etag_matches(get_request_header(event, 'if-none-match'), etag):
+        logging.info(f"Invoices of user {user_id} unchanged since version {invoices_version}")
+        return not_modified_response(etag)
+    headers = {'ETag': etag, 'Cache-Control': CONDITIONAL_CACHE_CONTROL}
+
+    cache_key = f"invoices:{user_id}:v{invoices_version}:{serialized_query_parameters}"
+    page = invoice_cache.get_or_load(cache_key, load_invoices)
+    logging.info("Invoice cache stats: %s", invoice_cache.stats())
+
+    invoices, invoices_count, next_token = page['invoices'], page['count'], page['next_token']
+    if invoices_count > 0:
+        return success_response(
+            message="Rental invoices retrieved successfully!",
+            data={
+                "invoiceCount": invoices_count,
+                "invoices": invoices,
+                "nextToken": next_token
+            },
+            headers=headers
+        )
+    else:
+        logging.info(f"No rental invoices found for user {user_id}")
+        return success_response(
+            message="No rental invoices found for this user.",
+            headers=headers
         )
-
-    except Exception as e:
-        return log_and_generate_error_response(ErrorCode.INTERNAL_SERVER_ERROR, "Internal Server Error", 500, e)
\ No newline at end of file
@@ -7,6 +7,8 @@ import textract
 from datetime import datetime
 from typing import Dict, Union, NoReturn, Tuple
 
+from utils.metrics_utils import span
+from utils.logging_utils import log_payload
 from utils.exceptions import InvoiceParseError
 # from logging_config import logger
 
@@ -19,7 +21,7 @@ def extract_text_from_pdf(filename) -> Union[str, NoReturn]:
     """
     try:
         text = textract.process(filename).decode()
-        logging.info(f"Text extracted from {filename}: \n\n{text}")
+        log_payload("Text extracted from %s", text, filename)
         return text
     except Exception as e:
         raise InvoiceParseError(f"Could not extract text from {filename}")
@@ -137,7 +139,7 @@ def extract_rental_info(text: str) -> Union[Dict, NoReturn]:
                 components = [parse_line(x) for x in line.split(':')]
                 extracted_info[components[0]] = convert_str_value_to_int(components[1])
 
-        logging.info(f"Rental breakdown: {rental_breakdown}")
+        log_payload("Rental breakdown", rental_breakdown)
         assert len(rental_breakdown) % 2 == 0
         rental_breakdown_mid = int(len(rental_breakdown) / 2)
 
@@ -160,8 +162,10 @@ def extract_rental_info(text: str) -> Union[Dict, NoReturn]:
 
 
 def extract_rental_info_from_file(filename) -> Dict:
-    text = extract_text_from_pdf(filename)
-    extractions = extract_rental_info(text)
+    with span('text_extraction'):
+        text = extract_text_from_pdf(filename)
+    with span('parsing'):
+        extractions = extract_rental_info(text)
     # store only the filename, not the whole path
     extractions['Filename'] = filename.split('/')[-1].split('.')[0]
     return extractions
@@ -0,0 +1,103 @@
+import os
+import logging
+from collections import defaultdict
+
+from utils.handler_utils import event_handler, get_table
+from utils.stream_utils import get_records_to_retry
+from utils.dynamodb_utils import bump_invoices_version, update_invoice_aggregates
+from utils.exceptions import DatabaseError
+
+USERS_TABLE = os.environ['USERS_TABLE']
+AGGREGATES_TABLE = os.environ['AGGREGATES_TABLE']
+
+
+def get_invoice_changes_per_user(records) -> dict:
+    """
+    Groups the stream records by user. For every user, this returns a dict mapping each changed invoice ID to the
+    latest image of that invoice in this batch, or to None if the invoice was removed.
+    """
+    from boto3.dynamodb.types import TypeDeserializer
+
+    deserializer = TypeDeserializer()
+    changes_per_user = defaultdict(dict)
+    for record in records:
+        if record['eventName'] not in ('INSERT', 'MODIFY', 'REMOVE'):
+            continue
+        keys = record['dynamodb']['Keys']
+        user_id = keys['UserID']['S']
+        invoice_id = keys['InvoiceID']['S']
+
+        if record['eventName'] == 'REMOVE':
+            changes_per_user[user_id][invoice_id] = None
+        else:
+            new_image = record['dynamodb']['NewImage']
+            changes_per_user[user_id][invoice_id] = {
+                key: deserializer.deserialize(value) for key, value in new_image.items()
+            }
+    return changes_per_user
+
+
+def get_previous_years_per_user(records) -> dict:
+    """
+    Returns the years that the changed invoices of every user were due in before their changes, from the old images
+    of the MODIFY and REMOVE records
+    """
+    previous_years_per_user = defaultdict(set)
+    for record in records:
+        old_image = record['dynamodb'].get('OldImage')
+        if old_image and 'due_date_year' in old_image:
+            # a string, or a number in invoices written by hand
+            year = old_image['due_date_year'].get('S') or old_image['due_date_year'].get('N')
+            previous_years_per_user[record['dynamodb']['Keys']['UserID']['S']].add(year)
+    return previous_years_per_user
+
+
+def get_sequence_numbers_per_user(records) -> dict:
+    """
+    Returns the sequence numbers of the stream records of every user
+    """
+    sequence_numbers_per_user = defaultdict(list)
+    for record in records:
+        sequence_numbers_per_user[record['dynamodb']['Keys']['UserID']['S']].append(
+            record['dynamodb']['SequenceNumber']
+        )
+    return sequence_numbers_per_user
+
+
+@event_handler
+def lambda_handler(event, context):
+    """
+    Triggered by the RentalInvoices table stream. For every affected user, this:
+        1. Updates the per-user invoice aggregates (totals, averages, min and max per year and per month)
+        2. Bumps the invoices version, which invalidates the cached invoice lists and details of this user in all
+           containers of get_rental_invoices and get_rental_invoice
+
+    If either fails for a user, the records of that user and every record after them are reported in
+    batchItemFailures, and Lambda retries the batch from the earliest of them. The other users are still processed,
+    so one failing user doesn't hold back the cache invalidation of the rest. Both steps can be repeated safely: the
+    month aggregates replace the contribution of every changed invoice, and an extra version bump only costs a cache
+    miss.
+    Records that can't be processed at all (e.g. malformed ones) raise, so that the mapping bisects the batch down to
+    them and sends them to its on-failure queue after maximum_retry_attempts.
+    """
+    changes_per_user = get_invoice_changes_per_user(event['Records'])
+    previous_years_per_user = get_previous_years_per_user(event['Records'])
+    sequence_numbers_per_user = get_sequence_numbers_per_user(event['Records'])
+    failed_sequence_numbers = []
+    for user_id, changes in changes_per_user.items():
+        try:
+            update_invoice_aggregates(get_table(AGGREGATES_TABLE), user_id=user_id, changes=changes,
+                                      previous_years=previous_years_per_user[user_id])
+            bump_invoices_version(get_table(USERS_TABLE), user_id=user_id)
+        except DatabaseError:
+            logging.exception("Invoice changes of user %s not processed", user_id)
+            failed_sequence_numbers.extend(sequence_numbers_per_user[user_id])
+
+    records_to_retry = get_records_to_retry(event['Records'], failed_sequence_numbers)
+    logging.info("Processed invoice changes for %s users, %s records to be retried", len(changes_per_user),
+                 len(records_to_retry))
+    return {
+        'batchItemFailures': [
+            {'itemIdentifier': sequence_number} for sequence_number in records_to_retry
+        ]
+    }
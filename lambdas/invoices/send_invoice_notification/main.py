@@ -1,37 +1,141 @@
 import os
-import json
-import boto3
-from typing import Dict
+import logging
+from typing import Dict, List, Tuple
+
+from botocore.exceptions import ClientError
+
+from utils.handler_utils import event_handler, get_client
+from utils.stream_utils import get_records_to_retry
+from utils.utility_functions import get_due_date_sort_key
 
-sns_client = boto3.client('sns')
 sns_topic_arn = os.getenv('SNS_TOPIC_ARN')
 
+NOTIFICATION_SUBJECT = "New invoice available!"
+DIGEST_NOTIFICATION_SUBJECT = "New invoices available!"
+# PublishBatch accepts at most 10 entries per request
+SNS_PUBLISH_BATCH_SIZE = 10
+
+# (sequence numbers of the records it covers, subject, message)
+Notification = Tuple[List[str], str, str]
+
+
 def get_fields_for_notification(data: Dict) -> Dict:
-    due_date = data['Due Date']['S']
-    amount = data['Total Amount']['S']
+    from boto3.dynamodb.types import TypeDeserializer
+
+    # 'Total Amount' is stored as a number and 'Due Date' as a string, the deserializer handles both
+    deserializer = TypeDeserializer()
+    due_date = deserializer.deserialize(data['Due Date'])
+    amount = deserializer.deserialize(data['Total Amount'])
+    sort_key = get_due_date_sort_key({
+        'Due Date': due_date,
+        'due_date_year': deserializer.deserialize(data['due_date_year']) if 'due_date_year' in data else 0,
+        'due_date_month': deserializer.deserialize(data['due_date_month']) if 'due_date_month' in data else 0
+    })
     return {
         'due_date': due_date,
-        'amount': amount
+        'amount': amount,
+        'sort_key': sort_key
     }
 
 
-def lambda_handler(event, context):
-    for record in event['Records']:
-        if record['eventName'] == 'INSERT':
-            new_data = record['dynamodb']['NewImage']
-            notification_fields = get_fields_for_notification(new_data)
+def get_new_invoices_per_user(records) -> Dict[str, List[Tuple[str, Dict]]]:
+    """
+    Groups the new invoices in a batch of stream records by user, as (sequence number, notification fields) pairs in
+    stream order. Records that can't be turned into a notification are logged and skipped, since retrying them would
+    fail the same way every time.
+    """
+    new_invoices_per_user = {}
+    for record in records:
+        if record['eventName'] != 'INSERT':
+            continue
+        sequence_number = record['dynamodb']['SequenceNumber']
+        try:
+            user_id = record['dynamodb']['Keys']['UserID']['S']
+            notification_fields = get_fields_for_notification(record['dynamodb']['NewImage'])
+        except (KeyError, ValueError) as e:
+            logging.error("Skipping record %s, missing field for the notification: %s", sequence_number, e)
+            continue
+        new_invoices_per_user.setdefault(user_id, []).append((sequence_number, notification_fields))
+    return new_invoices_per_user
 
-            message = f"New rental invoice of {notification_fields['amount']} SEK with due date of {notification_fields['due_date']} is now available!"
 
-            response = sns_client.publish(
-                TopicArn = sns_topic_arn,
-                Message=message,
-                Subject="New invoice available!"
+def get_notifications(records) -> List[Notification]:
+    """
+    Returns the notifications for a batch of stream records, one per user. A single new invoice gets the usual
+    notification. Several new invoices of the same user, e.g. from fetch_invoices importing their history, are
+    coalesced into one digest naming the number of invoices and the latest of them, instead of a notification each.
+    """
+    notifications = []
+    for user_id, new_invoices in get_new_invoices_per_user(records).items():
+        sequence_numbers = [sequence_number for sequence_number, _ in new_invoices]
+        if len(new_invoices) == 1:
+            fields = new_invoices[0][1]
+            message = f"New rental invoice of {fields['amount']} SEK with due date of {fields['due_date']} " \
+                      f"is now available!"
+            notifications.append((sequence_numbers, NOTIFICATION_SUBJECT, message))
+            continue
+
+        latest = max((fields for _, fields in new_invoices), key=lambda fields: fields['sort_key'])
+        message = f"{len(new_invoices)} rental invoices imported, the latest of {latest['amount']} SEK with due " \
+                  f"date of {latest['due_date']}!"
+        logging.info("Coalesced %d new invoices of user '%s' into one notification", len(new_invoices), user_id)
+        notifications.append((sequence_numbers, DIGEST_NOTIFICATION_SUBJECT, message))
+    return notifications
+
+
+def publish_notifications(sns_client, notifications: List[Notification]) -> List[str]:
+    """
+    Publishes the notifications with PublishBatch, up to SNS_PUBLISH_BATCH_SIZE per request, and returns the sequence
+    numbers of the records whose notification was not published. The first sequence number of every notification
+    doubles as its entry ID, which must be unique within a request.
+
+    Publishing stops after the first request with a failure, and the notifications of the later requests are reported
+    as failed without being sent, since Lambda retries them anyway.
+    """
+    for start in range(0, len(notifications), SNS_PUBLISH_BATCH_SIZE):
+        batch = notifications[start:start + SNS_PUBLISH_BATCH_SIZE]
+        try:
+            response = sns_client.publish_batch(
+                TopicArn=sns_topic_arn,
+                PublishBatchRequestEntries=[
+                    {'Id': sequence_numbers[0], 'Message': message, 'Subject': subject}
+                    for sequence_numbers, subject, message in batch
+                ]
             )
+        except ClientError as e:
+            logging.error("Error publishing %d notifications: %s", len(batch), e)
+            return [number for sequence_numbers, _, _ in notifications[start:] for number in sequence_numbers]
 
-            print(f"Notification sent: {response}")
+        failures = response.get('Failed', [])
+        if failures:
+            for failure in failures:
+                logging.error("Notification for record %s not published: %s (%s)", failure['Id'], failure.get('Code'),
+                              failure.get('Message'))
+            failed_ids = {failure['Id'] for failure in failures}
+            return [number for sequence_numbers, _, _ in batch if sequence_numbers[0] in failed_ids
+                    for number in sequence_numbers] + \
+                [number for sequence_numbers, _, _ in notifications[start + SNS_PUBLISH_BATCH_SIZE:]
+                 for number in sequence_numbers]
+    return []
+
+
+@event_handler
+def lambda_handler(event, context):
+    """
+    Triggered by the RentalInvoices table stream, in batches. This sends one notification for the new invoices of
+    every user in the batch. If a notification can't be published, its records and every record after them are reported
+    in batchItemFailures, and Lambda retries the batch from the earliest of them instead of the whole batch. A retry
+    can notify a user again about invoices whose notification was already published; after maximum_retry_attempts
+    the records go to the mapping's on-failure queue.
+    """
+    notifications = get_notifications(event['Records'])
+    failed_sequence_numbers = publish_notifications(get_client('sns'), notifications) if notifications else []
+    records_to_retry = get_records_to_retry(event['Records'], failed_sequence_numbers)
 
+    logging.info("%d notifications for %d records, %d records to be retried", len(notifications),
+                 len(event['Records']), len(records_to_retry))
     return {
-        'statusCode': 200,
-        'body': "Notification sent!"
+        'batchItemFailures': [
+            {'itemIdentifier': sequence_number} for sequence_number in records_to_retry
+        ]
     }
@@ -1,81 +1,81 @@
 import os
-import json
-import boto3
 import logging
 
-from utils.jwt_utils import get_user_id_from_token
-from utils.s3_utils import delete_user_folder_in_s3
-from utils.dynamodb_utils import delete_user_invoices, delete_user_in_dynamodb
-from utils.secretsmanager_utils import delete_email_credentials
-from utils.responses import success_response, log_and_generate_error_response, ErrorCode
-from utils.exceptions import JWTDecodingError, InvalidCredentialsError, InvalidTokenError, TokenExpiredError, \
-    SecretsManagerError, DatabaseError, S3Error
+from utils.jwt_utils import get_user_id
+from utils.dynamodb_utils import start_user_deletion
+from utils.deletion_utils import build_account_deletion_steps, run_account_deletion, start_account_deletion_job
+from utils.responses import success_response, ErrorCode
+from utils.handler_utils import api_handler, get_client, get_table
+from utils.exceptions import SecretsManagerError, DatabaseError, S3Error, LambdaInvocationError, \
+    InvalidQueryParameterError
 
 
-dynamodb = boto3.resource('dynamodb')
-secrets_manager = boto3.client('secretsmanager')
-s3 = boto3.client('s3')
-
 USERS_TABLE = os.environ['USERS_TABLE']
 INVOICES_TABLE = os.environ['INVOICES_TABLE']
+AGGREGATES_TABLE = os.environ['AGGREGATES_TABLE']
 BUCKET_NAME = os.environ['BUCKET_NAME']
 JWT_SECRET = os.environ['JWT_SECRET']
-
-users_table = dynamodb.Table(USERS_TABLE)
-invoices_table = dynamodb.Table(INVOICES_TABLE)
-
-
+DELETION_JOB_FUNCTION = os.environ['DELETION_JOB_FUNCTION']
+# a synchronous deletion that hasn't finished this long before the function times out is handed over to the
+# deletion job, so that there is still time to start it and respond
+SYNC_HANDOFF_MARGIN_SECONDS = 5
+# the steps still running at the handoff get this much of the margin to finish, so that the deletion job doesn't
+# repeat them while this invocation is frozen
+SYNC_HANDOFF_GRACE_SECONDS = 3
+
+
+def hand_over_to_deletion_job(user_id: str):
+    start_account_deletion_job(get_client('lambda'), DELETION_JOB_FUNCTION, user_id=user_id)
+    return success_response(
+        message=f"Deletion of user {user_id} is in progress",
+        data={"status": "in_progress"},
+        status_code=202
+    )
+
+
+@api_handler(error_mappings=[
+    (DatabaseError, ErrorCode.DEPENDENCY_FAILURE, "Database error during user deletion", 502),
+    (SecretsManagerError, ErrorCode.DEPENDENCY_FAILURE, "Error deleting Gmail credentials", 502),
+    (S3Error, ErrorCode.DEPENDENCY_FAILURE, "Error deleting S3 folder", 502),
+    (LambdaInvocationError, ErrorCode.DEPENDENCY_FAILURE, "Error starting the account deletion job", 502),
+])
 def lambda_handler(event, context):
-    try:
-        auth_header = event['headers'].get('authorization')
-        user_id = get_user_id_from_token(auth_header, JWT_SECRET)
-
-        # delete all invoices for this user in the RentalInvoices table
-        delete_user_invoices(invoices_table, user_id=user_id)
-
-        # delete secrets for this user
-        delete_email_credentials(secrets_manager, user_id=user_id)
-
-        # delete the folder for this user in S3
-        delete_user_folder_in_s3(s3, user_id=user_id, s3_bucket_name=BUCKET_NAME)
-
-        # delete this user from the Users table
-        delete_user_in_dynamodb(users_table, user_id=user_id)
-
-        logging.info(f"All data for user '{user_id}' deleted successfully!")
-
-        return success_response(
-            message=f"All data for user {user_id} deleted successfully!"
+    """
+    Deletes a user's account. The deletion steps run concurrently, and their progress is recorded on the user's item,
+    so that a retry after a failure resumes where the previous attempt stopped.
+
+    With the query parameter mode=async, the deletion is handed over to the deletion job right away. A synchronous
+    deletion (the default) that doesn't finish in time is handed over as well. Either way, the response is then
+    202, and GET /user/me/deletion reports the progress.
+    """
+    user_id = get_user_id(event, JWT_SECRET)
+
+    mode = (event.get('queryStringParameters') or {}).get('mode', 'sync')
+    if mode not in ('sync', 'async'):
+        raise InvalidQueryParameterError("'mode' must be either 'sync' or 'async'")
+
+    if mode == 'async':
+        if start_user_deletion(get_table(USERS_TABLE), user_id, mode) is None:
+            logging.info(f"User '{user_id}' has already been deleted")
+        else:
+            return hand_over_to_deletion_job(user_id)
+    else:
+        steps = build_account_deletion_steps(
+            user_id,
+            invoices_table=get_table(INVOICES_TABLE),
+            aggregates_table=get_table(AGGREGATES_TABLE),
+            secrets_manager=get_client('secretsmanager'),
+            s3=get_client('s3'),
+            bucket_name=BUCKET_NAME
         )
+        timeout_seconds = context.get_remaining_time_in_millis() / 1000 - SYNC_HANDOFF_MARGIN_SECONDS \
+            if context else None
+        if not run_account_deletion(get_table(USERS_TABLE), user_id, steps, mode, timeout_seconds=timeout_seconds,
+                                    grace_seconds=SYNC_HANDOFF_GRACE_SECONDS):
+            return hand_over_to_deletion_job(user_id)
 
-    except InvalidCredentialsError as e:
-        return log_and_generate_error_response(ErrorCode.INVALID_CREDENTIALS, "Invalid Credentials", 401, e)
-
-    except InvalidTokenError as e:
-        return log_and_generate_error_response(ErrorCode.INVALID_TOKEN, "Malformed Token", 401, e)
-
-    except TokenExpiredError as e:
-        return log_and_generate_error_response(ErrorCode.TOKEN_EXPIRED, "Expired token", 401, e)
-
-    except JWTDecodingError as e:
-        return log_and_generate_error_response(ErrorCode.JWT_ERROR, "Error parsing JWT token", 500, e)
-
-    except json.JSONDecodeError as e:
-        return log_and_generate_error_response(ErrorCode.INVALID_JSON, "Invalid JSON in request body", 400, e)
-
-    except DatabaseError as e:
-        return log_and_generate_error_response(
-            ErrorCode.DEPENDENCY_FAILURE,
-            "Database error during user deletion",
-            502,
-            e
-        )
-
-    except SecretsManagerError as e:
-        return log_and_generate_error_response(ErrorCode.DEPENDENCY_FAILURE, "Error deleting Gmail credentials", 502, e)
-
-    except S3Error as e:
-        return log_and_generate_error_response(ErrorCode.DEPENDENCY_FAILURE, "Error deleting S3 folder", 502, e)
+    logging.info(f"All data for user '{user_id}' deleted successfully!")
 
-    except Exception as e:
-        return log_and_generate_error_response(ErrorCode.INTERNAL_SERVER_ERROR, "Internal Server Error", 500, e)
+    return success_response(
+        message=f"All data for user {user_id} deleted successfully!"
+    )
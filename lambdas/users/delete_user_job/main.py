@@ -0,0 +1,47 @@
+import os
+import logging
+
+from utils.handler_utils import event_handler, get_client, get_table
+from utils.deletion_utils import build_account_deletion_steps, run_account_deletion, start_account_deletion_job
+
+USERS_TABLE = os.environ['USERS_TABLE']
+INVOICES_TABLE = os.environ['INVOICES_TABLE']
+AGGREGATES_TABLE = os.environ['AGGREGATES_TABLE']
+BUCKET_NAME = os.environ['BUCKET_NAME']
+# a deletion that hasn't finished this long before the function times out is continued by a new invocation
+CONTINUATION_MARGIN_SECONDS = 30
+# the steps still running at that point get this much of the margin to finish, so that the new invocation doesn't
+# repeat them while this one is frozen
+CONTINUATION_GRACE_SECONDS = 20
+
+
+@event_handler
+def lambda_handler(event, context):
+    """
+    Invoked asynchronously by delete_user, with the ID of the user to delete. This runs the steps of the account
+    deletion that haven't been completed yet. Failures are raised, so that Lambda retries the invocation, and every
+    retry resumes the deletion where the previous attempt stopped.
+    """
+    user_id = event['user_id']
+    steps = build_account_deletion_steps(
+        user_id,
+        invoices_table=get_table(INVOICES_TABLE),
+        aggregates_table=get_table(AGGREGATES_TABLE),
+        secrets_manager=get_client('secretsmanager'),
+        s3=get_client('s3'),
+        bucket_name=BUCKET_NAME
+    )
+    timeout_seconds = context.get_remaining_time_in_millis() / 1000 - CONTINUATION_MARGIN_SECONDS if context else None
+    if not run_account_deletion(get_table(USERS_TABLE), user_id, steps, 'async', timeout_seconds=timeout_seconds,
+                                grace_seconds=CONTINUATION_GRACE_SECONDS):
+        start_account_deletion_job(get_client('lambda'), context.function_name, user_id=user_id)
+        return {
+            'statusCode': 202,
+            'body': f"Deletion of user '{user_id}' continues in a new invocation"
+        }
+
+    logging.info(f"All data for user '{user_id}' deleted successfully!")
+    return {
+        'statusCode': 200,
+        'body': f"All data for user '{user_id}' deleted successfully!"
+    }
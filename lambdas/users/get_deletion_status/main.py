@@ -0,0 +1,30 @@
+import os
+import logging
+
+from utils.jwt_utils import get_user_id
+from utils.deletion_utils import get_account_deletion_status
+from utils.responses import success_response, ErrorCode
+from utils.handler_utils import api_handler, get_table
+from utils.exceptions import DatabaseError
+
+USERS_TABLE = os.environ['USERS_TABLE']
+JWT_SECRET = os.environ['JWT_SECRET']
+
+
+@api_handler(error_mappings=[
+    (DatabaseError, ErrorCode.DEPENDENCY_FAILURE, "Database error during deletion status retrieval", 502),
+])
+def lambda_handler(event, context):
+    """
+    Returns the progress of the user's account deletion, as recorded by delete_user and the deletion job. The status
+    is 'completed' once the user's item is gone, which is the last step of the deletion.
+    """
+    user_id = get_user_id(event, JWT_SECRET)
+
+    deletion_status = get_account_deletion_status(get_table(USERS_TABLE), user_id)
+    logging.info(f"Deletion status for user '{user_id}': {deletion_status['status']}")
+
+    return success_response(
+        message="Account deletion status retrieved successfully",
+        data=deletion_status
+    )
@@ -1,89 +1,49 @@
 import os
-import json
-import boto3
 import logging
 
-from utils.jwt_utils import get_user_id_from_token
+from utils.jwt_utils import get_user_id
 from utils.dynamodb_utils import fetch_user_by_id
-from utils.responses import success_response, log_and_generate_error_response, ErrorCode
-from utils.exceptions import InvalidCredentialsError, InvalidTokenError, TokenExpiredError, \
-    UserNotFoundError, DatabaseError
+from utils.responses import success_response, ErrorCode
+from utils.handler_utils import api_handler, get_table
+from utils.exceptions import UserNotFoundError, DatabaseError
 
-dynamodb = boto3.resource('dynamodb')
-secretsmanager = boto3.client('secretsmanager')
 USERS_TABLE = os.environ['USERS_TABLE']
 JWT_SECRET = os.environ['JWT_SECRET']
 REGION = os.environ['REGION']
 
-users_table = dynamodb.Table(USERS_TABLE)
 
-
-def check_gmail_connection(user_id: str) -> bool:
+def get_gmail_connection(user: dict) -> dict:
     """
-    Check if user has Gmail OAuth tokens stored in Secrets Manager.
-    
-    Returns:
-        bool: True if Gmail account is connected, False otherwise
+    Returns the Gmail connection status of a user. gmail_store_tokens and the token refresh path keep it up to date
+    on the user's item, so no Secrets Manager call is needed here.
     """
-    secret_name = f"gmail/user/{user_id}"
-    
-    try:
-        secretsmanager.get_secret_value(SecretId=secret_name)
-        logging.info(f"Gmail secret found for user {user_id}")
-        return True
-    except secretsmanager.exceptions.ResourceNotFoundException:
-        logging.info(f"No Gmail secret found for user {user_id}")
-        return False
-    except Exception as e:
-        logging.error(f"Error checking Gmail secret for user {user_id}: {e}")
-        return False
+    return {
+        "gmail_account_connected": bool(user.get('GmailConnected', False)),
+        "google_email": user.get('GoogleEmail'),
+        "gmail_last_refreshed": user.get('GmailLastRefreshed')
+    }
 
 
+@api_handler(error_mappings=[
+    (UserNotFoundError, ErrorCode.USER_NOT_FOUND, "User not found", 404),
+    (DatabaseError, ErrorCode.DEPENDENCY_FAILURE, "Database error during user retrieval", 502),
+])
 def lambda_handler(event, context):
-    try:
-        auth_header = event['headers'].get('authorization')
-        user_id = get_user_id_from_token(auth_header, JWT_SECRET)
-        logging.info(f"Retrieved user ID '{user_id}' from JWT token")
-
-        user = fetch_user_by_id(users_table, user_id=user_id)
-        logging.info(f"User '{user_id}' retrieved successfully from DB!")
-
-        # Check if Gmail account is connected
-        gmail_connected = check_gmail_connection(user_id)
-        logging.info(f"Gmail connection status for user {user_id}: {gmail_connected}")
-
-        return success_response(
-            message="User profile retrieved successfully",
-            data={
-                "name": user['Name'],
-                "email": user['Email'],
-                "created_on": user['CreatedOn'],
-                "gmail_account_connected": gmail_connected
-            }
-        )
-
-    except InvalidCredentialsError as e:
-        return log_and_generate_error_response(ErrorCode.INVALID_CREDENTIALS, "Invalid Credentials", 401, e)
-
-    except InvalidTokenError as e:
-        return log_and_generate_error_response(ErrorCode.INVALID_TOKEN, "Malformed Token", 401, e)
-
-    except TokenExpiredError as e:
-        return log_and_generate_error_response(ErrorCode.TOKEN_EXPIRED, "Expired token", 401, e)
-
-    except UserNotFoundError as e:
-        return log_and_generate_error_response(ErrorCode.USER_NOT_FOUND, "User not found", 404, e)
-
-    except DatabaseError as e:
-        return log_and_generate_error_response(
-            ErrorCode.DEPENDENCY_FAILURE,
-            "Database error during user retrieval",
-            502,
-            e
-        )
-
-    except json.JSONDecodeError as e:
-        return log_and_generate_error_response(ErrorCode.INVALID_JSON, "Invalid JSON in request body", 400, e)
-
-    except Exception as e:
-        return log_and_generate_error_response(ErrorCode.INTERNAL_SERVER_ERROR, "Internal Server Error", 500, e)
\ No newline at end of file
+    user_id = get_user_id(event, JWT_SECRET)
+    logging.info(f"Retrieved user ID '{user_id}' from JWT token")
+
+    user = fetch_user_by_id(get_table(USERS_TABLE), user_id=user_id)
+    logging.info(f"User '{user_id}' retrieved successfully from DB!")
+
+    gmail_connection = get_gmail_connection(user)
+    logging.info(f"Gmail connection status for user {user_id}: {gmail_connection['gmail_account_connected']}")
+
+    return success_response(
+        message="User profile retrieved successfully",
+        data={
+            "name": user['Name'],
+            "email": user['Email'],
+            "created_on": user['CreatedOn'],
+            **gmail_connection
+        }
+    )
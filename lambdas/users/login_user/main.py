@@ -1,62 +1,70 @@
 import os
 import json
-import boto3
 import logging
 
-from utils.responses import success_response, log_and_generate_error_response, ErrorCode
-from utils.dynamodb_utils import fetch_user_by_email
-from utils.auth_utils import verify_user_password
+from utils.responses import success_response, ErrorCode
+from utils.handler_utils import api_handler, MISSING_KEY_ERROR_MAPPING, get_table
+from utils.dynamodb_utils import fetch_user_by_email, update_user_password_hash
+from utils.auth_utils import verify_user_password, password_needs_rehash, create_password_hash
 from utils.jwt_utils import generate_jwt_token
-from utils.exceptions import UserNotFoundError, InvalidCredentialsError, JWTGenerationError
+from utils.exceptions import UserNotFoundError, JWTGenerationError, DatabaseError
 
-dynamodb = boto3.resource('dynamodb')
-users_table = dynamodb.Table(os.environ['USERS_TABLE'])
+USERS_TABLE = os.environ['USERS_TABLE']
 jwt_secret = os.environ['JWT_SECRET']
 
 
-def lambda_handler(event, context):
+def rehash_password_if_needed(user: dict, password: str):
+    """
+    If the cost factor policy has changed since the user's password was hashed, the password is rehashed with the
+    current cost factor. This can only happen after a successful login, since that's the only time the plain text
+    password is available. A failure here is logged, but doesn't fail the login.
+    """
+    db_password = user['Password']
+    if not password_needs_rehash(db_password):
+        return
     try:
-        user_info = json.loads(event['body'])
-
-        email = user_info['email']
-        password = user_info['password']
-        logging.info("Received email and password in request body! ")
-
-        user = fetch_user_by_email(users_table, email=email)
-        logging.info(f"User '{user['UserID']}' retrieved successfully from DB!")
-        db_password = user['Password']
-
-        verify_user_password(user_password=password, db_password=db_password)
-        logging.info("Password verified!")
+        update_user_password_hash(
+            get_table(USERS_TABLE),
+            user_id=user['UserID'],
+            old_password_hash=db_password,
+            new_password_hash=create_password_hash(password)
+        )
+        logging.info(f"Password of user '{user['UserID']}' rehashed with the current cost factor")
+    except DatabaseError as e:
+        logging.warning(f"Could not rehash password of user '{user['UserID']}': {e}")
 
-        token = generate_jwt_token(user_id=user['UserID'], email=email, jwt_secret=jwt_secret)
 
-        return success_response(
-            message="Login successful!",
-            data={
-                "username": user['Name'],
-                "access_token": token,
-                "token_type": "Bearer"
-            }
-        )
+@api_handler(error_mappings=[
+    (UserNotFoundError, ErrorCode.USER_NOT_FOUND, "User not found", 404),
+    (JWTGenerationError, ErrorCode.JWT_ERROR, "Error generating JWT", 500),
+    MISSING_KEY_ERROR_MAPPING,
+])
+def lambda_handler(event, context):
+    user_info = json.loads(event['body'])
 
-    except InvalidCredentialsError as e:
-        return log_and_generate_error_response(ErrorCode.INVALID_CREDENTIALS, "Invalid Credentials", 401, e)
+    email = user_info['email']
+    password = user_info['password']
+    logging.info("Received email and password in request body! ")
 
-    except UserNotFoundError as e:
-        return log_and_generate_error_response(ErrorCode.USER_NOT_FOUND, "User not found", 404, e)
+    user = fetch_user_by_email(get_table(USERS_TABLE), email=email)
+    logging.info(f"User '{user['UserID']}' retrieved successfully from DB!")
+    db_password = user['Password']
 
-    except JWTGenerationError as e:
-        return log_and_generate_error_response(ErrorCode.JWT_ERROR, "Error generating JWT", 500, e)
+    verify_user_password(user_password=password, db_password=db_password)
+    logging.info("Password verified!")
 
-    except json.JSONDecodeError as e:
-        return log_and_generate_error_response(ErrorCode.INVALID_JSON, "Invalid JSON in request body", 400, e)
+    rehash_password_if_needed(user, password)
 
-    except KeyError as e:
-        return log_and_generate_error_response(ErrorCode.MISSING_FIELDS, f"Missing key: {e}", 400, e)
+    token = generate_jwt_token(user_id=user['UserID'], email=email, jwt_secret=jwt_secret)
 
-    except Exception as e:
-        return log_and_generate_error_response(ErrorCode.INTERNAL_SERVER_ERROR, "Internal Server Error", 500, e)
+    return success_response(
+        message="Login successful!",
+        data={
+            "username": user['Name'],
+            "access_token": token,
+            "token_type": "Bearer"
+        }
+    )
 
 
 '''
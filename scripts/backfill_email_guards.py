@@ -0,0 +1,58 @@
+"""
+One-time backfill of the email guard items in the Users table, for users who signed up before signup_user started
+writing them. Without a guard item, the email address of such a user could be registered a second time.
+Running it again is safe, since existing guard items are never overwritten.
+
+Usage:
+    python scripts/backfill_email_guards.py --region eu-west-1
+"""
+import os
+import sys
+import logging
+import argparse
+
+import boto3
+from botocore.exceptions import ClientError
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'lambda_layers', 'common', 'python'))
+
+from utils.dynamodb_utils import get_email_guard_id  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Backfill the email guard items of existing users")
+    parser.add_argument('--region', default='eu-west-1')
+    parser.add_argument('--users-table', default='Users')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    users_table = boto3.resource('dynamodb', region_name=args.region).Table(args.users_table)
+
+    created, skipped = 0, 0
+    scan_kwargs = {'ProjectionExpression': 'UserID, Email'}
+    while True:
+        response = users_table.scan(**scan_kwargs)
+        for user in response['Items']:
+            if 'Email' not in user:
+                # this is a guard item itself
+                continue
+            try:
+                users_table.put_item(
+                    Item={'UserID': get_email_guard_id(user['Email']), 'OwnerUserID': user['UserID']},
+                    ConditionExpression='attribute_not_exists(UserID)'
+                )
+                created += 1
+            except ClientError as e:
+                if e.response['Error']['Code'] != 'ConditionalCheckFailedException':
+                    raise
+                logging.warning(f"Guard item for '{user['Email']}' already exists, skipping user '{user['UserID']}'")
+                skipped += 1
+        if 'LastEvaluatedKey' not in response:
+            break
+        scan_kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+    logging.info(f"Created {created} email guard items, skipped {skipped}")
+
+
+if __name__ == '__main__':
+    main()
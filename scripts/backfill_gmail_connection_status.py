@@ -0,0 +1,91 @@
+"""
+One-time backfill of the Gmail connection status attributes on the Users table (GmailConnected, GoogleEmail,
+GmailLastRefreshed and GmailTokenExpiresAt), for users who connected their Gmail account before gmail_store_tokens
+started writing them. get_user_profile reads the connection status from these attributes only.
+Users that already have a connection status are left alone, so running it again is safe.
+
+Usage:
+    python scripts/backfill_gmail_connection_status.py --region eu-west-1
+"""
+import json
+import logging
+import argparse
+
+import boto3
+from botocore.exceptions import ClientError
+
+
+def get_gmail_secret(secrets_manager, user_id: str):
+    try:
+        response = secrets_manager.get_secret_value(SecretId=f"gmail/user/{user_id}")
+    except secrets_manager.exceptions.ResourceNotFoundException:
+        return None
+    return json.loads(response['SecretString'])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Backfill the Gmail connection status of existing users")
+    parser.add_argument('--region', default='eu-west-1')
+    parser.add_argument('--users-table', default='Users')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    users_table = boto3.resource('dynamodb', region_name=args.region).Table(args.users_table)
+    secrets_manager = boto3.client('secretsmanager', region_name=args.region)
+
+    connected, not_connected, skipped = 0, 0, 0
+    scan_kwargs = {
+        'ProjectionExpression': 'UserID, Email, GmailConnected'
+    }
+    while True:
+        response = users_table.scan(**scan_kwargs)
+        for user in response['Items']:
+            if 'Email' not in user or 'GmailConnected' in user:
+                # guard items, and users whose status is already maintained
+                continue
+
+            secret = get_gmail_secret(secrets_manager, user['UserID'])
+            if secret is None:
+                update_expression = 'SET GmailConnected = :connected'
+                values = {':connected': False}
+            else:
+                update_expression = 'SET GmailConnected = :connected, GmailLastRefreshed = :last_refreshed'
+                values = {
+                    ':connected': True,
+                    ':last_refreshed': secret.get('created_at', '')
+                }
+                if secret.get('google_email'):
+                    update_expression += ', GoogleEmail = :google_email'
+                    values[':google_email'] = secret['google_email']
+                if secret.get('expires_at'):
+                    update_expression += ', GmailTokenExpiresAt = :expires_at'
+                    values[':expires_at'] = secret['expires_at']
+
+            try:
+                users_table.update_item(
+                    Key={'UserID': user['UserID']},
+                    UpdateExpression=update_expression,
+                    # gmail_store_tokens may have written a fresher status since the scan
+                    ConditionExpression='attribute_exists(UserID) AND attribute_not_exists(GmailConnected)',
+                    ExpressionAttributeValues=values
+                )
+            except ClientError as e:
+                if e.response['Error']['Code'] != 'ConditionalCheckFailedException':
+                    raise
+                skipped += 1
+                continue
+
+            if secret is None:
+                not_connected += 1
+            else:
+                connected += 1
+
+        if 'LastEvaluatedKey' not in response:
+            break
+        scan_kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+    logging.info(f"Marked {connected} users as connected and {not_connected} as not connected, skipped {skipped}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,50 @@
+"""
+One-time backfill of the RentalInvoiceAggregates table from the invoices already stored in the RentalInvoices table.
+New invoices are aggregated by the process_invoice_stream lambda function, so this only needs to be run once after
+the aggregates table has been created. Running it again is safe, since every invoice's contribution is overwritten.
+
+Usage:
+    python scripts/backfill_invoice_aggregates.py --region eu-west-1
+"""
+import os
+import sys
+import logging
+import argparse
+from collections import defaultdict
+
+import boto3
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'lambda_layers', 'common', 'python'))
+
+from utils.dynamodb_utils import update_invoice_aggregates  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Backfill the per-user invoice aggregates")
+    parser.add_argument('--region', default='eu-west-1')
+    parser.add_argument('--invoices-table', default='RentalInvoices')
+    parser.add_argument('--aggregates-table', default='RentalInvoiceAggregates')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    dynamodb = boto3.resource('dynamodb', region_name=args.region)
+    invoices_table = dynamodb.Table(args.invoices_table)
+    aggregates_table = dynamodb.Table(args.aggregates_table)
+
+    invoices_per_user = defaultdict(dict)
+    scan_kwargs = {}
+    while True:
+        response = invoices_table.scan(**scan_kwargs)
+        for invoice in response['Items']:
+            invoices_per_user[invoice['UserID']][invoice['InvoiceID']] = invoice
+        if 'LastEvaluatedKey' not in response:
+            break
+        scan_kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+    for user_id, invoices in invoices_per_user.items():
+        update_invoice_aggregates(aggregates_table, user_id=user_id, changes=invoices)
+    logging.info(f"Backfilled invoice aggregates for {len(invoices_per_user)} users")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,66 @@
+"""
+One-time backfill of the due_date_key attribute of the RentalInvoices table, for invoices that were stored before
+create_invoice_in_dynamodb started writing it. The attribute is the sort key of the index that get_rental_invoices
+pages through, so invoices without it are missing from that endpoint. Running it again is safe, since invoices that
+already have the attribute are skipped.
+
+Usage:
+    python scripts/backfill_invoice_due_date_keys.py --region eu-west-1
+"""
+import os
+import sys
+import logging
+import argparse
+
+import boto3
+from botocore.exceptions import ClientError
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'lambda_layers', 'common', 'python'))
+
+from utils.utility_functions import get_due_date_sort_key  # noqa: E402
+from utils.dynamodb_utils import DUE_DATE_KEY  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Backfill the due date keys of existing invoices")
+    parser.add_argument('--region', default='eu-west-1')
+    parser.add_argument('--invoices-table', default='RentalInvoices')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    invoices_table = boto3.resource('dynamodb', region_name=args.region).Table(args.invoices_table)
+
+    updated, skipped = 0, 0
+    scan_kwargs = {
+        'ProjectionExpression': 'UserID, InvoiceID, #due_date, due_date_year, due_date_month, #due_date_key',
+        'ExpressionAttributeNames': {'#due_date': 'Due Date', '#due_date_key': DUE_DATE_KEY}
+    }
+    while True:
+        response = invoices_table.scan(**scan_kwargs)
+        for invoice in response['Items']:
+            if DUE_DATE_KEY in invoice:
+                skipped += 1
+                continue
+            try:
+                invoices_table.update_item(
+                    Key={'UserID': invoice['UserID'], 'InvoiceID': invoice['InvoiceID']},
+                    UpdateExpression='SET #due_date_key = :due_date_key',
+                    # an invoice deleted since the scan must not be recreated
+                    ConditionExpression='attribute_exists(UserID)',
+                    ExpressionAttributeNames={'#due_date_key': DUE_DATE_KEY},
+                    ExpressionAttributeValues={':due_date_key': get_due_date_sort_key(invoice)}
+                )
+                updated += 1
+            except ClientError as e:
+                if e.response['Error']['Code'] != 'ConditionalCheckFailedException':
+                    raise
+                logging.warning(f"Invoice '{invoice['InvoiceID']}' of user '{invoice['UserID']}' was deleted, skipping")
+        if 'LastEvaluatedKey' not in response:
+            break
+        scan_kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+    logging.info(f"Set the due date key of {updated} invoices, skipped {skipped}")
+
+
+if __name__ == '__main__':
+    main()
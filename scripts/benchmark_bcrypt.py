@@ -0,0 +1,61 @@
+"""
+Measures bcrypt hash and verify latency across cost factors, and recommends the highest cost factor that meets a
+target login latency for each Lambda memory size.
+
+Lambda allocates CPU in proportion to memory, with one full vCPU at 1769 MB. bcrypt is single-threaded and CPU bound,
+so the latency on this machine is scaled by 1769 / memory for smaller functions. For exact numbers, run this script
+inside a Lambda (or a container limited to the same CPU share) of the memory size in question.
+
+Usage:
+    python scripts/benchmark_bcrypt.py --rounds 8 14 --samples 5 --target-ms 300
+"""
+import time
+import argparse
+import statistics
+
+import bcrypt
+
+FULL_VCPU_MEMORY_MB = 1769
+MEMORY_SIZES_MB = [128, 256, 512, 1024, 1769]
+
+
+def measure(rounds: int, samples: int):
+    password = b"correct horse battery staple"
+    hash_timings, verify_timings = [], []
+    for _ in range(samples):
+        start = time.perf_counter()
+        hashed_password = bcrypt.hashpw(password, bcrypt.gensalt(rounds=rounds))
+        hash_timings.append((time.perf_counter() - start) * 1000)
+
+        start = time.perf_counter()
+        bcrypt.checkpw(password, hashed_password)
+        verify_timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(hash_timings), statistics.median(verify_timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark bcrypt cost factors")
+    parser.add_argument('--rounds', type=int, nargs=2, default=[8, 14], metavar=('MIN', 'MAX'))
+    parser.add_argument('--samples', type=int, default=5)
+    parser.add_argument('--target-ms', type=float, default=300, help="Target verify latency for login")
+    args = parser.parse_args()
+
+    results = {}
+    print(f"{'rounds':>6} | {'hash (ms)':>10} | {'verify (ms)':>11} | " +
+          " | ".join(f"{f'verify @{memory}MB':>15}" for memory in MEMORY_SIZES_MB))
+    for rounds in range(args.rounds[0], args.rounds[1] + 1):
+        hash_ms, verify_ms = measure(rounds, args.samples)
+        results[rounds] = verify_ms
+        scaled = [verify_ms * FULL_VCPU_MEMORY_MB / memory for memory in MEMORY_SIZES_MB]
+        print(f"{rounds:>6} | {hash_ms:>10.1f} | {verify_ms:>11.1f} | " +
+              " | ".join(f"{value:>15.1f}" for value in scaled))
+
+    print(f"\nHighest cost factor with a verify latency under {args.target_ms:.0f} ms:")
+    for memory in MEMORY_SIZES_MB:
+        eligible = [rounds for rounds, verify_ms in results.items()
+                    if verify_ms * FULL_VCPU_MEMORY_MB / memory <= args.target_ms]
+        print(f"  {memory:>5} MB: {max(eligible) if eligible else 'none in the measured range'}")
+
+
+if __name__ == '__main__':
+    main()
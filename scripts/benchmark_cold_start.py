@@ -0,0 +1,109 @@
+"""
+Measures the import (init) time of each lambda function, the part of a cold start that the code controls. Every run
+imports the handler module in a fresh Python process with the common layer on the path, like the Lambda runtime does
+during INIT, and the median over all runs is reported.
+
+AWS calls are not made at import time, so no credentials are needed; dummy values are set for the environment
+variables the functions read. Functions whose dependencies are not installed locally are reported as such.
+
+Usage:
+    python scripts/benchmark_cold_start.py --runs 10
+    python scripts/benchmark_cold_start.py --runs 10 --only login_user signup_user
+"""
+import os
+import sys
+import json
+import argparse
+import statistics
+import subprocess
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+LAYER_PATH = os.path.join(REPO_ROOT, 'lambda_layers', 'common', 'python')
+HANDLER_FILES = ('main.py', 'lambda_function.py', os.path.join('src', 'lambda_function.py'))
+
+DUMMY_ENVIRONMENT = {
+    'AWS_DEFAULT_REGION': 'eu-west-1',
+    'AWS_ACCESS_KEY_ID': 'benchmark',
+    'AWS_SECRET_ACCESS_KEY': 'benchmark',
+    'REGION': 'eu-west-1',
+    'JWT_SECRET': 'benchmark',
+    'USERS_TABLE': 'Users',
+    'INVOICES_TABLE': 'Invoices',
+    'AGGREGATES_TABLE': 'InvoiceAggregates',
+    'DYNAMODB_TABLE': 'Invoices',
+    'S3_BUCKET': 'benchmark-bucket',
+    'BUCKET_NAME': 'benchmark-bucket',
+    'EMAIL_SENDER': 'benchmark@example.com',
+    'EMAIL_SUBJECT': 'benchmark',
+    'SNS_TOPIC_ARN': 'arn:aws:sns:eu-west-1:000000000000:benchmark',
+    'GOOGLE_OAUTH_CLIENT_ID': 'benchmark',
+}
+
+# runs in the child process, and prints the import time of the handler module in ms
+IMPORT_SNIPPET = """
+import sys, time, importlib.util
+start = time.perf_counter()
+spec = importlib.util.spec_from_file_location('handler_module', sys.argv[1])
+module = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(module)
+print((time.perf_counter() - start) * 1000)
+"""
+
+
+def find_lambdas():
+    lambdas_path = os.path.join(REPO_ROOT, 'lambdas')
+    for group in sorted(os.listdir(lambdas_path)):
+        for name in sorted(os.listdir(os.path.join(lambdas_path, group))):
+            for handler_file in HANDLER_FILES:
+                path = os.path.join(lambdas_path, group, name, handler_file)
+                if os.path.isfile(path):
+                    yield name, path
+                    break
+
+
+def measure(handler_path: str, runs: int):
+    environment = {
+        **os.environ,
+        **DUMMY_ENVIRONMENT,
+        'PYTHONPATH': os.pathsep.join([LAYER_PATH, os.path.dirname(handler_path)]),
+        'PYTHONDONTWRITEBYTECODE': '0'
+    }
+    timings = []
+    for _ in range(runs):
+        result = subprocess.run(
+            [sys.executable, '-c', IMPORT_SNIPPET, handler_path],
+            env=environment, capture_output=True, text=True
+        )
+        if result.returncode != 0:
+            error = result.stderr.strip().splitlines()
+            return None, error[-1] if error else f"exit code {result.returncode}"
+        timings.append(float(result.stdout.strip().splitlines()[-1]))
+    return statistics.median(timings), None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the import time of the lambda functions")
+    parser.add_argument('--runs', type=int, default=10)
+    parser.add_argument('--only', nargs='*', help="Names of the lambda functions to measure")
+    parser.add_argument('--json', action='store_true', help="Print the results as JSON")
+    args = parser.parse_args()
+
+    results = {}
+    for name, path in find_lambdas():
+        if args.only and name not in args.only:
+            continue
+        median_ms, error = measure(path, args.runs)
+        results[name] = {'median_ms': median_ms, 'error': error}
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    print(f"{'function':<28} | {'import (ms)':>11}")
+    for name, result in results.items():
+        value = f"{result['median_ms']:>11.1f}" if result['error'] is None else f"skipped: {result['error']}"
+        print(f"{name:<28} | {value}")
+
+
+if __name__ == '__main__':
+    main()
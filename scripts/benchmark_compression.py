@@ -0,0 +1,72 @@
+"""
+Measures the CPU cost of compressing invoice list responses against the bytes it saves, per encoding and level, and
+scales the latency to the Lambda memory sizes (see benchmark_bcrypt.py: Lambda allocates CPU in proportion to
+memory, with one full vCPU at 1769 MB). Bodies are the responses of get_rental_invoices as json_utils serializes them.
+
+Usage:
+    python scripts/benchmark_compression.py --sizes 12 60 240 --repeat 5
+"""
+import os
+import sys
+import gzip
+import time
+import argparse
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'lambda_layers', 'common', 'python'))
+
+from utils import json_utils  # noqa: E402
+from benchmark_json import make_response  # noqa: E402
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+FULL_VCPU_MEMORY_MB = 1769
+MEMORY_SIZES_MB = [128, 256, 512, 1024]
+
+
+def get_encoders():
+    encoders = {f"gzip-{level}": (lambda body, level=level: gzip.compress(body, compresslevel=level, mtime=0))
+                for level in (1, 5, 6, 9)}
+    if brotli is not None:
+        encoders.update({f"br-{quality}": (lambda body, quality=quality: brotli.compress(body, quality=quality))
+                         for quality in (1, 4, 6, 11)})
+    return encoders
+
+
+def measure(encode, body: bytes, repeat: int):
+    best, output = None, None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        output = encode(body)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best * 1000, len(output)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark response compression of invoice lists")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[12, 60, 240],
+                        help="Number of invoices per response (one per month)")
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"{'invoices':>8} | {'encoding':<8} | {'bytes':>9} | {'saved':>6} | {'ms (local)':>10} | " +
+          " | ".join(f"{f'ms @{memory}MB':>11}" for memory in MEMORY_SIZES_MB))
+    for size in args.sizes:
+        body = json_utils.dumps(json_utils.convert_dynamodb_item(make_response(size))).encode('utf-8')
+        print(f"{size:>8} | {'none':<8} | {len(body):>9} | {'':>6} | {'':>10} |")
+        for name, encode in get_encoders().items():
+            elapsed_ms, compressed_bytes = measure(encode, body, args.repeat)
+            saved = 1 - compressed_bytes / len(body)
+            scaled = [elapsed_ms * FULL_VCPU_MEMORY_MB / memory for memory in MEMORY_SIZES_MB]
+            print(f"{size:>8} | {name:<8} | {compressed_bytes:>9} | {saved:>6.1%} | {elapsed_ms:>10.2f} | " +
+                  " | ".join(f"{value:>11.1f}" for value in scaled))
+
+    if brotli is None:
+        print("\nbrotli is not installed, so its encodings were skipped")
+
+
+if __name__ == '__main__':
+    main()
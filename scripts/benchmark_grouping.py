@@ -0,0 +1,111 @@
+"""
+Compares the time utility_functions.postprocess_invoices takes to group a user's invoices by year with the grouping
+it replaced:
+    legacy:      a defaultdict of lists with list.insert(0, ...) per invoice, quadratic in the size of a year, and
+                 relying on the order DynamoDB returns the invoices in (by InvoiceID) instead of sorting them
+    desc, asc:   postprocess_invoices, which groups in one pass and sorts every year by due date
+    desc, 12:    postprocess_invoices keeping only the latest 12 invoices of every year
+
+Every case is a number of invoices spread over a number of years, so that both many small and a few large groups
+are covered. The invoices are synthetic, in the InvoiceID order of a DynamoDB query, which is not their due date
+order. The sorted column tells whether every year came out ordered by due date.
+
+Usage:
+    python scripts/benchmark_grouping.py --cases 10000:36 50000:36 50000:2 200000:1 --repeat 3
+"""
+import os
+import sys
+import time
+import random
+import argparse
+from collections import defaultdict
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'lambda_layers', 'common', 'python'))
+
+from utils.utility_functions import postprocess_invoices, get_due_date_sort_key  # noqa: E402
+
+
+def legacy_postprocess_invoices(invoices):
+    invoices_grouped_by_year = defaultdict(lambda: [])
+    for invoice in invoices:
+        invoice_year = invoice['due_date_year']
+        # sort the invoices per year in descending order
+        invoices_grouped_by_year[invoice_year].insert(0, invoice)
+
+    return invoices_grouped_by_year
+
+
+def make_invoices(count: int, years: int, seed: int = 42) -> list:
+    generator = random.Random(seed)
+    invoices = []
+    for index in range(count):
+        year = 2024 - index % years
+        month = generator.randint(1, 12)
+        day = generator.randint(1, 28)
+        ocr = generator.randrange(10 ** 9, 10 ** 10)
+        invoices.append({
+            'UserID': 'b2c1d3e4-5f60-4718-9a2b-3c4d5e6f7081',
+            'InvoiceID': f"Invoice_{ocr}",
+            'due_date_year': str(year),
+            'due_date_month': str(month),
+            'Due Date': f"{day:02d}-{month:02d}-{year}",
+            'Total Amount': 8562 + index % 390,
+        })
+    # the sort key of the RentalInvoices table
+    invoices.sort(key=lambda invoice: invoice['InvoiceID'])
+    return invoices
+
+
+def is_sorted(groups, descending: bool) -> bool:
+    for year_invoices in groups.values():
+        keys = [get_due_date_sort_key(invoice) for invoice in year_invoices]
+        if keys != sorted(keys, reverse=descending):
+            return False
+    return True
+
+
+def measure(group, repeat: int):
+    best, groups = None, None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        groups = group()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best * 1000, groups
+
+
+def parse_case(value: str):
+    count, _, years = value.partition(':')
+    try:
+        return int(count), int(years or 1)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected INVOICES:YEARS, got '{value}'")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the grouping of invoices by year")
+    parser.add_argument('--cases', type=parse_case, nargs='+',
+                        default=[(10000, 36), (50000, 36), (50000, 2), (200000, 1)],
+                        help="INVOICES:YEARS pairs")
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    print(f"{'invoices':>8} | {'years':>5} | {'grouping':<8} | {'time (ms)':>9} | {'sorted':>6}")
+    for count, years in args.cases:
+        invoices = make_invoices(count, years)
+        groupings = {
+            'legacy': (lambda: legacy_postprocess_invoices(invoices), True),
+            'desc': (lambda: postprocess_invoices(invoices), True),
+            'asc': (lambda: postprocess_invoices(invoices, descending=False), False),
+            'desc, 12': (lambda: postprocess_invoices(invoices, limit_per_group=12), True),
+        }
+        for name, (group, descending) in groupings.items():
+            elapsed_ms, groups = measure(group, args.repeat)
+            if name != 'desc, 12' and sum(len(year_invoices) for year_invoices in groups.values()) != count:
+                raise AssertionError(f"{name} lost invoices")
+            sorted_by_due_date = 'yes' if is_sorted(groups, descending) else 'no'
+            print(f"{count:>8} | {years:>5} | {name:<8} | {elapsed_ms:>9.1f} | {sorted_by_due_date:>6}")
+
+
+if __name__ == '__main__':
+    main()
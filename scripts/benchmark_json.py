@@ -0,0 +1,114 @@
+"""
+Compares the serialization time and output size of invoice list responses across JSON engines:
+    legacy:         json.dumps with a default hook per Decimal, as responses.py did before json_utils
+    json:           json_utils.dumps with the standard library backend
+    orjson:         json_utils.dumps with the orjson backend (skipped if orjson is not installed)
+    json (cached):  the standard library backend on items converted once by convert_dynamodb_item, which is how the
+                    invoice read functions serve cache hits
+    orjson (cached): the same with the orjson backend
+
+The invoices are synthetic, shaped like the items parse_invoice writes, with every number a Decimal like boto3
+returns them.
+
+Usage:
+    python scripts/benchmark_json.py --sizes 100 1000 10000 --repeat 7
+"""
+import os
+import sys
+import json
+import time
+import argparse
+from decimal import Decimal
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'lambda_layers', 'common', 'python'))
+
+from utils import json_utils  # noqa: E402
+
+
+def legacy_convert_decimal_to_int(obj):
+    if isinstance(obj, Decimal):
+        return float(obj) if obj % 1 else int(obj)
+    raise TypeError(f"Object of type '{type(obj).__name__}' for 'obj' is not JSON serializable.")
+
+
+def make_invoice(index: int) -> dict:
+    year = 2020 + index % 5
+    month = index % 12 + 1
+    return {
+        'UserID': 'b2c1d3e4-5f60-4718-9a2b-3c4d5e6f7081',
+        'InvoiceID': f"Invoice_{1306798107 + index}",
+        'due_date_year': str(year),
+        'due_date_month': str(month),
+        'Due Date': f"28-{month:02d}-{year}",
+        'Invoice Number': str(1306798107 + index),
+        'OCR': Decimal(1306798107 + index),
+        'Hyra': Decimal(8000 + index % 300),
+        'El': Decimal(250 + index % 90),
+        'Kallvatten': Decimal(120),
+        'Varmvatten': Decimal(80),
+        'Mervärdesskatt 25%': Decimal('112.5'),
+        'Retroaktiv hyra avser 2402': Decimal(0),
+        'Total Amount': Decimal(8562 + index % 390),
+        'Adress': 'Sveavägen 1, 113 50 Stockholm',
+    }
+
+
+def make_response(size: int) -> dict:
+    invoices = {}
+    for index in range(size):
+        invoice = make_invoice(index)
+        invoices.setdefault(invoice['due_date_year'], []).append(invoice)
+    return {'message': "Rental invoices retrieved successfully!", 'code': 200,
+            'data': {'invoiceCount': size, 'invoices': invoices, 'nextToken': None}}
+
+
+def measure(serialize, repeat: int):
+    best, output = None, None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        output = serialize()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best * 1000, len(output.encode('utf-8'))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark JSON serialization of invoice lists")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[100, 1000, 10000])
+    parser.add_argument('--repeat', type=int, default=7)
+    args = parser.parse_args()
+
+    orjson = json_utils.orjson
+    print(f"{'invoices':>8} | {'engine':<16} | {'time (ms)':>9} | {'bytes':>9}")
+    for size in args.sizes:
+        response = make_response(size)
+        cached_response = json_utils.convert_dynamodb_item(response)
+        expected = json.loads(json.dumps(response, default=legacy_convert_decimal_to_int))
+
+        engines = {
+            'legacy': lambda: json.dumps(response, default=legacy_convert_decimal_to_int),
+        }
+        json_utils.orjson = None
+        engines['json'] = lambda: json_utils.dumps(response)
+        engines['json (cached)'] = lambda: json_utils.dumps(cached_response)
+        if orjson is not None:
+            engines['orjson'] = lambda: orjson.dumps(response, default=json_utils.convert_decimal).decode('utf-8')
+            engines['orjson (cached)'] = lambda: orjson.dumps(cached_response).decode('utf-8')
+
+        for engine, serialize in engines.items():
+            if json.loads(serialize()) != expected:
+                raise AssertionError(f"{engine} produced different output")
+            elapsed_ms, size_bytes = measure(serialize, args.repeat)
+            print(f"{size:>8} | {engine:<16} | {elapsed_ms:>9.1f} | {size_bytes:>9}")
+        # paid once per cache fill by the invoice read functions
+        start = time.perf_counter()
+        json_utils.convert_dynamodb_item(response)
+        print(f"{size:>8} | {'convert once':<16} | {(time.perf_counter() - start) * 1000:>9.1f} |")
+        json_utils.orjson = orjson
+
+    if orjson is None:
+        print("\norjson is not installed, so its engines were skipped")
+
+
+if __name__ == '__main__':
+    main()
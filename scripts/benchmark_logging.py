@@ -0,0 +1,174 @@
+"""
+Measures what logging adds to an invocation of a function behind API Gateway, and how many bytes of logs it writes,
+which CloudWatch bills for ingestion. The handler is wrapped in api_handler and logs like fetch_invoices and
+parse_invoice: the received event (with OAuth tokens in its body), the text extracted from an invoice and the parsed
+fields, plus a few short messages. It runs with each of these logging styles:
+    none:   no logging in the handler, only the line api_handler logs per invocation
+    eager:  how the functions logged before logging_utils: f-strings with json.dumps(event) and the full invoice text
+            at INFO, which are formatted even when the level drops the record
+    lazy:   log_payload for the payloads and %-style arguments for the short messages
+
+at the levels WARNING, INFO and DEBUG. At INFO, lazy logs the payloads of PAYLOAD_LOG_SAMPLE_RATE of the invocations,
+so it runs with the default rate and with every invocation sampled. The records are formatted like the Lambda
+runtime's text format and written to a stream that only counts them.
+
+Usage:
+    python scripts/benchmark_logging.py --invocations 2000
+"""
+import os
+import sys
+import json
+import time
+import logging
+import argparse
+import contextlib
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'lambda_layers', 'common', 'python'))
+
+from utils import logging_utils  # noqa: E402
+from utils.logging_utils import log_payload  # noqa: E402
+from utils.handler_utils import api_handler  # noqa: E402
+from utils.responses import success_response  # noqa: E402
+
+
+class CountingStream:
+    def __init__(self):
+        self.bytes_written = 0
+
+    def write(self, text: str):
+        self.bytes_written += len(text.encode('utf-8'))
+
+    def flush(self):
+        pass
+
+
+def make_event() -> dict:
+    body = {
+        'access_token': 'ya29.' + 'a' * 200,
+        'refresh_token': '1//' + 'r' * 100,
+        'expires_in': 3599,
+        'scope': ['https://www.googleapis.com/auth/gmail.readonly'],
+        'email': 'tenant@example.com',
+    }
+    return {
+        'version': '2.0',
+        'routeKey': 'POST /v1/invoices/{type}/ingest',
+        'rawPath': '/v1/invoices/rental/ingest',
+        'headers': {
+            'authorization': 'Bearer ' + 'j' * 180,
+            'accept-encoding': 'gzip, deflate, br',
+            'content-type': 'application/json',
+            'user-agent': 'PayPulse/1.4 CFNetwork/1494.0.7 Darwin/23.4.0',
+            'x-amzn-trace-id': 'Root=1-67891233-abcdef012345678912345678',
+            'x-forwarded-for': '203.0.113.10',
+        },
+        'requestContext': {
+            'accountId': '123456789012',
+            'apiId': 'a1b2c3d4e5',
+            'authorizer': {'lambda': {'user_id': 'b2c1d3e4-5f60-4718-9a2b-3c4d5e6f7081'}},
+            'http': {'method': 'POST', 'path': '/v1/invoices/rental/ingest', 'sourceIp': '203.0.113.10'},
+            'requestId': 'JKJaXmPLvHcESHA=',
+            'stage': '$default',
+            'timeEpoch': 1700000000000,
+        },
+        'pathParameters': {'type': 'rental'},
+        'body': json.dumps(body),
+        'isBase64Encoded': False,
+    }
+
+
+INVOICE_TEXT = '\n'.join(
+    ['Hyresavi', '', 'Hyresvärd AB', 'Box 123, 113 50 Stockholm', '', 'Hyra', 'Kallvatten', 'Varmvatten',
+     'El enligt mätare', '8 450', '120', '80', '312', '', 'Moms: 78', '', 'Förfallodatum: 2024-05-31', '',
+     'Totalt att betala:', '', '9 040', '', '1306798107 #', ''] +
+    [f"Meddelande rad {line}: Betalning ska vara oss tillhanda senast på förfallodagen." for line in range(20)]
+)
+PARSED_DATA = {
+    'OCR': '1306798107', 'Due Date': '31-05-2024', 'due_date_month': '5', 'due_date_year': '2024',
+    'Total Amount': 9040, 'Hyra': 8450, 'Kallvatten': 120, 'Varmvatten': 80, 'El': 312, 'Moms': 78,
+    'Filename': 'Hyresavi_1306798107',
+}
+
+
+@api_handler()
+def handler_none(event, context):
+    return success_response(message="Invoices ingested", data={'invoices': 1})
+
+
+@api_handler()
+def handler_eager(event, context):
+    logging.info(f"Received this event: {json.dumps(event)}")
+    user_id = event['requestContext']['authorizer']['lambda']['user_id']
+    logging.info(f"Processing invoices of user {user_id}")
+    filename = '/tmp/Hyresavi_1306798107.pdf'
+    logging.info(f"Text extracted from {filename}: \n\n{INVOICE_TEXT}")
+    logging.info(f"\tParsed data: {PARSED_DATA}")
+    logging.info(f"\tInvoice ID: Invoice_{PARSED_DATA['OCR']}")
+    return success_response(message="Invoices ingested", data={'invoices': 1})
+
+
+@api_handler()
+def handler_lazy(event, context):
+    log_payload("Received this event", event)
+    user_id = event['requestContext']['authorizer']['lambda']['user_id']
+    logging.info("Processing invoices of user %s", user_id)
+    filename = '/tmp/Hyresavi_1306798107.pdf'
+    log_payload("Text extracted from %s", INVOICE_TEXT, filename)
+    log_payload("\tParsed data", PARSED_DATA)
+    logging.info("\tInvoice ID: Invoice_%s", PARSED_DATA['OCR'])
+    return success_response(message="Invoices ingested", data={'invoices': 1})
+
+
+HANDLERS = {'none': handler_none, 'eager': handler_eager, 'lazy': handler_lazy}
+
+
+def measure(handler, level: int, sample_rate: float, invocations: int, stream: CountingStream):
+    logging.getLogger().setLevel(level)
+    logging_utils.PAYLOAD_LOG_SAMPLE_RATE = sample_rate
+    event = make_event()
+    for _ in range(min(100, invocations)):
+        handler(event, None)
+    stream.bytes_written = 0
+    start = time.perf_counter()
+    for _ in range(invocations):
+        handler(event, None)
+    elapsed = time.perf_counter() - start
+    return elapsed / invocations * 1e6, stream.bytes_written / invocations
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the logging overhead of a handler invocation")
+    parser.add_argument('--invocations', type=int, default=2000)
+    args = parser.parse_args()
+
+    stream = CountingStream()
+    handler = logging.StreamHandler(stream)
+    handler.setFormatter(logging.Formatter('[%(levelname)s]\t%(asctime)s\t%(message)s'))
+    logging.getLogger().addHandler(handler)
+    default_sample_rate = logging_utils.PAYLOAD_LOG_SAMPLE_RATE
+
+    runs = []
+    for level in (logging.WARNING, logging.INFO, logging.DEBUG):
+        for style in HANDLERS:
+            runs.append((style, level, default_sample_rate))
+        if level == logging.INFO:
+            runs.append(('lazy', level, 1.0))
+
+    results = {}
+    # api_handler writes the (empty) stage metrics to stdout
+    with contextlib.redirect_stdout(CountingStream()):
+        for style, level, sample_rate in runs:
+            results[(style, level, sample_rate)] = measure(HANDLERS[style], level, sample_rate, args.invocations,
+                                                           stream)
+
+    print(f"{'level':<8} | {'style':<5} | {'sampled':>7} | {'µs/invocation':>13} | {'overhead µs':>11} | "
+          f"{'log bytes/invocation':>20}")
+    for (style, level, sample_rate), (microseconds, log_bytes) in results.items():
+        baseline = results[('none', level, default_sample_rate)][0]
+        sampled = f"{sample_rate:.0%}" if style == 'lazy' and level == logging.INFO else '-'
+        print(f"{logging.getLevelName(level):<8} | {style:<5} | {sampled:>7} | {microseconds:>13.1f} | "
+              f"{microseconds - baseline:>11.1f} | {log_bytes:>20.0f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,884 @@
+"""
+Load-tests the lambda functions locally and offline: every function runs in this process against in-process stand-ins
+for AWS (scripts/load_test_aws.py) and for the Gmail and Google OAuth endpoints (scripts/load_test_google.py). The
+script reports the throughput and the p50/p95/p99 latency of every API endpoint, the invocations of every function,
+and the AWS and Gmail calls they made, so that the effect of a change on all of them can be measured before it is
+deployed.
+
+What runs the way it does in AWS:
+- API Gateway: the routes of aws-infra-terraform/api_gateway.tf, payload format 2.0 events, the lambda authorizer
+  with its result cached per authorization header for AUTHORIZER_CACHE_TTL seconds, and compressed responses
+- the RentalInvoices stream: batches of up to 100 records for process_invoice_stream and send_invoice_notification,
+  with their batching windows shortened to --stream-window, and the retries of the records in batchItemFailures
+- the S3 notification of uploaded invoices to parse_invoice, asynchronous Lambda invocations (the deletion job) with
+  2 retries, and the refresh_oauth_tokens schedule, shortened to --refresh-interval
+
+The workload signs up --users users, connects their Gmail accounts (each with its own synthetic mailbox of --months
+monthly invoices) and ingests their invoices. It then runs a mix of the app's requests from --concurrency workers
+for --duration seconds, including logins and account deletions followed by new signups.
+
+The numbers are meant for comparing changes, not as the capacity of the deployed stack. All functions share this
+process and its GIL, like a single warm container serving every concurrent request, and the AWS latencies are the
+ones configured in load_test_aws.py. Functions whose dependencies are not installed locally are skipped, except for
+parse_invoice: without textract, its S3 notifications are handled by an emulation that stores the invoice fields the
+synthetic mailbox is known to contain. fetch_invoices and fetch_latest_invoice need the Google API client libraries.
+
+Usage:
+    python scripts/load_test.py
+    python scripts/load_test.py --users 100 --concurrency 20 --duration 120 --bcrypt-rounds 4
+    python scripts/load_test.py --json --max-error-rate 0.01
+"""
+import io
+import os
+import re
+import sys
+import json
+import gzip
+import time
+import uuid
+import base64
+import random
+import logging
+import argparse
+import threading
+import contextlib
+import importlib.util
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+from queue import Queue, Empty
+from urllib.parse import urlencode
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+LAYER_PATH = os.path.join(REPO_ROOT, 'lambda_layers', 'common', 'python')
+TERRAFORM_LAMBDAS_PATH = os.path.join(REPO_ROOT, 'aws-infra-terraform', 'lambdas')
+HANDLER_FILES = ('main.py', 'lambda_function.py', os.path.join('src', 'lambda_function.py'))
+
+sys.path.insert(0, LAYER_PATH)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from load_test_aws import (  # noqa: E402
+    FakeAws, FakeDynamoDB, FakeS3, FakeSecretsManager, FakeSNS, FakeLambda, TableSchema, DEFAULT_LATENCIES_MS
+)
+from load_test_google import FakeGoogleServer, access_token_for, refresh_token_for, synthetic_invoice  # noqa: E402
+
+API_VERSION = 'v1'
+USERS_TABLE = 'Users'
+INVOICES_TABLE = 'RentalInvoices'
+AGGREGATES_TABLE = 'InvoiceAggregates'
+BUCKET_NAME = 'paypulse-load-test'
+EMAIL_SENDER = 'avisering@hyresvard.example.com'
+EMAIL_SUBJECT = 'hyresavi'
+DELETION_JOB_FUNCTION = 'delete_user_job'
+
+ENVIRONMENT = {
+    'AWS_DEFAULT_REGION': 'eu-west-1',
+    'AWS_ACCESS_KEY_ID': 'load-test',
+    'AWS_SECRET_ACCESS_KEY': 'load-test',
+    'REGION': 'eu-west-1',
+    'JWT_SECRET': 'load-test-secret-of-at-least-32-bytes',
+    'USERS_TABLE': USERS_TABLE,
+    'INVOICES_TABLE': INVOICES_TABLE,
+    'DYNAMODB_TABLE': INVOICES_TABLE,
+    'AGGREGATES_TABLE': AGGREGATES_TABLE,
+    'BUCKET_NAME': BUCKET_NAME,
+    'S3_BUCKET': BUCKET_NAME,
+    'EMAIL_SENDER': EMAIL_SENDER,
+    'EMAIL_SUBJECT': EMAIL_SUBJECT,
+    'SNS_TOPIC_ARN': 'arn:aws:sns:eu-west-1:000000000000:paypulse-load-test',
+    'DELETION_JOB_FUNCTION': DELETION_JOB_FUNCTION,
+    'GOOGLE_OAUTH_CLIENT_ID': 'load-test.apps.googleusercontent.com',
+    # only the sampled summaries; the EMF documents are written either way
+    'METRICS_SUMMARY_SAMPLE_RATE': '0',
+}
+
+TABLE_SCHEMAS = {
+    USERS_TABLE: TableSchema('UserID', indexes={'Email-index': ('Email', None)}),
+    INVOICES_TABLE: TableSchema('UserID', 'InvoiceID', indexes={
+        'due_date_year-due_date_month-index': ('due_date_year', 'due_date_month'),
+        'UserID-due_date_key-index': ('UserID', 'due_date_key'),
+    }, stream=True),
+    AGGREGATES_TABLE: TableSchema('UserID', 'Period'),
+}
+
+# (route, function, authorized), from aws-infra-terraform/api_gateway.tf
+ROUTES = [
+    ('POST /v1/auth/signup', 'signup_user', False),
+    ('POST /v1/auth/login', 'login_user', False),
+    ('POST /v1/auth/gmail/store-tokens', 'gmail_store_tokens', True),
+    ('POST /v1/invoices/{type}/ingest', 'fetch_invoices', True),
+    ('POST /v1/invoices/{type}/ingest/latest', 'fetch_latest_invoice', True),
+    ('GET /v1/invoices/{type}', 'get_rental_invoices', True),
+    ('GET /v1/invoices/{type}/aggregates', 'get_invoice_aggregates', True),
+    ('GET /v1/invoices/{type}/{invoice_id}', 'get_rental_invoice', True),
+    ('GET /v1/invoices/{type}/{invoice_id}/pdf', 'get_invoice_pdf_url', True),
+    ('GET /v1/user/me', 'get_user_profile', True),
+    ('GET /v1/user/me/deletion', 'get_deletion_status', True),
+    ('DELETE /v1/user/me', 'delete_user', True),
+]
+AUTHORIZER_CACHE_TTL = 300
+
+# consumers of the RentalInvoices stream and their batch sizes, from aws-infra-terraform/eventbridge.tf
+STREAM_CONSUMERS = {'process_invoice_stream': 100, 'send_invoice_notification': 100}
+STREAM_MAX_RETRIES = 5
+ASYNC_INVOKE_RETRIES = 2
+S3_NOTIFICATION_PREFIX = 'rental-invoices/'
+# the functions that only import the Google client libraries once they call Gmail, so that importing their handler
+# doesn't show whether they can run
+LAZY_DEPENDENCIES = {
+    'fetch_invoices': ('googleapiclient', 'google.oauth2', 'google.auth'),
+    'fetch_latest_invoice': ('googleapiclient', 'google.oauth2', 'google.auth'),
+    'refresh_oauth_tokens': ('google.oauth2', 'google.auth'),
+}
+
+# relative weights of the requests of the mixed phase, and the functions they need
+WORKLOAD_MIX = {
+    'list_invoices': (30, 'get_rental_invoices'),
+    'revalidate_invoices': (20, 'get_rental_invoices'),
+    'get_invoice': (15, 'get_rental_invoice'),
+    'get_aggregates': (10, 'get_invoice_aggregates'),
+    'get_pdf_url': (5, 'get_invoice_pdf_url'),
+    'get_profile': (8, 'get_user_profile'),
+    'ingest_latest': (5, 'fetch_latest_invoice'),
+    'login': (5, 'login_user'),
+    'delete_account': (2, 'delete_user'),
+}
+
+
+def find_lambdas():
+    lambdas_path = os.path.join(REPO_ROOT, 'lambdas')
+    for group in sorted(os.listdir(lambdas_path)):
+        for name in sorted(os.listdir(os.path.join(lambdas_path, group))):
+            for handler_file in HANDLER_FILES:
+                path = os.path.join(lambdas_path, group, name, handler_file)
+                if os.path.isfile(path):
+                    yield name, path
+                    break
+
+
+def read_timeouts():
+    """
+    Returns the timeout in seconds of every function, from its Terraform file
+    """
+    timeouts = {}
+    for filename in os.listdir(TERRAFORM_LAMBDAS_PATH):
+        match = re.fullmatch(r'lambda_(\w+)\.tf', filename)
+        if not match:
+            continue
+        with open(os.path.join(TERRAFORM_LAMBDAS_PATH, filename)) as f:
+            timeout = re.search(r'^\s*timeout\s*=\s*(\d+)', f.read(), re.MULTILINE)
+        if timeout:
+            timeouts[match.group(1)] = int(timeout.group(1))
+    return timeouts
+
+
+def load_handler(name: str, path: str):
+    """
+    Imports the handler module of a function under a name of its own, with its directory on the path like in its
+    deployment package. Returns the lambda_handler, or the reason it could not be imported.
+    """
+    for dependency in LAZY_DEPENDENCIES.get(name, ()):
+        try:
+            found = importlib.util.find_spec(dependency) is not None
+        except ModuleNotFoundError:
+            found = False
+        if not found:
+            return None, f"ModuleNotFoundError: No module named '{dependency}'"
+
+    handler_directory = os.path.dirname(path)
+    sys.path.insert(0, handler_directory)
+    try:
+        spec = importlib.util.spec_from_file_location(f"load_test_{name}", path)
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+        return module.lambda_handler, None
+    except Exception as e:
+        return None, f"{type(e).__name__}: {e}"
+    finally:
+        sys.path.remove(handler_directory)
+
+
+def percentile(sorted_values, fraction: float) -> float:
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))]
+
+
+class LatencyStats:
+    """
+    Latencies and outcomes per key (an endpoint or a function), from many threads
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = {}
+
+    def record(self, key: str, duration_ms: float, outcome: str):
+        with self._lock:
+            entry = self._entries.setdefault(key, {'durations': [], 'outcomes': {}})
+            entry['durations'].append(duration_ms)
+            entry['outcomes'][outcome] = entry['outcomes'].get(outcome, 0) + 1
+
+    def reset(self):
+        with self._lock:
+            self._entries = {}
+
+    def summary(self, elapsed_seconds: float):
+        with self._lock:
+            entries = {key: (sorted(entry['durations']), dict(entry['outcomes'])) for key, entry in self._entries.items()}
+        return {
+            key: {
+                'count': len(durations),
+                'outcomes': outcomes,
+                'throughput': len(durations) / elapsed_seconds if elapsed_seconds else 0.0,
+                'p50_ms': percentile(durations, 0.50),
+                'p95_ms': percentile(durations, 0.95),
+                'p99_ms': percentile(durations, 0.99),
+                'max_ms': durations[-1] if durations else 0.0,
+            }
+            for key, (durations, outcomes) in sorted(entries.items())
+        }
+
+
+class LambdaContext:
+    def __init__(self, function_name: str, timeout_seconds: int):
+        self.function_name = function_name
+        self.function_version = '$LATEST'
+        self.memory_limit_in_mb = 128
+        self.aws_request_id = str(uuid.uuid4())
+        self.invoked_function_arn = f"arn:aws:lambda:eu-west-1:000000000000:function:{function_name}"
+        self._deadline = time.monotonic() + timeout_seconds
+
+    def get_remaining_time_in_millis(self) -> int:
+        return max(0, int((self._deadline - time.monotonic()) * 1000))
+
+
+class LocalRuntime:
+    """
+    Invokes the functions in this process, and emulates the event sources that trigger them: the RentalInvoices
+    stream, S3 notifications, asynchronous invocations and the token refresh schedule
+    """
+
+    def __init__(self, handlers, timeouts, stats: LatencyStats, stream_window: float):
+        self.handlers = handlers
+        self.timeouts = timeouts
+        self.stats = stats
+        self.stream_window = stream_window
+        self._executor = ThreadPoolExecutor(max_workers=16, thread_name_prefix='async-invoke')
+        self._pending = 0
+        self._pending_lock = threading.Lock()
+        self._stream_queues = {}
+        self._stopped = threading.Event()
+        self._threads = []
+
+    def invoke(self, name: str, event):
+        handler = self.handlers[name]
+        start = time.perf_counter()
+        outcome = 'ok'
+        try:
+            response = handler(event, LambdaContext(name, self.timeouts.get(name, 30)))
+            if isinstance(response, dict) and isinstance(response.get('statusCode'), int):
+                outcome = f"{response['statusCode'] // 100}xx"
+            return response
+        except Exception:
+            outcome = 'error'
+            raise
+        finally:
+            self.stats.record(name, (time.perf_counter() - start) * 1000, outcome)
+
+    # asynchronous invocations (S3 notifications, Lambda Event invocations)
+
+    def invoke_async(self, name: str, event):
+        if name not in self.handlers:
+            return
+        with self._pending_lock:
+            self._pending += 1
+        self._executor.submit(self._invoke_with_retries, name, event)
+
+    def _invoke_with_retries(self, name: str, event):
+        try:
+            for attempt in range(ASYNC_INVOKE_RETRIES + 1):
+                try:
+                    response = self.invoke(name, event)
+                except Exception:
+                    logging.exception(f"Asynchronous invocation of {name} failed (attempt {attempt + 1})")
+                    continue
+                # the api_handler functions turn errors into responses, which Lambda counts as successes
+                if not (isinstance(response, dict) and response.get('statusCode', 200) >= 500):
+                    return
+        finally:
+            with self._pending_lock:
+                self._pending -= 1
+
+    # the RentalInvoices stream
+
+    def on_stream_record(self, table_name: str, record):
+        # called with the fake DynamoDB's lock held, so only queue the record here
+        if table_name == INVOICES_TABLE:
+            for stream_queue in self._stream_queues.values():
+                stream_queue.put(record)
+
+    def _poll_stream(self, name: str, batch_size: int):
+        stream_queue = self._stream_queues[name]
+        while not self._stopped.is_set():
+            try:
+                batch = [stream_queue.get(timeout=0.1)]
+            except Empty:
+                continue
+            window_end = time.monotonic() + self.stream_window
+            while len(batch) < batch_size:
+                try:
+                    batch.append(stream_queue.get(timeout=max(0.0, window_end - time.monotonic())))
+                except Empty:
+                    break
+            self._deliver_batch(name, batch)
+            for _ in batch:
+                stream_queue.task_done()
+
+    def _deliver_batch(self, name: str, records):
+        for _ in range(STREAM_MAX_RETRIES + 1):
+            try:
+                response = self.invoke(name, {'Records': records})
+            except Exception:
+                logging.exception(f"{name} failed on a batch of {len(records)} records")
+                continue
+            failures = (response or {}).get('batchItemFailures') if isinstance(response, dict) else None
+            if not failures:
+                return
+            # the batch is retried from the earliest failed record
+            failed = {failure['itemIdentifier'] for failure in failures}
+            first_failed = next((index for index, record in enumerate(records)
+                                 if record['dynamodb']['SequenceNumber'] in failed), 0)
+            records = records[first_failed:]
+
+    # scheduled invocations
+
+    def _run_schedule(self, name: str, interval: float):
+        while not self._stopped.wait(interval):
+            try:
+                self.invoke(name, {'source': 'aws.events', 'detail-type': 'Scheduled Event', 'detail': {}})
+            except Exception:
+                logging.exception(f"Scheduled invocation of {name} failed")
+
+    def start(self, refresh_interval: float):
+        for name, batch_size in STREAM_CONSUMERS.items():
+            if name in self.handlers:
+                self._stream_queues[name] = Queue()
+                self._threads.append(threading.Thread(target=self._poll_stream, args=(name, batch_size), daemon=True))
+        if refresh_interval > 0 and 'refresh_oauth_tokens' in self.handlers:
+            self._threads.append(threading.Thread(target=self._run_schedule,
+                                                  args=('refresh_oauth_tokens', refresh_interval), daemon=True))
+        for thread in self._threads:
+            thread.start()
+
+    def wait_until_idle(self, timeout: float = 120.0):
+        """
+        Waits until all asynchronous invocations and stream records have been processed
+        """
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            with self._pending_lock:
+                pending = self._pending
+            if not pending and all(stream_queue.unfinished_tasks == 0 for stream_queue in self._stream_queues.values()):
+                return True
+            time.sleep(0.05)
+        return False
+
+    def stop(self):
+        self._stopped.set()
+        for thread in self._threads:
+            thread.join(timeout=5)
+        self._executor.shutdown(wait=True)
+
+
+class LocalApiGateway:
+    """
+    Routes requests to the functions like the HTTP API does, including its lambda authorizer and the authorizer's
+    result cache
+    """
+
+    def __init__(self, runtime: LocalRuntime, stats: LatencyStats):
+        self.runtime = runtime
+        self.stats = stats
+        self._routes = []
+        for route_key, function_name, authorized in ROUTES:
+            method, path = route_key.split(' ', 1)
+            pattern = re.sub(r'\\{(\w+)\\}', r'(?P<\1>[^/]+)', re.escape(path))
+            self._routes.append((method, re.compile(f"^{pattern}$"), path.count('{'), route_key, function_name,
+                                 authorized))
+        self._authorizer_cache = {}
+        self._cache_lock = threading.Lock()
+
+    def _match(self, method: str, path: str):
+        # like API Gateway, the route with the fewest path variables wins, so that .../aggregates isn't an invoice ID
+        candidates = [(variables, route_key, function_name, authorized, match.groupdict())
+                      for route_method, pattern, variables, route_key, function_name, authorized in self._routes
+                      if route_method == method and (match := pattern.match(path))]
+        return min(candidates, key=lambda candidate: candidate[0])[1:] if candidates else None
+
+    def _authorize(self, authorization: str):
+        now = time.monotonic()
+        with self._cache_lock:
+            cached = self._authorizer_cache.get(authorization)
+        if cached is not None and cached[0] > now:
+            return cached[1]
+        response = self.runtime.invoke('authorizer', {
+            'version': '2.0',
+            'type': 'REQUEST',
+            'headers': {'authorization': authorization} if authorization else {},
+        })
+        result = response.get('context') if response.get('isAuthorized') else None
+        with self._cache_lock:
+            self._authorizer_cache[authorization] = (now + AUTHORIZER_CACHE_TTL, result)
+        return result
+
+    def request(self, method: str, path: str, token: str = None, body=None, query=None, headers=None):
+        """
+        Sends a request and returns its status code, headers and decoded JSON body (None if it has no body)
+        """
+        start = time.perf_counter()
+        route = self._match(method, path)
+        if route is None:
+            return 404, {}, {'message': 'Not Found'}
+        route_key, function_name, authorized, path_parameters = route
+        try:
+            status, response_headers, response_body = self._send(method, path, route_key, function_name, authorized,
+                                                                  path_parameters, token, body, query, headers)
+        except Exception:
+            logging.exception(f"{route_key} failed")
+            status, response_headers, response_body = 500, {}, {'message': 'Internal Server Error'}
+        self.stats.record(route_key, (time.perf_counter() - start) * 1000, f"{status // 100}xx")
+        return status, response_headers, response_body
+
+    def _send(self, method, path, route_key, function_name, authorized, path_parameters, token, body, query, headers):
+        if function_name not in self.runtime.handlers:
+            return 503, {}, {'message': f"{function_name} is not available locally"}
+
+        request_headers = {'accept-encoding': 'gzip, br', 'content-type': 'application/json',
+                           **{key.lower(): value for key, value in (headers or {}).items()}}
+        if token:
+            request_headers['authorization'] = f"Bearer {token}"
+        request_context = {
+            'http': {'method': method, 'path': path},
+            'requestId': uuid.uuid4().hex,
+            'routeKey': route_key,
+            'stage': '$default',
+        }
+        if authorized:
+            if not request_headers.get('authorization'):
+                # the identity source is missing, so API Gateway doesn't invoke the authorizer at all
+                return 401, {}, {'message': 'Unauthorized'}
+            authorizer_context = self._authorize(request_headers.get('authorization'))
+            if authorizer_context is None:
+                return 403, {}, {'message': 'Forbidden'}
+            request_context['authorizer'] = {'lambda': authorizer_context}
+
+        event = {
+            'version': '2.0',
+            'routeKey': route_key,
+            'rawPath': path,
+            'rawQueryString': urlencode(query or {}),
+            'headers': request_headers,
+            'requestContext': request_context,
+            'isBase64Encoded': False,
+        }
+        if query:
+            event['queryStringParameters'] = query
+        if path_parameters:
+            event['pathParameters'] = path_parameters
+        if body is not None:
+            event['body'] = json.dumps(body)
+
+        response = self.runtime.invoke(function_name, event)
+        return response['statusCode'], response.get('headers') or {}, self._decode_body(response)
+
+    @staticmethod
+    def _decode_body(response):
+        body = response.get('body')
+        if not body:
+            return None
+        if isinstance(body, dict):
+            return body
+        data = base64.b64decode(body) if response.get('isBase64Encoded') else body.encode('utf-8')
+        encoding = {key.lower(): value for key, value in (response.get('headers') or {}).items()}.get('content-encoding')
+        if encoding == 'gzip':
+            data = gzip.decompress(data)
+        elif encoding == 'br':
+            import brotli
+            data = brotli.decompress(data)
+        return json.loads(data)
+
+
+class VirtualUser:
+    def __init__(self, number: int):
+        self.number = number
+        self.lock = threading.Lock()
+        self.generation = 0
+        self.new_identity()
+
+    def new_identity(self):
+        # a deleted account's user signs up again as a new user, with a new mailbox
+        self.generation += 1
+        self.mailbox = f"user{self.number:04d}g{self.generation}"
+        self.email = f"{self.mailbox}@example.com"
+        self.password = f"load-test-password-{self.number}"
+        self.token = None
+        self.invoice_ids = []
+        self.list_etag = None
+
+
+def user_id_of(token: str) -> str:
+    payload = token.split('.')[1]
+    return json.loads(base64.urlsafe_b64decode(payload + '=' * (-len(payload) % 4)))['user_id']
+
+
+class LoadTest:
+    def __init__(self, args, api: LocalApiGateway, runtime: LocalRuntime, google: FakeGoogleServer, aws: FakeAws):
+        self.args = args
+        self.api = api
+        self.runtime = runtime
+        self.google = google
+        self.aws = aws
+        self.users = [VirtualUser(number) for number in range(args.users)]
+        # (user ID, OCR number) -> (mailbox, year, month), for the emulation of parse_invoice
+        self.invoice_sources = {}
+        self._sources_lock = threading.Lock()
+
+    # user lifecycle
+
+    def onboard(self, user: VirtualUser):
+        """
+        Signs a user up, connects their Gmail account and ingests their invoices, like the app's first launch
+        """
+        status, _, body = self.api.request('POST', f"/{API_VERSION}/auth/signup",
+                                           body={'email': user.email, 'name': user.mailbox, 'password': user.password})
+        if status == 201:
+            user.token = body['data']['access_token']
+        elif body and body.get('error', {}).get('code') == 'USER_ALREADY_EXISTS':
+            # an earlier attempt got as far as the signup
+            self.login(user)
+        if user.token is None:
+            # a worker of the mixed phase tries again when it picks the user
+            return
+
+        user_id = user_id_of(user.token)
+        with self._sources_lock:
+            for _, year, month in self.google.messages(user.mailbox):
+                self.invoice_sources[(user_id, synthetic_invoice(user.mailbox, year, month)['ocr'])] = \
+                    (user.mailbox, year, month)
+
+        self.api.request('POST', f"/{API_VERSION}/auth/gmail/store-tokens", token=user.token, body={
+            'access_token': access_token_for(user.mailbox),
+            'refresh_token': refresh_token_for(user.mailbox),
+            'expires_in': 3599,
+            'scope': ['https://www.googleapis.com/auth/gmail.readonly'],
+            'email': user.email,
+        })
+
+        if 'fetch_invoices' in self.runtime.handlers:
+            self.api.request('POST', f"/{API_VERSION}/invoices/rental/ingest", token=user.token)
+        else:
+            self.seed_invoices(user, user_id)
+
+    def seed_invoices(self, user: VirtualUser, user_id: str):
+        # without the Google libraries, the uploads of fetch_invoices are made here, which triggers the same pipeline
+        from utils.handler_utils import get_client
+        from load_test_google import build_invoice_pdf, invoice_filename
+
+        s3 = get_client('s3')
+        for _, year, month in self.google.messages(user.mailbox):
+            invoice = synthetic_invoice(user.mailbox, year, month)
+            s3.put_object(Bucket=BUCKET_NAME, Key=f"{S3_NOTIFICATION_PREFIX}{user_id}/{invoice_filename(invoice)}",
+                          Body=build_invoice_pdf(invoice))
+
+    def emulate_parse_invoice(self, event, context):
+        """
+        Stores the fields of an uploaded invoice like parse_invoice does, taking them from the synthetic mailbox
+        instead of extracting them from the PDF with textract
+        """
+        from utils.handler_utils import get_table
+        from utils.dynamodb_utils import create_invoice_in_dynamodb
+
+        for record in event['Records']:
+            key = record['s3']['object']['key']
+            user_id = key.split('/')[-2]
+            filename = key.split('/')[-1].split('.')[0]
+            ocr = filename.split('_')[-1]
+            with self._sources_lock:
+                source = self.invoice_sources.get((user_id, ocr))
+            if source is None:
+                continue
+            invoice = synthetic_invoice(*source)
+            due_date = datetime.strptime(invoice['due_date'], '%Y-%m-%d')
+            create_invoice_in_dynamodb(get_table(INVOICES_TABLE), f"Invoice_{ocr}", user_id, {
+                'OCR': ocr,
+                'Due Date': due_date.strftime('%d-%m-%Y'),
+                'due_date_month': str(due_date.month),
+                'due_date_year': str(due_date.year),
+                'Total Amount': invoice['total'],
+                'Hyra': invoice['rent'],
+                'El': invoice['electricity'],
+                'Kallvatten': invoice['cold_water'],
+                'Varmvatten': invoice['hot_water'],
+                'Moms': invoice['vat'],
+                'Filename': filename,
+            })
+        return {'statusCode': 200, 'body': json.dumps({'message': 'Emulated parse_invoice', 'code': 'SUCCESS'})}
+
+    # the requests of the mixed phase
+
+    def list_invoices(self, user: VirtualUser):
+        status, headers, body = self.api.request('GET', f"/{API_VERSION}/invoices/rental", token=user.token,
+                                                 query={'view': 'summary'})
+        if status == 200:
+            user.list_etag = headers.get('ETag')
+            user.invoice_ids = [invoice['InvoiceID'] for invoices in (body['data'].get('invoices') or {}).values()
+                                for invoice in invoices]
+
+    def revalidate_invoices(self, user: VirtualUser):
+        # the app's pull-to-refresh, which mostly gets a 304
+        if user.list_etag is None:
+            return self.list_invoices(user)
+        status, headers, _ = self.api.request('GET', f"/{API_VERSION}/invoices/rental", token=user.token,
+                                              query={'view': 'summary'}, headers={'If-None-Match': user.list_etag})
+        if status == 200:
+            user.list_etag = headers.get('ETag')
+
+    def get_invoice(self, user: VirtualUser):
+        if not user.invoice_ids:
+            return self.list_invoices(user)
+        self.api.request('GET', f"/{API_VERSION}/invoices/rental/{random.choice(user.invoice_ids)}", token=user.token)
+
+    def get_aggregates(self, user: VirtualUser):
+        self.api.request('GET', f"/{API_VERSION}/invoices/rental/aggregates", token=user.token)
+
+    def get_pdf_url(self, user: VirtualUser):
+        if not user.invoice_ids:
+            return self.list_invoices(user)
+        self.api.request('GET', f"/{API_VERSION}/invoices/rental/{random.choice(user.invoice_ids)}/pdf",
+                         token=user.token)
+
+    def get_profile(self, user: VirtualUser):
+        self.api.request('GET', f"/{API_VERSION}/user/me", token=user.token)
+
+    def ingest_latest(self, user: VirtualUser):
+        self.api.request('POST', f"/{API_VERSION}/invoices/rental/ingest/latest", token=user.token)
+
+    def login(self, user: VirtualUser):
+        status, _, body = self.api.request('POST', f"/{API_VERSION}/auth/login",
+                                           body={'email': user.email, 'password': user.password})
+        if status == 200:
+            user.token = body['data']['access_token']
+
+    def delete_account(self, user: VirtualUser):
+        status, _, _ = self.api.request('DELETE', f"/{API_VERSION}/user/me", token=user.token,
+                                        query={'mode': random.choice(['sync', 'async'])})
+        if status >= 400:
+            return
+        self.api.request('GET', f"/{API_VERSION}/user/me/deletion", token=user.token)
+        user.new_identity()
+        self.onboard(user)
+
+    # phases
+
+    def run_setup(self):
+        with ThreadPoolExecutor(max_workers=self.args.concurrency) as executor:
+            list(executor.map(self.onboard, self.users))
+        self.runtime.wait_until_idle()
+
+    def run_mixed(self, duration: float):
+        # the requests of functions that are skipped would only measure the 503s
+        operations = [operation for operation, (_, function_name) in WORKLOAD_MIX.items()
+                      if function_name in self.runtime.handlers]
+        weights = [WORKLOAD_MIX[operation][0] for operation in operations]
+        deadline = time.monotonic() + duration
+
+        def worker():
+            while time.monotonic() < deadline:
+                user = random.choice(self.users)
+                # a user's requests are sequential, like the app's
+                if not user.lock.acquire(blocking=False):
+                    continue
+                try:
+                    operation = 'onboard' if user.token is None else random.choices(operations, weights)[0]
+                    try:
+                        getattr(self, operation)(user)
+                    except Exception:
+                        logging.exception(f"{operation} of {user.email} failed")
+                finally:
+                    user.lock.release()
+
+        workers = [threading.Thread(target=worker) for _ in range(self.args.concurrency)]
+        for thread in workers:
+            thread.start()
+        for thread in workers:
+            thread.join()
+        self.runtime.wait_until_idle()
+
+
+def print_report(report):
+    print(f"{report['phase']} phase: {report['elapsed_seconds']:.1f} s")
+    print(f"{'endpoint':<42} | {'requests':>8} | {'4xx':>5} | {'5xx':>5} | {'req/s':>7} | {'p50 ms':>7} | "
+          f"{'p95 ms':>7} | {'p99 ms':>7} | {'max ms':>7}")
+    for key, entry in report['endpoints'].items():
+        print(f"{key:<42} | {entry['count']:>8} | {entry['outcomes'].get('4xx', 0):>5} | "
+              f"{entry['outcomes'].get('5xx', 0):>5} | {entry['throughput']:>7.1f} | {entry['p50_ms']:>7.1f} | "
+              f"{entry['p95_ms']:>7.1f} | {entry['p99_ms']:>7.1f} | {entry['max_ms']:>7.1f}")
+    print()
+    print(f"{'function':<42} | {'invocations':>11} | {'errors':>6} | {'p50 ms':>7} | {'p95 ms':>7} | {'p99 ms':>7}")
+    for key, entry in report['functions'].items():
+        errors = entry['outcomes'].get('error', 0) + entry['outcomes'].get('5xx', 0)
+        print(f"{key:<42} | {entry['count']:>11} | {errors:>6} | {entry['p50_ms']:>7.1f} | {entry['p95_ms']:>7.1f} | "
+              f"{entry['p99_ms']:>7.1f}")
+    print()
+    print("AWS calls: " + ', '.join(f"{operation} {count}" for operation, count in report['aws_calls'].items()))
+    print("Google requests: " + ', '.join(f"{endpoint} {count}" for endpoint, count in report['google_requests'].items())
+          + f" ({report['gmail_quota_errors']} rate limited)")
+    print(f"SNS messages published: {report['sns_messages']}")
+    print()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load-test the lambda functions locally against stand-ins for AWS "
+                                                 "and Google")
+    parser.add_argument('--users', type=int, default=50)
+    parser.add_argument('--concurrency', type=int, default=10, help="Number of concurrent virtual clients")
+    parser.add_argument('--duration', type=float, default=60, help="Seconds of the mixed phase")
+    parser.add_argument('--months', type=int, default=24, help="Months of invoices in every mailbox")
+    parser.add_argument('--bcrypt-rounds', type=int, help="Overrides BCRYPT_ROUNDS, e.g. 4 to keep signups cheap")
+    parser.add_argument('--stream-window', type=float, default=0.5,
+                        help="Batching window of the stream consumers in seconds")
+    parser.add_argument('--refresh-interval', type=float, default=30,
+                        help="Seconds between runs of refresh_oauth_tokens, 0 to disable")
+    parser.add_argument('--aws-latency', action='append', default=[], metavar='SERVICE=MS',
+                        help=f"Latency of an AWS service's calls (defaults: {DEFAULT_LATENCIES_MS})")
+    parser.add_argument('--aws-error-rate', action='append', default=[], metavar='SERVICE=RATE',
+                        help="Share of an AWS service's calls that are throttled")
+    parser.add_argument('--gmail-latency', type=float, default=40, help="Latency of the Google endpoints in ms")
+    parser.add_argument('--gmail-error-rate', type=float, default=0.0,
+                        help="Share of Gmail requests that are rate limited on top of the per-user quota")
+    parser.add_argument('--json', action='store_true', help="Print the results as JSON")
+    parser.add_argument('--max-error-rate', type=float,
+                        help="Exit with status 1 if more than this share of the mixed phase's requests got a 5xx")
+    parser.add_argument('--verbose', action='store_true', help="Show the output and logs of the functions")
+    parser.add_argument('--seed', type=int, help="Seed of the workload's random choices")
+    args = parser.parse_args()
+
+    if args.seed is not None:
+        random.seed(args.seed)
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.CRITICAL,
+                        format='%(asctime)s %(levelname)s %(threadName)s %(message)s')
+
+    google = FakeGoogleServer(EMAIL_SENDER, EMAIL_SUBJECT, months_of_history=args.months,
+                              latency_ms=args.gmail_latency, error_rate=args.gmail_error_rate)
+    base_url = google.start()
+    os.environ.update(ENVIRONMENT)
+    os.environ.update({
+        'GMAIL_API_ENDPOINT': f"{base_url}/",
+        'GOOGLE_TOKEN_URI': f"{base_url}/token",
+        'GOOGLE_USERINFO_URL': f"{base_url}/oauth2/v3/userinfo",
+    })
+    if args.bcrypt_rounds is not None:
+        os.environ['BCRYPT_ROUNDS'] = str(args.bcrypt_rounds)
+
+    function_stats = LatencyStats()
+    endpoint_stats = LatencyStats()
+    runtime = LocalRuntime({}, read_timeouts(), function_stats, args.stream_window)
+
+    def parse_overrides(values, name):
+        overrides = {}
+        for value in values:
+            service, _, number = value.partition('=')
+            if not number:
+                parser.error(f"{name} expects SERVICE=NUMBER, got {value!r}")
+            overrides[service] = float(number)
+        return overrides
+
+    def on_object_created(bucket, key):
+        if key.startswith(S3_NOTIFICATION_PREFIX) and key.endswith('.pdf'):
+            runtime.invoke_async('parse_invoice', {'Records': [{
+                'eventSource': 'aws:s3',
+                'eventName': 'ObjectCreated:Put',
+                's3': {'bucket': {'name': bucket}, 'object': {'key': key}}
+            }]})
+
+    def on_invoke(function_name, payload, invocation_type):
+        if invocation_type == 'Event':
+            return runtime.invoke_async(function_name, payload)
+        return runtime.invoke(function_name, payload)
+
+    aws = FakeAws(FakeDynamoDB(TABLE_SCHEMAS, on_stream_record=runtime.on_stream_record),
+                  FakeS3(on_object_created=on_object_created), FakeSecretsManager(), FakeSNS(), FakeLambda(on_invoke),
+                  latencies_ms=parse_overrides(args.aws_latency, '--aws-latency'),
+                  error_rates=parse_overrides(args.aws_error_rate, '--aws-error-rate'))
+    # before the functions are imported, since they may create their clients at import time
+    aws.install()
+
+    unavailable = {}
+    output = io.StringIO()
+    # the functions print their events and EMF documents, which would bury the report
+    with contextlib.redirect_stdout(sys.stdout if args.verbose else output):
+        for name, path in find_lambdas():
+            handler, error = load_handler(name, path)
+            if handler is not None:
+                runtime.handlers[name] = handler
+            else:
+                unavailable[name] = error
+
+        load_test = LoadTest(args, LocalApiGateway(runtime, endpoint_stats), runtime, google, aws)
+        if 'parse_invoice' not in runtime.handlers:
+            runtime.handlers['parse_invoice'] = load_test.emulate_parse_invoice
+        runtime.start(args.refresh_interval)
+
+        reports = []
+        for phase, run in (('setup', load_test.run_setup),
+                           ('mixed', lambda: load_test.run_mixed(args.duration))):
+            endpoint_stats.reset()
+            function_stats.reset()
+            calls_before = dict(aws.calls)
+            google_before = dict(google.requests)
+            quota_errors_before = google.quota_errors
+            sns_before = len(aws.services['sns'].messages)
+            start = time.perf_counter()
+            run()
+            elapsed = time.perf_counter() - start
+            reports.append({
+                'phase': phase,
+                'elapsed_seconds': elapsed,
+                'endpoints': endpoint_stats.summary(elapsed),
+                'functions': function_stats.summary(elapsed),
+                'aws_calls': {operation: count - calls_before.get(operation, 0)
+                              for operation, count in sorted(aws.calls.items())
+                              if count > calls_before.get(operation, 0)},
+                'google_requests': {endpoint: count - google_before.get(endpoint, 0)
+                                    for endpoint, count in sorted(google.requests.items())
+                                    if count > google_before.get(endpoint, 0)},
+                'gmail_quota_errors': google.quota_errors - quota_errors_before,
+                'sns_messages': len(aws.services['sns'].messages) - sns_before,
+            })
+            # the output of each phase is only needed while it runs
+            output.seek(0)
+            output.truncate()
+        runtime.stop()
+    google.stop()
+
+    config = {key: value for key, value in vars(args).items() if key not in ('json', 'verbose')}
+    if args.json:
+        print(json.dumps({'config': config, 'unavailable_functions': unavailable, 'phases': reports}, indent=2))
+    else:
+        for name, reason in unavailable.items():
+            print(f"{name}: {'emulated' if name in runtime.handlers else 'skipped'} ({reason})")
+        print()
+        for report in reports:
+            print_report(report)
+
+    if args.max_error_rate is not None:
+        mixed = reports[-1]['endpoints']
+        requests = sum(entry['count'] for entry in mixed.values())
+        server_errors = sum(entry['outcomes'].get('5xx', 0) for entry in mixed.values())
+        if requests and server_errors / requests > args.max_error_rate:
+            print(f"5xx rate {server_errors / requests:.2%} exceeds {args.max_error_rate:.2%}", file=sys.stderr)
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,1066 @@
+"""
+In-process stand-ins for the AWS services the lambda functions use (DynamoDB, S3, Secrets Manager, SNS and Lambda),
+used by scripts/load_test.py.
+
+The stand-ins answer the calls of every boto3 client created from the default session at botocore's before-call
+event, i.e. after boto3 has validated and serialized the parameters and right before a request would be sent. The
+repo's code therefore runs exactly as it does against AWS: Table resources, batch_writer, paginators, the condition
+builders, ClientError and its error codes, and the hooks of aws_call_utils. Every call first sleeps for the latency
+configured for its service.
+
+Only the behaviour the lambda functions rely on is implemented. DynamoDB supports the expression syntax they use
+(comparisons, AND/OR/NOT, BETWEEN, IN, attribute_exists, attribute_not_exists, begins_with, contains, size; SET with
++, -, if_not_exists and list_append; REMOVE, ADD and DELETE), global secondary indexes, 1 MB pages, conditional
+writes, transactions, consumed capacity and a stream of NEW_AND_OLD_IMAGES records.
+"""
+import io
+import re
+import copy
+import json
+import time
+import uuid
+import random
+import hashlib
+import threading
+from decimal import Decimal
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Tuple
+
+from boto3.dynamodb.types import TypeDeserializer, TypeSerializer
+from botocore.awsrequest import AWSResponse
+from botocore.response import StreamingBody
+
+# rough latencies of calls within a region, in ms
+DEFAULT_LATENCIES_MS = {
+    'dynamodb': 5,
+    's3': 20,
+    'secretsmanager': 15,
+    'sns': 10,
+    'lambda': 15,
+}
+# DynamoDB returns at most 1 MB of items per Query or Scan page
+DYNAMODB_PAGE_BYTES = 1024 * 1024
+# key under which the API parameters of a call are kept in botocore's request context until before-call
+_PARAMS_KEY = 'fake_aws_params'
+
+_deserializer = TypeDeserializer()
+_serializer = TypeSerializer()
+_MISSING = object()
+
+
+class FakeAwsError(Exception):
+    """
+    An error response of a stand-in. Extra fields end up next to 'Error' in the parsed response, like the modeled
+    fields of real error responses (e.g. CancellationReasons)
+    """
+
+    def __init__(self, code: str, message: str, status_code: int = 400, **fields):
+        super().__init__(message)
+        self.code = code
+        self.message = message
+        self.status_code = status_code
+        self.fields = fields
+
+
+class TableSchema(NamedTuple):
+    hash_key: str
+    range_key: Optional[str] = None
+    # index name -> (hash key, range key or None). All indexes project all attributes
+    indexes: Optional[Dict[str, Tuple[str, Optional[str]]]] = None
+    stream: bool = False
+
+
+class _EmptyRaw:
+    def stream(self, **kwargs):
+        yield b''
+
+
+def _http_response(status_code: int) -> AWSResponse:
+    response = AWSResponse('https://fake-aws.local', status_code, {}, _EmptyRaw())
+    response._content = b''
+    return response
+
+
+# ---------------------------------------------------------------------------------------------------------------------
+# DynamoDB expressions
+
+_TOKEN_PATTERN = re.compile(r'\s*(?:(?P<number>\d+)|(?P<name>#[A-Za-z0-9_]+|[A-Za-z_][A-Za-z0-9_]*)'
+                            r'|(?P<value>:[A-Za-z0-9_]+)|(?P<op><>|<=|>=|[=<>(),.\[\]+-]))')
+_UPDATE_CLAUSES = ('SET', 'REMOVE', 'ADD', 'DELETE')
+
+
+def _tokenize(expression: str) -> List[Tuple[str, str]]:
+    tokens = []
+    position = 0
+    expression = expression.rstrip()
+    while position < len(expression):
+        match = _TOKEN_PATTERN.match(expression, position)
+        if not match or match.end() == position:
+            raise FakeAwsError('ValidationException', f"Invalid expression near '{expression[position:]}'")
+        kind = match.lastgroup
+        tokens.append((kind, match.group(kind)))
+        position = match.end()
+    return tokens
+
+
+class _ExpressionParser:
+    """
+    Recursive descent parser turning condition, key condition, filter, projection and update expressions into
+    nested tuples, which _evaluate and _apply_update interpret
+    """
+
+    def __init__(self, expression: str):
+        self.tokens = _tokenize(expression)
+        self.position = 0
+
+    def peek(self, offset: int = 0) -> Tuple[Optional[str], Optional[str]]:
+        index = self.position + offset
+        return self.tokens[index] if index < len(self.tokens) else (None, None)
+
+    def next(self) -> Tuple[str, str]:
+        token = self.peek()
+        if token[0] is None:
+            raise FakeAwsError('ValidationException', "Unexpected end of expression")
+        self.position += 1
+        return token
+
+    def expect(self, text: str):
+        kind, token = self.next()
+        if token.upper() != text:
+            raise FakeAwsError('ValidationException', f"Expected '{text}', got '{token}'")
+
+    def accept_keyword(self, keyword: str) -> bool:
+        kind, token = self.peek()
+        if kind == 'name' and token.upper() == keyword:
+            self.position += 1
+            return True
+        return False
+
+    def at_end(self) -> bool:
+        return self.position >= len(self.tokens)
+
+    # conditions
+
+    def parse_condition(self):
+        condition = self.parse_or()
+        if not self.at_end():
+            raise FakeAwsError('ValidationException', f"Unexpected token '{self.peek()[1]}'")
+        return condition
+
+    def parse_or(self):
+        node = self.parse_and()
+        while self.accept_keyword('OR'):
+            node = ('or', node, self.parse_and())
+        return node
+
+    def parse_and(self):
+        node = self.parse_not()
+        while self.accept_keyword('AND'):
+            node = ('and', node, self.parse_not())
+        return node
+
+    def parse_not(self):
+        if self.accept_keyword('NOT'):
+            return ('not', self.parse_not())
+        return self.parse_comparison()
+
+    def parse_comparison(self):
+        kind, token = self.peek()
+        if token == '(':
+            self.next()
+            node = self.parse_or()
+            self.expect(')')
+            return node
+        if kind == 'name' and self.peek(1)[1] == '(' and token.lower() != 'size':
+            return self.parse_function()
+
+        operand = self.parse_operand()
+        kind, token = self.peek()
+        if token in ('=', '<>', '<', '<=', '>', '>='):
+            self.next()
+            return ('cmp', token, operand, self.parse_operand())
+        if kind == 'name' and token.upper() == 'BETWEEN':
+            self.next()
+            low = self.parse_operand()
+            self.expect('AND')
+            return ('between', operand, low, self.parse_operand())
+        if kind == 'name' and token.upper() == 'IN':
+            self.next()
+            self.expect('(')
+            candidates = [self.parse_operand()]
+            while self.peek()[1] == ',':
+                self.next()
+                candidates.append(self.parse_operand())
+            self.expect(')')
+            return ('in', operand, candidates)
+        raise FakeAwsError('ValidationException', f"Expected a comparison, got '{token}'")
+
+    def parse_function(self):
+        _, name = self.next()
+        self.expect('(')
+        arguments = [self.parse_operand()]
+        while self.peek()[1] == ',':
+            self.next()
+            arguments.append(self.parse_operand())
+        self.expect(')')
+        return ('function', name.lower(), arguments)
+
+    def parse_operand(self):
+        kind, token = self.peek()
+        if kind == 'value':
+            self.next()
+            return ('value', token)
+        if kind == 'name' and token.lower() == 'size' and self.peek(1)[1] == '(':
+            self.next()
+            self.expect('(')
+            path = self.parse_path()
+            self.expect(')')
+            return ('size', path)
+        return self.parse_path()
+
+    def parse_path(self):
+        kind, token = self.next()
+        if kind != 'name':
+            raise FakeAwsError('ValidationException', f"Expected an attribute name, got '{token}'")
+        parts = [token]
+        while self.peek()[1] in ('.', '['):
+            _, separator = self.next()
+            if separator == '.':
+                parts.append(self.next()[1])
+            else:
+                parts.append(int(self.next()[1]))
+                self.expect(']')
+        return ('path', parts)
+
+    # projections
+
+    def parse_projection(self) -> List:
+        paths = [self.parse_path()]
+        while self.peek()[1] == ',':
+            self.next()
+            paths.append(self.parse_path())
+        return paths
+
+    # updates
+
+    def parse_update(self) -> List[Tuple]:
+        actions = []
+        while not self.at_end():
+            _, clause = self.next()
+            clause = clause.upper()
+            if clause not in _UPDATE_CLAUSES:
+                raise FakeAwsError('ValidationException', f"Unknown update clause '{clause}'")
+            while True:
+                path = self.parse_path()
+                if clause == 'SET':
+                    self.expect('=')
+                    actions.append(('SET', path, self.parse_set_value()))
+                elif clause == 'REMOVE':
+                    actions.append(('REMOVE', path, None))
+                else:
+                    actions.append((clause, path, self.parse_operand()))
+                if self.peek()[1] != ',':
+                    break
+                self.next()
+        return actions
+
+    def parse_set_value(self):
+        node = self.parse_set_operand()
+        if self.peek()[1] in ('+', '-'):
+            _, operator = self.next()
+            node = ('arithmetic', operator, node, self.parse_set_operand())
+        return node
+
+    def parse_set_operand(self):
+        kind, token = self.peek()
+        if kind == 'name' and token.lower() in ('if_not_exists', 'list_append') and self.peek(1)[1] == '(':
+            self.next()
+            self.expect('(')
+            first = self.parse_set_value()
+            self.expect(',')
+            second = self.parse_set_value()
+            self.expect(')')
+            return (token.lower(), first, second)
+        return self.parse_operand()
+
+
+class _ExpressionContext:
+    def __init__(self, names: Optional[Dict[str, str]], values: Optional[Dict[str, Dict]]):
+        self.names = names or {}
+        self.values = {key: _deserializer.deserialize(value) for key, value in (values or {}).items()}
+
+    def name(self, part):
+        if isinstance(part, str) and part.startswith('#'):
+            if part not in self.names:
+                raise FakeAwsError('ValidationException', f"Undefined attribute name placeholder {part}")
+            return self.names[part]
+        return part
+
+    def resolve(self, item: Dict, path) -> Any:
+        current = item
+        for part in path[1]:
+            part = self.name(part)
+            if isinstance(part, int):
+                if not isinstance(current, list) or part >= len(current):
+                    return _MISSING
+                current = current[part]
+            else:
+                if not isinstance(current, dict) or part not in current:
+                    return _MISSING
+                current = current[part]
+        return current
+
+    def operand(self, item: Dict, node) -> Any:
+        if node[0] == 'value':
+            if node[1] not in self.values:
+                raise FakeAwsError('ValidationException', f"Undefined attribute value placeholder {node[1]}")
+            return self.values[node[1]]
+        if node[0] == 'size':
+            value = self.resolve(item, node[1])
+            return _MISSING if value is _MISSING else Decimal(len(value))
+        return self.resolve(item, node)
+
+
+def _comparable(a, b) -> bool:
+    if a is _MISSING or b is _MISSING:
+        return False
+    numeric = (Decimal, int, float)
+    return isinstance(a, numeric) and isinstance(b, numeric) or type(a) is type(b)
+
+
+def _compare(operator: str, a, b) -> bool:
+    if operator == '=':
+        return _comparable(a, b) and a == b
+    if operator == '<>':
+        return a is not _MISSING and (not _comparable(a, b) or a != b)
+    if not _comparable(a, b) or isinstance(a, (set, dict, list, bool)):
+        return False
+    return {'<': a < b, '<=': a <= b, '>': a > b, '>=': a >= b}[operator]
+
+
+def _evaluate(node, item: Dict, context: _ExpressionContext) -> bool:
+    kind = node[0]
+    if kind == 'and':
+        return _evaluate(node[1], item, context) and _evaluate(node[2], item, context)
+    if kind == 'or':
+        return _evaluate(node[1], item, context) or _evaluate(node[2], item, context)
+    if kind == 'not':
+        return not _evaluate(node[1], item, context)
+    if kind == 'cmp':
+        return _compare(node[1], context.operand(item, node[2]), context.operand(item, node[3]))
+    if kind == 'between':
+        value = context.operand(item, node[1])
+        return _compare('>=', value, context.operand(item, node[2])) and \
+            _compare('<=', value, context.operand(item, node[3]))
+    if kind == 'in':
+        value = context.operand(item, node[1])
+        return any(_compare('=', value, context.operand(item, candidate)) for candidate in node[2])
+    if kind == 'function':
+        name, arguments = node[1], node[2]
+        value = context.operand(item, arguments[0])
+        if name == 'attribute_exists':
+            return value is not _MISSING
+        if name == 'attribute_not_exists':
+            return value is _MISSING
+        if name == 'begins_with':
+            prefix = context.operand(item, arguments[1])
+            return isinstance(value, str) and isinstance(prefix, str) and value.startswith(prefix)
+        if name == 'contains':
+            needle = context.operand(item, arguments[1])
+            return value is not _MISSING and isinstance(value, (str, set, list)) and needle in value
+        raise FakeAwsError('ValidationException', f"Unsupported function {name}")
+    raise FakeAwsError('ValidationException', f"Not a condition: {kind}")
+
+
+def _set_path(item: Dict, path, value, context: _ExpressionContext):
+    parts = [context.name(part) for part in path[1]]
+    current = item
+    for part in parts[:-1]:
+        current = current[part]
+    current[parts[-1]] = value
+
+
+def _remove_path(item: Dict, path, context: _ExpressionContext):
+    parts = [context.name(part) for part in path[1]]
+    current = item
+    for part in parts[:-1]:
+        current = current.get(part, {}) if isinstance(current, dict) else current[part]
+    if isinstance(current, dict):
+        current.pop(parts[-1], None)
+    elif isinstance(current, list) and parts[-1] < len(current):
+        current.pop(parts[-1])
+
+
+def _set_value(node, item: Dict, context: _ExpressionContext):
+    kind = node[0]
+    if kind == 'arithmetic':
+        a, b = _set_value(node[2], item, context), _set_value(node[3], item, context)
+        if not isinstance(a, Decimal) or not isinstance(b, Decimal):
+            raise FakeAwsError('ValidationException', "An operand in the update expression has an incorrect data type")
+        return a + b if node[1] == '+' else a - b
+    if kind == 'if_not_exists':
+        value = context.resolve(item, node[1])
+        return _set_value(node[2], item, context) if value is _MISSING else value
+    if kind == 'list_append':
+        return list(_set_value(node[1], item, context)) + list(_set_value(node[2], item, context))
+    value = context.operand(item, node)
+    if value is _MISSING:
+        raise FakeAwsError('ValidationException', "The provided expression refers to an attribute that does not "
+                                                  "exist in the item")
+    return value
+
+
+def _apply_update(actions: List[Tuple], item: Dict, context: _ExpressionContext) -> Dict:
+    updated = copy.deepcopy(item)
+    for clause, path, operand in actions:
+        if clause == 'SET':
+            # operands refer to the item as it was before the update
+            _set_path(updated, path, _set_value(operand, item, context), context)
+        elif clause == 'REMOVE':
+            _remove_path(updated, path, context)
+        elif clause == 'ADD':
+            value = context.operand(item, operand)
+            current = context.resolve(updated, path)
+            if current is _MISSING:
+                _set_path(updated, path, value, context)
+            elif isinstance(current, set):
+                _set_path(updated, path, current | value, context)
+            else:
+                _set_path(updated, path, current + value, context)
+        elif clause == 'DELETE':
+            current = context.resolve(updated, path)
+            if isinstance(current, set):
+                remaining = current - context.operand(item, operand)
+                if remaining:
+                    _set_path(updated, path, remaining, context)
+                else:
+                    _remove_path(updated, path, context)
+    return updated
+
+
+def _updated_attribute_names(actions: List[Tuple], context: _ExpressionContext) -> List[str]:
+    return [context.name(path[1][0]) for _, path, _ in actions]
+
+
+# ---------------------------------------------------------------------------------------------------------------------
+# DynamoDB tables
+
+def _item_size(item: Dict) -> int:
+    return len(json.dumps(serialize_item(item), default=str))
+
+
+def serialize_item(item: Dict) -> Dict:
+    return {key: _serializer.serialize(value) for key, value in item.items()}
+
+
+def deserialize_item(item: Dict) -> Dict:
+    return {key: _deserializer.deserialize(value) for key, value in item.items()}
+
+
+class FakeTable:
+    def __init__(self, name: str, schema: TableSchema):
+        self.name = name
+        self.schema = schema
+        self.items: Dict[Tuple, Dict] = {}
+        # hash key value -> keys of the items, for the table itself and every index
+        self.partitions: Dict[Optional[str], Dict[Any, Dict[Tuple, None]]] = {None: {}}
+        for index_name in (schema.indexes or {}):
+            self.partitions[index_name] = {}
+
+    def key_schema(self, index_name: Optional[str] = None) -> Tuple[str, Optional[str]]:
+        if index_name is None:
+            return self.schema.hash_key, self.schema.range_key
+        if index_name not in (self.schema.indexes or {}):
+            raise FakeAwsError('ValidationException', f"The table does not have the specified index: {index_name}")
+        return self.schema.indexes[index_name]
+
+    def key_of(self, item: Dict) -> Tuple:
+        hash_key, range_key = self.key_schema()
+        if hash_key not in item or (range_key and range_key not in item):
+            raise FakeAwsError('ValidationException', "The provided key element does not match the schema")
+        return (item[hash_key], item[range_key]) if range_key else (item[hash_key],)
+
+    def key_attributes(self, item: Dict, index_name: Optional[str] = None) -> Dict:
+        names = [name for name in self.key_schema() if name]
+        if index_name:
+            names += [name for name in self.key_schema(index_name) if name]
+        return {name: item[name] for name in names if name in item}
+
+    def put(self, item: Dict) -> Optional[Dict]:
+        key = self.key_of(item)
+        old_item = self.items.get(key)
+        if old_item is not None:
+            self._unindex(key, old_item)
+        self.items[key] = item
+        self._index(key, item)
+        return old_item
+
+    def delete(self, key: Tuple) -> Optional[Dict]:
+        old_item = self.items.pop(key, None)
+        if old_item is not None:
+            self._unindex(key, old_item)
+        return old_item
+
+    def _index(self, key: Tuple, item: Dict):
+        for index_name, partitions in self.partitions.items():
+            hash_key = self.key_schema(index_name)[0]
+            if hash_key in item:
+                partitions.setdefault(item[hash_key], {})[key] = None
+
+    def _unindex(self, key: Tuple, item: Dict):
+        for index_name, partitions in self.partitions.items():
+            hash_key = self.key_schema(index_name)[0]
+            partition = partitions.get(item.get(hash_key))
+            if partition is not None:
+                partition.pop(key, None)
+                if not partition:
+                    del partitions[item[hash_key]]
+
+    def partition(self, hash_value, index_name: Optional[str] = None) -> List[Dict]:
+        keys = self.partitions[index_name].get(hash_value, {})
+        items = [self.items[key] for key in keys]
+        range_key = self.key_schema(index_name)[1]
+        if range_key:
+            # items without the range key of an index are not part of it
+            items = sorted((item for item in items if range_key in item), key=lambda item: item[range_key])
+        return items
+
+
+def _find_hash_key_value(node, hash_key: str, context: _ExpressionContext):
+    """
+    Returns the value that a key condition requires the hash key to equal
+    """
+    if node[0] == 'and':
+        for child in node[1:]:
+            value = _find_hash_key_value(child, hash_key, context)
+            if value is not _MISSING:
+                return value
+    if node[0] == 'cmp' and node[1] == '=':
+        for path, value in ((node[2], node[3]), (node[3], node[2])):
+            if path[0] == 'path' and len(path[1]) == 1 and context.name(path[1][0]) == hash_key:
+                return context.operand({}, value)
+    return _MISSING
+
+
+class FakeDynamoDB:
+    """
+    DynamoDB tables in memory. All operations take one lock, so conditional writes and transactions are atomic.
+    Writes to tables with a stream are passed to on_stream_record as stream records.
+    """
+
+    def __init__(self, schemas: Dict[str, TableSchema],
+                 on_stream_record: Optional[Callable[[str, Dict], None]] = None):
+        self.tables = {name: FakeTable(name, schema) for name, schema in schemas.items()}
+        self.on_stream_record = on_stream_record
+        self._lock = threading.RLock()
+        self._sequence_number = 0
+
+    def table(self, name: str) -> FakeTable:
+        if name not in self.tables:
+            raise FakeAwsError('ResourceNotFoundException', f"Requested resource not found: Table: {name} not found")
+        return self.tables[name]
+
+    def handle(self, operation: str, params: Dict) -> Dict:
+        handler = getattr(self, f"_{_snake_case(operation)}", None)
+        if handler is None:
+            raise FakeAwsError('UnknownOperationException', f"DynamoDB operation {operation} is not supported")
+        with self._lock:
+            return handler(params)
+
+    # helpers
+
+    def _emit(self, table: FakeTable, old_item: Optional[Dict], new_item: Optional[Dict]):
+        if not table.schema.stream or self.on_stream_record is None or (old_item is None and new_item is None):
+            return
+        self._sequence_number += 1
+        record = {
+            'eventID': uuid.uuid4().hex,
+            'eventName': 'INSERT' if old_item is None else 'REMOVE' if new_item is None else 'MODIFY',
+            'eventSource': 'aws:dynamodb',
+            'dynamodb': {
+                'Keys': serialize_item(table.key_attributes(new_item or old_item)),
+                'SequenceNumber': str(self._sequence_number).zfill(21),
+                'SizeBytes': _item_size(new_item or old_item),
+                'StreamViewType': 'NEW_AND_OLD_IMAGES'
+            }
+        }
+        if new_item is not None:
+            record['dynamodb']['NewImage'] = serialize_item(new_item)
+        if old_item is not None:
+            record['dynamodb']['OldImage'] = serialize_item(old_item)
+        self.on_stream_record(table.name, record)
+
+    @staticmethod
+    def _check_condition(params: Dict, item: Optional[Dict], context: _ExpressionContext) -> bool:
+        expression = params.get('ConditionExpression')
+        if not expression:
+            return True
+        return _evaluate(_ExpressionParser(expression).parse_condition(), item or {}, context)
+
+    @staticmethod
+    def _project(item: Dict, params: Dict, context: _ExpressionContext) -> Dict:
+        expression = params.get('ProjectionExpression')
+        if not expression:
+            return item
+        names = [context.name(path[1][0]) for path in _ExpressionParser(expression).parse_projection()]
+        return {name: item[name] for name in names if name in item}
+
+    @staticmethod
+    def _consumed_capacity(params: Dict, table_name: str, units: float) -> Dict:
+        if params.get('ReturnConsumedCapacity') in ('TOTAL', 'INDEXES'):
+            return {'ConsumedCapacity': {'TableName': table_name, 'CapacityUnits': units}}
+        return {}
+
+    @staticmethod
+    def _read_units(size: int, consistent: bool) -> float:
+        return max(1, -(-size // 4096)) * (1.0 if consistent else 0.5)
+
+    @staticmethod
+    def _write_units(size: int) -> float:
+        return float(max(1, -(-size // 1024)))
+
+    @staticmethod
+    def _return_values(params: Dict, old_item: Optional[Dict], new_item: Optional[Dict],
+                       updated_names: List[str] = ()) -> Dict:
+        return_values = params.get('ReturnValues', 'NONE')
+        if return_values == 'ALL_OLD' and old_item:
+            return {'Attributes': serialize_item(old_item)}
+        if return_values == 'ALL_NEW' and new_item:
+            return {'Attributes': serialize_item(new_item)}
+        if return_values == 'UPDATED_OLD' and old_item:
+            return {'Attributes': serialize_item({name: old_item[name] for name in updated_names if name in old_item})}
+        if return_values == 'UPDATED_NEW' and new_item:
+            return {'Attributes': serialize_item({name: new_item[name] for name in updated_names if name in new_item})}
+        return {}
+
+    # single item operations
+
+    def _get_item(self, params: Dict) -> Dict:
+        table = self.table(params['TableName'])
+        context = _ExpressionContext(params.get('ExpressionAttributeNames'), None)
+        item = table.items.get(table.key_of(deserialize_item(params['Key'])))
+        response = self._consumed_capacity(
+            params, table.name, self._read_units(_item_size(item) if item else 0, params.get('ConsistentRead', False))
+        )
+        if item is not None:
+            response['Item'] = serialize_item(self._project(item, params, context))
+        return response
+
+    def _put_item(self, params: Dict) -> Dict:
+        table = self.table(params['TableName'])
+        item = deserialize_item(params['Item'])
+        self._write_put(table, item, params)
+        return self._consumed_capacity(params, table.name, self._write_units(_item_size(item)))
+
+    def _write_put(self, table: FakeTable, item: Dict, params: Dict, emit: bool = True) -> Dict:
+        context = _ExpressionContext(params.get('ExpressionAttributeNames'), params.get('ExpressionAttributeValues'))
+        old_item = table.items.get(table.key_of(item))
+        if not self._check_condition(params, old_item, context):
+            raise FakeAwsError('ConditionalCheckFailedException', "The conditional request failed")
+        table.put(item)
+        if emit:
+            self._emit(table, old_item, item)
+        return self._return_values(params, old_item, item)
+
+    def _update_item(self, params: Dict) -> Dict:
+        table = self.table(params['TableName'])
+        response = self._write_update(table, params)
+        item = table.items.get(table.key_of(deserialize_item(params['Key'])))
+        response.update(self._consumed_capacity(params, table.name, self._write_units(_item_size(item or {}))))
+        return response
+
+    def _write_update(self, table: FakeTable, params: Dict, emit: bool = True) -> Dict:
+        context = _ExpressionContext(params.get('ExpressionAttributeNames'), params.get('ExpressionAttributeValues'))
+        key_item = deserialize_item(params['Key'])
+        old_item = table.items.get(table.key_of(key_item))
+        if not self._check_condition(params, old_item, context):
+            raise FakeAwsError('ConditionalCheckFailedException', "The conditional request failed")
+        actions = _ExpressionParser(params.get('UpdateExpression', '')).parse_update()
+        new_item = _apply_update(actions, old_item or key_item, context)
+        table.put(new_item)
+        if emit:
+            self._emit(table, old_item, new_item)
+        return self._return_values(params, old_item, new_item, _updated_attribute_names(actions, context))
+
+    def _delete_item(self, params: Dict) -> Dict:
+        table = self.table(params['TableName'])
+        response = self._write_delete(table, params)
+        response.update(self._consumed_capacity(params, table.name, 1.0))
+        return response
+
+    def _write_delete(self, table: FakeTable, params: Dict, emit: bool = True) -> Dict:
+        context = _ExpressionContext(params.get('ExpressionAttributeNames'), params.get('ExpressionAttributeValues'))
+        key = table.key_of(deserialize_item(params['Key']))
+        old_item = table.items.get(key)
+        if not self._check_condition(params, old_item, context):
+            raise FakeAwsError('ConditionalCheckFailedException', "The conditional request failed")
+        table.delete(key)
+        if emit:
+            self._emit(table, old_item, None)
+        return self._return_values(params, old_item, None)
+
+    # multi item operations
+
+    def _read_page(self, table: FakeTable, candidates: List[Dict], params: Dict,
+                   index_name: Optional[str] = None) -> Dict:
+        context = _ExpressionContext(params.get('ExpressionAttributeNames'), params.get('ExpressionAttributeValues'))
+        start = 0
+        if params.get('ExclusiveStartKey'):
+            start_key = table.key_of(deserialize_item(params['ExclusiveStartKey']))
+            for position, item in enumerate(candidates):
+                if table.key_of(item) == start_key:
+                    start = position + 1
+                    break
+
+        limit = params.get('Limit')
+        filter_condition = _ExpressionParser(params['FilterExpression']).parse_condition() \
+            if params.get('FilterExpression') else None
+        items, scanned, size, last_item = [], 0, 0, None
+        for item in candidates[start:]:
+            if (limit is not None and scanned >= limit) or size >= DYNAMODB_PAGE_BYTES:
+                break
+            scanned += 1
+            size += _item_size(item)
+            last_item = item
+            if filter_condition is None or _evaluate(filter_condition, item, context):
+                items.append(item)
+
+        response = {'Count': len(items), 'ScannedCount': scanned}
+        if params.get('Select') != 'COUNT':
+            response['Items'] = [serialize_item(self._project(item, params, context)) for item in items]
+        if last_item is not None and start + scanned < len(candidates):
+            response['LastEvaluatedKey'] = serialize_item(table.key_attributes(last_item, index_name))
+        response.update(self._consumed_capacity(
+            params, table.name, self._read_units(size, params.get('ConsistentRead', False))
+        ))
+        return response
+
+    def _query(self, params: Dict) -> Dict:
+        table = self.table(params['TableName'])
+        index_name = params.get('IndexName')
+        hash_key = table.key_schema(index_name)[0]
+        context = _ExpressionContext(params.get('ExpressionAttributeNames'), params.get('ExpressionAttributeValues'))
+        key_condition = _ExpressionParser(params['KeyConditionExpression']).parse_condition()
+        hash_value = _find_hash_key_value(key_condition, hash_key, context)
+        if hash_value is _MISSING:
+            raise FakeAwsError('ValidationException', "Query condition missed key schema element")
+
+        candidates = [item for item in table.partition(hash_value, index_name)
+                      if _evaluate(key_condition, item, context)]
+        if not params.get('ScanIndexForward', True):
+            candidates.reverse()
+        return self._read_page(table, candidates, params, index_name)
+
+    def _scan(self, params: Dict) -> Dict:
+        table = self.table(params['TableName'])
+        candidates = list(table.items.values())
+        index_name = params.get('IndexName')
+        if index_name:
+            hash_key, range_key = table.key_schema(index_name)
+            candidates = [item for item in candidates if hash_key in item and (not range_key or range_key in item)]
+        return self._read_page(table, candidates, params, index_name)
+
+    def _batch_write_item(self, params: Dict) -> Dict:
+        units = {}
+        for table_name, requests in params['RequestItems'].items():
+            table = self.table(table_name)
+            for request in requests:
+                if 'PutRequest' in request:
+                    item = deserialize_item(request['PutRequest']['Item'])
+                    self._emit(table, table.put(item), item)
+                    size = _item_size(item)
+                else:
+                    old_item = table.delete(table.key_of(deserialize_item(request['DeleteRequest']['Key'])))
+                    self._emit(table, old_item, None)
+                    size = 1
+                units[table_name] = units.get(table_name, 0.0) + self._write_units(size)
+        response = {'UnprocessedItems': {}}
+        if params.get('ReturnConsumedCapacity') in ('TOTAL', 'INDEXES'):
+            response['ConsumedCapacity'] = [{'TableName': name, 'CapacityUnits': value} for name, value in units.items()]
+        return response
+
+    def _batch_get_item(self, params: Dict) -> Dict:
+        responses = {}
+        for table_name, request in params['RequestItems'].items():
+            table = self.table(table_name)
+            context = _ExpressionContext(request.get('ExpressionAttributeNames'), None)
+            responses[table_name] = [
+                serialize_item(self._project(table.items[key], request, context))
+                for key in (table.key_of(deserialize_item(key)) for key in request['Keys']) if key in table.items
+            ]
+        return {'Responses': responses, 'UnprocessedKeys': {}}
+
+    def _transact_write_items(self, params: Dict) -> Dict:
+        # all conditions are checked before anything is written, so that a transaction either applies fully or not
+        reasons, writes = [], []
+        for transact_item in params['TransactItems']:
+            (action, request), = transact_item.items()
+            table = self.table(request['TableName'])
+            context = _ExpressionContext(request.get('ExpressionAttributeNames'),
+                                         request.get('ExpressionAttributeValues'))
+            key_item = deserialize_item(request['Item'] if action == 'Put' else request['Key'])
+            current = table.items.get(table.key_of(key_item))
+            if self._check_condition(request, current, context):
+                reasons.append({'Code': 'None'})
+            else:
+                reasons.append({'Code': 'ConditionalCheckFailed', 'Message': "The conditional request failed"})
+            writes.append((action, table, request, current))
+
+        if any(reason['Code'] != 'None' for reason in reasons):
+            raise FakeAwsError('TransactionCanceledException',
+                               f"Transaction cancelled, please refer cancellation reasons for specific reasons "
+                               f"[{', '.join(reason['Code'] for reason in reasons)}]",
+                               CancellationReasons=reasons)
+
+        for action, table, request, current in writes:
+            request = {key: value for key, value in request.items() if key != 'ConditionExpression'}
+            if action == 'Put':
+                self._write_put(table, deserialize_item(request['Item']), request)
+            elif action == 'Update':
+                self._write_update(table, request)
+            elif action == 'Delete':
+                self._write_delete(table, request)
+        return {}
+
+
+def _snake_case(name: str) -> str:
+    return re.sub(r'(?<!^)(?=[A-Z])', '_', name).lower()
+
+
+# ---------------------------------------------------------------------------------------------------------------------
+# S3, Secrets Manager, SNS and Lambda
+
+class FakeS3:
+    """
+    Buckets in memory. Objects created under a bucket's notification prefix are passed to on_object_created
+    """
+
+    def __init__(self, on_object_created: Optional[Callable[[str, str], None]] = None):
+        self.objects: Dict[Tuple[str, str], bytes] = {}
+        self.on_object_created = on_object_created
+        self._lock = threading.Lock()
+
+    def handle(self, operation: str, params: Dict) -> Dict:
+        handler = getattr(self, f"_{_snake_case(operation)}", None)
+        if handler is None:
+            raise FakeAwsError('NotImplemented', f"S3 operation {operation} is not supported", 501)
+        return handler(params)
+
+    def _get(self, params: Dict) -> bytes:
+        with self._lock:
+            data = self.objects.get((params['Bucket'], params['Key']))
+        if data is None:
+            raise FakeAwsError('NoSuchKey', "The specified key does not exist.", 404)
+        return data
+
+    def _put_object(self, params: Dict) -> Dict:
+        body = params.get('Body', b'')
+        if hasattr(body, 'read'):
+            body = body.read()
+        if isinstance(body, str):
+            body = body.encode('utf-8')
+        with self._lock:
+            self.objects[(params['Bucket'], params['Key'])] = body
+        if self.on_object_created is not None:
+            self.on_object_created(params['Bucket'], params['Key'])
+        return {'ETag': f'"{hashlib.md5(body).hexdigest()}"'}
+
+    def _head_object(self, params: Dict) -> Dict:
+        try:
+            data = self._get(params)
+        except FakeAwsError:
+            # HEAD responses have no body, so the error code is the status code
+            raise FakeAwsError('404', "Not Found", 404)
+        return {'ContentLength': len(data), 'ETag': f'"{hashlib.md5(data).hexdigest()}"',
+                'ContentType': 'binary/octet-stream'}
+
+    def _get_object(self, params: Dict) -> Dict:
+        data = self._get(params)
+        if params.get('Range'):
+            start, _, end = params['Range'].replace('bytes=', '').partition('-')
+            data = data[int(start):int(end) + 1 if end else None]
+        return {'Body': StreamingBody(io.BytesIO(data), len(data)), 'ContentLength': len(data),
+                'ETag': f'"{hashlib.md5(data).hexdigest()}"', 'ContentType': 'binary/octet-stream'}
+
+    def _list_objects_v2(self, params: Dict) -> Dict:
+        prefix = params.get('Prefix', '')
+        max_keys = params.get('MaxKeys', 1000)
+        start_after = params.get('ContinuationToken') or params.get('StartAfter') or ''
+        with self._lock:
+            keys = sorted(key for bucket, key in self.objects
+                          if bucket == params['Bucket'] and key.startswith(prefix) and key > start_after)
+            contents = [{'Key': key, 'Size': len(self.objects[(params['Bucket'], key)])} for key in keys[:max_keys]]
+        response = {'KeyCount': len(contents), 'IsTruncated': len(keys) > max_keys, 'Prefix': prefix,
+                    'MaxKeys': max_keys}
+        if contents:
+            response['Contents'] = contents
+        if len(keys) > max_keys:
+            response['NextContinuationToken'] = contents[-1]['Key']
+        return response
+
+    def _delete_objects(self, params: Dict) -> Dict:
+        deleted = []
+        with self._lock:
+            for entry in params['Delete']['Objects']:
+                self.objects.pop((params['Bucket'], entry['Key']), None)
+                deleted.append({'Key': entry['Key']})
+        return {} if params['Delete'].get('Quiet') else {'Deleted': deleted}
+
+    def _delete_object(self, params: Dict) -> Dict:
+        with self._lock:
+            self.objects.pop((params['Bucket'], params['Key']), None)
+        return {}
+
+
+class FakeSecretsManager:
+    def __init__(self):
+        self.secrets: Dict[str, str] = {}
+        self._lock = threading.Lock()
+
+    def handle(self, operation: str, params: Dict) -> Dict:
+        with self._lock:
+            if operation == 'CreateSecret':
+                if params['Name'] in self.secrets:
+                    raise FakeAwsError('ResourceExistsException', f"The secret {params['Name']} already exists.")
+                self.secrets[params['Name']] = params.get('SecretString', '')
+                return self._describe(params['Name'])
+
+            secret_id = params['SecretId']
+            if secret_id not in self.secrets:
+                raise FakeAwsError('ResourceNotFoundException', "Secrets Manager can't find the specified secret.")
+            if operation == 'GetSecretValue':
+                return {**self._describe(secret_id), 'SecretString': self.secrets[secret_id]}
+            if operation in ('UpdateSecret', 'PutSecretValue'):
+                self.secrets[secret_id] = params.get('SecretString', self.secrets[secret_id])
+                return self._describe(secret_id)
+            if operation == 'DeleteSecret':
+                del self.secrets[secret_id]
+                return self._describe(secret_id)
+            if operation == 'DescribeSecret':
+                return self._describe(secret_id)
+        raise FakeAwsError('InvalidRequestException', f"Secrets Manager operation {operation} is not supported")
+
+    @staticmethod
+    def _describe(name: str) -> Dict:
+        return {'ARN': f"arn:aws:secretsmanager:eu-west-1:000000000000:secret:{name}", 'Name': name,
+                'VersionId': uuid.uuid4().hex}
+
+
+class FakeSNS:
+    def __init__(self):
+        self.messages: List[Dict] = []
+        self._lock = threading.Lock()
+
+    def handle(self, operation: str, params: Dict) -> Dict:
+        if operation == 'Publish':
+            with self._lock:
+                self.messages.append({'Subject': params.get('Subject'), 'Message': params['Message']})
+            return {'MessageId': uuid.uuid4().hex}
+        if operation == 'PublishBatch':
+            successful = []
+            with self._lock:
+                for entry in params['PublishBatchRequestEntries']:
+                    self.messages.append({'Subject': entry.get('Subject'), 'Message': entry['Message']})
+                    successful.append({'Id': entry['Id'], 'MessageId': uuid.uuid4().hex})
+            return {'Successful': successful, 'Failed': []}
+        raise FakeAwsError('InvalidParameter', f"SNS operation {operation} is not supported")
+
+
+class FakeLambda:
+    """
+    Passes invocations on to on_invoke(function name, payload, invocation type), which returns the function's
+    response for RequestResponse invocations
+    """
+
+    def __init__(self, on_invoke: Optional[Callable[[str, Dict, str], Any]] = None):
+        self.on_invoke = on_invoke
+
+    def handle(self, operation: str, params: Dict) -> Dict:
+        if operation != 'Invoke':
+            raise FakeAwsError('InvalidRequestContentException', f"Lambda operation {operation} is not supported")
+        payload = params.get('Payload') or b'{}'
+        if hasattr(payload, 'read'):
+            payload = payload.read()
+        invocation_type = params.get('InvocationType', 'RequestResponse')
+        function_name = params['FunctionName'].split(':')[-1]
+        if self.on_invoke is None:
+            raise FakeAwsError('ResourceNotFoundException', f"Function not found: {function_name}", 404)
+        result = self.on_invoke(function_name, json.loads(payload), invocation_type)
+        if invocation_type == 'Event':
+            return {'StatusCode': 202, 'Payload': StreamingBody(io.BytesIO(b''), 0)}
+        body = json.dumps(result, default=str).encode('utf-8')
+        return {'StatusCode': 200, 'Payload': StreamingBody(io.BytesIO(body), len(body))}
+
+
+# ---------------------------------------------------------------------------------------------------------------------
+
+class FakeAws:
+    """
+    Routes the calls of boto3 clients to the stand-ins. install() must run before the first client of the default
+    session is created, since clients copy the session's event handlers when they are created.
+
+    latencies_ms maps services to the latency added to each of their calls, and error_rates maps them to the share
+    of calls answered with a ThrottlingException instead. Since the stand-ins answer before botocore's retry handler
+    runs, these errors reach the calling code straight away, as if all retries had failed.
+    """
+
+    def __init__(self, dynamodb: FakeDynamoDB, s3: FakeS3, secretsmanager: FakeSecretsManager, sns: FakeSNS,
+                 lambda_: FakeLambda, latencies_ms: Optional[Dict[str, float]] = None,
+                 error_rates: Optional[Dict[str, float]] = None):
+        self.services = {
+            'dynamodb': dynamodb,
+            's3': s3,
+            'secretsmanager': secretsmanager,
+            'sns': sns,
+            'lambda': lambda_,
+        }
+        self.latencies_ms = {**DEFAULT_LATENCIES_MS, **(latencies_ms or {})}
+        self.error_rates = error_rates or {}
+        self.calls: Dict[str, int] = {}
+        self._calls_lock = threading.Lock()
+
+    def install(self, session=None):
+        import boto3
+
+        if session is None:
+            if boto3.DEFAULT_SESSION is None:
+                boto3.setup_default_session()
+            session = boto3.DEFAULT_SESSION
+        session.events.register('before-parameter-build', self._keep_params, unique_id='fake-aws-params')
+        session.events.register('before-call', self._answer, unique_id='fake-aws-answer')
+
+    @staticmethod
+    def _keep_params(params, context, **kwargs):
+        # the same dict is serialized in place by boto3's own handlers (e.g. the DynamoDB type serializer), so by
+        # before-call it holds the parameters as they would be sent
+        context[_PARAMS_KEY] = params
+
+    def _answer(self, model, context, **kwargs):
+        service_name = model.service_model.service_name
+        operation = model.name
+        params = context.get(_PARAMS_KEY, {})
+        with self._calls_lock:
+            self.calls[f"{service_name}.{operation}"] = self.calls.get(f"{service_name}.{operation}", 0) + 1
+
+        latency_ms = self.latencies_ms.get(service_name, 0)
+        if latency_ms:
+            time.sleep(latency_ms / 1000)
+
+        try:
+            if random.random() < self.error_rates.get(service_name, 0):
+                raise FakeAwsError('ThrottlingException', "Rate exceeded", 400)
+            service = self.services.get(service_name)
+            if service is None:
+                raise FakeAwsError('UnrecognizedClientException', f"{service_name} has no stand-in", 400)
+            parsed = service.handle(operation, params)
+            status_code = 200
+        except FakeAwsError as e:
+            status_code = e.status_code
+            parsed = {'Error': {'Code': e.code, 'Message': e.message}, **e.fields}
+
+        parsed['ResponseMetadata'] = {
+            'RequestId': uuid.uuid4().hex,
+            'HTTPStatusCode': status_code,
+            'HTTPHeaders': {},
+            'RetryAttempts': 0
+        }
+        return _http_response(status_code), parsed
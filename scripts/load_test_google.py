@@ -0,0 +1,320 @@
+"""
+A local stand-in for the Google endpoints the lambda functions call, used by scripts/load_test.py: the Gmail API
+(messages.list and messages.get), the OAuth token endpoint and the userinfo endpoint. It serves synthetic rental
+invoice emails with PDF attachments, with configurable latency and quota errors.
+
+Every mailbox is identified by the tokens issued for it: access tokens look like 'ya29.loadtest.<mailbox>.<n>' and
+refresh tokens like '1//loadtest.<mailbox>'. A mailbox holds one invoice email per month, for the months_of_history
+months up to and including the current one.
+
+Gmail enforces a quota per user of 250 quota units per second, and messages.list and messages.get cost 5 units each.
+The server enforces the same per mailbox, answering with 429 rateLimitExceeded like Gmail does, and additionally
+fails error_rate of all requests with a 429.
+"""
+import json
+import time
+import base64
+import random
+import hashlib
+import threading
+from datetime import datetime
+from email.mime.text import MIMEText
+from email.mime.multipart import MIMEMultipart
+from email.mime.application import MIMEApplication
+from email.utils import format_datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urlparse, parse_qs
+
+GMAIL_QUOTA_UNITS_PER_SECOND = 250
+GMAIL_CALL_QUOTA_UNITS = 5
+ACCESS_TOKEN_PREFIX = 'ya29.loadtest.'
+REFRESH_TOKEN_PREFIX = '1//loadtest.'
+
+
+def access_token_for(mailbox: str, generation: int = 0) -> str:
+    return f"{ACCESS_TOKEN_PREFIX}{mailbox}.{generation}"
+
+
+def refresh_token_for(mailbox: str) -> str:
+    return f"{REFRESH_TOKEN_PREFIX}{mailbox}"
+
+
+def _mailbox_of_token(token: str) -> Optional[str]:
+    if token.startswith(ACCESS_TOKEN_PREFIX):
+        return token[len(ACCESS_TOKEN_PREFIX):].rsplit('.', 1)[0]
+    if token.startswith(REFRESH_TOKEN_PREFIX):
+        return token[len(REFRESH_TOKEN_PREFIX):]
+    return None
+
+
+def _months_back(count: int, today: datetime) -> List[Tuple[int, int]]:
+    months = []
+    year, month = today.year, today.month
+    for _ in range(count):
+        months.append((year, month))
+        year, month = (year, month - 1) if month > 1 else (year - 1, 12)
+    return months
+
+
+def synthetic_invoice(mailbox: str, year: int, month: int) -> Dict:
+    """
+    Returns the fields of a mailbox's invoice for a month. They are derived from a hash, so they are the same
+    every time, and match what parse_invoice extracts from the attachment
+    """
+    seed = int(hashlib.sha256(f"{mailbox}-{year}-{month}".encode('utf-8')).hexdigest()[:12], 16)
+    rent = 8000 + seed % 1500
+    electricity = 150 + seed % 400
+    cold_water = 60 + seed % 90
+    hot_water = 90 + seed % 120
+    vat = round(electricity * 0.2)
+    return {
+        'ocr': str(1000000000 + seed % 9000000000)[:10],
+        'due_date': f"{year}-{month:02d}-28",
+        'rent': rent,
+        'electricity': electricity,
+        'cold_water': cold_water,
+        'hot_water': hot_water,
+        'vat': vat,
+        'total': rent + electricity + cold_water + hot_water + vat,
+    }
+
+
+def _invoice_text(invoice: Dict) -> List[str]:
+    # the layout pdftotext produces for a Hyresavi invoice, which HyresaviParser expects
+    return [
+        'Hyresavi', '',
+        'Hyra', 'Kallvatten', 'Varmvatten', 'El enligt mätare',
+        f"{invoice['rent']:,}".replace(',', ' '), str(invoice['cold_water']), str(invoice['hot_water']),
+        str(invoice['electricity']), '',
+        f"Moms: {invoice['vat']}", '',
+        f"Förfallodatum: {invoice['due_date']}", '',
+        'Totalt att betala:', '', f"{invoice['total']:,}".replace(',', ' '), '',
+        f"{invoice['ocr']} #",
+    ]
+
+
+def build_invoice_pdf(invoice: Dict) -> bytes:
+    """
+    Returns a minimal one-page PDF holding the text of an invoice, one line per text object
+    """
+    def escape(line: str) -> str:
+        return line.replace('\\', '\\\\').replace('(', '\\(').replace(')', '\\)')
+
+    lines = ['BT', '/F1 11 Tf', '14 TL', '50 800 Td']
+    for line in _invoice_text(invoice):
+        lines.append(f"({escape(line)}) Tj T*")
+    lines.append('ET')
+    stream = '\n'.join(lines).encode('latin-1')
+
+    objects = [
+        b'<< /Type /Catalog /Pages 2 0 R >>',
+        b'<< /Type /Pages /Kids [3 0 R] /Count 1 >>',
+        b'<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] /Contents 4 0 R '
+        b'/Resources << /Font << /F1 5 0 R >> >> >>',
+        b'<< /Length ' + str(len(stream)).encode('ascii') + b' >>\nstream\n' + stream + b'\nendstream',
+        b'<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>',
+    ]
+    pdf = b'%PDF-1.4\n'
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(pdf))
+        pdf += f"{number} 0 obj\n".encode('ascii') + body + b'\nendobj\n'
+    xref_offset = len(pdf)
+    pdf += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode('ascii')
+    pdf += b''.join(f"{offset:010d} 00000 n \n".encode('ascii') for offset in offsets)
+    pdf += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref_offset}\n%%EOF\n".encode('ascii')
+    return pdf
+
+
+def invoice_filename(invoice: Dict) -> str:
+    return f"Hyresavi_{invoice['ocr']}.pdf"
+
+
+class _QuotaBucket:
+    def __init__(self, units_per_second: float):
+        self.units_per_second = units_per_second
+        self.units = units_per_second
+        self.updated = time.monotonic()
+
+    def take(self, units: float) -> bool:
+        now = time.monotonic()
+        self.units = min(self.units_per_second, self.units + (now - self.updated) * self.units_per_second)
+        self.updated = now
+        if self.units < units:
+            return False
+        self.units -= units
+        return True
+
+
+class FakeGoogleServer:
+    """
+    Serves the fake Google endpoints from a thread of the calling process. base_url is known once start() returns.
+    """
+
+    def __init__(self, sender: str, subject: str, months_of_history: int = 24, latency_ms: float = 0.0,
+                 error_rate: float = 0.0, quota_units_per_second: float = GMAIL_QUOTA_UNITS_PER_SECOND):
+        self.sender = sender
+        self.subject = subject
+        self.months_of_history = months_of_history
+        self.latency_ms = latency_ms
+        self.error_rate = error_rate
+        self.quota_units_per_second = quota_units_per_second
+        self.requests: Dict[str, int] = {}
+        self.quota_errors = 0
+        self._quota_buckets: Dict[str, _QuotaBucket] = {}
+        self._raw_messages: Dict[str, str] = {}
+        self._lock = threading.Lock()
+        self._server: Optional[ThreadingHTTPServer] = None
+        self.base_url = None
+
+    # mailbox contents
+
+    def messages(self, mailbox: str) -> List[Tuple[str, int, int]]:
+        """
+        Returns the (message ID, year, month) of a mailbox's invoice emails, newest first like Gmail
+        """
+        return [(f"{mailbox}-{year}{month:02d}", year, month)
+                for year, month in _months_back(self.months_of_history, datetime.utcnow())]
+
+    def raw_message(self, message_id: str) -> Optional[str]:
+        with self._lock:
+            raw = self._raw_messages.get(message_id)
+        if raw is not None:
+            return raw
+
+        mailbox, _, year_month = message_id.rpartition('-')
+        if not mailbox or len(year_month) != 6 or not year_month.isdigit():
+            return None
+        year, month = int(year_month[:4]), int(year_month[4:])
+        invoice = synthetic_invoice(mailbox, year, month)
+
+        message = MIMEMultipart()
+        message['From'] = self.sender
+        message['To'] = f"{mailbox}@example.com"
+        message['Subject'] = self.subject.capitalize()
+        message['Date'] = format_datetime(datetime(year, month, 1, 8, 0))
+        message.attach(MIMEText(f"Din hyresavi för {year}-{month:02d} finns bifogad.", 'plain', 'utf-8'))
+        attachment = MIMEApplication(build_invoice_pdf(invoice), _subtype='pdf')
+        attachment.add_header('Content-Disposition', 'attachment', filename=invoice_filename(invoice))
+        message.attach(attachment)
+        raw = base64.urlsafe_b64encode(message.as_bytes()).decode('ascii')
+        with self._lock:
+            self._raw_messages[message_id] = raw
+        return raw
+
+    # requests
+
+    def _count(self, endpoint: str):
+        with self._lock:
+            self.requests[endpoint] = self.requests.get(endpoint, 0) + 1
+
+    def _take_quota(self, mailbox: str) -> bool:
+        with self._lock:
+            bucket = self._quota_buckets.get(mailbox)
+            if bucket is None:
+                bucket = self._quota_buckets[mailbox] = _QuotaBucket(self.quota_units_per_second)
+            allowed = bucket.take(GMAIL_CALL_QUOTA_UNITS) and random.random() >= self.error_rate
+            if not allowed:
+                self.quota_errors += 1
+            return allowed
+
+    def handle(self, method: str, url: str, headers: Dict[str, str], body: bytes) -> Tuple[int, Dict]:
+        if self.latency_ms:
+            time.sleep(self.latency_ms * random.uniform(0.5, 1.5) / 1000)
+
+        parsed = urlparse(url)
+        path = parsed.path.rstrip('/')
+        query = parse_qs(parsed.query)
+        authorization = headers.get('authorization', '')
+        token = authorization[len('Bearer '):] if authorization.startswith('Bearer ') else ''
+
+        if method == 'POST' and path == '/token':
+            self._count('oauth.token')
+            form = parse_qs(body.decode('utf-8'))
+            mailbox = _mailbox_of_token(form.get('refresh_token', [''])[0])
+            if form.get('grant_type', [''])[0] != 'refresh_token' or mailbox is None:
+                return 400, {'error': 'invalid_grant', 'error_description': 'Bad Request'}
+            return 200, {
+                'access_token': access_token_for(mailbox, int(time.time() * 1000)),
+                'expires_in': 3599,
+                'scope': 'https://www.googleapis.com/auth/gmail.readonly',
+                'token_type': 'Bearer'
+            }
+
+        mailbox = _mailbox_of_token(token)
+        if mailbox is None:
+            return 401, {'error': {'code': 401, 'message': 'Request had invalid authentication credentials.',
+                                   'status': 'UNAUTHENTICATED'}}
+
+        if method == 'GET' and path == '/oauth2/v3/userinfo':
+            self._count('oauth.userinfo')
+            return 200, {'id': hashlib.sha256(mailbox.encode('utf-8')).hexdigest()[:21],
+                         'email': f"{mailbox}@example.com", 'name': mailbox, 'verified_email': True}
+
+        if method == 'GET' and path.startswith('/gmail/v1/users/me/messages'):
+            message_id = path[len('/gmail/v1/users/me/messages'):].lstrip('/')
+            self._count('gmail.messages.get' if message_id else 'gmail.messages.list')
+            if not self._take_quota(mailbox):
+                return 429, {'error': {'code': 429, 'message': 'User-rate limit exceeded.',
+                                       'errors': [{'reason': 'rateLimitExceeded', 'domain': 'usageLimits'}],
+                                       'status': 'RESOURCE_EXHAUSTED'}}
+            if message_id:
+                raw = self.raw_message(message_id) if message_id.startswith(f"{mailbox}-") else None
+                if raw is None:
+                    return 404, {'error': {'code': 404, 'message': 'Requested entity was not found.',
+                                           'status': 'NOT_FOUND'}}
+                return 200, {'id': message_id, 'threadId': message_id, 'raw': raw}
+            return 200, self._search(mailbox, query.get('q', [''])[0])
+
+        return 404, {'error': {'code': 404, 'message': f"{method} {path} is not served", 'status': 'NOT_FOUND'}}
+
+    def _search(self, mailbox: str, q: str) -> Dict:
+        after = None
+        sender_matches = True
+        for term in q.split():
+            if term.startswith('after:'):
+                after = tuple(int(part) for part in term[len('after:'):].split('/')[:2])
+            elif term.startswith('from:'):
+                sender_matches = term[len('from:'):].lower() == self.sender.lower()
+        messages = [{'id': message_id, 'threadId': message_id}
+                    for message_id, year, month in self.messages(mailbox)
+                    if sender_matches and (after is None or (year, month) >= after)]
+        return {'messages': messages, 'resultSizeEstimate': len(messages)} if messages else {'resultSizeEstimate': 0}
+
+    # server
+
+    def start(self, host: str = '127.0.0.1', port: int = 0) -> str:
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def _respond(self):
+                length = int(self.headers.get('Content-Length') or 0)
+                body = self.rfile.read(length) if length else b''
+                status, payload = fake.handle(self.command, self.path,
+                                              {key.lower(): value for key, value in self.headers.items()}, body)
+                data = json.dumps(payload).encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json; charset=UTF-8')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            do_GET = _respond
+            do_POST = _respond
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        self.base_url = f"http://{host}:{self._server.server_address[1]}"
+        return self.base_url
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
@@ -0,0 +1,88 @@
+"""
+Breaks down the import time of each lambda function by module, using Python's -X importtime. The handler module is
+imported in a fresh process with the common layer on the path, like in benchmark_cold_start.py, and the modules
+with the highest cumulative import time are listed along with the total self time per top-level package.
+
+Heavy packages that are loaded during import (boto3, the Google client libraries, jwt, redis) are flagged, since the
+common layer imports them on first use.
+
+Usage:
+    python scripts/profile_imports.py
+    python scripts/profile_imports.py --only login_user fetch_latest_invoice --top 15
+"""
+import os
+import sys
+import argparse
+import subprocess
+from collections import defaultdict
+
+from benchmark_cold_start import DUMMY_ENVIRONMENT, IMPORT_SNIPPET, LAYER_PATH, find_lambdas
+
+HEAVY_PACKAGES = ('boto3', 'botocore', 's3transfer', 'google', 'googleapiclient', 'jwt', 'redis')
+
+
+def profile(handler_path: str):
+    """
+    Returns a list of (module, self time in µs, cumulative time in µs, depth) for every module imported by the handler
+    module, in import order, or an error message if the import failed
+    """
+    environment = {
+        **os.environ,
+        **DUMMY_ENVIRONMENT,
+        'PYTHONPATH': os.pathsep.join([LAYER_PATH, os.path.dirname(handler_path)])
+    }
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', IMPORT_SNIPPET, handler_path],
+        env=environment, capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        error = result.stderr.strip().splitlines()
+        return None, error[-1] if error else f"exit code {result.returncode}"
+
+    modules = []
+    for line in result.stderr.splitlines():
+        # import time: self [us] | cumulative | imported package
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        depth = (len(name) - len(name.lstrip())) // 2
+        modules.append((name.strip(), int(self_us), int(cumulative_us), depth))
+    return modules, None
+
+
+def report(name: str, modules, top: int):
+    # the snippet itself starts with `import sys, time, importlib.util`; only the top-level imports after it count
+    total_us = sum(cumulative_us for _, _, cumulative_us, depth in modules if depth == 0)
+    print(f"\n=== {name}: {total_us / 1000:.1f} ms in {len(modules)} modules")
+
+    print(f"  {'cumulative (ms)':>15} | {'self (ms)':>9} | module")
+    for module, self_us, cumulative_us, _ in sorted(modules, key=lambda module: -module[2])[:top]:
+        print(f"  {cumulative_us / 1000:>15.1f} | {self_us / 1000:>9.1f} | {module}")
+
+    per_package = defaultdict(int)
+    for module, self_us, _, _ in modules:
+        per_package[module.split('.')[0]] += self_us
+    print(f"  {'self per package (ms)':>21} | package")
+    for package, self_us in sorted(per_package.items(), key=lambda item: -item[1])[:top]:
+        flag = '  <- heavy, load on first use' if package in HEAVY_PACKAGES else ''
+        print(f"  {self_us / 1000:>21.1f} | {package}{flag}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Profile the imports of the lambda functions")
+    parser.add_argument('--only', nargs='*', help="Names of the lambda functions to profile")
+    parser.add_argument('--top', type=int, default=10, help="Number of modules and packages to list")
+    args = parser.parse_args()
+
+    for name, path in find_lambdas():
+        if args.only and name not in args.only:
+            continue
+        modules, error = profile(path)
+        if error:
+            print(f"\n=== {name}: skipped: {error}")
+            continue
+        report(name, modules, args.top)
+
+
+if __name__ == '__main__':
+    main()
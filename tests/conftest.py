@@ -0,0 +1,98 @@
+"""
+The tests run the lambda functions and the common layer against the in-process AWS stand-ins of the load test
+(scripts/load_test_aws.py), with the same tables and environment as scripts/load_test.py.
+
+    python -m pytest -q tests
+"""
+import os
+import sys
+
+import pytest
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(REPO_ROOT, 'scripts'))
+
+from load_test import ENVIRONMENT, TABLE_SCHEMAS, LAYER_PATH, LambdaContext, load_handler  # noqa: E402
+from load_test_aws import FakeAws, FakeDynamoDB, FakeS3, FakeSecretsManager, FakeSNS, FakeLambda  # noqa: E402
+
+os.environ.update(ENVIRONMENT)
+if LAYER_PATH not in sys.path:
+    sys.path.insert(0, LAYER_PATH)
+
+
+@pytest.fixture
+def aws():
+    """
+    A fresh set of stand-ins without latencies, installed on a new default boto3 session. The clients and the caches
+    that the common layer keeps per container are dropped, so every test starts like a cold container.
+    """
+    import boto3
+    from utils import handler_utils
+    from utils.jwt_utils import verified_tokens
+    from utils.secretsmanager_utils import secret_cache
+
+    boto3.DEFAULT_SESSION = None
+    boto3.setup_default_session()
+    handler_utils._aws_clients.clear()
+    secret_cache.clear()
+    verified_tokens.clear()
+
+    fake_aws = FakeAws(FakeDynamoDB(TABLE_SCHEMAS), FakeS3(), FakeSecretsManager(), FakeSNS(), FakeLambda(),
+                       latencies_ms={service: 0 for service in ('dynamodb', 's3', 'secretsmanager', 'sns', 'lambda')})
+    fake_aws.install()
+    yield fake_aws
+    handler_utils._aws_clients.clear()
+    boto3.DEFAULT_SESSION = None
+
+
+@pytest.fixture
+def dynamodb_calls(aws, monkeypatch):
+    """
+    Records the operation and the parameters, as sent, of every call answered by the DynamoDB stand-in
+    """
+    dynamodb = aws.services['dynamodb']
+    handle = dynamodb.handle
+    calls = []
+
+    def recording_handle(operation, params):
+        calls.append((operation, params))
+        return handle(operation, params)
+    monkeypatch.setattr(dynamodb, 'handle', recording_handle)
+    return calls
+
+
+@pytest.fixture
+def lambda_handler():
+    """
+    Imports the lambda_handler of a function, e.g. lambda_handler('invoices', 'get_rental_invoice'). The module is
+    imported anew on every call, so module level state (such as caches) is not shared between tests.
+    """
+    def load(group: str, name: str, handler_file: str = 'main.py'):
+        handler, error = load_handler(name, os.path.join(REPO_ROOT, 'lambdas', group, name, handler_file))
+        if handler is None:
+            pytest.skip(f"{name} can't be imported here: {error}")
+        return handler
+    return load
+
+
+@pytest.fixture
+def context():
+    return LambdaContext('test', 30)
+
+
+@pytest.fixture
+def api_event():
+    """
+    Builds the API Gateway event (payload format 2.0) of a request that passed the authorizer
+    """
+    def build(user_id: str, path_parameters: dict = None, query: dict = None, headers: dict = None, body=None):
+        return {
+            'version': '2.0',
+            'headers': headers or {},
+            'queryStringParameters': query,
+            'pathParameters': path_parameters or {},
+            'requestContext': {'authorizer': {'lambda': {'user_id': user_id}}, 'http': {'method': 'GET'}},
+            'body': body,
+            'isBase64Encoded': False,
+        }
+    return build
@@ -0,0 +1,63 @@
+import threading
+
+import pytest
+
+from load_test import USERS_TABLE
+
+USER_ID = 'user-1'
+
+
+@pytest.fixture
+def users_table(aws):
+    from utils.handler_utils import get_table
+
+    table = get_table(USERS_TABLE)
+    table.put_item(Item={'UserID': USER_ID, 'Email': 'tenant@example.com'})
+    return table
+
+
+def build_steps(release: threading.Event, runs: dict):
+    """
+    Four steps that record how often they ran, of which 's3_folder' blocks until release is set
+    """
+    def step(name):
+        def run():
+            runs[name] = runs.get(name, 0) + 1
+            if name == 's3_folder':
+                release.wait(5)
+        return run
+    return {name: step(name) for name in ('invoices', 'aggregates', 'credentials', 's3_folder')}
+
+
+def test_running_step_finishes_within_the_grace_period(users_table):
+    from utils.deletion_utils import run_account_deletion
+    from utils.dynamodb_utils import get_user_deletion_progress
+
+    release, runs = threading.Event(), {}
+    threading.Timer(0.2, release.set).start()
+
+    assert run_account_deletion(users_table, USER_ID, build_steps(release, runs), 'sync',
+                                timeout_seconds=0.05, grace_seconds=2)
+    # the slow step finished before returning, so there is nothing left to hand over
+    assert get_user_deletion_progress(users_table, USER_ID) is None
+    assert runs == {'invoices': 1, 'aggregates': 1, 'credentials': 1, 's3_folder': 1}
+
+
+def test_step_outlasting_the_grace_period_is_handed_over(users_table):
+    from utils.deletion_utils import run_account_deletion
+    from utils.dynamodb_utils import get_user_deletion_progress
+
+    release, runs = threading.Event(), {}
+    steps = build_steps(release, runs)
+    try:
+        assert not run_account_deletion(users_table, USER_ID, steps, 'sync', timeout_seconds=0.05, grace_seconds=0.1)
+        assert get_user_deletion_progress(users_table, USER_ID)['DeletionSteps'] == {
+            'invoices', 'aggregates', 'credentials'
+        }
+    finally:
+        release.set()
+
+    # the next run only repeats the step that was still running, and that step finishes the deletion
+    assert run_account_deletion(users_table, USER_ID, steps, 'async')
+    assert runs == {'invoices': 1, 'aggregates': 1, 'credentials': 1, 's3_folder': 2}
+    assert get_user_deletion_progress(users_table, USER_ID) is None
@@ -0,0 +1,76 @@
+import pytest
+
+from load_test import ENVIRONMENT
+
+JWT_SECRET = ENVIRONMENT['JWT_SECRET']
+
+
+@pytest.fixture
+def handler(aws, lambda_handler):
+    return lambda_handler('auth', 'authorizer')
+
+
+@pytest.mark.parametrize('headers', [None, {}, {'authorization': None}])
+def test_requests_without_an_authorization_header_are_not_authorized(handler, context, headers):
+    assert handler({'headers': headers}, context) == {'isAuthorized': False}
+
+
+def test_a_valid_token_passes_on_the_user_id(handler, context):
+    from utils.jwt_utils import generate_jwt_token
+
+    token = generate_jwt_token('user-1', 'tenant@example.com', JWT_SECRET)
+
+    response = handler({'headers': {'authorization': f"Bearer {token}"}}, context)
+
+    assert response == {'isAuthorized': True, 'context': {'user_id': 'user-1'}}
+
+
+def test_get_user_id_handles_a_null_headers_field(aws):
+    from utils.exceptions import InvalidCredentialsError
+    from utils.jwt_utils import get_user_id
+
+    with pytest.raises(InvalidCredentialsError):
+        get_user_id({'headers': None, 'requestContext': {}}, JWT_SECRET)
+
+
+def expired_token(user_id: str = 'user-1') -> str:
+    import jwt
+
+    return jwt.encode({'user_id': user_id, 'email': 'tenant@example.com', 'exp': 1}, JWT_SECRET, algorithm='HS256')
+
+
+@pytest.mark.parametrize('token', [expired_token(), 'not-a-jwt'])
+def test_rejected_tokens_are_let_through_without_a_user_id(handler, context, token):
+    assert handler({'headers': {'authorization': f"Bearer {token}"}}, context) == {
+        'isAuthorized': True, 'context': {}
+    }
+
+
+@pytest.fixture
+def api_gateway(aws, lambda_handler):
+    from load_test import LatencyStats, LocalRuntime, LocalApiGateway
+
+    handlers = {name: lambda_handler(group, name) for group, name in (('auth', 'authorizer'),
+                                                                       ('invoices', 'get_rental_invoices'))}
+    return LocalApiGateway(LocalRuntime(handlers, {}, LatencyStats(), 0), LatencyStats())
+
+
+@pytest.mark.parametrize('token, error_code', [(expired_token(), 'TOKEN_EXPIRED'), ('not-a-jwt', 'INVALID_TOKEN')])
+def test_rejected_tokens_are_answered_with_401_and_the_error_code(api_gateway, token, error_code):
+    for _ in range(2):
+        # the second request is authorized from API Gateway's cache
+        status, _, body = api_gateway.request('GET', '/v1/invoices/rental', token=token)
+
+        assert status == 401
+        assert body['error']['code'] == error_code
+
+
+def test_valid_and_missing_tokens_through_api_gateway(api_gateway):
+    from utils.jwt_utils import generate_jwt_token
+
+    status, _, _ = api_gateway.request('GET', '/v1/invoices/rental',
+                                       token=generate_jwt_token('user-1', 'tenant@example.com', JWT_SECRET))
+    assert status == 200
+
+    status, _, body = api_gateway.request('GET', '/v1/invoices/rental')
+    assert (status, body) == (401, {'message': 'Unauthorized'})
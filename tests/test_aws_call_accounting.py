@@ -0,0 +1,116 @@
+import json
+from decimal import Decimal
+
+import pytest
+
+from load_test import ENVIRONMENT, INVOICES_TABLE, USERS_TABLE
+from load_test_aws import FakeAwsError
+
+USER_ID = 'user-1'
+
+
+@pytest.fixture
+def call_accounting(aws, monkeypatch):
+    """
+    Turns the call accounting on. The aws fixture dropped the clients of earlier tests, so every client created from
+    here on is instrumented
+    """
+    from utils.aws_call_utils import aws_call_accounting
+
+    monkeypatch.setattr(aws_call_accounting, 'enabled', True)
+    aws_call_accounting.reset()
+    yield aws_call_accounting
+    aws_call_accounting.reset()
+
+
+@pytest.fixture
+def handler(call_accounting, lambda_handler):
+    from utils.handler_utils import get_table
+    from utils.dynamodb_utils import create_invoice_in_dynamodb
+
+    get_table(USERS_TABLE).put_item(Item={'UserID': USER_ID, 'Email': 'tenant@example.com', 'InvoicesVersion': 1})
+    for month in range(1, 4):
+        create_invoice_in_dynamodb(get_table(INVOICES_TABLE), f"Invoice_{month}", USER_ID, {
+            'Due Date': f"28-{month:02d}-2024", 'due_date_month': str(month), 'due_date_year': '2024',
+            'Total Amount': Decimal(8000 + month)
+        })
+    return lambda_handler('invoices', 'get_rental_invoices')
+
+
+def test_invoice_list_stays_within_its_budget(call_accounting, handler, api_event, context):
+    response = handler(api_event(USER_ID, {'type': 'rental'}), context)
+
+    assert response['statusCode'] == 200
+    # the version of the user's invoices, and one page of the invoices
+    call_accounting.assert_call_budget({'dynamodb.GetItem': 1, 'dynamodb.Query': 1, 'dynamodb.Scan': 0, '*': 2})
+    operations = call_accounting.get_operations()
+    assert operations['dynamodb.GetItem']['capacity_units'] == 0.5
+    assert operations['dynamodb.Query']['capacity_units'] > 0
+    assert call_accounting.get_totals()['errors'] == 0
+
+    # the warm invocation is served from the cache, after reading the version
+    handler(api_event(USER_ID, {'type': 'rental'}), context)
+    call_accounting.assert_call_budget({'dynamodb.GetItem': 1, 'dynamodb.Query': 0, '*': 1})
+    with pytest.raises(AssertionError, match="dynamodb.GetItem: 1 calls, budget 0"):
+        call_accounting.assert_call_budget({'dynamodb.GetItem': 0})
+
+
+def test_unchanged_refresh_stays_within_its_budget(call_accounting, handler, api_event, context):
+    etag = handler(api_event(USER_ID, {'type': 'rental'}), context)['headers']['ETag']
+
+    response = handler(api_event(USER_ID, {'type': 'rental'}, headers={'if-none-match': etag}), context)
+
+    assert response['statusCode'] == 304
+    call_accounting.assert_call_budget({'dynamodb.GetItem': 1, '*': 1})
+    assert call_accounting.get_totals()['capacity_units'] == 0.5
+
+
+def test_failed_query_is_counted_as_an_error(aws, call_accounting, handler, api_event, context, monkeypatch):
+    dynamodb = aws.services['dynamodb']
+    handle = dynamodb.handle
+
+    def failing_handle(operation, params):
+        if operation == 'Query':
+            raise FakeAwsError('InternalServerError', "Internal server error", 500)
+        return handle(operation, params)
+    monkeypatch.setattr(dynamodb, 'handle', failing_handle)
+
+    response = handler(api_event(USER_ID, {'type': 'rental'}), context)
+
+    assert response['statusCode'] == 502
+    assert json.loads(response['body'])['error']['code'] == 'DEPENDENCY_FAILURE'
+    call_accounting.assert_call_budget({'dynamodb.GetItem': 1, 'dynamodb.Query': 1, '*': 2})
+    operations = call_accounting.get_operations()
+    assert operations['dynamodb.Query']['errors'] == 1
+    assert operations['dynamodb.GetItem']['errors'] == 0
+
+
+def test_throttled_version_read_fails_fast(aws, call_accounting, handler, api_event, context):
+    aws.error_rates['dynamodb'] = 1.0
+
+    response = handler(api_event(USER_ID, {'type': 'rental'}), context)
+
+    assert response['statusCode'] == 502
+    # the invoices are never queried once the version can't be read
+    call_accounting.assert_call_budget({'dynamodb.GetItem': 1, 'dynamodb.Query': 0, '*': 1})
+    assert call_accounting.get_totals()['errors'] == 1
+
+
+def test_call_without_a_response_is_counted(call_accounting):
+    import boto3
+    from botocore.config import Config
+    from botocore.exceptions import EndpointConnectionError
+
+    # nothing listens on the discard port, so the call fails before any response (after-call-error)
+    client = boto3.session.Session().client(
+        'dynamodb', region_name=ENVIRONMENT['REGION'], endpoint_url='http://127.0.0.1:9',
+        aws_access_key_id='test', aws_secret_access_key='test',
+        config=Config(retries={'max_attempts': 1, 'mode': 'standard'}, connect_timeout=1)
+    )
+    call_accounting.instrument(client)
+
+    with pytest.raises(EndpointConnectionError):
+        client.describe_table(TableName=USERS_TABLE)
+
+    operation = call_accounting.get_operations()['dynamodb.DescribeTable']
+    assert (operation['calls'], operation['errors'], operation['capacity_units']) == (1, 1, 0)
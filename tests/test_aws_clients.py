@@ -0,0 +1,91 @@
+import pytest
+
+from load_test import ENVIRONMENT, USERS_TABLE, INVOICES_TABLE
+
+REGION = ENVIRONMENT['REGION']
+USER_ID = 'user-1'
+
+
+@pytest.fixture
+def created_clients(aws):
+    """
+    Records the service of every botocore client created from the default session, resources included
+    """
+    import boto3
+
+    services = []
+
+    def record(event_name, **kwargs):
+        # the event is named after the service ID, e.g. creating-client-class.secrets-manager
+        services.append(event_name.split('.')[-1].replace('-', ''))
+    boto3.DEFAULT_SESSION.events.register('creating-client-class', record)
+    return services
+
+
+def test_clients_resources_and_tables_are_created_once(created_clients):
+    from utils.handler_utils import get_client, get_resource, get_table
+
+    for _ in range(3):
+        sns = get_client('sns')
+        dynamodb = get_resource('dynamodb')
+        users_table = get_table(USERS_TABLE)
+        get_table(INVOICES_TABLE)
+
+    assert sorted(created_clients) == ['dynamodb', 'sns']
+    assert get_client('sns') is sns
+    assert get_resource('dynamodb') is dynamodb
+    assert users_table.meta.client is dynamodb.meta.client
+
+
+def test_clients_with_other_settings_are_created_separately(created_clients):
+    from utils.handler_utils import get_client
+
+    assert get_client('secretsmanager', region_name=REGION) is not get_client('secretsmanager')
+    assert get_client('secretsmanager', max_attempts=5) is get_client('secretsmanager', max_attempts=5)
+    assert created_clients == ['secretsmanager'] * 3
+
+
+def test_warm_invocations_create_no_clients(aws, created_clients, lambda_handler, api_event, context):
+    from utils.handler_utils import get_table
+
+    handler = lambda_handler('invoices', 'get_rental_invoices')
+    get_table(USERS_TABLE).put_item(Item={'UserID': USER_ID, 'Email': 'tenant@example.com'})
+    assert handler(api_event(USER_ID), context)['statusCode'] == 200
+    clients = len(created_clients)
+
+    for _ in range(5):
+        assert handler(api_event(USER_ID), context)['statusCode'] == 200
+
+    assert len(created_clients) == clients
+
+
+def test_secret_reads_are_cached_and_writes_go_through(aws, created_clients):
+    from utils.secretsmanager_utils import store_oauth_tokens, get_oauth_tokens, update_oauth_tokens
+
+    store_oauth_tokens(USER_ID, 'token-1', 'refresh-token', 3600, 'https://www.googleapis.com/auth/gmail.readonly',
+                       REGION)
+    for _ in range(3):
+        assert get_oauth_tokens(USER_ID, REGION)['access_token'] == 'token-1'
+    # the stored tokens are cached when they are written
+    assert aws.calls.get('secretsmanager.GetSecretValue', 0) == 0
+
+    update_oauth_tokens(USER_ID, 'token-2', 'refresh-token', 3600, REGION)
+    assert get_oauth_tokens(USER_ID, REGION)['access_token'] == 'token-2'
+    assert aws.calls.get('secretsmanager.GetSecretValue', 0) == 0
+
+    assert get_oauth_tokens(USER_ID, REGION, use_cache=False)['access_token'] == 'token-2'
+    assert aws.calls['secretsmanager.GetSecretValue'] == 1
+    assert created_clients == ['secretsmanager']
+
+
+def test_secret_written_by_another_container_is_read_once(aws, created_clients):
+    import json
+    from utils.secretsmanager_utils import get_email_credentials
+
+    aws.services['secretsmanager'].secrets[f"gmail/user/{USER_ID}"] = json.dumps({'GMAIL_USER': 'tenant@example.com'})
+
+    for _ in range(3):
+        assert get_email_credentials(USER_ID, REGION)['GMAIL_USER'] == 'tenant@example.com'
+
+    assert aws.calls['secretsmanager.GetSecretValue'] == 1
+    assert created_clients == ['secretsmanager']
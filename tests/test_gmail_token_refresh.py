@@ -0,0 +1,134 @@
+import time
+import threading
+from types import SimpleNamespace
+from datetime import datetime, timedelta
+
+import pytest
+
+from load_test import ENVIRONMENT, USERS_TABLE
+
+USER_ID = 'user-1'
+REGION = ENVIRONMENT['REGION']
+
+
+class CountingRefresh:
+    """
+    Replaces the refresh at Google's token endpoint, which needs the Google client libraries and network access. Like
+    the real refresh, it stores the new tokens in Secrets Manager, here the stand-in
+    """
+
+    def __init__(self, duration_seconds: float = 0.2):
+        self.duration_seconds = duration_seconds
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, user_id, credentials, region, users_table=None):
+        from utils.secretsmanager_utils import update_oauth_tokens
+
+        with self._lock:
+            self.count += 1
+            token = f"new-token-{self.count}"
+        time.sleep(self.duration_seconds)
+        credentials.token = token
+        return update_oauth_tokens(user_id, token, credentials.refresh_token, 3600, region)
+
+
+@pytest.fixture
+def gmail_api_utils(aws, monkeypatch):
+    from utils import gmail_api_utils
+
+    monkeypatch.setattr(gmail_api_utils, 'TOKEN_REFRESH_POLL_SECONDS', 0.01)
+    return gmail_api_utils
+
+
+@pytest.fixture
+def refresh(gmail_api_utils, monkeypatch):
+    counting_refresh = CountingRefresh()
+    monkeypatch.setattr(gmail_api_utils, 'refresh_oauth_tokens', counting_refresh)
+    return counting_refresh
+
+
+@pytest.fixture
+def users_table(aws):
+    from utils.handler_utils import get_table
+
+    table = get_table(USERS_TABLE)
+    table.put_item(Item={'UserID': USER_ID, 'Email': 'tenant@example.com'})
+    return table
+
+
+def store_tokens(access_token: str, expires_in: int):
+    from utils.secretsmanager_utils import store_oauth_tokens
+
+    store_oauth_tokens(USER_ID, access_token, 'refresh-token', expires_in,
+                       'https://www.googleapis.com/auth/gmail.readonly', REGION)
+
+
+def credentials_of(access_token):
+    return SimpleNamespace(token=access_token, refresh_token='refresh-token', expiry=None)
+
+
+def test_parallel_invocations_refresh_the_token_once(gmail_api_utils, refresh, users_table):
+    # all invocations read the expired token, but reach the refresh at different times: some while the refresh is
+    # running, some after the lease has been released again
+    store_tokens('expired-token', -60)
+    invocations = 8
+    credentials = [credentials_of('expired-token') for _ in range(invocations)]
+    errors = []
+
+    def invoke(invocation_credentials, delay_seconds):
+        time.sleep(delay_seconds)
+        try:
+            gmail_api_utils.refresh_oauth_tokens_single_flight(USER_ID, invocation_credentials, REGION, users_table)
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=invoke, args=(invocation_credentials, index * refresh.duration_seconds / 2))
+               for index, invocation_credentials in enumerate(credentials)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    assert refresh.count == 1
+    assert {invocation_credentials.token for invocation_credentials in credentials} == {'new-token-1'}
+
+
+def test_lease_holder_uses_a_token_refreshed_before_it_took_the_lease(gmail_api_utils, refresh, users_table):
+    # this invocation read the expired token, then another one refreshed it and released the lease
+    store_tokens('expired-token', -60)
+    refresh(USER_ID, credentials_of('expired-token'), REGION)
+    credentials = credentials_of('expired-token')
+
+    oauth_data = gmail_api_utils.refresh_oauth_tokens_single_flight(USER_ID, credentials, REGION, users_table)
+
+    assert refresh.count == 1
+    assert oauth_data['access_token'] == credentials.token == 'new-token-1'
+    assert credentials.expiry > datetime.utcnow() + timedelta(minutes=55)
+
+
+def test_scheduled_refresh_skips_tokens_that_are_still_valid(gmail_api_utils, refresh, users_table):
+    # the scheduled refresh builds its credentials without an access token, so only the expiry counts
+    store_tokens('valid-token', 3600)
+
+    gmail_api_utils.refresh_oauth_tokens_single_flight(USER_ID, credentials_of(None), REGION, users_table,
+                                                       wait_seconds=0, min_valid_seconds=1800)
+    assert refresh.count == 0
+
+    store_tokens('expiring-token', 600)
+    gmail_api_utils.refresh_oauth_tokens_single_flight(USER_ID, credentials_of(None), REGION, users_table,
+                                                       wait_seconds=0, min_valid_seconds=1800)
+    assert refresh.count == 1
+
+
+def test_invocation_without_the_lease_returns_none_when_not_waiting(gmail_api_utils, refresh, users_table):
+    from utils.dynamodb_utils import acquire_token_refresh_lease
+
+    store_tokens('expired-token', -60)
+    assert acquire_token_refresh_lease(users_table, USER_ID, 'other-invocation', 30)
+
+    assert gmail_api_utils.refresh_oauth_tokens_single_flight(
+        USER_ID, credentials_of('expired-token'), REGION, users_table, wait_seconds=0
+    ) is None
+    assert refresh.count == 0
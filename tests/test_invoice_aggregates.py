@@ -0,0 +1,165 @@
+import json
+from decimal import Decimal
+
+import pytest
+
+from load_test import AGGREGATES_TABLE, INVOICES_TABLE, USERS_TABLE
+
+USER_ID = 'user-1'
+
+
+@pytest.fixture
+def stream(aws):
+    records = []
+    aws.services['dynamodb'].on_stream_record = lambda table_name, record: records.append(record)
+    return records
+
+
+@pytest.fixture
+def process_stream(stream, lambda_handler, context):
+    """
+    Delivers the stream records written so far to process_invoice_stream, and returns them
+    """
+    handler = lambda_handler('invoices', 'process_invoice_stream')
+
+    def deliver():
+        records = list(stream)
+        stream.clear()
+        assert handler({'Records': records}, context) == {'batchItemFailures': []}
+        return records
+    return deliver
+
+
+@pytest.fixture
+def invoices_table(aws):
+    from utils.handler_utils import get_table
+
+    get_table(USERS_TABLE).put_item(Item={'UserID': USER_ID, 'Email': 'tenant@example.com'})
+    return get_table(INVOICES_TABLE)
+
+
+def put_invoice(invoices_table, invoice_id: str, year: int, month: int, amount: int, rent: int = 8000):
+    from utils.dynamodb_utils import create_invoice_in_dynamodb
+
+    create_invoice_in_dynamodb(invoices_table, invoice_id, USER_ID, {
+        'Due Date': f"28-{month:02d}-{year}",
+        'due_date_month': str(month),
+        'due_date_year': str(year),
+        'Total Amount': Decimal(amount),
+        'Hyra': Decimal(rent),
+    })
+
+
+def get_aggregates(lambda_handler, api_event, context):
+    response = lambda_handler('invoices', 'get_invoice_aggregates')(api_event(USER_ID), context)
+    if response['statusCode'] == 204:
+        return None
+    return json.loads(response['body'])['data']
+
+
+def aggregates_items():
+    from utils.handler_utils import get_table
+
+    return {item['Period']: item for item in get_table(AGGREGATES_TABLE).scan()['Items']}
+
+
+def test_statistics_per_year_and_month(invoices_table, process_stream, lambda_handler, api_event, context):
+    put_invoice(invoices_table, 'Invoice_1', 2023, 12, 9000)
+    put_invoice(invoices_table, 'Invoice_2', 2024, 1, 8000)
+    put_invoice(invoices_table, 'Invoice_3', 2024, 1, 500, rent=0)
+    put_invoice(invoices_table, 'Invoice_4', 2024, 2, 8200)
+    process_stream()
+
+    aggregates = get_aggregates(lambda_handler, api_event, context)
+
+    assert sorted(aggregates['yearly']) == ['2023', '2024']
+    assert sorted(aggregates['monthly']) == ['2023-12', '2024-01', '2024-02']
+    assert aggregates['yearly']['2024']['InvoiceCount'] == 3
+    assert aggregates['yearly']['2024']['Total Amount'] == {'total': 16700, 'average': 5566.67, 'min': 500,
+                                                            'max': 8200}
+    assert aggregates['monthly']['2024-01']['Total Amount'] == {'total': 8500, 'average': 4250, 'min': 500,
+                                                                'max': 8000}
+    assert aggregates['yearly']['2024']['Hyra']['min'] == 0
+
+
+def test_modified_moved_and_removed_invoices(invoices_table, process_stream, lambda_handler, api_event, context):
+    put_invoice(invoices_table, 'Invoice_1', 2023, 12, 9000)
+    put_invoice(invoices_table, 'Invoice_2', 2024, 1, 8000)
+    put_invoice(invoices_table, 'Invoice_3', 2024, 1, 500)
+    process_stream()
+
+    # the maximum of 2024-01 is lowered, 2023's only invoice moves to 2024 and the minimum of 2024-01 is removed
+    invoices_table.update_item(Key={'UserID': USER_ID, 'InvoiceID': 'Invoice_2'},
+                               UpdateExpression="SET #amount = :amount",
+                               ExpressionAttributeNames={'#amount': 'Total Amount'},
+                               ExpressionAttributeValues={':amount': Decimal(7000)})
+    put_invoice(invoices_table, 'Invoice_1', 2024, 3, 9000)
+    invoices_table.delete_item(Key={'UserID': USER_ID, 'InvoiceID': 'Invoice_3'})
+    process_stream()
+
+    aggregates = get_aggregates(lambda_handler, api_event, context)
+    assert sorted(aggregates['yearly']) == ['2024']
+    assert sorted(aggregates['monthly']) == ['2024-01', '2024-03']
+    assert aggregates['monthly']['2024-01']['Total Amount'] == {'total': 7000, 'average': 7000, 'min': 7000,
+                                                                'max': 7000}
+    assert aggregates['yearly']['2024']['Total Amount'] == {'total': 16000, 'average': 8000, 'min': 7000,
+                                                            'max': 9000}
+    assert sorted(aggregates_items()) == ['2024', '2024-01', '2024-03']
+
+    invoices_table.delete_item(Key={'UserID': USER_ID, 'InvoiceID': 'Invoice_1'})
+    invoices_table.delete_item(Key={'UserID': USER_ID, 'InvoiceID': 'Invoice_2'})
+    process_stream()
+
+    assert get_aggregates(lambda_handler, api_event, context) is None
+    assert aggregates_items() == {}
+
+
+def test_a_retried_batch_changes_nothing(invoices_table, process_stream, dynamodb_calls, lambda_handler, context):
+    put_invoice(invoices_table, 'Invoice_1', 2024, 1, 8000)
+    put_invoice(invoices_table, 'Invoice_2', 2024, 2, 8100)
+    records = process_stream()
+    items = aggregates_items()
+
+    dynamodb_calls.clear()
+    lambda_handler('invoices', 'process_invoice_stream')({'Records': records}, context)
+
+    # the items of 2024 are read, and found up to date
+    assert [operation for operation, params in dynamodb_calls if params.get('TableName') == AGGREGATES_TABLE] == \
+        ['Query']
+    assert aggregates_items() == items
+
+
+def test_item_size_and_writes_dont_grow_with_the_history(aws, invoices_table, process_stream, dynamodb_calls):
+    from load_test_aws import _item_size
+
+    for year in range(2015, 2025):
+        for month in range(1, 13):
+            put_invoice(invoices_table, f"Invoice_{year}_{month}", year, month, 8000 + month)
+        process_stream()
+
+    dynamodb_calls.clear()
+    put_invoice(invoices_table, 'Invoice_new', 2025, 1, 8500)
+    process_stream()
+
+    aggregates_calls = [(operation, params) for operation, params in dynamodb_calls
+                        if AGGREGATES_TABLE in json.dumps(params)]
+    # one query for the items of 2025, and one transaction writing its year and month items
+    assert [operation for operation, _ in aggregates_calls] == ['Query', 'TransactWriteItems']
+    assert len(aggregates_calls[1][1]['TransactItems']) == 2
+    table = aws.services['dynamodb'].table(AGGREGATES_TABLE)
+    assert len(table.items) == 10 * 13 + 2
+    assert max(_item_size(item) for item in table.items.values()) < 2048
+
+
+def test_deleting_the_aggregates_removes_every_item(invoices_table, process_stream):
+    from utils.handler_utils import get_table
+    from utils.dynamodb_utils import delete_invoice_aggregates
+
+    for month in range(1, 13):
+        put_invoice(invoices_table, f"Invoice_{month}", 2024, month, 8000)
+    process_stream()
+    assert len(aggregates_items()) == 13
+
+    delete_invoice_aggregates(get_table(AGGREGATES_TABLE), USER_ID)
+
+    assert aggregates_items() == {}
@@ -0,0 +1,115 @@
+import json
+from decimal import Decimal
+
+import pytest
+
+from load_test import INVOICES_TABLE, USERS_TABLE
+
+USER_ID = 'user-1'
+
+
+@pytest.fixture
+def stream(aws):
+    records = []
+    aws.services['dynamodb'].on_stream_record = lambda table_name, record: records.append(record)
+    return records
+
+
+@pytest.fixture
+def process_stream(stream, lambda_handler, context):
+    """
+    Delivers the stream records written so far to process_invoice_stream, like its event source mapping
+    """
+    handler = lambda_handler('invoices', 'process_invoice_stream')
+
+    def deliver():
+        records = list(stream)
+        stream.clear()
+        handler({'Records': records}, context)
+    return deliver
+
+
+@pytest.fixture
+def tables(aws):
+    from utils.handler_utils import get_table
+
+    get_table(USERS_TABLE).put_item(Item={'UserID': USER_ID, 'Email': 'tenant@example.com'})
+    return get_table(INVOICES_TABLE)
+
+
+def put_invoice(invoices_table, month: int, amount: int):
+    from utils.dynamodb_utils import create_invoice_in_dynamodb
+
+    create_invoice_in_dynamodb(invoices_table, f"Invoice_{month}", USER_ID, {
+        'Due Date': f"28-{month:02d}-2024",
+        'due_date_month': str(month),
+        'due_date_year': '2024',
+        'Total Amount': Decimal(amount),
+    })
+
+
+def invoice_table_reads(dynamodb_calls) -> int:
+    return sum(1 for _, params in dynamodb_calls if params.get('TableName') == INVOICES_TABLE)
+
+
+def amounts_in(response) -> list:
+    body = json.loads(response['body'])
+    assert response['statusCode'] == 200, body
+    amounts = []
+
+    def collect(value):
+        if isinstance(value, dict):
+            if 'Total Amount' in value:
+                amounts.append(value['Total Amount'])
+            for field_value in value.values():
+                collect(field_value)
+        elif isinstance(value, list):
+            for item in value:
+                collect(item)
+    collect(body['data'])
+    return sorted(amounts)
+
+
+def test_invoice_list_is_reloaded_once_the_stream_event_is_processed(tables, process_stream, dynamodb_calls,
+                                                                      lambda_handler, api_event, context):
+    handler = lambda_handler('invoices', 'get_rental_invoices')
+    put_invoice(tables, 1, 8001)
+    process_stream()
+
+    assert amounts_in(handler(api_event(USER_ID), context)) == [8001]
+    reads = invoice_table_reads(dynamodb_calls)
+    assert amounts_in(handler(api_event(USER_ID), context)) == [8001]
+    assert invoice_table_reads(dynamodb_calls) == reads, "the second read should be served from the cache"
+
+    put_invoice(tables, 2, 8002)
+    tables.update_item(Key={'UserID': USER_ID, 'InvoiceID': 'Invoice_1'}, UpdateExpression="SET #amount = :amount",
+                       ExpressionAttributeNames={'#amount': 'Total Amount'},
+                       ExpressionAttributeValues={':amount': Decimal(7001)})
+    process_stream()
+
+    assert amounts_in(handler(api_event(USER_ID), context)) == [7001, 8002]
+
+    tables.delete_item(Key={'UserID': USER_ID, 'InvoiceID': 'Invoice_2'})
+    process_stream()
+
+    assert amounts_in(handler(api_event(USER_ID), context)) == [7001]
+
+
+def test_invoice_details_are_reloaded_once_the_stream_event_is_processed(tables, process_stream, dynamodb_calls,
+                                                                         lambda_handler, api_event, context):
+    handler = lambda_handler('invoices', 'get_rental_invoice')
+    event = api_event(USER_ID, path_parameters={'type': 'rental', 'invoice_id': 'Invoice_1'})
+    put_invoice(tables, 1, 8001)
+    process_stream()
+
+    assert amounts_in(handler(event, context)) == [8001]
+    reads = invoice_table_reads(dynamodb_calls)
+    assert amounts_in(handler(event, context)) == [8001]
+    assert invoice_table_reads(dynamodb_calls) == reads, "the second read should be served from the cache"
+
+    tables.update_item(Key={'UserID': USER_ID, 'InvoiceID': 'Invoice_1'}, UpdateExpression="SET #amount = :amount",
+                       ExpressionAttributeNames={'#amount': 'Total Amount'},
+                       ExpressionAttributeValues={':amount': Decimal(7001)})
+    process_stream()
+
+    assert amounts_in(handler(event, context)) == [7001]
@@ -0,0 +1,68 @@
+from decimal import Decimal
+
+import pytest
+
+from load_test import INVOICES_TABLE, USERS_TABLE
+
+USER_ID = 'user-1'
+
+
+@pytest.fixture
+def user(aws):
+    from utils.handler_utils import get_table
+    from utils.dynamodb_utils import create_invoice_in_dynamodb
+
+    get_table(USERS_TABLE).put_item(Item={'UserID': USER_ID, 'Email': 'tenant@example.com', 'InvoicesVersion': 3})
+    create_invoice_in_dynamodb(get_table(INVOICES_TABLE), 'Invoice_1', USER_ID, {
+        'Due Date': '28-01-2024', 'due_date_month': '1', 'due_date_year': '2024', 'Total Amount': Decimal(8001)
+    })
+
+
+@pytest.mark.parametrize('function_name, path_parameters', [
+    ('get_rental_invoices', {'type': 'rental'}),
+    ('get_rental_invoice', {'type': 'rental', 'invoice_id': 'Invoice_1'}),
+])
+def test_unchanged_refresh_reads_only_the_version(aws, user, dynamodb_calls, lambda_handler, api_event, context,
+                                                 function_name, path_parameters):
+    response = lambda_handler('invoices', function_name)(api_event(USER_ID, path_parameters), context)
+    assert response['statusCode'] == 200
+    etag = response['headers']['ETag']
+
+    # a new container, so that nothing is served from the invoice cache of the first one
+    handler = lambda_handler('invoices', function_name)
+    dynamodb_calls.clear()
+    response = handler(api_event(USER_ID, path_parameters, headers={'if-none-match': etag}), context)
+
+    assert response['statusCode'] == 304
+    assert response['headers']['ETag'] == etag
+    assert 'body' not in response
+    # no read of RentalInvoices at all, i.e. 0 RCU there. The version is one eventually consistent GetItem of the
+    # user's item, projected to InvoicesVersion: 0.5 RCU
+    assert [(operation, params['TableName']) for operation, params in dynamodb_calls] == [('GetItem', USERS_TABLE)]
+    operation, params = dynamodb_calls[0]
+    assert params['ProjectionExpression'] == 'InvoicesVersion'
+    assert not params.get('ConsistentRead')
+
+
+def test_version_read_consumes_half_a_read_unit(aws, user):
+    from utils.handler_utils import get_table
+
+    response = get_table(USERS_TABLE).get_item(Key={'UserID': USER_ID}, ProjectionExpression='InvoicesVersion',
+                                               ReturnConsumedCapacity='TOTAL')
+
+    assert response['Item'] == {'InvoicesVersion': 3}
+    assert response['ConsumedCapacity'] == {'TableName': USERS_TABLE, 'CapacityUnits': 0.5}
+
+
+def test_changed_invoices_are_returned_with_a_new_etag(aws, user, lambda_handler, api_event, context):
+    from utils.handler_utils import get_table
+    from utils.dynamodb_utils import bump_invoices_version
+
+    handler = lambda_handler('invoices', 'get_rental_invoices')
+    etag = handler(api_event(USER_ID, {'type': 'rental'}), context)['headers']['ETag']
+
+    bump_invoices_version(get_table(USERS_TABLE), USER_ID)
+    response = handler(api_event(USER_ID, {'type': 'rental'}, headers={'if-none-match': etag}), context)
+
+    assert response['statusCode'] == 200
+    assert response['headers']['ETag'] != etag
@@ -0,0 +1,44 @@
+import json
+import logging
+
+import pytest
+
+
+@pytest.fixture
+def log_payload(caplog):
+    from utils.logging_utils import log_payload
+
+    caplog.set_level(logging.DEBUG)
+    return log_payload
+
+
+def test_raw_json_body_is_redacted(log_payload, caplog):
+    log_payload("Body", json.dumps({'access_token': 'ya29.secret', 'refresh_token': '1//secret', 'expires_in': 3599}))
+
+    assert 'secret' not in caplog.text
+    assert '"expires_in": 3599' in caplog.text
+
+
+@pytest.mark.parametrize('text', [
+    'access_token=ya29.secret&refresh_token=1//secret&scope=gmail.readonly',
+    'Authorization: Bearer ya29.secret',
+    "{'refresh_token': '1//secret', 'scope': 'gmail.readonly'}",
+    'token eyJhbGciOiJIUzI1NiJ9.eyJzdWIiOiJ1c2VyLTEifQ.secret rejected',
+])
+def test_credentials_in_text_are_redacted(log_payload, caplog, text):
+    log_payload("Text", text)
+
+    assert 'secret' not in caplog.text
+    assert '[REDACTED]' in caplog.text
+
+
+def test_text_is_only_capped_in_total(log_payload, caplog):
+    from utils.logging_utils import PAYLOAD_FIELD_MAX_CHARS, PAYLOAD_LOG_MAX_CHARS
+
+    text = 'Hyra 8000 kr ' * PAYLOAD_LOG_MAX_CHARS
+
+    log_payload("Text", text)
+
+    assert caplog.records[0].getMessage() == f"Text: {text[:PAYLOAD_LOG_MAX_CHARS]}..." \
+                                             f"({len(text) - PAYLOAD_LOG_MAX_CHARS} more chars)"
+    assert PAYLOAD_FIELD_MAX_CHARS < PAYLOAD_LOG_MAX_CHARS
@@ -0,0 +1,91 @@
+from decimal import Decimal
+
+import pytest
+
+from load_test import AGGREGATES_TABLE, INVOICES_TABLE, USERS_TABLE
+from load_test_aws import FakeAwsError
+
+
+@pytest.fixture
+def stream(aws):
+    records = []
+    aws.services['dynamodb'].on_stream_record = lambda table_name, record: records.append(record)
+    return records
+
+
+@pytest.fixture
+def handler(lambda_handler):
+    return lambda_handler('invoices', 'process_invoice_stream')
+
+
+@pytest.fixture
+def failing_users(aws, monkeypatch):
+    """
+    Users whose aggregates item can't be written, e.g. because of an outage of its partition
+    """
+    dynamodb = aws.services['dynamodb']
+    handle = dynamodb.handle
+    users = set()
+
+    def failing_handle(operation, params):
+        if operation == 'TransactWriteItems' and any(
+            request['TableName'] == AGGREGATES_TABLE and
+            request['Item' if 'Item' in request else 'Key']['UserID']['S'] in users
+            for transact_item in params['TransactItems'] for request in transact_item.values()
+        ):
+            raise FakeAwsError('InternalServerError', "Internal server error", 500)
+        return handle(operation, params)
+    monkeypatch.setattr(dynamodb, 'handle', failing_handle)
+    return users
+
+
+def put_invoice(user_id: str, month: int, amount: int):
+    from utils.handler_utils import get_table
+    from utils.dynamodb_utils import create_invoice_in_dynamodb
+
+    get_table(USERS_TABLE).put_item(Item={'UserID': user_id, 'Email': f"{user_id}@example.com"})
+    create_invoice_in_dynamodb(get_table(INVOICES_TABLE), f"Invoice_{month}", user_id, {
+        'Due Date': f"28-{month:02d}-2024",
+        'due_date_month': str(month),
+        'due_date_year': '2024',
+        'Total Amount': Decimal(amount),
+    })
+
+
+def invoices_version(user_id: str) -> int:
+    from utils.handler_utils import get_table
+    from utils.dynamodb_utils import get_invoices_version
+
+    return get_invoices_version(get_table(USERS_TABLE), user_id)
+
+
+def test_records_of_a_failing_user_and_after_them_are_reported(aws, stream, handler, context, failing_users):
+    failing_users.add('user-b')
+    put_invoice('user-a', 1, 8001)
+    put_invoice('user-b', 1, 9001)
+    put_invoice('user-c', 1, 7001)
+    put_invoice('user-a', 2, 8002)
+    sequence_numbers = [record['dynamodb']['SequenceNumber'] for record in stream]
+
+    response = handler({'Records': stream}, context)
+
+    assert [failure['itemIdentifier'] for failure in response['batchItemFailures']] == sequence_numbers[1:]
+    # the other users are processed all the same
+    assert invoices_version('user-a') == 1
+    assert invoices_version('user-c') == 1
+    assert invoices_version('user-b') == 0
+
+
+def test_a_batch_without_failures_reports_none(aws, stream, handler, context):
+    put_invoice('user-a', 1, 8001)
+
+    assert handler({'Records': stream}, context) == {'batchItemFailures': []}
+    assert invoices_version('user-a') == 1
+
+
+def test_a_malformed_record_fails_the_batch(aws, stream, handler, context):
+    put_invoice('user-a', 1, 8001)
+    del stream[0]['dynamodb']['NewImage']
+
+    with pytest.raises(KeyError):
+        handler({'Records': stream}, context)
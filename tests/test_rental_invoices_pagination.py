@@ -0,0 +1,101 @@
+import json
+import random
+from decimal import Decimal
+
+import pytest
+
+from load_test import INVOICES_TABLE, USERS_TABLE
+
+USER_ID = 'user-1'
+
+
+@pytest.fixture
+def due_dates(aws):
+    """
+    Three years of monthly invoices of one user. The InvoiceIDs (the table's sort key) are random OCR numbers, so
+    their order has nothing to do with the due dates
+    """
+    from utils.handler_utils import get_table
+    from utils.dynamodb_utils import create_invoice_in_dynamodb
+
+    get_table(USERS_TABLE).put_item(Item={'UserID': USER_ID, 'Email': 'tenant@example.com'})
+    generator = random.Random(7)
+    due_dates = []
+    for year in (2022, 2023, 2024):
+        for month in range(1, 13):
+            due_date = f"{generator.randint(1, 28):02d}-{month:02d}-{year}"
+            create_invoice_in_dynamodb(get_table(INVOICES_TABLE), f"Invoice_{generator.randrange(10 ** 9, 10 ** 10)}",
+                                       USER_ID, {
+                                           'Due Date': due_date,
+                                           'due_date_month': str(month),
+                                           'due_date_year': str(year),
+                                           'Total Amount': Decimal(8000 + month),
+                                       })
+            due_dates.append(due_date)
+    return due_dates
+
+
+@pytest.fixture
+def handler(lambda_handler):
+    return lambda_handler('invoices', 'get_rental_invoices')
+
+
+def chronological(due_date: str) -> str:
+    return due_date[6:] + due_date[3:5] + due_date[:2]
+
+
+def read_all_pages(handler, api_event, context, query: dict) -> list:
+    """
+    Returns the due dates of the invoices of every page in the order the pages list them
+    """
+    pages, next_token = [], None
+    while True:
+        page_query = {**query, 'next_token': next_token} if next_token else query
+        response = handler(api_event(USER_ID, {'type': 'rental'}, query=page_query), context)
+        body = json.loads(response['body'])
+        assert response['statusCode'] == 200, body
+        data = body.get('data') or {}
+        pages.append([invoice['Due Date'] for year_invoices in data.get('invoices', {}).values()
+                      for invoice in year_invoices])
+        next_token = data.get('nextToken')
+        if not next_token:
+            return pages
+
+
+@pytest.mark.parametrize('order, descending', [('desc', True), ('asc', False)])
+def test_pages_follow_each_other_in_due_date_order(due_dates, handler, api_event, context, order, descending):
+    pages = read_all_pages(handler, api_event, context, {'limit': '5', 'order': order})
+
+    assert [len(page) for page in pages[:-1]] == [5] * (len(pages) - 1)
+    assert [due_date for page in pages for due_date in page] == \
+        sorted(due_dates, key=chronological, reverse=descending)
+
+
+def test_first_page_holds_the_latest_invoices(due_dates, handler, api_event, context):
+    response = handler(api_event(USER_ID, {'type': 'rental'}, query={'limit': '3'}), context)
+
+    invoices = json.loads(response['body'])['data']['invoices']
+    assert list(invoices) == ['2024']
+    assert [invoice['due_date_month'] for invoice in invoices['2024']] == ['12', '11', '10']
+
+
+def test_date_filters_are_applied_across_pages(due_dates, handler, api_event, context):
+    pages = read_all_pages(handler, api_event, context, {'limit': '4', 'from': '2022-11', 'to': '2023-06'})
+
+    assert [due_date for page in pages for due_date in page] == sorted(
+        (due_date for due_date in due_dates if '202211' <= chronological(due_date)[:6] <= '202306'),
+        key=chronological, reverse=True
+    )
+
+    pages = read_all_pages(handler, api_event, context, {'limit': '4', 'year': '2023', 'to': '2023-02'})
+    assert [[due_date[3:] for due_date in page] for page in pages] == [['02-2023', '01-2023']]
+
+
+def test_a_token_of_the_table_is_rejected(due_dates, handler, api_event, context):
+    from utils.utility_functions import encode_pagination_token
+
+    next_token = encode_pagination_token({'UserID': USER_ID, 'InvoiceID': 'Invoice_1'})
+    response = handler(api_event(USER_ID, {'type': 'rental'}, query={'limit': '5', 'next_token': next_token}),
+                       context)
+
+    assert response['statusCode'] == 400
@@ -0,0 +1,183 @@
+from decimal import Decimal
+
+import pytest
+
+from load_test import INVOICES_TABLE
+from load_test_aws import FakeSNS
+
+
+class FlakySNS(FakeSNS):
+    """
+    Fails the PublishBatch entries of the notifications containing one of failing_messages, like SNS does for single
+    entries of a request while publishing the others, in the first failing_requests requests
+    """
+
+    def __init__(self, failing_messages=(), failing_requests: int = None):
+        super().__init__()
+        self.failing_messages = set(failing_messages)
+        self.failing_requests = failing_requests
+        self.requests = []
+
+    def handle(self, operation, params):
+        if operation != 'PublishBatch':
+            return super().handle(operation, params)
+        entries = params['PublishBatchRequestEntries']
+        self.requests.append(len(entries))
+        failing = [entry for entry in entries if any(text in entry['Message'] for text in self.failing_messages)]
+        if self.failing_requests is not None and len(self.requests) > self.failing_requests:
+            failing = []
+        response = super().handle(operation, {
+            **params, 'PublishBatchRequestEntries': [entry for entry in entries if entry not in failing]
+        })
+        response['Failed'] = [{'Id': entry['Id'], 'Code': 'InternalError', 'Message': "Internal error",
+                               'SenderFault': False} for entry in failing]
+        return response
+
+
+@pytest.fixture
+def stream(aws):
+    records = []
+    aws.services['dynamodb'].on_stream_record = lambda table_name, record: records.append(record)
+    return records
+
+
+@pytest.fixture
+def handler(lambda_handler):
+    return lambda_handler('invoices', 'send_invoice_notification')
+
+
+def put_invoice(user_id: str, month: int, amount: int):
+    from utils.handler_utils import get_table
+
+    get_table(INVOICES_TABLE).put_item(Item={
+        'UserID': user_id,
+        'InvoiceID': f"Invoice_{month}",
+        'Due Date': f"28-{month:02d}-2024",
+        'due_date_month': str(month),
+        'due_date_year': '2024',
+        'Total Amount': Decimal(amount),
+    })
+
+
+def deliver(handler, context, records, max_retries: int = 5):
+    """
+    Delivers a batch like the event source mapping does: retried from the earliest record in batchItemFailures
+    """
+    responses = []
+    for _ in range(max_retries + 1):
+        response = handler({'Records': records}, context)
+        responses.append(response)
+        failed = {failure['itemIdentifier'] for failure in response['batchItemFailures']}
+        if not failed:
+            break
+        records = records[min(index for index, record in enumerate(records)
+                              if record['dynamodb']['SequenceNumber'] in failed):]
+    return responses
+
+
+def test_new_invoices_of_a_user_are_coalesced(aws, stream, handler, context):
+    for month in range(1, 13):
+        put_invoice('user-a', month, 8000 + month)
+    put_invoice('user-b', 5, 9000)
+
+    response = handler({'Records': stream}, context)
+
+    assert response == {'batchItemFailures': []}
+    messages = sorted(message['Message'] for message in aws.services['sns'].messages)
+    assert messages == [
+        "12 rental invoices imported, the latest of 8012 SEK with due date of 28-12-2024!",
+        "New rental invoice of 9000 SEK with due date of 28-05-2024 is now available!",
+    ]
+
+
+def test_publish_batch_requests_carry_at_most_10_entries(aws, stream, handler, context):
+    sns = aws.services['sns'] = FlakySNS()
+    for user in range(25):
+        put_invoice(f"user-{user}", 1, 1000 + user)
+
+    response = handler({'Records': stream}, context)
+
+    assert response == {'batchItemFailures': []}
+    assert sns.requests == [10, 10, 5]
+    assert len(sns.messages) == 25
+
+
+def test_every_record_after_a_failed_entry_is_reported(aws, stream, handler, context):
+    # user-a's digest covers the first and the third record, and is published in the same request as the failing
+    # notification of user-b, which covers the second
+    aws.services['sns'] = FlakySNS(failing_messages=["9000 SEK"])
+    put_invoice('user-a', 1, 8001)
+    put_invoice('user-b', 1, 9000)
+    put_invoice('user-a', 2, 8002)
+    put_invoice('user-c', 1, 7000)
+    sequence_numbers = [record['dynamodb']['SequenceNumber'] for record in stream]
+
+    response = handler({'Records': stream}, context)
+
+    assert [failure['itemIdentifier'] for failure in response['batchItemFailures']] == sequence_numbers[1:]
+
+
+def test_a_throttled_request_reports_the_whole_batch(aws, stream, handler, context):
+    aws.error_rates['sns'] = 1.0
+    put_invoice('user-a', 1, 8001)
+    put_invoice('user-b', 1, 9000)
+
+    response = handler({'Records': stream}, context)
+
+    assert [failure['itemIdentifier'] for failure in response['batchItemFailures']] == \
+        [record['dynamodb']['SequenceNumber'] for record in stream]
+    assert aws.services['sns'].messages == []
+
+
+def test_records_are_notified_once_the_retry_succeeds(aws, stream, handler, context):
+    sns = aws.services['sns'] = FlakySNS(failing_messages=["9000 SEK"], failing_requests=1)
+    put_invoice('user-a', 1, 8001)
+    put_invoice('user-b', 1, 9000)
+    put_invoice('user-a', 2, 8002)
+
+    responses = deliver(handler, context, stream)
+
+    assert len(responses) == 2
+    assert responses[-1] == {'batchItemFailures': []}
+    assert [message['Message'] for message in sns.messages if "9000 SEK" in message['Message']] == [
+        "New rental invoice of 9000 SEK with due date of 28-01-2024 is now available!"
+    ]
+    # the retry starts at user-b's record, after the first invoice of user-a
+    assert sns.messages[-1]['Message'] == \
+        "New rental invoice of 8002 SEK with due date of 28-02-2024 is now available!"
+
+
+def test_modified_and_malformed_records_are_skipped(aws, stream, handler, context):
+    from utils.handler_utils import get_table
+
+    put_invoice('user-a', 1, 8001)
+    get_table(INVOICES_TABLE).update_item(
+        Key={'UserID': 'user-a', 'InvoiceID': 'Invoice_1'},
+        UpdateExpression="SET is_paid = :paid",
+        ExpressionAttributeValues={':paid': True}
+    )
+    get_table(INVOICES_TABLE).put_item(Item={'UserID': 'user-b', 'InvoiceID': 'Invoice_1', 'Due Date': '28-01-2024'})
+
+    response = handler({'Records': stream}, context)
+
+    assert response == {'batchItemFailures': []}
+    assert [message['Message'] for message in aws.services['sns'].messages] == [
+        "New rental invoice of 8001 SEK with due date of 28-01-2024 is now available!"
+    ]
+
+
+def test_records_of_a_published_digest_after_a_failure_are_reported(aws, stream, handler, context):
+    # user-a's digest is published in the first request, but its second record comes after the failed notification
+    # of user-11 in the second request. Lambda processes that record again on the retry, so it is reported too
+    aws.services['sns'] = FlakySNS(failing_messages=["9011 SEK"])
+    put_invoice('user-a', 1, 8001)
+    for user in range(1, 13):
+        put_invoice(f"user-{user}", 1, 9000 + user)
+    put_invoice('user-a', 2, 8002)
+    sequence_numbers = [record['dynamodb']['SequenceNumber'] for record in stream]
+
+    response = handler({'Records': stream}, context)
+
+    assert "2 rental invoices imported, the latest of 8002 SEK with due date of 28-02-2024!" in \
+        [message['Message'] for message in aws.services['sns'].messages]
+    assert [failure['itemIdentifier'] for failure in response['batchItemFailures']] == sequence_numbers[11:]
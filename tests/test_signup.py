@@ -0,0 +1,55 @@
+import json
+import threading
+
+import pytest
+
+from load_test import USERS_TABLE
+
+EMAIL = 'tenant@example.com'
+
+
+@pytest.fixture
+def handler(aws, lambda_handler, monkeypatch):
+    # the cost factor doesn't matter here, only how the signups interleave
+    monkeypatch.setenv('BCRYPT_ROUNDS', '4')
+    return lambda_handler('users', 'signup_user')
+
+
+def signup_event(name: str) -> dict:
+    return {'body': json.dumps({'email': EMAIL, 'name': name, 'password': 'correct horse battery staple'})}
+
+
+def test_parallel_signups_with_the_same_email_create_one_user(aws, handler, context):
+    signups = 10
+    start = threading.Barrier(signups)
+    responses = [None] * signups
+
+    def signup(index):
+        start.wait()
+        responses[index] = handler(signup_event(f"Tenant {index}"), context)
+
+    threads = [threading.Thread(target=signup, args=(index,)) for index in range(signups)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    status_codes = sorted(response['statusCode'] for response in responses)
+    assert status_codes == [201] + [403] * (signups - 1)
+    for response in responses:
+        if response['statusCode'] == 403:
+            assert json.loads(response['body'])['error']['code'] == 'USER_ALREADY_EXISTS'
+
+    users = aws.services['dynamodb'].table(USERS_TABLE).items.values()
+    assert [user['Email'] for user in users if 'Email' in user] == [EMAIL]
+    guards = [user for user in users if user['UserID'] == f"EMAIL#{EMAIL}"]
+    assert len(guards) == 1
+
+
+def test_signup_with_a_registered_email_is_rejected(aws, handler, context):
+    assert handler(signup_event("Tenant"), context)['statusCode'] == 201
+
+    response = handler(signup_event("Someone else"), context)
+
+    assert response['statusCode'] == 403
+    assert json.loads(response['body'])['error']['code'] == 'USER_ALREADY_EXISTS'
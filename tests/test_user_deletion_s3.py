@@ -0,0 +1,110 @@
+import threading
+
+import pytest
+
+from load_test import BUCKET_NAME
+from load_test_aws import FakeS3
+
+USER_ID = 'user-1'
+OBJECTS = 25000
+
+
+class FlakyS3(FakeS3):
+    """
+    Records the keys of every DeleteObjects request, and reports the keys chosen by fails(key, attempt) as per-key
+    errors of the response instead of deleting them, like S3 does for e.g. SlowDown or InternalError
+    """
+
+    def __init__(self, fails=lambda key, attempt: False):
+        super().__init__()
+        self.fails = fails
+        self.delete_requests = []
+        self._attempts = {}
+        self._attempts_lock = threading.Lock()
+
+    def _delete_objects(self, params):
+        keys = [entry['Key'] for entry in params['Delete']['Objects']]
+        failed = []
+        with self._attempts_lock:
+            self.delete_requests.append(keys)
+            for key in keys:
+                self._attempts[key] = self._attempts.get(key, 0) + 1
+                if self.fails(key, self._attempts[key]):
+                    failed.append(key)
+        response = super()._delete_objects({
+            **params, 'Delete': {**params['Delete'], 'Objects': [{'Key': key} for key in keys if key not in failed]}
+        })
+        if failed:
+            response['Errors'] = [{'Key': key, 'Code': 'InternalError', 'Message': "We encountered an internal error."}
+                                  for key in failed]
+        return response
+
+
+@pytest.fixture
+def s3_utils(aws, monkeypatch):
+    from utils import s3_utils
+
+    monkeypatch.setattr(s3_utils, 'S3_DELETE_RETRY_BASE_DELAY_SECONDS', 0)
+    return s3_utils
+
+
+def fill_bucket(s3: FakeS3):
+    for number in range(OBJECTS):
+        s3.objects[(BUCKET_NAME, f"rental-invoices/{USER_ID}/Hyresavi_{number:05d}.pdf")] = b'%PDF'
+    # the folders of other users, including one whose ID starts with this user's
+    s3.objects[(BUCKET_NAME, f"rental-invoices/{USER_ID}0/Hyresavi_1.pdf")] = b'%PDF'
+    s3.objects[(BUCKET_NAME, "rental-invoices/user-2/Hyresavi_1.pdf")] = b'%PDF'
+
+
+def user_keys(s3: FakeS3) -> list:
+    return [key for bucket, key in s3.objects if key.startswith(f"rental-invoices/{USER_ID}/")]
+
+
+def test_large_folder_is_deleted_in_batches_of_1000(aws, s3_utils):
+    from utils.handler_utils import get_client
+
+    s3 = aws.services['s3'] = FlakyS3()
+    fill_bucket(s3)
+
+    s3_utils.delete_user_folder_in_s3(get_client('s3'), USER_ID, BUCKET_NAME)
+
+    assert user_keys(s3) == []
+    assert len(s3.objects) == 2
+    assert sorted(len(keys) for keys in s3.delete_requests) == [1000] * (OBJECTS // 1000)
+    assert aws.calls['s3.DeleteObjects'] == OBJECTS // 1000
+    assert aws.calls.get('s3.DeleteObject', 0) == 0
+
+
+def test_keys_failing_in_a_batch_are_retried_alone(aws, s3_utils):
+    from utils.handler_utils import get_client
+
+    # the keys ending in 7 fail once, and the keys ending in 000 twice
+    s3 = aws.services['s3'] = FlakyS3(fails=lambda key, attempt: attempt <= 2 if key.endswith('000.pdf')
+                                       else attempt == 1 and key.endswith('7.pdf'))
+    fill_bucket(s3)
+
+    s3_utils.delete_user_folder_in_s3(get_client('s3'), USER_ID, BUCKET_NAME)
+
+    assert user_keys(s3) == []
+    first_attempts = [keys for keys in s3.delete_requests if len(keys) == 1000]
+    retries = [keys for keys in s3.delete_requests if len(keys) < 1000]
+    assert len(first_attempts) == OBJECTS // 1000
+    # a second attempt per batch with its failed keys, and a third with its key ending in 000
+    assert sorted(len(keys) for keys in retries) == [1] * (OBJECTS // 1000) + [101] * (OBJECTS // 1000)
+    assert all(key.endswith(('7.pdf', '000.pdf')) for keys in retries for key in keys)
+
+
+def test_keys_that_keep_failing_raise_an_error(aws, s3_utils):
+    from utils.handler_utils import get_client
+    from utils.exceptions import S3Error
+
+    s3 = aws.services['s3'] = FlakyS3(fails=lambda key, attempt: key.endswith('12345.pdf'))
+    fill_bucket(s3)
+
+    with pytest.raises(S3Error):
+        s3_utils.delete_user_folder_in_s3(get_client('s3'), USER_ID, BUCKET_NAME)
+
+    # everything else is deleted, and the key is left for the next run of the deletion
+    assert user_keys(s3) == [f"rental-invoices/{USER_ID}/Hyresavi_12345.pdf"]
+    assert [keys for keys in s3.delete_requests if len(keys) < 1000] == \
+        [[f"rental-invoices/{USER_ID}/Hyresavi_12345.pdf"]] * (s3_utils.S3_DELETE_MAX_ATTEMPTS - 1)